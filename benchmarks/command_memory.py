@@ -0,0 +1,74 @@
+#! /usr/bin/env python3
+
+"""
+Benchmark reports the memory held per in-flight command.
+A command is in flight from the moment an interface receives it until it's result is posted.
+While in flight it's kept in the interface inventory and the command queue,
+then in the handler (command + receiver) of an executor worker.
+
+Use like:
+    python3 benchmarks/command_memory.py [--count N]
+"""
+
+import argparse
+import gc
+import tracemalloc
+from queue import Queue
+from typing import Any, Callable
+
+from kitchen_aid.__main__ import register_commands
+from kitchen_aid.models.command import CommandHandler, Result
+from kitchen_aid.models.interact import ClearTextInterface
+
+
+def measure(count: int, build: Callable[[int], Any]) -> float:
+    """ Bytes allocated per object created by build """
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    kept = [build(i) for i in range(count)]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Don't count the list holding the objects
+    per_item = (end - start - kept.__sizeof__()) / count
+    del kept
+    return per_item
+
+
+def main() -> None:
+    """ Run the benchmark """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--count", type=int, default=20000, help="In-flight commands")
+    args = parser.parse_args()
+    register_commands()
+    command_queue: Queue = Queue()
+    iface = ClearTextInterface(command_queue, Queue(), inventory_size=args.count * 2)
+
+    def kw_args(i: int) -> dict[str, Any]:
+        return {
+            "url": f"http://example.com/page/{i:08d}",
+            "method": "GET", "headers": {}, "params": {}, "data": None, "timeout": 10,
+        }
+
+    def queued(i: int) -> bool:
+        return iface.receive_command("get-page", [], kw_args(i), iface.main_thread)
+
+    def handler(i: int) -> CommandHandler:
+        return CommandHandler("get-page", [], kw_args(i))
+
+    def result(i: int) -> Result:
+        return Result(True, "", [str(i)] if i < 0 else [])
+
+    results = {
+        "queued (inventory + queue)": measure(args.count, queued),
+        "executing (handler + command + receiver)": measure(args.count, handler),
+        "result (without payload)": measure(args.count, result),
+    }
+    print(f"Bytes per in-flight command, {args.count} commands")
+    for name, size in results.items():
+        print(f"  {name:<45} {size:10.1f}")
+    print(f"  {'total':<45} {sum(results.values()):10.1f}")
+
+
+if __name__ == "__main__":
+    main()
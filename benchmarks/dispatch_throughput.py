@@ -0,0 +1,118 @@
+#! /usr/bin/env python3
+
+"""
+Benchmark reports the dispatch throughput and latency of the command engine.
+Producer threads (the interfaces) queue no-op calls, so only the cost of getting a call
+to a worker is measured:
+* two-queue - calls go through a `queue.Queue` to a dispatcher thread, which submits them
+    to a pool, the way the engine dispatched commands before
+* direct - producers submit to the work-stealing pool themselves, the way `CommandDispatcher` does
+Two-queue is run on `ThreadPoolExecutor` and on the adaptive pool, to tell the gain
+of dropping the dispatcher thread from the gain of the per-worker queues.
+Throughput is measured with the producers queueing as fast as they can,
+latency (from queueing a call to a worker starting it) with the producers pausing between calls.
+Under the GIL, producers that never block compete with the workers for it; on few cores
+that's what the throughput at many producers mostly shows.
+
+Use like:
+    python3 benchmarks/dispatch_throughput.py [--producers 1 4 16] [--calls N] [--workers 8]
+"""
+
+import argparse
+import itertools
+import os
+import statistics
+import sys
+from concurrent.futures import Executor, ThreadPoolExecutor
+from queue import Queue
+from threading import Barrier, Event, Thread
+from time import perf_counter, sleep
+from typing import Callable
+
+from kitchen_aid.models.executor import AdaptiveThreadPoolExecutor
+
+
+# pylint: disable=too-many-arguments,too-many-locals
+def run(
+    producers: int, calls: int, pool: Executor, direct: bool, pause: float = 0.0
+) -> tuple[float, list[float]]:
+    """ Calls per second, from the first call queued to the last one done, and the latencies """
+    total = producers * calls
+    done = itertools.count(1)
+    finished = Event()
+    barrier = Barrier(producers + 1)
+    latencies: list[float] = []
+
+    def call(queued: float) -> None:
+        latencies.append(perf_counter() - queued)
+        if next(done) == total:
+            finished.set()
+
+    queue: Queue = Queue()
+
+    def dispatch() -> None:
+        while (queued := queue.get()) is not None:
+            pool.submit(call, queued)
+
+    def produce() -> None:
+        barrier.wait()
+        for _ in range(calls):
+            if direct:
+                pool.submit(call, perf_counter())
+            else:
+                queue.put(perf_counter())
+            if pause:
+                sleep(pause)
+
+    if not direct:
+        Thread(target=dispatch, daemon=True).start()
+    threads = [Thread(target=produce) for _ in range(producers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = perf_counter()
+    finished.wait()
+    elapsed = perf_counter() - start
+    queue.put(None)
+    pool.shutdown()
+    return total / elapsed, latencies
+
+
+def main() -> None:
+    """ Run the benchmark """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-p", "--producers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("-n", "--calls", type=int, default=20000, help="Calls per producer")
+    parser.add_argument("-w", "--workers", type=int, default=8)
+    parser.add_argument(
+        "--pause", type=float, default=0.001, help="Seconds between the calls of a producer, "
+        "when measuring latency"
+    )
+    args = parser.parse_args()
+    designs: dict[str, Callable[[], tuple[Executor, bool]]] = {
+        "two-queue, thread pool": lambda: (ThreadPoolExecutor(args.workers), False),
+        "two-queue, adaptive": lambda: (
+            AdaptiveThreadPoolExecutor(args.workers, args.workers), False
+        ),
+        "direct, adaptive": lambda: (AdaptiveThreadPoolExecutor(args.workers, args.workers), True),
+    }
+    print(f"Python {sys.version.split()[0]}, {os.cpu_count()} CPUs, {args.workers} workers")
+    header = f"{'producers':>10}" + "".join(f"{name:>26}" for name in designs)
+    print("Throughput\n" + header)
+    for producers in args.producers:
+        rates = [run(producers, args.calls, *design())[0] for design in designs.values()]
+        print(f"{producers:>10}" + "".join(f"{rate:>21.0f} op/s" for rate in rates))
+    print(f"Latency p50 / p99 in microseconds, {args.pause * 1000:g}ms between calls\n" + header)
+    for producers in args.producers:
+        cells = []
+        for design in designs.values():
+            latencies = sorted(
+                run(producers, max(args.calls // 20, 100), *design(), args.pause)[1]
+            )
+            p99 = latencies[int(len(latencies) * 0.99)]
+            cells.append(f"{statistics.median(latencies) * 1e6:.0f} / {p99 * 1e6:.0f}")
+        print(f"{producers:>10}" + "".join(f"{cell:>26}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
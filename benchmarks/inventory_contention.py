@@ -0,0 +1,63 @@
+#! /usr/bin/env python3
+
+"""
+Benchmark reports the throughput of the command inventory under contention.
+Every thread adds, reads and removes it's own commands, the way interfaces and the result
+emitter do, on a single inventory striped over 1 and more shards.
+Run it on a free-threaded build (python3.13t) as well, that's where a single lock hurts most.
+
+Use like:
+    python3 benchmarks/inventory_contention.py [--threads 1 4 16] [--ops N] [--shards 1 16]
+"""
+
+import argparse
+import sys
+import sysconfig
+from threading import Barrier, Thread
+from time import perf_counter
+
+from kitchen_aid.models.inventory import CommandInventory
+
+
+def run(threads: int, ops: int, shards: int) -> float:
+    """ Inventory operations per second of all threads together """
+    inventory = CommandInventory(threads * ops + 1, 3600, shards=shards)
+    barrier = Barrier(threads + 1)
+
+    def work(worker: int) -> None:
+        cmd_ids = [f"cmd:get-page;args:;kw_args:url--{worker}/{i};thread:{worker}"
+                   for i in range(ops)]
+        barrier.wait()
+        for cmd_id in cmd_ids:
+            inventory.add(cmd_id, cmd_id)
+            inventory.get(cmd_id)
+            inventory.pop(cmd_id)
+
+    workers = [Thread(target=work, args=(worker,)) for worker in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = perf_counter()
+    for worker in workers:
+        worker.join()
+    return threads * ops * 3 / (perf_counter() - start)
+
+
+def main() -> None:
+    """ Run the benchmark """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", "--threads", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("-n", "--ops", type=int, default=20000, help="Commands per thread")
+    parser.add_argument("-s", "--shards", type=int, nargs="+", default=[1, 16])
+    args = parser.parse_args()
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    free_threaded = bool(sysconfig.get_config_var("Py_GIL_DISABLED"))
+    print(f"Python {sys.version.split()[0]}, free-threaded build: {free_threaded}, GIL: {gil}")
+    print(f"{'threads':>8}" + "".join(f"{f'{shards} shards':>16}" for shards in args.shards))
+    for threads in args.threads:
+        rates = [run(threads, args.ops, shards) for shards in args.shards]
+        print(f"{threads:>8}" + "".join(f"{rate:>12.0f} op/s" for rate in rates))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,85 @@ Use like:
     python3 -m kitchen_aid --config config
     OR
     python3 -m kitchen_aid --command command [with optional args]
+    OR
+    python3 -m kitchen_aid --batch [file] [--max-in-flight N]
+    OR
+    python3 -m kitchen_aid --replay recording [--speed N]
 """
 
-from time import sleep
 import argparse
+import logging
+import os
+import signal
+import sys
 from sys import argv
-from threading import Thread
+from threading import Event, Thread
+from typing import Any
 
-from kitchen_aid.models.command import CommandMapper, CommandHandler
-from kitchen_aid.models.engine import CommandEngine, InteractEngine
+from kitchen_aid.models.budget import DEFAULT_MAX_WAIT, configure_budget
+from kitchen_aid.models.command import CommandArgumentParser, CommandMapper, CommandHandler
+from kitchen_aid.models.compression import configure_compression
+from kitchen_aid.models.config import (
+    DEFAULT_GRACE_PERIOD, ConfigWatcher, changed_sections, load_config
+)
+from kitchen_aid.models.engine import DEFAULT_FLUSH_TIMEOUT, CommandEngine, InteractEngine
+from kitchen_aid.models.exceptions import (
+    InvalidCommandArguments,
+    InvalidConfig,
+    InvalidRecording,
+)
+from kitchen_aid.models.executor import DEFAULT_TARGET_WAIT
+from kitchen_aid.models.interact import ClearTextInterface, InteractInterfacesRegistry
+from kitchen_aid.models.log import close_logging, configure_logging
+from kitchen_aid.models.pipeline import configure_pipelines
+from kitchen_aid.models.profiler import (
+    DEFAULT_DURATION, DEFAULT_INTERVAL, DEFAULT_TOP, configure_profiles
+)
+from kitchen_aid.models.recorder import configure_recorder
+from kitchen_aid.models.replay import Recording, Replayer
+from kitchen_aid.models.scheduler import Scheduler
 
 # commands
+from kitchen_aid.pkgs.commands.extract_page import (
+    ExtractPage, PageExtraction
+)
 from kitchen_aid.pkgs.commands.get_web_page import (
     GetWebPage, HTTPRequest
 )
+from kitchen_aid.pkgs.commands.get_web_pages import (
+    GetWebPages, HTTPBatchRequest
+)
+from kitchen_aid.pkgs.commands.hedge_stats import (
+    HedgeStats, HedgingStats
+)
+from kitchen_aid.pkgs.commands.memory_stats import (
+    MemoryStats, MemoryBudgetStats
+)
+from kitchen_aid.pkgs.commands.profile import (
+    ProfileThreads, ProfileRequest
+)
+from kitchen_aid.pkgs.commands.run_pipeline import (
+    RunPipeline, PipelineFile
+)
+from kitchen_aid.pkgs.commands.schedule import (
+    ManageSchedules, ScheduleRequest
+)
+
+# http
+from kitchen_aid.pkgs.http.cache import DEFAULT_CACHE_SIZE, configure_cache
+from kitchen_aid.pkgs.http.delta import configure_fingerprints
+from kitchen_aid.pkgs.http.dns import configure_dns
+from kitchen_aid.pkgs.http.hedging import close_hedging, configure_hedging
+from kitchen_aid.pkgs.http.http_requests import configure_url_files
+from kitchen_aid.pkgs.http.replay import install_stub
+from kitchen_aid.pkgs.http.warmup import configure_warmup
+
+# interfaces
+from kitchen_aid.pkgs.interacts.http_interface import HTTPInterface
+from kitchen_aid.pkgs.interacts.unix_socket import UnixSocketInterface
+
+
+LOG: logging.Logger = logging.getLogger("kitchen_aid")
 
 
 def usage(args: list[str]) -> None:
@@ -27,6 +92,11 @@ def usage(args: list[str]) -> None:
     print("Usage: python3 -m kitchen_aid --config config")
     print("OR")
     print("Usage: python3 -m kitchen_aid --command command [with optional args]")
+    print("OR")
+    print("Usage: python3 -m kitchen_aid --batch [file] [--max-in-flight N]")
+    print("Batch reads commands from file (or stdin when omitted), one per line")
+    print("OR")
+    print("Usage: python3 -m kitchen_aid --replay recording [--speed N]")
     print("Command args are specific to the command")
     print(f"Called with args: {args}")
 
@@ -34,9 +104,9 @@ def usage(args: list[str]) -> None:
 def register_commands() -> None:
     """ Register commands """
 
-    def generate_parser(arguments: list[tuple[list, dict]]) -> argparse.ArgumentParser:
+    def generate_parser(arguments: list[tuple[list, dict]]) -> CommandArgumentParser:
         """ Generate a parser from args"""
-        parser = argparse.ArgumentParser()
+        parser = CommandArgumentParser()
         for args, kwargs in arguments:
             parser.add_argument(*args, **kwargs)
         return parser
@@ -67,37 +137,375 @@ def register_commands() -> None:
                 ["-t", "--timeout"],
                 {"help": "HTTP timeout", "type": int, "default": 10},
             ),
+            (
+                ["--no-cache"],
+                {"help": "Skip the HTTP cache", "dest": "cache", "action": "store_false"},
+            ),
+            (
+                ["--hedge"],
+                {"help": "Hedge slow requests", "action": "store_true"},
+            ),
+            (
+                ["--delta"],
+                {"help": "Report only the changes since the previous request",
+                 "action": "store_true"},
+            ),
         ])
     )
+    CommandMapper().register(
+        GetWebPages,
+        HTTPBatchRequest,
+        "get-pages",
+        generate_parser([
+            (['urls'], {"help": "URLs to get", "nargs": "*"}),
+            (
+                ["-f", "--url-file"],
+                {
+                    "help": "File with URLs to get, one per line, relative to the URL directory",
+                    "type": str,
+                    "default": None,
+                },
+            ),
+            (
+                ["-c", "--concurrency"],
+                {"help": "Max concurrent requests", "type": int, "default": 10},
+            ),
+            (
+                ["-t", "--timeout"],
+                {"help": "HTTP timeout", "type": int, "default": 10},
+            ),
+            (
+                ["--no-cache"],
+                {"help": "Skip the HTTP cache", "dest": "cache", "action": "store_false"},
+            ),
+            (
+                ["--hedge"],
+                {"help": "Hedge slow requests", "action": "store_true"},
+            ),
+            (
+                ["--status-only"],
+                {"help": "Report status and size instead of bodies", "action": "store_true"},
+            ),
+        ])
+    )
+    CommandMapper().register(
+        ExtractPage,
+        PageExtraction,
+        "extract-page",
+        generate_parser([
+            (['url'], {"help": "URL of the page, omitted in pipelines", "nargs": "?"}),
+            (
+                ["-s", "--select"],
+                {"help": "Keep the content of elements matching a CSS selector",
+                 "action": "append", "default": None},
+            ),
+            (
+                ["-x", "--exclude"],
+                {"help": "Drop the content of elements matching a CSS selector",
+                 "action": "append", "default": None},
+            ),
+            (
+                ["--links"],
+                {"help": "Render links inline, as markdown", "action": "store_true"},
+            ),
+            (
+                ["--headers"],
+                {"help": "HTTP headers", "type": dict[str, str], "default": {}}
+            ),
+            (
+                ["-t", "--timeout"],
+                {"help": "HTTP timeout", "type": int, "default": 10},
+            ),
+        ])
+    )
+    CommandMapper().register(
+        HedgeStats,
+        HedgingStats,
+        "hedge-stats",
+        generate_parser([]),
+    )
+    CommandMapper().register(
+        MemoryStats,
+        MemoryBudgetStats,
+        "memory-stats",
+        generate_parser([]),
+    )
+    CommandMapper().register(
+        ProfileThreads,
+        ProfileRequest,
+        "profile",
+        generate_parser([
+            (
+                ["-d", "--duration"],
+                {"help": "Seconds to sample for", "type": float, "default": DEFAULT_DURATION},
+            ),
+            (
+                ["-i", "--interval"],
+                {"help": "Seconds between samples", "type": float, "default": DEFAULT_INTERVAL},
+            ),
+            (
+                ["-n", "--top"],
+                {"help": "Functions listed per thread", "type": int, "default": DEFAULT_TOP},
+            ),
+            (
+                ["-o", "--output"],
+                {
+                    "help": "File for the collapsed stacks, relative to the profile directory",
+                    "type": str,
+                    "default": None,
+                },
+            ),
+            (
+                ["--threads"],
+                {"help": "Glob of the thread names to sample", "type": str, "default": None},
+            ),
+        ])
+    )
+    CommandMapper().register(
+        RunPipeline,
+        PipelineFile,
+        "pipeline",
+        generate_parser([
+            (
+                ['spec'],
+                {"help": "Pipeline spec file, JSON or YAML, relative to the pipeline directory"},
+            ),
+            (
+                ["-w", "--max-workers"],
+                {"help": "Max stages executed at once", "type": int, "default": None},
+            ),
+        ])
+    )
+    CommandMapper().register(
+        ManageSchedules,
+        ScheduleRequest,
+        "schedule",
+        generate_parser([
+            (['action'], {"help": "Action", "choices": ["add", "remove", "list"]}),
+            (['name'], {"help": "Schedule name", "nargs": "?", "default": None}),
+            (
+                ["--every"],
+                {"help": "Run every N seconds", "type": float, "default": None},
+            ),
+            (
+                ["--cron"],
+                {"help": "Run on a cron expression or macro (@hourly)", "default": None},
+            ),
+            (
+                ["--jitter"],
+                {"help": "Max random delay of a run in seconds", "type": float, "default": None},
+            ),
+            (
+                ['target'],
+                {
+                    "help": "Command and it's arguments. Schedule options go before the action",
+                    "nargs": argparse.REMAINDER,
+                },
+            ),
+        ])
+    )
+
+
+def register_interfaces() -> None:
+    """ Register interface types, so they can be referenced in the config """
+    InteractInterfacesRegistry().register_type(HTTPInterface, "http")
+    InteractInterfacesRegistry().register_type(UnixSocketInterface, "unix")
+    InteractInterfacesRegistry().register_type(Scheduler, "scheduler")
 
 
 def execute_command_flow(args: list[str]) -> None:
     """ Execute a command """
     command_name = args[0]
+    # Local flows read URL files and pipeline specs relative to the working directory
+    configure_url_files(os.getcwd())
+    configure_pipelines(os.getcwd())
     _, _, parser = CommandMapper().get_command(command_name)
-    kw_args = vars(parser.parse_args(args[1:]))
+    try:
+        kw_args = vars(parser.parse_args(args[1:]))
+    except InvalidCommandArguments as error:
+        sys.exit(f"{parser.format_help()}\n{command_name}: error: {error}")
     cmd_handler = CommandHandler(
         command=command_name, args=[], kwargs=kw_args, retry_limit=0
     )
+    cmd_handler.command.set_emitter(print)
     print(cmd_handler.command.execute())
 
 
+def execute_batch_flow(args: list[str]) -> int:
+    """
+    Execute commands in batch mode.
+    Returns the number of failed commands.
+    """
+    parser = argparse.ArgumentParser(prog="kitchen_aid --batch")
+    parser.add_argument("source", nargs="?", default="-", help="Commands file, - for stdin")
+    parser.add_argument(
+        "-j", "--max-in-flight", type=int, default=16, help="Max concurrent commands"
+    )
+    parsed = parser.parse_args(args)
+    configure_url_files(os.getcwd())
+    configure_pipelines(os.getcwd())
+    cmd_engine = CommandEngine()
+    Thread(target=cmd_engine.run, daemon=True, name="cmd_engine").start()
+    iface = ClearTextInterface(cmd_engine.command_queue, cmd_engine.command_result_queue)
+    if parsed.source == "-":
+        tracker = iface.run_batch(sys.stdin, max_in_flight=parsed.max_in_flight)
+    else:
+        with open(parsed.source, "r", encoding="utf-8") as source:
+            tracker = iface.run_batch(source, max_in_flight=parsed.max_in_flight)
+    print(f"Batch done: {tracker.succeeded} succeeded, {tracker.failed} failed")
+    return tracker.failed
+
+
+def execute_replay_flow(args: list[str]) -> int:
+    """
+    Replay a traffic recording against stubbed upstreams and print the comparison.
+    Returns the number of failed commands.
+    """
+    parser = argparse.ArgumentParser(prog="kitchen_aid --replay")
+    parser.add_argument("recording", help="Recording file, gzipped when it ends with .gz")
+    parser.add_argument(
+        "-s", "--speed", type=float, default=1.0, help="Replay N times faster than recorded"
+    )
+    parser.add_argument(
+        "-w", "--max-workers", type=int, default=None, help="Max commands executed at once"
+    )
+    parser.add_argument(
+        "-t", "--timeout", type=float, default=60.0,
+        help="Seconds to wait for the results after the last command",
+    )
+    parsed = parser.parse_args(args)
+    try:
+        recording = Recording.load(parsed.recording)
+    except InvalidRecording as error:
+        print(error)
+        return 1
+    transport = install_stub(recording)
+    # Hedging would double the stubbed requests
+    report = Replayer(
+        recording, parsed.speed, parsed.max_workers, overrides={"hedge": False}
+    ).run(parsed.timeout)
+    print(report.format())
+    print(f"Stubbed requests: {transport.served}")
+    return report.replay.failed
+
+
+def configure_http(conf: dict[str, Any]) -> None:
+    """
+    Configure the process wide HTTP cache, hedging, DNS cache, page fingerprints,
+      URL file directory and connection warmup
+    """
+    cache = conf.get("cache")
+    if cache:
+        configure_cache(cache["directory"], cache.get("max_bytes", DEFAULT_CACHE_SIZE))
+    else:
+        configure_cache(None)
+    configure_hedging(**conf.get("hedging", {}))
+    configure_dns(**conf.get("dns", {}))
+    configure_fingerprints(**conf.get("delta", {}))
+    configure_url_files(conf.get("url_directory"))
+    warmup = dict(conf.get("warmup", {}))
+    configure_warmup(warmup.pop("urls", None), **warmup)
+
+
+def configure_memory(conf: dict[str, Any]) -> None:
+    """ Configure the process wide memory budget of command payloads """
+    configure_budget(conf.get("max_bytes"), conf.get("max_wait", DEFAULT_MAX_WAIT))
+
+
+def apply_config(
+    previous: dict[str, Any],
+    config: dict[str, Any],
+    cmd_engine: CommandEngine,
+    int_engine: InteractEngine,
+) -> None:
+    """
+    Apply the sections of a reloaded config that changed.
+    Queues and in-flight work are kept.
+    """
+    changed = changed_sections(previous, config)
+    LOG.info("Config reloaded", extra={"sections": sorted(changed)})
+    if "logging" in changed:
+        configure_logging(**config["logging"])
+    if "engine" in changed:
+        engine = config["engine"]
+        cmd_engine.set_max_workers(
+            engine.get("max_workers"),
+            engine.get("min_workers", 1),
+            engine.get("target_wait", DEFAULT_TARGET_WAIT),
+        )
+    if "memory" in changed:
+        configure_memory(config["memory"])
+    if "compression" in changed:
+        configure_compression(**config["compression"])
+    if "http" in changed:
+        configure_http(config["http"])
+    if "profile" in changed:
+        configure_profiles(config["profile"].get("directory"))
+    if "pipeline" in changed:
+        configure_pipelines(config["pipeline"].get("directory"))
+    if "recording" in changed:
+        configure_recorder(config["recording"].get("path"))
+    if "interacts" in changed:
+        int_engine.reconfigure(config)
+
+
+def shutdown(cmd_engine: CommandEngine, int_engine: InteractEngine, grace: float) -> int:
+    """
+    Stop accepting commands, wait up to grace for the commands in flight and stop.
+    Returns the number of commands that were cancelled.
+    """
+    int_engine.drain()
+    failed = cmd_engine.shutdown(grace)
+    int_engine.stop(DEFAULT_FLUSH_TIMEOUT)
+    close_hedging()
+    configure_warmup(None)
+    configure_recorder(None)
+    return failed
+
+
 def execute_robot_flow(conf: str) -> None:
     """ This should trigger the standard execution flow """
-    print("Standard execution flow")
-    print(f"Conf file: {conf}")
-    cmd_engine = CommandEngine()
+    try:
+        config = load_config(conf)
+    except InvalidConfig as error:
+        LOG.error("%s", error)
+        sys.exit(1)
+    configure_logging(**config["logging"])
+    LOG.info("Standard execution flow", extra={"config": conf})
+    configure_memory(config["memory"])
+    configure_compression(**config["compression"])
+    configure_http(config["http"])
+    configure_recorder(config["recording"].get("path"))
+    configure_profiles(config["profile"].get("directory"))
+    configure_pipelines(config["pipeline"].get("directory"))
+    cmd_engine = CommandEngine(**config["engine"])
     int_engine = InteractEngine(
-        {"interacts": {}},
+        config,
         cmd_engine.command_queue,
         cmd_engine.command_result_queue
     )
+    watcher = ConfigWatcher(
+        conf,
+        lambda previous, new: apply_config(previous, new, cmd_engine, int_engine),
+        config,
+    )
+    watcher.install_signal_handler()
     eng_thread = Thread(target=cmd_engine.run, daemon=True)
     int_thread = Thread(target=int_engine.run, daemon=True)
+    watch_thread = Thread(target=watcher.run, daemon=True, name="config_watcher")
+    stop = Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
     eng_thread.start()
     int_thread.start()
-    while True:
-        sleep(100000)
+    watch_thread.start()
+    stop.wait()
+    watcher.stop()
+    grace = watcher.config["shutdown"].get("grace_period", DEFAULT_GRACE_PERIOD)
+    LOG.info("Shutting down", extra={"grace_period": grace})
+    failed = shutdown(cmd_engine, int_engine, grace)
+    LOG.info("Shut down", extra={"cancelled": failed})
+    close_logging()
 
 
 def main(args: list) -> None:
@@ -108,12 +516,17 @@ def main(args: list) -> None:
         usage(args)
         return
     register_commands()
+    register_interfaces()
     if args[1] == "--config":
-        execute_robot_flow(argv[2])
+        execute_robot_flow(args[2])
         return
     if args[1] == "--command":
         execute_command_flow(args[2:])
         return
+    if args[1] == "--batch":
+        sys.exit(1 if execute_batch_flow(args[2:]) else 0)
+    if args[1] == "--replay":
+        sys.exit(1 if execute_replay_flow(args[2:]) else 0)
 
 
 if __name__ == "__main__":
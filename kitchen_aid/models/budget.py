@@ -0,0 +1,197 @@
+#! /usr/bin/env python3
+
+"""
+This module provides the process wide memory budget of command payloads.
+Receivers reserve the bytes of the payloads they read. A reservation is held by
+the result carrying the payload and is released with it, so the budget tracks
+the payloads of the commands in flight and of the results waiting to be posted.
+Once the budget is used up, new reservations and new commands wait for
+the budget to free up. Bytes that don't fit in the budget are refused,
+so the reserved bytes never exceed it.
+"""
+
+from threading import Condition, RLock
+from time import monotonic
+from typing import Any
+
+import kitchen_aid.models.exceptions as excs
+
+
+DEFAULT_MAX_WAIT: float = 30.0
+
+
+class Reservation:
+    """
+    Bytes reserved from a budget.
+    Released explicitly or when the reservation is garbage collected.
+    """
+
+    __slots__ = ("_budget", "size")
+
+    def __init__(self, budget: "MemoryBudget") -> None:
+        self._budget: MemoryBudget | None = budget
+        self.size: int = 0
+
+    def grow(self, nbytes: int) -> None:
+        """
+        Add bytes to the reservation. Never waits - the payload is already being read.
+        Raises MemoryBudgetExhausted when the bytes don't fit in the budget,
+          the reservation keeps the bytes it had.
+        """
+        if self._budget is not None:
+            self._budget.charge(nbytes)
+            self.size += nbytes
+
+    def release(self) -> None:
+        """ Give the bytes back to the budget """
+        budget, self._budget = self._budget, None
+        if budget is not None:
+            budget.credit(self.size)
+
+    def __del__(self) -> None:
+        self.release()
+
+
+# pylint: disable=too-many-instance-attributes
+class MemoryBudget:
+    """ Bytes available to the payloads of all commands """
+
+    def __init__(self, max_bytes: int, max_wait: float = DEFAULT_MAX_WAIT) -> None:
+        if max_bytes < 1:
+            raise ValueError("Memory budget should be positive")
+        self.max_bytes: int = max_bytes
+        self.max_wait: float = max_wait
+        # Reservations are released from finalizers, which can run while the lock is held
+        self._cond: Condition = Condition(RLock())
+        self._used: int = 0
+        self._peak: int = 0
+        self._reservations: int = 0
+        self._waiting: int = 0
+        self._waited: int = 0
+        self._timeouts: int = 0
+        self._refused: int = 0
+
+    @property
+    def used(self) -> int:
+        """ Get the reserved bytes """
+        return self._used
+
+    @property
+    def exhausted(self) -> bool:
+        """ Is the whole budget reserved """
+        return self._used >= self.max_bytes
+
+    def configure(self, max_bytes: int, max_wait: float = DEFAULT_MAX_WAIT) -> None:
+        """ Change the budget in place. Reservations are kept. """
+        if max_bytes < 1:
+            raise ValueError("Memory budget should be positive")
+        with self._cond:
+            self.max_bytes = max_bytes
+            self.max_wait = max_wait
+            self._cond.notify_all()
+
+    def wait_available(self, timeout: float | None = None) -> bool:
+        """ Wait until the budget is not exhausted. Returns False on timeout. """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self.exhausted, timeout)
+
+    def reserve(self, timeout: float | None = None) -> Reservation:
+        """
+        Start a reservation, waiting while the budget is exhausted.
+        Raises MemoryBudgetExhausted if the budget doesn't free up within timeout
+          (`max_wait` by default).
+        """
+        timeout = self.max_wait if timeout is None else timeout
+        with self._cond:
+            if self.exhausted:
+                self._waited += 1
+                self._waiting += 1
+                deadline = monotonic() + timeout
+                try:
+                    while self.exhausted:
+                        remaining = deadline - monotonic()
+                        if remaining <= 0:
+                            self._timeouts += 1
+                            raise excs.MemoryBudgetExhausted(
+                                f"Memory budget exhausted, {self._used} of "
+                                f"{self.max_bytes} bytes in use"
+                            )
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._reservations += 1
+        return Reservation(self)
+
+    def charge(self, nbytes: int) -> None:
+        """
+        Account bytes of a reservation.
+        Raises MemoryBudgetExhausted when they would take the budget over `max_bytes`.
+        """
+        with self._cond:
+            if self._used + nbytes > self.max_bytes:
+                self._refused += 1
+                raise excs.MemoryBudgetExhausted(
+                    f"Memory budget exhausted, {nbytes} more bytes don't fit, "
+                    f"{self._used} of {self.max_bytes} bytes in use"
+                )
+            self._used += nbytes
+            self._peak = max(self._peak, self._used)
+
+    def credit(self, nbytes: int) -> None:
+        """ Give back the bytes of a released reservation """
+        with self._cond:
+            self._used -= nbytes
+            self._reservations -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> dict[str, Any]:
+        """ Budget usage """
+        with self._cond:
+            return {
+                "max_bytes": self.max_bytes,
+                "used": self._used,
+                "peak": self._peak,
+                "usage": self._used / self.max_bytes,
+                "reservations": self._reservations,
+                "waiting": self._waiting,
+                "waited": self._waited,
+                "timeouts": self._timeouts,
+                "refused": self._refused,
+            }
+
+
+# pylint: disable=too-few-public-methods
+class MemoryBudgetStats:
+    """ Reads the usage of the process wide memory budget """
+
+    __slots__ = ()
+
+    def collect(self) -> dict[str, Any] | None:
+        """ Get the budget usage, None when there is no budget """
+        budget = get_budget()
+        return None if budget is None else budget.stats()
+
+
+_budget: MemoryBudget | None = None  # pylint: disable=invalid-name
+
+
+def configure_budget(
+    max_bytes: int | None, max_wait: float = DEFAULT_MAX_WAIT
+) -> MemoryBudget | None:
+    """
+    Set the process wide memory budget. None disables it.
+    An existing budget is changed in place, so the reservations it has stay accounted.
+    """
+    global _budget  # pylint: disable=global-statement
+    if max_bytes is None:
+        _budget = None
+    elif _budget is None:
+        _budget = MemoryBudget(max_bytes, max_wait)
+    else:
+        _budget.configure(max_bytes, max_wait)
+    return _budget
+
+
+def get_budget() -> MemoryBudget | None:
+    """ Get the process wide memory budget """
+    return _budget
@@ -0,0 +1,166 @@
+#! /usr/bin/env python3
+
+"""
+This module provides message coalescing for interact interfaces.
+Messages for the same thread that are posted within a small time or size window
+are grouped and delivered at once.
+"""
+
+from dataclasses import dataclass
+from threading import Condition, Lock, Thread
+from time import monotonic
+from typing import Any, Callable
+
+
+@dataclass
+class FlushPolicy:
+    """
+    When buffered messages of a thread are delivered.
+    A buffer is flushed when any of the limits is reached.
+    """
+
+    max_messages: int = 64
+    max_bytes: int = 64 * 1024
+    max_delay: float = 0.05
+    separator: bytes = b"\n"
+
+    def __post_init__(self) -> None:
+        if isinstance(self.separator, str):
+            self.separator = self.separator.encode("utf-8")
+        if self.max_messages < 1 or self.max_bytes < 1 or self.max_delay < 0:
+            raise ValueError(f"Invalid flush policy: {self}")
+
+
+# pylint: disable=too-few-public-methods
+class _Buffer:
+    """ Messages of a single thread """
+
+    __slots__ = ("messages", "size", "deadline", "deliver_lock")
+
+    def __init__(self, deadline: float) -> None:
+        self.messages: list[bytes] = []
+        self.size: int = 0
+        self.deadline: float = deadline
+        # Taken while delivering, so batches of the same thread stay in order
+        self.deliver_lock: Lock = Lock()
+
+
+# pylint: disable=too-many-instance-attributes
+class MessageCoalescer:
+    """
+    Groups messages per thread and delivers them with `deliver(message, thread)`.
+    Size limits are enforced by the posting thread, time limits by a background flusher.
+    """
+
+    def __init__(
+        self, deliver: Callable[[bytes, Any], None], policy: FlushPolicy | None = None
+    ) -> None:
+        self._deliver: Callable[[bytes, Any], None] = deliver
+        self._policy: FlushPolicy = policy or FlushPolicy()
+        self._buffers: dict[Any, _Buffer] = {}
+        self._cond: Condition = Condition()
+        self._flusher: Thread | None = None
+        self._closed: bool = False
+        self.deliveries: int = 0
+        self.messages: int = 0
+
+    @property
+    def policy(self) -> FlushPolicy:
+        """ Get the flush policy """
+        return self._policy
+
+    @policy.setter
+    def policy(self, policy: FlushPolicy) -> None:
+        """ Set the flush policy """
+        with self._cond:
+            self._policy = policy
+            self._cond.notify_all()
+
+    @property
+    def buffered(self) -> int:
+        """ Get the number of buffered messages """
+        with self._cond:
+            return sum(len(buf.messages) for buf in self._buffers.values())
+
+    def add(self, message: bytes, thread: Any) -> None:
+        """ Buffer a message for the thread """
+        with self._cond:
+            if self._closed:
+                full = None
+            else:
+                buf = self._buffers.get(thread)
+                if buf is None:
+                    buf = self._buffers[thread] = _Buffer(0.0)
+                    self._ensure_flusher()
+                if not buf.messages:
+                    buf.deadline = monotonic() + self._policy.max_delay
+                    self._cond.notify_all()
+                buf.messages.append(message)
+                buf.size += len(message)
+                self.messages += 1
+                policy = self._policy
+                full = len(buf.messages) >= policy.max_messages or buf.size >= policy.max_bytes
+        if full is None:
+            # Closed coalescer delivers right away
+            self._deliver(message, thread)
+        elif full:
+            self.flush(thread)
+
+    def _ensure_flusher(self) -> None:
+        """ Start the background flusher. Lock should be held by the caller. """
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = Thread(target=self._run_flusher, daemon=True, name="coalescer")
+            self._flusher.start()
+
+    def flush(self, thread: Any | None = None) -> None:
+        """ Deliver the buffered messages of a thread, or of all threads """
+        if thread is None:
+            with self._cond:
+                threads = list(self._buffers)
+            for buffered_thread in threads:
+                self.flush(buffered_thread)
+            return
+        with self._cond:
+            buf = self._buffers.get(thread)
+        if buf is None:
+            return
+        # Buffer stays registered while delivering, so batches of a thread stay in order
+        with buf.deliver_lock:
+            with self._cond:
+                messages, buf.messages, buf.size = buf.messages, [], 0
+                if messages:
+                    self.deliveries += 1
+            if messages:
+                self._deliver(self._policy.separator.join(messages), thread)
+            with self._cond:
+                if not buf.messages and self._buffers.get(thread) is buf:
+                    del self._buffers[thread]
+
+    def _run_flusher(self) -> None:
+        """ Flush buffers whose delay has passed """
+        while True:
+            with self._cond:
+                if not self._buffers:
+                    # Flusher is started again with the next buffer
+                    self._flusher = None
+                    return
+                now = monotonic()
+                pending = [
+                    (thread, buf.deadline) for thread, buf in self._buffers.items() if buf.messages
+                ]
+                due = [thread for thread, deadline in pending if deadline <= now]
+                if not due:
+                    timeout = min(
+                        (deadline for _, deadline in pending), default=now + 1.0
+                    ) - now
+                    self._cond.wait(max(timeout, 0.001))
+                    continue
+            for thread in due:
+                self.flush(thread)
+
+    def close(self) -> None:
+        """ Deliver everything that is buffered. Messages added later are not buffered. """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.flush()
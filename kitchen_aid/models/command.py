@@ -6,24 +6,28 @@ This module provides base command and result utilities
 
 from argparse import ArgumentParser
 
-from dataclasses import dataclass
-from typing import Any, Callable
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, NoReturn
 
 from gears.singleton_meta import SingletonController
 
 import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.budget import Reservation
 
 
-@dataclass
+@dataclass(slots=True)
 class Result:
     """
     Base result class.
     All commands are expected to return a result object or a derived class
+    Payload of the message can be accounted in the memory budget with a reservation,
+      which is released with the result.
     """
 
     success: bool
     message: str
     errors: list[Exception | str]
+    reservation: Reservation | None = field(default=None, compare=False, repr=False)
 
     def get_byte_message(self) -> bytes:
         """
@@ -32,6 +36,23 @@ class Result:
         return self.message.encode("utf-8")
 
 
+@dataclass(slots=True)
+class PartialResult(Result):
+    """
+    Intermediate result of a command that is still executing.
+    Partial results are posted as they are emitted. The command is done with it's final result.
+    """
+
+
+@dataclass(slots=True)
+class UnchangedResult(Result):
+    """
+    Final result of a command whose output didn't change since it's previous execution.
+    It closes the command, but it's not delivered to interface threads nor subscribers.
+    Request/response interfaces answer with it's short message, their clients wait for it.
+    """
+
+
 class FailedOperation(excs.GenericCommandError):
     """
     This error identifies a failed operation
@@ -48,10 +69,47 @@ class Command:
     All commands are expected to inherit from this class
     """
 
+    __slots__ = ("_receiver", "_emitter", "_origin")
+
     can_undo: bool = False
+    # Command can yield it's output in chunks with `stream`
+    can_stream: bool = False
+    # Receiver of the command accepts an iterable of chunks as it's pipeline input
+    accepts_stream: bool = False
 
     def __init__(self, receiver: Any) -> None:
         self._receiver = receiver
+        self._emitter: Callable[[Result], None] | None = None
+        self._origin: str | None = None
+
+    def set_emitter(self, emitter: Callable[[Result], None] | None) -> None:
+        """ Set the callback that receives partial results """
+        self._emitter = emitter
+
+    @property
+    def origin(self) -> str | None:
+        """
+        Get the id the command was scheduled under - the command, it's arguments,
+          thread and interface. None when it was not scheduled by an interface.
+        """
+        return self._origin
+
+    def set_origin(self, origin: str | None) -> None:
+        """ Set the id the command was scheduled under """
+        self._origin = origin
+
+    def emit(self, result: Result) -> None:
+        """
+        Emit a partial result while the command is executing.
+        Partial results are dropped when nobody listens for them.
+        """
+        if self._emitter is None:
+            return
+        if not isinstance(result, PartialResult):
+            result = PartialResult(
+                result.success, result.message, result.errors, result.reservation
+            )
+        self._emitter(result)
 
     def execute(self) -> Result:
         """
@@ -59,6 +117,18 @@ class Command:
         """
         raise NotImplementedError
 
+    def stream(self) -> Iterator[str]:
+        """
+        Yield the output of the command in chunks, instead of returning a single result.
+        By default the message of `execute` is the only chunk, commands that set `can_stream`
+          override it to yield their output as it's produced.
+        Raises FailedOperation when the command fails.
+        """
+        result = self.execute()
+        if not result.success:
+            raise FailedOperation(result.message)
+        yield result.message
+
     def undo(self) -> Result:
         """
         All commands are expected to implement this method
@@ -72,6 +142,32 @@ class Command:
         raise NotImplementedError
 
 
+# pylint: disable=abstract-method
+class IrreversibleCommand(Command):
+    """
+    Base command class of the commands that can't be undone.
+    Undo and redo fail.
+    """
+
+    __slots__ = ()
+
+    can_undo: bool = False
+
+    def undo(self) -> Result:
+        """ Undo command. It will fail as it's not supported """
+        raise FailedOperation(
+            "Undo not supported",
+            undo_result=Result(False, "Undo not supported", [])
+        )
+
+    def redo(self) -> Result:
+        """ Redo command. It will fail as it's not supported """
+        raise FailedOperation(
+            "Redo not supported",
+            undo_result=Result(False, "Redo not supported", [])
+        )
+
+
 # pylint: disable=too-few-public-methods
 class CommandHandler:
     """
@@ -79,6 +175,8 @@ class CommandHandler:
     All command handlers are expected to inherit from this class
     """
 
+    __slots__ = ("command", "retry_limit")
+
     def __init__(
         self,
         command: str,
@@ -137,6 +235,26 @@ class CommandHandler:
         )
 
 
+class CommandArgumentParser(ArgumentParser):
+    """
+    Parser of command arguments.
+    Commands are received from interfaces, so invalid arguments raise InvalidCommandArguments
+      instead of printing the usage to stderr and exiting. There is no `-h`, see `format_help`.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        kwargs.setdefault("add_help", False)
+        super().__init__(*args, **kwargs)
+
+    def error(self, message: str) -> NoReturn:
+        """ Raise InvalidCommandArguments with the message """
+        raise excs.InvalidCommandArguments(message)
+
+    def exit(self, status: int = 0, message: str | None = None) -> NoReturn:
+        """ Raise InvalidCommandArguments, the process keeps running """
+        raise excs.InvalidCommandArguments(message or f"Parser exited with status {status}")
+
+
 class CommandMapper(metaclass=SingletonController):
     """ Command mapper class """
 
@@ -152,7 +270,7 @@ class CommandMapper(metaclass=SingletonController):
     ) -> None:
         """ Register a command """
         if arg_parser is None:
-            arg_parser = ArgumentParser()
+            arg_parser = CommandArgumentParser()
         self._command_map[name] = (command, receiver, arg_parser)
 
     def get_command(self, name: str) -> tuple[type[Command], type, ArgumentParser]:
@@ -0,0 +1,160 @@
+#! /usr/bin/env python3
+
+"""
+This module provides the encodings used to compress payloads and the compression policy.
+gzip and deflate are always available, brotli (`br`) and zstandard (`zstd`) when their
+optional packages (`brotli` or `brotlicffi`, `zstandard`) are installed.
+Upstream requests advertise the encodings of the policy (`accept`) and their bodies are
+decoded chunk by chunk as they are read.
+Results posted through interfaces are compressed when they are at least `min_size` bytes
+and the client accepts one of the encodings.
+"""
+
+import zlib
+from threading import Lock
+from typing import Callable, Iterable
+
+try:
+    import brotli  # type: ignore[import-not-found]
+except ImportError:
+    try:
+        import brotlicffi as brotli  # type: ignore[import-not-found,no-redef]
+    except ImportError:
+        brotli = None
+try:
+    import zstandard  # type: ignore[import-not-found]
+except ImportError:
+    zstandard = None
+
+
+DEFAULT_MIN_SIZE: int = 1024
+# zlib level of gzip and deflate, brotli and zstd use their fast levels
+DEFAULT_LEVEL: int = 6
+_BROTLI_QUALITY: int = 4
+_ZSTD_LEVEL: int = 3
+
+
+def _gzip(payload: bytes, level: int) -> bytes:
+    """ gzip without a file name nor a timestamp """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(payload) + compressor.flush()
+
+
+# Encodings by preference, the ones whose package is missing are left out
+COMPRESSORS: dict[str, Callable[[bytes, int], bytes]] = {}
+DECOMPRESSORS: dict[str, Callable[[bytes], bytes]] = {}
+if zstandard is not None:
+    COMPRESSORS["zstd"] = lambda payload, _: zstandard.ZstdCompressor(
+        level=_ZSTD_LEVEL
+    ).compress(payload)
+    DECOMPRESSORS["zstd"] = lambda payload: zstandard.ZstdDecompressor().decompress(payload)
+if brotli is not None:
+    COMPRESSORS["br"] = lambda payload, _: brotli.compress(payload, quality=_BROTLI_QUALITY)
+    DECOMPRESSORS["br"] = brotli.decompress
+COMPRESSORS["gzip"] = _gzip
+DECOMPRESSORS["gzip"] = lambda payload: zlib.decompress(payload, 16 + zlib.MAX_WBITS)
+COMPRESSORS["deflate"] = zlib.compress
+DECOMPRESSORS["deflate"] = zlib.decompress
+KNOWN_ENCODINGS: frozenset[str] = frozenset({"zstd", "br", "gzip", "deflate"})
+
+
+def parse_accept_encoding(header: str) -> list[str]:
+    """
+    Encodings of an Accept-Encoding header that are accepted (q > 0),
+      by the client's preference. `*` stands for all the available encodings.
+    """
+    weighted: list[tuple[float, int, str]] = []
+    for index, item in enumerate(header.split(",")):
+        name, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            weighted.append((-quality, index, name.lower()))
+    encodings: list[str] = []
+    for _, _, name in sorted(weighted):
+        for encoding in (COMPRESSORS if name == "*" else (name,)):
+            if encoding not in encodings:
+                encodings.append(encoding)
+    return encodings
+
+
+def negotiate(accepted: Iterable[str]) -> str | None:
+    """ First of the accepted encodings that's available """
+    for encoding in accepted:
+        if encoding in COMPRESSORS:
+            return encoding
+    return None
+
+
+# pylint: disable=too-few-public-methods
+class CompressionPolicy:
+    """
+    Upstream encodings to accept and the threshold of compressed results.
+    Encodings that are known, but not available, are left out of `accept`.
+    """
+
+    __slots__ = ("accept", "min_size", "level")
+
+    def __init__(
+        self,
+        accept: Iterable[str] | None = None,
+        min_size: int = DEFAULT_MIN_SIZE,
+        level: int = DEFAULT_LEVEL,
+    ) -> None:
+        accept = list(COMPRESSORS) if accept is None else [name.lower() for name in accept]
+        unknown = set(accept) - KNOWN_ENCODINGS
+        if unknown:
+            raise ValueError(f"Unknown encodings: {sorted(unknown)}")
+        if min_size < 0 or not 0 <= level <= 9:
+            raise ValueError("Minimal size should not be negative and the level within [0, 9]")
+        self.accept: tuple[str, ...] = tuple(name for name in accept if name in COMPRESSORS)
+        self.min_size: int = min_size
+        self.level: int = level
+
+    @property
+    def accept_encoding(self) -> str:
+        """ Accept-Encoding header of upstream requests """
+        return ", ".join(self.accept) or "identity"
+
+    def compress(self, payload: bytes, accepted: Iterable[str]) -> tuple[bytes, str | None]:
+        """
+        Compress a payload with the first accepted encoding, when it's large enough.
+        Returns the payload and it's encoding, None when it was left as it is.
+        """
+        if len(payload) < self.min_size:
+            return payload, None
+        encoding = negotiate(accepted)
+        if encoding is None:
+            return payload, None
+        compressed = COMPRESSORS[encoding](payload, self.level)
+        if len(compressed) >= len(payload):
+            return payload, None
+        return compressed, encoding
+
+
+_policy: CompressionPolicy = CompressionPolicy()
+_policy_lock: Lock = Lock()
+
+
+def configure_compression(
+    accept: Iterable[str] | None = None,
+    min_size: int = DEFAULT_MIN_SIZE,
+    level: int = DEFAULT_LEVEL,
+) -> CompressionPolicy:
+    """ Set the process wide compression policy. It applies to new requests and results. """
+    global _policy  # pylint: disable=global-statement
+    policy = CompressionPolicy(accept, min_size, level)
+    with _policy_lock:
+        _policy = policy
+    return policy
+
+
+def get_compression() -> CompressionPolicy:
+    """ Get the process wide compression policy """
+    return _policy
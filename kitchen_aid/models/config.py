@@ -0,0 +1,415 @@
+#! /usr/bin/env python3
+
+"""
+This module provides configuration loading and hot reload.
+Config is a YAML (or JSON) file, validated against `CONFIG_SCHEMA`.
+The schema is compiled once, when the module is loaded.
+`ConfigWatcher` reloads the config when the file changes or on SIGHUP and hands
+the previous and the new config over to a callback, which applies the differences.
+"""
+
+import logging
+import os
+import signal
+from threading import Event
+from typing import Any, Callable
+
+from jsonschema import Draft202012Validator
+from ruamel.yaml import YAML
+from ruamel.yaml.error import YAMLError
+
+import kitchen_aid.models.exceptions as excs
+
+
+_POSITIVE_INT: dict[str, Any] = {"type": "integer", "minimum": 1}
+_POSITIVE_NUMBER: dict[str, Any] = {"type": "number", "exclusiveMinimum": 0}
+
+# Options every interact accepts
+_INTERACT_OPTIONS: dict[str, Any] = {
+    "name": {"type": "string", "minLength": 1},
+    "interface_type": {"type": "string", "minLength": 1},
+    "start": {"type": "boolean"},
+    "inventory_size": _POSITIVE_INT,
+    "inventory_ttl": _POSITIVE_NUMBER,
+    "coalesce": {
+        "type": "object",
+        "additionalProperties": False,
+        "properties": {
+            "max_messages": _POSITIVE_INT,
+            "max_bytes": _POSITIVE_INT,
+            "max_delay": {"type": "number", "minimum": 0},
+            "separator": {"type": "string"},
+        },
+    },
+}
+# Options of the built-in interface types, on top of the common ones.
+# Types registered by others are checked by their constructors only.
+_INTERFACE_OPTIONS: dict[str, dict[str, Any]] = {
+    "http": {
+        "host": {"type": "string", "minLength": 1},
+        "port": {"type": "integer", "minimum": 1, "maximum": 65535},
+        "keep_alive_timeout": _POSITIVE_NUMBER,
+        "max_body_size": _POSITIVE_INT,
+        "result_ttl": _POSITIVE_NUMBER,
+        "max_threads": _POSITIVE_INT,
+        # Doesn't coalesce messages, see `InteractInterface.coalescing`
+        "coalesce": {"not": {}},
+    },
+    "unix": {
+        "path": {"type": "string", "minLength": 1},
+        "max_frame": _POSITIVE_INT,
+        "coalesce": {"not": {}},
+    },
+    "scheduler": {
+        "schedules": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "additionalProperties": False,
+                "required": ["name", "command"],
+                "oneOf": [{"required": ["every"]}, {"required": ["cron"]}],
+                "properties": {
+                    "name": {"type": "string", "minLength": 1},
+                    "command": {"type": "string", "minLength": 1},
+                    "args": {"type": "array", "items": {"type": "string"}},
+                    "every": _POSITIVE_NUMBER,
+                    "cron": {"type": "string", "minLength": 1},
+                    "jitter": {"type": "number", "minimum": 0},
+                },
+            },
+        },
+        "tick": _POSITIVE_NUMBER,
+        "wheel_slots": {"type": "integer", "minimum": 2},
+        "wheel_levels": _POSITIVE_INT,
+    },
+}
+
+CONFIG_SCHEMA: dict[str, Any] = {
+    "$schema": "https://json-schema.org/draft/2020-12/schema",
+    "type": "object",
+    "additionalProperties": False,
+    "properties": {
+        "compression": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                # Encodings upstream requests accept, the unavailable ones are left out
+                "accept": {
+                    "type": "array",
+                    "items": {"type": "string", "enum": ["zstd", "br", "gzip", "deflate"]},
+                },
+                # Results posted through interfaces are compressed from this size on
+                "min_size": {"type": "integer", "minimum": 0},
+                "level": {"type": "integer", "minimum": 0, "maximum": 9},
+            },
+        },
+        "engine": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "max_workers": _POSITIVE_INT,
+                "min_workers": {"type": "integer", "minimum": 0},
+                "target_wait": _POSITIVE_NUMBER,
+            },
+        },
+        "http": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "cache": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "required": ["directory"],
+                    "properties": {
+                        "directory": {"type": "string", "minLength": 1},
+                        "max_bytes": _POSITIVE_INT,
+                    },
+                },
+                "hedging": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "properties": {
+                        "percentile": {
+                            "type": "number", "exclusiveMinimum": 0, "exclusiveMaximum": 1,
+                        },
+                        "min_delay": {"type": "number", "minimum": 0},
+                        "default_delay": _POSITIVE_NUMBER,
+                        "max_extra_load": {"type": "number", "minimum": 0},
+                        "window": _POSITIVE_INT,
+                        "min_samples": _POSITIVE_INT,
+                        "burst": _POSITIVE_NUMBER,
+                    },
+                },
+                "dns": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "properties": {
+                        "ttl": _POSITIVE_NUMBER,
+                        "negative_ttl": {"type": "number", "minimum": 0},
+                        "max_entries": _POSITIVE_INT,
+                    },
+                },
+                "delta": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "properties": {
+                        # Pages whose fingerprints are kept for `get-page --delta`
+                        "max_entries": _POSITIVE_INT,
+                    },
+                },
+                # `get-pages --url-file` files are read from it, and refused without it
+                "url_directory": {"type": "string", "minLength": 1},
+                "warmup": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "required": ["urls"],
+                    "properties": {
+                        "urls": {"type": "array", "items": {"type": "string", "minLength": 1}},
+                        "interval": _POSITIVE_NUMBER,
+                        "timeout": _POSITIVE_NUMBER,
+                        "method": {"type": "string", "enum": ["HEAD", "GET", "OPTIONS"]},
+                    },
+                },
+            },
+        },
+        "memory": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                # Bytes of payloads held by commands in flight and results not yet posted
+                "max_bytes": _POSITIVE_INT,
+                # Seconds a payload waits for the budget before it's command fails
+                "max_wait": {"type": "number", "minimum": 0},
+            },
+        },
+        "logging": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "level": {
+                    "type": "string", "enum": ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+                },
+                # JSON lines are appended to the file, written to stdout without it
+                "path": {"type": "string", "minLength": 1},
+                # Fraction of the debug records kept, and at most how many per second
+                "debug_sample": {"type": "number", "minimum": 0, "maximum": 1},
+                "debug_rate": _POSITIVE_NUMBER,
+                "batch_size": _POSITIVE_INT,
+                "flush_interval": _POSITIVE_NUMBER,
+                # Records queued over it are dropped, so logging never holds threads back
+                "max_queue": _POSITIVE_INT,
+            },
+        },
+        "profile": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                # `profile --output` files are written under it, and refused without it
+                "directory": {"type": "string", "minLength": 1},
+            },
+        },
+        "pipeline": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                # `pipeline` spec files are read under it, and refused without it
+                "directory": {"type": "string", "minLength": 1},
+            },
+        },
+        "recording": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                # Traffic recording, gzipped when the path ends with .gz
+                "path": {"type": "string", "minLength": 1},
+            },
+        },
+        "interacts": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": _INTERACT_OPTIONS,
+                # Interacts of the built-in types accept only their own options
+                "allOf": [
+                    {
+                        "if": {
+                            "required": ["interface_type"],
+                            "properties": {"interface_type": {"const": interface_type}},
+                        },
+                        "then": {
+                            "additionalProperties": False,
+                            "properties": {**_INTERACT_OPTIONS, **options},
+                        },
+                    }
+                    for interface_type, options in _INTERFACE_OPTIONS.items()
+                ],
+            },
+        },
+        "shutdown": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                # Seconds commands in flight get to finish on SIGTERM
+                "grace_period": {"type": "number", "minimum": 0},
+            },
+        },
+        "reload": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                # 0 disables polling, the config is reloaded on SIGHUP only
+                "poll_interval": {"type": "number", "minimum": 0},
+            },
+        },
+    },
+}
+
+LOG: logging.Logger = logging.getLogger(__name__)
+
+Draft202012Validator.check_schema(CONFIG_SCHEMA)
+_VALIDATOR: Draft202012Validator = Draft202012Validator(CONFIG_SCHEMA)
+
+DEFAULT_POLL_INTERVAL: float = 5.0
+DEFAULT_GRACE_PERIOD: float = 25.0
+
+
+def validate_config(config: Any) -> dict[str, Any]:
+    """
+    Validate a config and fill in the missing sections.
+    Raises InvalidConfig listing all the violations.
+    """
+    if config is None:
+        config = {}
+    errors = sorted(_VALIDATOR.iter_errors(config), key=lambda error: list(error.absolute_path))
+    if errors:
+        raise excs.InvalidConfig("Invalid config: " + "; ".join(
+            f"{'.'.join(str(part) for part in error.absolute_path) or '<root>'}: {error.message}"
+            for error in errors
+        ))
+    config = dict(config)
+    for section in (
+        "compression", "engine", "http", "logging", "memory", "pipeline", "profile", "recording",
+        "reload", "shutdown",
+    ):
+        config.setdefault(section, {})
+    config.setdefault("interacts", [])
+    return config
+
+
+def load_config(path: str) -> dict[str, Any]:
+    """ Load and validate a config file """
+    try:
+        with open(path, "r", encoding="utf-8") as config_file:
+            config = YAML(typ="safe").load(config_file)
+    except (OSError, YAMLError) as error:
+        raise excs.InvalidConfig(f"Can't load config {path}: {error}") from error
+    return validate_config(config)
+
+
+def changed_sections(old: dict[str, Any] | None, new: dict[str, Any]) -> set[str]:
+    """ Top level sections that differ between two configs """
+    if old is None:
+        return set(new)
+    return {section for section in set(old) | set(new) if old.get(section) != new.get(section)}
+
+
+# pylint: disable=too-many-instance-attributes
+class ConfigWatcher:
+    """
+    Reloads the config when the file changes or when SIGHUP is received.
+    File changes are detected by polling it's modification time and size,
+      which also catches the symlink swaps of mounted ConfigMaps.
+    Invalid configs are reported and ignored, the current config stays in effect.
+    So does it when applying a config fails, the next reload applies every section
+      that differs from it again.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        on_change: Callable[[dict[str, Any], dict[str, Any]], None],
+        config: dict[str, Any] | None = None,
+        poll_interval: float | None = None,
+    ) -> None:
+        self._path: str = path
+        self._on_change: Callable[[dict[str, Any], dict[str, Any]], None] = on_change
+        self._config: dict[str, Any] = config if config is not None else load_config(path)
+        self._stamp: tuple[int, int] | None = self._file_stamp()
+        self._poll_interval: float | None = poll_interval
+        self._wakeup: Event = Event()
+        self._reload_requested: bool = False
+        self._stopped: bool = False
+        self.reloads: int = 0
+
+    @property
+    def config(self) -> dict[str, Any]:
+        """ Get the config in effect """
+        return self._config
+
+    @property
+    def poll_interval(self) -> float:
+        """ Get the poll interval, from the config unless it was given explicitly """
+        if self._poll_interval is not None:
+            return self._poll_interval
+        return self._config["reload"].get("poll_interval", DEFAULT_POLL_INTERVAL)
+
+    def _file_stamp(self) -> tuple[int, int] | None:
+        """ Modification time and size of the config file """
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def request_reload(self, *_: Any) -> None:
+        """ Reload the config as soon as possible. Usable as a signal handler. """
+        self._reload_requested = True
+        self._wakeup.set()
+
+    def install_signal_handler(self) -> None:
+        """ Reload on SIGHUP. Should be called from the main thread. """
+        signal.signal(signal.SIGHUP, self.request_reload)
+
+    def reload(self) -> bool:
+        """
+        Reload the config. Returns True when a changed config was applied.
+        Errors of applying it are raised and the current config is kept.
+        """
+        self._stamp = self._file_stamp()
+        try:
+            config = load_config(self._path)
+        except excs.InvalidConfig as error:
+            LOG.warning("Config not reloaded: %s", error)
+            return False
+        if config == self._config:
+            return False
+        # The new config is in effect only once it was applied
+        self._on_change(self._config, config)
+        self._config = config
+        self.reloads += 1
+        return True
+
+    def check(self) -> bool:
+        """ Reload the config if it was requested or the file has changed """
+        requested, self._reload_requested = self._reload_requested, False
+        if requested or self._file_stamp() != self._stamp:
+            return self.reload()
+        return False
+
+    def run(self) -> None:
+        """ Watch the config until stopped. Call this method in it's own thread. """
+        while not self._stopped:
+            interval = self.poll_interval
+            self._wakeup.wait(interval or None)
+            self._wakeup.clear()
+            if self._stopped:
+                return
+            try:
+                self.check()
+            except Exception:  # pylint: disable=broad-exception-caught
+                LOG.exception("Config reload failed")
+
+    def stop(self) -> None:
+        """ Stop watching """
+        self._stopped = True
+        self._wakeup.set()
@@ -4,24 +4,45 @@
 This module povides the kitchen aid engine.
 """
 
-from threading import Lock, Thread
-from concurrent.futures import ThreadPoolExecutor, Executor, Future
+import logging
+from collections import deque
+from itertools import count
+from threading import Condition, Event, Lock, Thread
+from concurrent.futures import ThreadPoolExecutor, Executor
 from queue import Queue
-from typing import Any
-from time import sleep
+from typing import Any, Callable, Iterator
+from time import monotonic
 
-from kitchen_aid.models.command import Result, CommandHandler
+from kitchen_aid.models.budget import get_budget
+from kitchen_aid.models.command import (
+    Result, PartialResult, CommandHandler, FailedOperation
+)
+from kitchen_aid.models.executor import DEFAULT_TARGET_WAIT, AdaptiveThreadPoolExecutor
 from kitchen_aid.models.interact import (
     IThread, InteractInterface, InteractInterfacesRegistry, get_cmd_id
 )
+from kitchen_aid.models.recorder import get_recorder
+from kitchen_aid.models.subscriptions import SubscriptionHub, get_hub
+
+
+LOG: logging.Logger = logging.getLogger(__name__)
+
+SHUTDOWN_MESSAGE: str = "Cancelled by shutdown"
+DEFAULT_FLUSH_TIMEOUT: float = 5.0
 
 
 class Engine:
     """ Base engine class """
 
-    def __init__(self, max_workers: int | None = None) -> None:
-        self._executor: Executor = ThreadPoolExecutor(max_workers)
+    def __init__(self, max_workers: int | None = None, executor: Executor | None = None) -> None:
+        self._executor: Executor = executor or ThreadPoolExecutor(max_workers)
         self._lock: Lock = Lock()
+        self._stop_event: Event = Event()
+
+    @property
+    def stopped(self) -> bool:
+        """ Is the engine stopped """
+        return self._stop_event.is_set()
 
     def execute(self) -> None:
         """ Use this method to execute the engine logic"""
@@ -32,16 +53,111 @@ class Engine:
         raise NotImplementedError
 
 
+class CommandDispatcher:
+    """
+    Command queue of the command engine. Interfaces only put commands into it.
+    Commands are dispatched right away, in the thread of the caller, so they go to
+      the worker pool without a hand-off to a dispatcher thread.
+    While the memory budget is exhausted, commands are held, in order, for the dispatch
+      thread of the engine (`CommandEngine.execute`) - interface threads never wait on it.
+    Once closed, commands are dispatched right away again, the engine fails them.
+    """
+
+    __slots__ = ("_dispatch", "_held", "_cond", "_closed")
+
+    def __init__(self, dispatch: Callable[[Any], None]) -> None:
+        self._dispatch: Callable[[Any], None] = dispatch
+        self._held: deque[Any] = deque()
+        self._cond: Condition = Condition()
+        self._closed: bool = False
+
+    def put(self, item: Any) -> None:
+        """ Dispatch a command, or hold it while the memory budget is exhausted """
+        budget = get_budget()
+        if not self._held and (budget is None or not budget.exhausted):
+            self._dispatch(item)
+            return
+        with self._cond:
+            if not self._closed:
+                self._held.append(item)
+                self._cond.notify()
+                return
+        self._dispatch(item)
+
+    def qsize(self) -> int:
+        """ Get the number of held commands """
+        return len(self._held)
+
+    def take(self, timeout: float | None = None) -> Any:
+        """ Take the oldest held command, waiting up to timeout for one. None if there is none. """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._held, timeout):
+                return None
+            return self._held.popleft()
+
+    def close(self) -> list[Any]:
+        """ Stop holding commands. Returns the commands that were held. """
+        with self._cond:
+            self._closed = True
+            held, self._held = list(self._held), deque()
+            self._cond.notify_all()
+        return held
+
+
+# pylint: disable=too-many-instance-attributes
 class CommandEngine(Engine):
     """
     Command engine.
     This engine is dedicated to scheduling and execution of commands.
+    Commands run on an adaptive pool, sized between `min_workers` and `max_workers`
+      by the queue wait of the commands.
+    Commands are dispatched to the pool by the thread that queues them (see `CommandDispatcher`),
+      and are in flight until their final result is queued.
+      `shutdown` waits for them and fails the ones that don't finish in time.
     """
 
-    def __init__(self, max_workers: int | None = None) -> None:
-        super().__init__(max_workers)
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        min_workers: int = 1,
+        target_wait: float = DEFAULT_TARGET_WAIT,
+        subscriptions: SubscriptionHub | None = None,
+    ) -> None:
+        self._pool: AdaptiveThreadPoolExecutor = AdaptiveThreadPoolExecutor(
+            min_workers, max_workers, target_wait, thread_name_prefix="cmd_worker"
+        )
+        super().__init__(executor=self._pool)
         self._command_result_queue: Queue = Queue()
-        self._command_queue: Queue = Queue()
+        self._command_queue: CommandDispatcher = CommandDispatcher(self.dispatch)
+        self._tokens: Iterator[int] = count()
+        # Commands in flight by token - command id and the interface of the result
+        self._in_flight: dict[int, tuple[str, InteractInterface]] = {}
+        self._all_done: Condition = Condition(self._lock)
+        self._intake_closed: Event = Event()
+        self._flushed: Event = Event()
+        # Final results are published to the subscribers after they are posted
+        self.subscriptions: SubscriptionHub = subscriptions or get_hub()
+
+    @property
+    def pool(self) -> AdaptiveThreadPoolExecutor:
+        """ Get the worker pool """
+        return self._pool
+
+    @property
+    def in_flight(self) -> int:
+        """ Get the number of commands that haven't queued their final result yet """
+        return len(self._in_flight)
+
+    def set_max_workers(
+        self,
+        max_workers: int | None,
+        min_workers: int | None = None,
+        target_wait: float | None = None,
+    ) -> None:
+        """ Change the bounds of the worker pool. Running and queued commands are kept. """
+        self._pool.resize(min_workers, max_workers)
+        if target_wait is not None:
+            self._pool.target_wait = target_wait
 
     @property
     def command_result_queue(self) -> Queue:
@@ -49,7 +165,7 @@ class CommandEngine(Engine):
         return self._command_result_queue
 
     @property
-    def command_queue(self) -> Queue:
+    def command_queue(self) -> CommandDispatcher:
         """ Get the command queue """
         return self._command_queue
 
@@ -60,22 +176,16 @@ class CommandEngine(Engine):
         iface.post_command_result(cmd_id, result)
 
     def run(self) -> None:
-        """ Run the engine """
-        cmd_exec_thread = Thread(
-            target=self.execute, daemon=True, name="cmd_exec_thread"
-        )
+        """ Run the engine. Returns once the engine is shut down and it's results are emitted. """
+        cmd_exec_thread = Thread(target=self.execute, daemon=True, name="cmd_exec_thread")
         message_emmit_thread = Thread(
             target=self.emmit_command_results, daemon=True, name="message_emmit_thread"
         )
-
         cmd_exec_thread.start()
         message_emmit_thread.start()
-        while True:
-            sleep(1)  # There are no blocking steps here
-            if not cmd_exec_thread.is_alive():
-                cmd_exec_thread = Thread(
-                    target=self.execute, daemon=True, name="cmd_exec_thread"
-                )
+        while not self._flushed.wait(1):
+            if not cmd_exec_thread.is_alive() and not self._intake_closed.is_set():
+                cmd_exec_thread = Thread(target=self.execute, daemon=True, name="cmd_exec_thread")
                 cmd_exec_thread.start()
             if not message_emmit_thread.is_alive():
                 message_emmit_thread = Thread(
@@ -88,39 +198,202 @@ class CommandEngine(Engine):
         Emit command results over the result interface.
         Emissions are threaded.
         Call this method in it's own thread.
+        Returns once the results queued before the shutdown are emitted.
         """
         cmd_id: str
         result: Result
         iface: InteractInterface
         while True:
-            cmd_id, result, iface = self._command_result_queue.get()
+            item = self._command_result_queue.get()
+            if item is None:
+                self._flushed.set()
+                return
+            cmd_id, result, iface = item
             self._emmit_command_result(cmd_id, result, iface)
+            recorder = get_recorder()
+            if recorder is not None:
+                recorder.result(cmd_id, result)
+            self.subscriptions.publish(cmd_id, result)
+            # Payload is handed over to the interface
+            if result.reservation is not None:
+                result.reservation.release()
 
-    def execute(self) -> None:
+    # pylint: disable=broad-exception-caught
+    @staticmethod
+    def _run_command(
+        cmd: str,
+        args: list[str],
+        kw_args: dict[str, Any],
+        emitter: Callable[[Result], None] | None = None,
+        origin: str | None = None,
+    ) -> tuple[CommandHandler | None, Result]:
         """
-        Execute polls the command queue and schedules the command for execution.
-        Results are placed in the result queue.
+        Build and execute a command. Returns the handler, if it was built, and the result.
+        Origin is the id the command was scheduled under, see `Command.origin`.
         """
-        cmd: str
-        args: list[str]
-        kw_args: dict[str, Any]
-        thread: IThread
-        iface: InteractInterface
-
-        while True:
-            cmd, args, kw_args, thread, iface = self._command_queue.get()
-            cmd_id = get_cmd_id(cmd, args, kw_args, thread, iface)
-            cmd_handler = CommandHandler(
-                command=cmd, args=args, kwargs=kw_args
+        handler: CommandHandler | None = None
+        try:
+            handler = CommandHandler(command=cmd, args=args, kwargs=kw_args)
+            handler.command.set_emitter(emitter)
+            handler.command.set_origin(origin)
+            result = handler.execute()
+        except FailedOperation as error:
+            LOG.debug("Command failed", extra={"command": cmd, "error": str(error)})
+            errors: list[Exception | str] = [error]
+            if error.undo_result is not None:
+                errors.append(f"Undo result: {error.undo_result}")
+            return handler, Result(False, str(error), errors)
+        except Exception as error:
+            LOG.error("Command %s raised", cmd, exc_info=error, extra={"command": cmd})
+            return handler, Result(False, f"{type(error).__name__}: {error}", [error])
+        if not isinstance(result, Result):
+            return handler, Result(
+                False, f"Command returned {type(result).__name__}, not a result", []
             )
-            future: Future = self._executor.submit(cmd_handler.command.execute)
-            future.add_done_callback(
-                lambda future: self._command_result_queue.put(
-                    (cmd_id, future.result(), iface)
-                )
+        if isinstance(result, PartialResult):
+            # Final result should close the command
+            return handler, Result(
+                result.success, result.message, result.errors, result.reservation
             )
+        return handler, result
 
+    @staticmethod
+    def run_command(
+        cmd: str,
+        args: list[str],
+        kw_args: dict[str, Any],
+        emitter: Callable[[Result], None] | None = None,
+    ) -> Result:
+        """
+        Build and execute a command.
+        Any exception raised while doing so is turned into a failed result,
+          so every scheduled command produces a result.
+        Partial results of the command are passed to the emitter.
+        """
+        return CommandEngine._run_command(cmd, args, kw_args, emitter)[1]
 
+    def _finish(self, token: int, result: Result) -> bool:
+        """
+        Queue the final result of a command that is in flight.
+        Returns False if the command was already failed by the shutdown.
+        """
+        with self._lock:
+            entry = self._in_flight.pop(token, None)
+            if entry is None:
+                return False
+            self._command_result_queue.put((entry[0], result, entry[1]))
+            self._all_done.notify_all()
+        return True
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def _execute_command(
+        self,
+        cmd_id: str,
+        cmd: str,
+        args: list[str],
+        kw_args: dict[str, Any],
+        iface: InteractInterface,
+        token: int | None = None,
+    ) -> None:
+        """
+        Execute a command and place it's results in the result queue.
+        A command that finishes after the shutdown failed it is undone, when it supports it,
+          as it's client was told it failed.
+        """
+        def emit(result: Result) -> None:
+            if token is None or token in self._in_flight:
+                self._command_result_queue.put((cmd_id, result, iface))
+
+        handler, result = self._run_command(cmd, args, kw_args, emit, cmd_id)
+        if token is None:
+            self._command_result_queue.put((cmd_id, result, iface))
+            return
+        if self._finish(token, result) or not result.success:
+            return
+        if handler is not None and handler.command.can_undo:
+            try:
+                handler.command.undo()
+            except Exception:  # pylint: disable=broad-exception-caught
+                pass  # Undo is best effort, the process is shutting down
+
+    def dispatch(
+        self, item: tuple[str, list[str], dict[str, Any], IThread, InteractInterface]
+    ) -> None:
+        """
+        Schedule a command for execution. Never waits, commands held back by the memory budget
+          are dispatched by `execute`. Commands queued after the shutdown started get
+          a failed result.
+        """
+        cmd, args, kw_args, thread, iface = item
+        cmd_id = get_cmd_id(cmd, args, kw_args, thread, iface)
+        LOG.debug("Command queued", extra={"command": cmd})
+        with self._lock:
+            if self._intake_closed.is_set():
+                self._command_result_queue.put(
+                    (cmd_id, Result(False, SHUTDOWN_MESSAGE, []), iface)
+                )
+                return
+            token = next(self._tokens)
+            self._in_flight[token] = (cmd_id, iface)
+        try:
+            self._executor.submit(self._execute_command, cmd_id, cmd, args, kw_args, iface, token)
+        except RuntimeError:
+            # Pool is already shut down
+            self._finish(token, Result(False, SHUTDOWN_MESSAGE, []))
+
+    def _wait_for_memory(self) -> None:
+        """ Hold new commands back while the memory budget is exhausted """
+        budget = get_budget()
+        while budget is not None and not budget.wait_available(1.0):
+            if self._stop_event.is_set():
+                return
+
+    def execute(self) -> None:
+        """
+        Dispatch the commands held back by the memory budget, in order, once it frees up.
+        Call this method in it's own thread. Returns once the shutdown started.
+        """
+        while not self._intake_closed.is_set():
+            item = self._command_queue.take(1.0)
+            if item is None:
+                continue
+            self._wait_for_memory()
+            self.dispatch(item)
+
+    def shutdown(self, grace: float, flush_timeout: float = DEFAULT_FLUSH_TIMEOUT) -> int:
+        """
+        Stop the engine.
+        Commands queued so far are already scheduled, the engine waits up to `grace` seconds
+          for the commands in flight. The ones still running after that, and the ones
+          queued after the shutdown started, get a failed result.
+        Returns once all results are emitted (waiting at least `flush_timeout` for that),
+          the return value is the number of failed commands.
+        Interfaces should stop accepting commands before the engine is shut down.
+        """
+        deadline = monotonic() + grace
+        self._stop_event.set()
+        failed: list[tuple[str, InteractInterface]] = []
+        with self._lock:
+            self._intake_closed.set()
+        for item in self._command_queue.close():
+            self.dispatch(item)
+        with self._lock:
+            while self._in_flight:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                self._all_done.wait(remaining)
+            failed.extend(self._in_flight.values())
+            self._in_flight.clear()
+        for cmd_id, iface in failed:
+            self._command_result_queue.put((cmd_id, Result(False, SHUTDOWN_MESSAGE, []), iface))
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._command_result_queue.put(None)
+        self._flushed.wait(max(deadline - monotonic(), flush_timeout))
+        return len(failed)
+
+
+# pylint: disable=too-many-instance-attributes
 class InteractEngine(Engine):
     """
     Interact engine.
@@ -138,6 +411,38 @@ class InteractEngine(Engine):
         self._reg: InteractInterfacesRegistry = InteractInterfacesRegistry()  # type: ignore
         self._reg.add_queues(self._cmd_queue, self._result_queue)  # type: ignore
         self._interact_listeners: list[str] = []
+        # Config of every interact generated from the config, by name
+        self._confs: dict[str, dict[str, Any]] = {}
+        self._threads: dict[str, Thread] = {}
+
+    def _parse_conf(
+        self, conf: dict[str, Any]
+    ) -> tuple[str, type[InteractInterface], bool, dict[str, Any]]:
+        """ Split an interact conf into name, type, start flag and interface options """
+        options = dict(conf)
+        do_start = options.pop("start", False)
+        iface_type = self._reg.get_type(options.pop("interface_type", None))
+        name = options.pop("name", None) or iface_type.__name__
+        return name, iface_type, do_start, options
+
+    def _add_interact(self, conf: dict[str, Any]) -> None:
+        """ Create an interact and register it """
+        name, iface_type, do_start, options = self._parse_conf(conf)
+        self._reg.register(iface_type(self._cmd_queue, self._result_queue, **options), name)
+        with self._lock:
+            self._confs[name] = dict(conf)
+            if do_start and name not in self._interact_listeners:
+                self._interact_listeners.append(name)
+
+    def _remove_interact(self, name: str) -> None:
+        """ Stop an interact and remove it from the registry """
+        with self._lock:
+            self._confs.pop(name, None)
+            if name in self._interact_listeners:
+                self._interact_listeners.remove(name)
+        iface = self._reg.unregister(name)
+        if iface is not None:
+            iface.stop()
 
     def gen_interacts(self) -> None:
         """
@@ -146,18 +451,51 @@ class InteractEngine(Engine):
         If the interact conf has a key `start` with value `True` that interact
           is added to the list of interacts that will be started in listen mode
         """
-        if not self._conf["interacts"]:
+        if not self._interact_confs:
             self._reg.get(None)
             self._interact_listeners = ["default"]
             return
 
         for conf in self._interact_confs:
-            do_start = conf.pop("start", False)
-            name = conf.pop("name", None)
-            iface_type = conf.pop("interface_type", self._reg.default_class)
-            self._reg.register(iface_type(**conf), name)
-            if do_start:
-                self._interact_listeners.append(name)
+            self._add_interact(conf)
+
+    def reconfigure(self, conf: dict[str, Any]) -> None:
+        """
+        Apply a new config to the running interacts. Interacts are matched by name.
+        New interacts are created, removed ones are stopped and changed ones are
+          reconfigured in place when they support it, otherwise they are replaced.
+        Commands in flight post their results to the interface that scheduled them.
+        """
+        new: dict[str, dict[str, Any]] = {}
+        for interact_conf in conf.get("interacts", []):
+            new[self._parse_conf(interact_conf)[0]] = interact_conf
+        with self._lock:
+            old = dict(self._confs)
+        for name in set(old) - set(new):
+            self._remove_interact(name)
+        for name, interact_conf in new.items():
+            previous = old.get(name)
+            if previous is None:
+                self._add_interact(interact_conf)
+                continue
+            if previous == interact_conf:
+                continue
+            _, old_type, old_start, old_options = self._parse_conf(previous)
+            _, new_type, new_start, new_options = self._parse_conf(interact_conf)
+            changed = {
+                option: new_options.get(option)
+                for option in set(old_options) | set(new_options)
+                if old_options.get(option) != new_options.get(option)
+            }
+            same_kind = old_type is new_type and old_start == new_start
+            if same_kind and self._reg.get(name).reconfigure(**changed):
+                with self._lock:
+                    self._confs[name] = dict(interact_conf)
+                continue
+            self._remove_interact(name)
+            self._add_interact(interact_conf)
+        self._conf = conf
+        self._interact_confs = conf.get("interacts", [])
 
     def run(self) -> None:
         """ Run the engine """
@@ -165,33 +503,58 @@ class InteractEngine(Engine):
             target=self.execute, daemon=True, name="interact_exec_thread"
         )
         interact_exec_thread.start()
-        while True:
-            sleep(1)
+        while not self._stop_event.wait(1):
             if not interact_exec_thread.is_alive():
                 interact_exec_thread = Thread(
                     target=self.execute, daemon=True, name="interact_exec_thread"
                 )
                 interact_exec_thread.start()
 
+    def _start_listeners(self) -> None:
+        """
+        Start listening on the interacts that are not listening yet.
+        Listener of a replaced interact is started once the old one has stopped.
+        """
+        with self._lock:
+            listeners = list(self._interact_listeners)
+        for iface in set(self._threads) - set(listeners):
+            del self._threads[iface]
+        for iface in listeners:
+            thread = self._threads.get(iface)
+            try:
+                interact = self._reg.get(iface)
+            except KeyError:
+                continue
+            if thread is not None and (thread.is_alive() or interact.stopped):
+                continue
+            self._threads[iface] = Thread(target=interact.listen, daemon=True, name=iface)
+            self._threads[iface].start()
+
     def execute(self) -> None:
         """
         Method generates all interacts and starts listening
           on the ones that are set to start in separate threads.
-        Method will restart failed threads.
+        Method will restart failed threads and start the interacts added by `reconfigure`.
         """
-        self.gen_interacts()
-        threads: dict[str, Thread] = {}
+        if not self._confs and not self._interact_listeners:
+            self.gen_interacts()
+        self._start_listeners()
+        while not self._stop_event.wait(1):
+            self._start_listeners()
 
-        def start_listener(iface: str) -> None:
-            """ Start the listener in it's thread """
-            interact = self._reg.get(iface)
-            threads[iface] = Thread(target=interact.listen, daemon=True, name=iface)
-            threads[iface].start()
+    def drain(self) -> None:
+        """ Make all interacts stop accepting commands, results are still delivered """
+        for iface in self._reg.interfaces():
+            iface.drain()
 
-        for iface in self._interact_listeners:
-            start_listener(iface)
-        while True:
-            sleep(1)
-            for iface in self._interact_listeners:
-                if not threads[iface].is_alive():
-                    start_listener(iface)
+    def stop(self, timeout: float | None = None) -> None:
+        """
+        Stop all interacts, delivering their buffered messages,
+          and wait up to timeout for their listeners to exit.
+        """
+        self._stop_event.set()
+        for iface in self._reg.interfaces():
+            iface.stop()
+        deadline = None if timeout is None else monotonic() + timeout
+        for thread in list(self._threads.values()):
+            thread.join(None if deadline is None else max(deadline - monotonic(), 0))
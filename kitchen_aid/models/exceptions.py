@@ -23,3 +23,23 @@ class CommandNotFound(GenericCommandError):
 
 class CommandTryAgain(RetriableError):
     """ This error identifies a command that should be retried """
+
+
+class InvalidCommandArguments(GenericCommandError):
+    """ This error identifies command arguments that can't be parsed """
+
+
+class InvalidPipeline(GenericKitchenAidError):
+    """ This error identifies a pipeline spec that can't be executed """
+
+
+class InvalidConfig(GenericKitchenAidError):
+    """ This error identifies a config that can't be loaded or doesn't match the schema """
+
+
+class MemoryBudgetExhausted(GenericCommandError):
+    """ This error identifies a payload that couldn't be reserved from the memory budget in time """
+
+
+class InvalidRecording(GenericKitchenAidError):
+    """ This error identifies a traffic recording that can't be replayed """
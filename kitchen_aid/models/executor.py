@@ -0,0 +1,532 @@
+#! /usr/bin/env python3
+
+"""
+This module provides an adaptive thread pool executor.
+The pool grows while work waits in the queue for longer than the target wait
+and shrinks while the workers are mostly idle, staying between it's bounds.
+Every worker has it's own queue. Calls are spread over the queues without a shared lock,
+and a worker that runs out of calls steals from the others.
+"""
+
+import itertools
+import math
+import os
+from collections import deque
+from concurrent.futures import Executor, Future
+from threading import Event, Lock, Thread, get_ident
+from time import monotonic
+from typing import Any, Callable, Iterator
+
+
+DEFAULT_TARGET_WAIT: float = 0.05
+
+
+def default_max_workers() -> int:
+    """ Same default as ThreadPoolExecutor """
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+# pylint: disable=too-few-public-methods
+class _WorkItem:
+    """ Queued call """
+
+    __slots__ = ("future", "fn", "args", "kwargs", "enqueued")
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        future: Future,
+        fn: Callable[..., Any],
+        args: tuple[Any, ...],
+        kwargs: dict[str, Any],
+        enqueued: float,
+    ) -> None:
+        self.future: Future = future
+        self.fn: Callable[..., Any] = fn
+        self.args: tuple[Any, ...] = args
+        self.kwargs: dict[str, Any] = kwargs
+        self.enqueued: float = enqueued
+
+    def run(self) -> None:
+        """ Run the call and set the result of it's future """
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except BaseException as error:  # pylint: disable=broad-exception-caught
+            self.future.set_exception(error)
+        else:
+            self.future.set_result(result)
+
+
+# pylint: disable=too-few-public-methods,too-many-instance-attributes
+class _Worker:
+    """ Worker of the pool, with it's own queue and measurements """
+
+    __slots__ = (
+        "thread", "queue", "wake", "sleeping", "closed", "started", "busy", "wait", "taken",
+        "stolen",
+    )
+
+    def __init__(self) -> None:
+        self.thread: Thread | None = None
+        self.queue: deque[_WorkItem] = deque()
+        # Held while the worker has nothing to do, it sleeps on it until released
+        self.wake: Lock = Lock()
+        self.wake.acquire()  # pylint: disable=consider-using-with
+        self.sleeping: bool = False
+        # Set once the worker exits, calls queued to it after that are moved to the inbox
+        self.closed: bool = False
+        # Start of the running call, None while idle
+        self.started: float | None = None
+        # Totals, written only by the worker thread
+        self.busy: float = 0.0
+        self.wait: float = 0.0
+        self.taken: int = 0
+        self.stolen: int = 0
+
+
+# pylint: disable=too-many-instance-attributes
+class AdaptiveThreadPoolExecutor(Executor):
+    """
+    Thread pool that sizes itself between `min_workers` and `max_workers`.
+    Every `interval` seconds the pool is checked:
+    * queue wait (the average wait of the calls started since the last check, or the age of
+        the oldest queued call if it's longer) over `target_wait` grows the pool,
+        at most doubling it
+    * utilization (busy time / worker time) under `low_utilization` with an empty queue
+        retires half of the idle workers
+    Hysteresis - the pool grows after `grow_after` and shrinks after `shrink_after` consecutive
+      checks that call for it, anything in between resets the counts.
+    Calls submitted while all workers are busy and the queue is already late grow the pool
+      right away, so bursts don't wait for the next check.
+    Calls are queued round robin to the workers, calls submitted by a worker go to it's own queue.
+    A worker takes the calls of it's queue in order, then the oldest calls of the other queues.
+    Idle workers sleep on their own lock, a call goes straight to the queue of a sleeping
+      worker and wakes it up. The pool lock is only taken to resize the pool,
+      so calls are submitted and taken without contending on it.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        min_workers: int = 1,
+        max_workers: int | None = None,
+        target_wait: float = DEFAULT_TARGET_WAIT,
+        low_utilization: float = 0.3,
+        interval: float = 0.5,
+        grow_after: int = 1,
+        shrink_after: int = 10,
+        thread_name_prefix: str = "adaptive_pool",
+    ) -> None:
+        self._min_workers: int = 1
+        self._max_workers: int = 1
+        self._check_bounds(min_workers, max_workers)
+        self.target_wait: float = target_wait
+        self.low_utilization: float = low_utilization
+        self.interval: float = interval
+        self.grow_after: int = grow_after
+        self.shrink_after: int = shrink_after
+        self._prefix: str = thread_name_prefix
+        self._lock: Lock = Lock()
+        # Replaced, never changed in place, so it's read without the lock
+        self._workers: tuple[_Worker, ...] = ()
+        # Calls that have no worker to go to
+        self._inbox: deque[_WorkItem] = deque()
+        # Workers going to sleep, the last one is woken up first
+        self._sleepers: list[_Worker] = []
+        self._next: Iterator[int] = itertools.count()
+        # Workers by the ident of their thread
+        self._owners: dict[int, _Worker] = {}
+        self._size: int = 0
+        # Spawned workers that haven't picked up work yet
+        self._starting: int = 0
+        self._retire: int = 0
+        self._spawned: int = 0
+        self._shutdown: bool = False
+        self._stop: Event = Event()
+        self._controller: Thread | None = None
+        # Totals of the workers that exited
+        self._exited: _Worker = _Worker()
+        # Measurements since the last check are the totals less the totals at it's start
+        self._window_start: float = monotonic()
+        self._base: tuple[float, float, int] = (0.0, 0.0, 0)
+        self._high: int = 0
+        self._low: int = 0
+        self.grown: int = 0
+        self.shrunk: int = 0
+        with self._lock:
+            self._set_bounds(min_workers, max_workers)
+
+    @staticmethod
+    def _check_bounds(min_workers: int, max_workers: int | None) -> None:
+        """ Validate the bounds """
+        if min_workers < 0:
+            raise ValueError("Minimum workers can't be negative")
+        if max_workers is not None and max_workers < max(min_workers, 1):
+            raise ValueError("Maximum workers should be positive and at least the minimum")
+
+    def _set_bounds(self, min_workers: int, max_workers: int | None) -> None:
+        """ Set the bounds and bring the size within them. Lock should be held. """
+        self._min_workers = min_workers
+        self._max_workers = max_workers or max(default_max_workers(), min_workers)
+        size = self._size - self._retire
+        if size > self._max_workers:
+            self._retire = self._size - self._max_workers
+            self._wake_all()
+        elif size < self._min_workers:
+            reclaimed = min(self._retire, self._min_workers - size)
+            self._retire -= reclaimed
+            self._spawn(self._min_workers - size - reclaimed)
+
+    @property
+    def min_workers(self) -> int:
+        """ Get the lower bound """
+        return self._min_workers
+
+    @property
+    def max_workers(self) -> int:
+        """ Get the upper bound """
+        return self._max_workers
+
+    @property
+    def size(self) -> int:
+        """ Get the number of workers """
+        return self._size - self._retire
+
+    def stats(self) -> dict[str, float]:
+        """ Get the pool size and the measurements since the last check """
+        with self._lock:
+            wait, utilization = self._measure(monotonic())
+            return {
+                "size": self._size - self._retire,
+                "min_workers": self._min_workers,
+                "max_workers": self._max_workers,
+                "idle": self._idle(),
+                "queued": self._queued(),
+                "wait": wait,
+                "utilization": utilization,
+                "grown": self.grown,
+                "shrunk": self.shrunk,
+                "stolen": sum(worker.stolen for worker in (self._exited, *self._workers)),
+            }
+
+    def resize(self, min_workers: int | None = None, max_workers: int | None = None) -> None:
+        """
+        Change the bounds. Workers over the new maximum exit once they are done with their call.
+        None keeps the current minimum, but means the default for the maximum.
+        """
+        with self._lock:
+            min_workers = self._min_workers if min_workers is None else min_workers
+            self._check_bounds(min_workers, max_workers)
+            self._set_bounds(min_workers, max_workers)
+
+    def _spawn(self, count: int) -> None:
+        """ Start workers. Lock should be held. """
+        for _ in range(count):
+            self._spawned += 1
+            worker = _Worker()
+            worker.thread = Thread(
+                target=self._work, args=(worker,), daemon=True,
+                name=f"{self._prefix}_{self._spawned}",
+            )
+            self._workers = (*self._workers, worker)
+            self._size += 1
+            self._starting += 1
+            worker.thread.start()
+
+    def _queued(self) -> int:
+        """ Get the number of queued calls """
+        return len(self._inbox) + sum(len(worker.queue) for worker in self._workers)
+
+    def _oldest(self) -> float | None:
+        """ Get the time the oldest queued call was submitted """
+        oldest: float | None = None
+        for queue in (self._inbox, *(worker.queue for worker in self._workers)):
+            try:
+                enqueued = queue[0].enqueued
+            except IndexError:
+                continue
+            if oldest is None or enqueued < oldest:
+                oldest = enqueued
+        return oldest
+
+    def _take(self, worker: _Worker) -> _WorkItem | None:
+        """ Get the next call of a worker - from it's queue, the inbox or another worker """
+        # Queues are checked before popping, an empty pop costs an exception
+        for queue in (worker.queue, self._inbox):
+            if queue:
+                try:
+                    return queue.popleft()
+                except IndexError:
+                    pass
+        workers = self._workers
+        start = next(self._next)
+        for offset in range(len(workers)):
+            victim = workers[(start + offset) % len(workers)]
+            if victim is worker or not victim.queue:
+                continue
+            try:
+                item = victim.queue.popleft()
+            except IndexError:
+                continue
+            worker.stolen += 1
+            return item
+        return None
+
+    def _idle(self) -> int:
+        """ Get the number of sleeping workers """
+        return sum(worker.sleeping for worker in self._workers)
+
+    def _wake(self) -> bool:
+        """ Wake up the last worker that went to sleep. Returns False if none is sleeping. """
+        try:
+            worker = self._sleepers.pop()
+        except IndexError:
+            return False
+        self._release(worker)
+        return True
+
+    def _wake_all(self) -> None:
+        """ Wake up all sleeping workers """
+        while self._wake():
+            pass
+
+    @staticmethod
+    def _release(worker: _Worker) -> None:
+        """ Wake up a worker """
+        try:
+            worker.wake.release()
+        except RuntimeError:
+            pass  # Already woken up
+
+    def _unlist(self, worker: _Worker) -> None:
+        """ Remove a worker from the sleepers """
+        try:
+            self._sleepers.remove(worker)
+        except ValueError:
+            pass  # Already taken off by a wake up
+
+    def _park(self, worker: _Worker) -> _WorkItem | None:
+        """
+        Wait for a call. Returns None once the worker should exit.
+        The worker is listed as sleeping before it looks for calls the last time,
+          so a call submitted meanwhile is either found or wakes it up.
+        A wake up that comes after the worker found a call makes the next wait return
+          right away, which only costs another look for calls.
+        """
+        while True:
+            if self._retire > 0 or self._shutdown:
+                with self._lock:
+                    item = self._take(worker)
+                    if item is not None:
+                        return item
+                    if self._retire > 0 or self._shutdown:
+                        self._retire = max(self._retire - 1, 0)
+                        self._exit(worker)
+                        return None
+            self._sleepers.append(worker)
+            item = self._take(worker)
+            if item is None and not (self._retire > 0 or self._shutdown):
+                worker.sleeping = True
+                worker.wake.acquire()  # pylint: disable=consider-using-with
+                worker.sleeping = False
+                item = self._take(worker)
+            self._unlist(worker)
+            if item is not None:
+                return item
+
+    def _exit(self, worker: _Worker) -> None:
+        """ Remove a worker, keeping it's totals and calls. Lock should be held. """
+        worker.closed = True
+        self._owners.pop(get_ident(), None)
+        self._unlist(worker)
+        self._workers = tuple(other for other in self._workers if other is not worker)
+        self._size -= 1
+        self._exited.busy += worker.busy
+        self._exited.wait += worker.wait
+        self._exited.taken += worker.taken
+        self._exited.stolen += worker.stolen
+        self._rescue(worker)
+
+    def _rescue(self, worker: _Worker) -> None:
+        """ Move the calls of an exited worker to the inbox. Lock should be held. """
+        while worker.queue:
+            try:
+                self._inbox.append(worker.queue.popleft())
+            except IndexError:
+                break
+        if self._inbox:
+            self._wake()
+
+    def _work(self, worker: _Worker) -> None:
+        """ Worker loop """
+        self._owners[get_ident()] = worker
+        with self._lock:
+            self._starting -= 1
+        while True:
+            item = self._take(worker) or self._park(worker)
+            if item is None:
+                return
+            started = monotonic()
+            worker.wait += started - item.enqueued
+            worker.taken += 1
+            worker.started = started
+            item.run()
+            del item
+            worker.started = None
+            worker.busy += monotonic() - started
+
+    def _totals(self, now: float) -> tuple[float, float, int]:
+        """ Busy time, queue wait and calls taken by all workers so far """
+        busy, wait, taken = self._exited.busy, self._exited.wait, self._exited.taken
+        for worker in self._workers:
+            started = worker.started
+            busy += worker.busy + (0.0 if started is None else now - started)
+            wait += worker.wait
+            taken += worker.taken
+        return busy, wait, taken
+
+    def _measure(self, now: float) -> tuple[float, float]:
+        """ Queue wait and utilization since the last check. Lock should be held. """
+        busy, wait_sum, taken = self._totals(now)
+        base_busy, base_wait, base_taken = self._base
+        wait = (wait_sum - base_wait) / (taken - base_taken) if taken > base_taken else 0.0
+        oldest = self._oldest()
+        if oldest is not None:
+            wait = max(wait, now - oldest)
+        elapsed = now - self._window_start
+        if elapsed <= 0 or not self._size:
+            return wait, 0.0
+        return wait, min((busy - base_busy) / (elapsed * self._size), 1.0)
+
+    def adjust(self, now: float | None = None) -> int:
+        """ Check the measurements and resize the pool. Returns the change in size. """
+        now = monotonic() if now is None else now
+        with self._lock:
+            if self._shutdown:
+                return 0
+            wait, utilization = self._measure(now)
+            size = self._size - self._retire
+            change = 0
+            queued = self._queued()
+            demand = queued - self._idle() - self._starting
+            if wait > self.target_wait and demand > 0 and size < self._max_workers:
+                self._high, self._low = self._high + 1, 0
+                if self._high >= self.grow_after:
+                    change = min(self._max_workers - size, max(1, min(demand, size)))
+            elif utilization < self.low_utilization and not queued and size > self._min_workers:
+                self._high, self._low = 0, self._low + 1
+                if self._low >= self.shrink_after:
+                    busy_workers = math.ceil(utilization * size)
+                    change = -min(size - self._min_workers, max(1, (size - busy_workers) // 2))
+            else:
+                self._high = self._low = 0
+            if change > 0:
+                self._grow(change)
+            elif change < 0:
+                self._retire -= change
+                self.shrunk -= change
+                self._high = self._low = 0
+                self._wake_all()
+            self._window_start = now
+            self._base = self._totals(now)
+            return change
+
+    def _grow(self, count: int) -> None:
+        """ Add workers, taking back pending retirements first. Lock should be held. """
+        reclaimed = min(self._retire, count)
+        self._retire -= reclaimed
+        self._spawn(count - reclaimed)
+        self.grown += count
+        self._high = self._low = 0
+
+    def _control(self) -> None:
+        """ Check the pool every interval until shutdown """
+        while not self._stop.wait(self.interval):
+            self.adjust()
+
+    def _late(self, now: float) -> bool:
+        """ Should a call submitted while no worker is idle grow the pool """
+        size = self._size - self._retire
+        if size >= self._max_workers or self._queued() <= self._starting:
+            return False
+        oldest = self._oldest()
+        return size == 0 or (oldest is not None and now - oldest > self.target_wait)
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        """ Schedule a call """
+        if self._shutdown:
+            raise RuntimeError("Cannot schedule new futures after shutdown")
+        future: Future = Future()
+        now = monotonic()
+        item = _WorkItem(future, fn, args, kwargs, now)
+        worker: _Worker | None = self._owners.get(get_ident())
+        sleeper: _Worker | None = None
+        if worker is None or worker.closed:
+            try:
+                worker = sleeper = self._sleepers.pop() if self._sleepers else None
+            except IndexError:
+                pass  # Woken up meanwhile
+            if worker is None:
+                workers = self._workers
+                worker = workers[next(self._next) % len(workers)] if workers else None
+        queue = self._inbox if worker is None else worker.queue
+        queue.append(item)
+        if sleeper is not None:
+            self._release(sleeper)
+        elif self._sleepers:
+            # A worker that went to sleep meanwhile steals the call
+            self._wake()
+        unmanaged = self._controller is None or self._shutdown
+        closed = worker is not None and worker.closed
+        if unmanaged or closed or (sleeper is None and self._late(now)):
+            self._dispatch(item, queue, worker, now)
+        return future
+
+    def _dispatch(
+        self, item: _WorkItem, queue: deque[_WorkItem], worker: _Worker | None, now: float
+    ) -> None:
+        """ Submit under the lock - grow the pool, rescue the call or back out of a shutdown """
+        with self._lock:
+            if self._shutdown:
+                for candidate in (queue, self._inbox):
+                    try:
+                        candidate.remove(item)
+                    except ValueError:
+                        continue
+                    raise RuntimeError("Cannot schedule new futures after shutdown")
+                return  # Already taken by a worker
+            if self._controller is None:
+                self._controller = Thread(
+                    target=self._control, daemon=True, name=f"{self._prefix}_control"
+                )
+                self._controller.start()
+            if worker is not None and worker.closed:
+                self._rescue(worker)
+            size = self._size - self._retire
+            demand = self._queued() - self._idle() - self._starting
+            oldest = self._oldest()
+            if demand > 0 and size < self._max_workers and (
+                size == 0 or (oldest is not None and now - oldest > self.target_wait)
+            ):
+                self._grow(1)
+            self._wake()
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        """ Stop the pool. Queued calls are run unless cancelled. """
+        with self._lock:
+            self._shutdown = True
+            if cancel_futures:
+                for queue in (self._inbox, *(worker.queue for worker in self._workers)):
+                    while True:
+                        try:
+                            queue.popleft().future.cancel()
+                        except IndexError:
+                            break
+            workers = [worker.thread for worker in self._workers]
+            self._wake_all()
+        self._stop.set()
+        if wait:
+            for thread in workers:
+                thread.join()  # type: ignore
@@ -5,14 +5,22 @@ This module povides base interact utilities
 """
 
 
-from typing import Any, OrderedDict
+import sys
+from typing import Any, Iterable, OrderedDict, TextIO
 from queue import Queue
-from threading import Lock
+from threading import Condition, Event, Lock
 
 from gears.singleton_meta import SingletonController
 
 import kitchen_aid.models.exceptions as excs
-from kitchen_aid.models.command import Result, CommandMapper
+from kitchen_aid.models.coalesce import FlushPolicy, MessageCoalescer
+from kitchen_aid.models.command import Result, PartialResult, UnchangedResult, CommandMapper
+from kitchen_aid.models.inventory import (
+    CommandInventory, DEFAULT_INVENTORY_SIZE, DEFAULT_INVENTORY_TTL
+)
+from kitchen_aid.models.log import console
+from kitchen_aid.models.recorder import get_recorder
+from kitchen_aid.models.subscriptions import Subscription, command_name, get_hub
 
 
 def get_cmd_id(
@@ -55,6 +63,8 @@ class IThread:  # pragma: no cover
     between interfaces to communicate.
     """
 
+    __slots__ = ()
+
     def post(self, message: bytes | Any) -> None:
         """
         Post a message to the thread
@@ -66,18 +76,97 @@ class InteractInterface:
     """ Base interact interface """
 
     has_threads: bool = False
+    # Whether messages can be coalesced, see `_deliver`
+    coalescing: bool = True
+    # Options that can be changed on a running interface, see `reconfigure`
+    reconfigurable: frozenset[str] = frozenset({"inventory_size", "inventory_ttl", "coalesce"})
 
-    def __init__(self, command_queue: Queue, command_result_queue: Queue) -> None:
+    def __init__(
+        self,
+        command_queue: Queue,
+        command_result_queue: Queue,
+        inventory_size: int = DEFAULT_INVENTORY_SIZE,
+        inventory_ttl: float = DEFAULT_INVENTORY_TTL,
+        coalesce: dict[str, Any] | None = None,
+    ) -> None:
         self.main_thread: IThread = self.get_main_thread()
         self._command_queue: Queue = command_queue
         self._command_result_queue: Queue = command_result_queue
-        self._command_inventory: dict[str, Any] = {}
-        self._lock: Lock = Lock()
+        self._command_inventory: CommandInventory = CommandInventory(
+            inventory_size, inventory_ttl
+        )
+        self._stop_event: Event = Event()
+        self._draining: Event = Event()
+        self._coalescer: MessageCoalescer | None = None
+        if coalesce is not None:
+            if not self.coalescing:
+                raise ValueError(f"{type(self).__name__} doesn't coalesce messages")
+            self._coalescer = MessageCoalescer(self._post_message, FlushPolicy(**coalesce))
+
+    @property
+    def stopped(self) -> bool:
+        """ Is the interface stopped """
+        return self._stop_event.is_set()
+
+    @property
+    def accepting(self) -> bool:
+        """ Does the interface accept new commands """
+        return not (self._draining.is_set() or self._stop_event.is_set())
+
+    def drain(self) -> None:
+        """
+        Stop accepting new commands.
+        Interface keeps running, so results of the scheduled commands are delivered.
+        """
+        self._draining.set()
+
+    def stop(self) -> None:
+        """
+        Stop the interface.
+        Stopped interfaces don't listen for new commands and are not restarted.
+        Buffered messages are delivered.
+        """
+        self._stop_event.set()
+        get_hub().unsubscribe_interface(self)
+        if self._coalescer is not None:
+            self._coalescer.close()
+
+    def reconfigure(self, **options: Any) -> bool:
+        """
+        Apply changed options to the running interface.
+        Options that were removed from the config are passed as None, meaning the default.
+        Returns False, without changing anything, when an option can only be set
+          on a new interface.
+        """
+        if not set(options) <= self.reconfigurable:
+            return False
+        if "inventory_size" in options or "inventory_ttl" in options:
+            inventory = self._command_inventory
+            inventory.configure(
+                options.get("inventory_size", inventory.max_size) or DEFAULT_INVENTORY_SIZE,
+                options.get("inventory_ttl", inventory.ttl) or DEFAULT_INVENTORY_TTL,
+            )
+        if "coalesce" in options:
+            coalesce = options["coalesce"]
+            if coalesce is None:
+                coalescer, self._coalescer = self._coalescer, None
+                if coalescer is not None:
+                    coalescer.close()
+            elif self._coalescer is None:
+                self._coalescer = MessageCoalescer(self._post_message, FlushPolicy(**coalesce))
+            else:
+                self._coalescer.policy = FlushPolicy(**coalesce)
+        return True
+
+    @property
+    def pending_commands(self) -> int:
+        """ Get the number of commands that haven't posted their result yet """
+        return self._command_inventory.size
 
     def listen(self) -> None:
         """
         Listen for inputs in this method.
-        This method should go into infinite loop and listen for inputs.
+        This method should loop and listen for inputs until the interface is stopped.
         Take care of your inputs here as well.
         """
         raise NotImplementedError
@@ -94,9 +183,21 @@ class InteractInterface:
         """ Spawn a new thread """
         raise NotImplementedError
 
+    def _deliver(self, message: bytes, thread: IThread) -> None:
+        """ Post a message, through the coalescing buffer when one is configured """
+        if self._coalescer is None:
+            self._post_message(message, thread)
+        else:
+            self._coalescer.add(message, thread)
+
+    def flush(self) -> None:
+        """ Deliver all buffered messages """
+        if self._coalescer is not None:
+            self._coalescer.flush()
+
     def post(self, message: bytes, thread: IThread | None = None) -> None:
         """ Post a message """
-        self._post_message(
+        self._deliver(
             message,
             thread if thread else self.spawn_thread() if self.has_threads else self.main_thread
         )
@@ -109,8 +210,12 @@ class InteractInterface:
         kwargs: dict | None = None,
         thread: IThread | None = None,
         cback_iiface: str | type["InteractInterface"] | None = None
-    ) -> None:
-        """ Receive a command and schedule it for execution """
+    ) -> bool:
+        """
+        Receive a command and schedule it for execution.
+        Returns False if the same command is already scheduled or the interface
+          doesn't accept commands.
+        """
         cback: InteractInterface
         args = args or []
         kwargs = kwargs or {}
@@ -122,28 +227,63 @@ class InteractInterface:
         cmd_tuple: tuple[str, list[str], dict[str, str], IThread, InteractInterface] = (
             command, args, kwargs, thread, cback
         )
-        do_put: bool = False
         cmd_id: str = get_cmd_id(command, args, kwargs, thread, cback)
-        with self._lock:
-            # Make sure that we don't shedule a command that is already scheduled
-            if cmd_id not in self._command_inventory:
-                self._command_inventory[cmd_id] = cmd_tuple
-                do_put = True
-        if do_put:
-            self._command_queue.put(cmd_tuple)
+        if not self.accepting:
+            return False
+        # Make sure that we don't shedule a command that is already scheduled
+        if not self._command_inventory.add(cmd_id, cmd_tuple):
+            return False
+        recorder = get_recorder()
+        if recorder is not None:
+            recorder.command(cmd_id, command, args, kwargs)
+        self._command_queue.put(cmd_tuple)
+        return True
+
+    def subscribe(
+        self,
+        command_id: str | None = None,
+        pattern: str | None = None,
+        thread: IThread | None = None,
+    ) -> Subscription:
+        """
+        Get the results of a command id, or of all commands with a name matching a pattern
+          (`get-page*`), posted to a thread (the main thread by default).
+        Only final results are delivered. Subscriptions end with the interface.
+        """
+        return get_hub().subscribe(self, thread or self.main_thread, command_id, pattern)
+
+    def encode_result(self, cmd_id: str, result: Result) -> bytes:
+        """ Encode the result of a subscription. Encoding should be the same for all threads """
+        return wrap_result(result, command_name(cmd_id)).encode("utf-8")
+
+    def _pop_command(self, cmd_id: str, result: Result) -> Any | None:
+        """ Get the inventory entry of a command, removing it when the result is final """
+        if isinstance(result, PartialResult):
+            return self._command_inventory.get(cmd_id)
+        return self._command_inventory.pop(cmd_id)
 
     def post_command_result(
         self, cmd_id: str, result: Result
     ) -> None:
-        """ Post a command result to the queue """
-        cmd, args, kwargs, thread, _ = self._command_inventory[cmd_id]
-        args.extend(f"{arg[0]}: {arg[1]}" for arg in kwargs.items())
-        self._post_message(
-            wrap_result(result, cmd, args).encode("utf-8"),
+        """
+        Post a command result to the thread that scheduled the command.
+        If the command has already left the inventory (expired or evicted),
+          the result is posted to the main thread.
+        Partial results keep the command in the inventory.
+        Unchanged results only remove it.
+        """
+        entry = self._pop_command(cmd_id, result)
+        if isinstance(result, UnchangedResult):
+            return
+        if entry is None:
+            self._deliver(wrap_result(result, cmd_id).encode("utf-8"), self.main_thread)
+            return
+        cmd, args, kwargs, thread, _ = entry
+        call_args = [*args, *(f"{arg[0]}: {arg[1]}" for arg in kwargs.items())]
+        self._deliver(
+            wrap_result(result, cmd, call_args).encode("utf-8"),
             thread
         )
-        with self._lock:
-            del self._command_inventory[cmd_id]
 
 
 # Let's define a simple interface and threads that go with it.
@@ -152,18 +292,87 @@ class InteractInterface:
 class STDOutThread(IThread):
     """ Standard output thread """
 
+    __slots__ = ()
+
+    def post(self, message: bytes | Any) -> None:
+        """ Post a message. It's written by the log writer, when logging is configured. """
+        console(message.decode("utf-8"))
+
+
+class BatchThread(IThread):
+    """
+    Thread of a single batch line.
+    Messages are tagged with the line number and written to the batch output.
+    """
+
+    __slots__ = ("line_no", "_output", "_lock")
+
+    def __init__(self, line_no: int, output: TextIO, lock: Lock) -> None:
+        self.line_no: int = line_no
+        self._output: TextIO = output
+        self._lock: Lock = lock
+
+    def __str__(self) -> str:
+        return f"batch-line-{self.line_no}"
+
     def post(self, message: bytes | Any) -> None:
         """ Post a message """
-        print(message.decode("utf-8"))
+        if isinstance(message, bytes):
+            message = message.decode("utf-8")
+        with self._lock:
+            self._output.write(f"[line {self.line_no}] {message}\n")
+            self._output.flush()
+
+
+class BatchTracker:
+    """ Tracks in-flight batch commands and bounds their number """
+
+    def __init__(self, max_in_flight: int) -> None:
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight should be positive")
+        self._max_in_flight: int = max_in_flight
+        self._cond: Condition = Condition()
+        self.in_flight: int = 0
+        self.succeeded: int = 0
+        self.failed: int = 0
+
+    def acquire(self) -> None:
+        """ Block until there is room for one more command """
+        with self._cond:
+            self._cond.wait_for(lambda: self.in_flight < self._max_in_flight)
+            self.in_flight += 1
+
+    def release(self, success: bool) -> None:
+        """ Mark a command as done """
+        with self._cond:
+            self.in_flight -= 1
+            if success:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            self._cond.notify_all()
+
+    def reject(self) -> None:
+        """ Mark a command that was never scheduled as failed """
+        with self._cond:
+            self.failed += 1
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """ Wait for all in-flight commands to finish """
+        with self._cond:
+            return self._cond.wait_for(lambda: self.in_flight == 0, timeout)
 
 
 class ClearTextInterface(InteractInterface):
     """ Command line interface """
     has_threads: bool = False
 
-    def __init__(self, command_queue: Queue, command_result_queue: Queue) -> None:
-        super().__init__(command_queue, command_result_queue)
+    def __init__(
+        self, command_queue: Queue, command_result_queue: Queue, **kwargs: Any
+    ) -> None:
+        super().__init__(command_queue, command_result_queue, **kwargs)
         self._cmd_map = CommandMapper()
+        self._batch_trackers: dict[str, BatchTracker] = {}
 
     def get_main_thread(self) -> IThread:
         """ Get the main thread """
@@ -177,24 +386,54 @@ class ClearTextInterface(InteractInterface):
         """ Spawn a new thread """
         return self.main_thread
 
+    def parse_command(self, line: str) -> tuple[str, dict[str, Any]]:
+        """
+        Parse a command line into command name and keyword arguments.
+        Raises CommandNotFound or InvalidCommandArguments.
+        """
+        cmd, *args = line.split()
+        _, _, parser = self._cmd_map.get_command(cmd)  # type: ignore
+        try:
+            return cmd, vars(parser.parse_args(args))
+        except excs.InvalidCommandArguments as error:
+            raise excs.InvalidCommandArguments(
+                f"Invalid arguments for command {cmd}: {error}"
+            ) from error
+
+    def post_command_result(self, cmd_id: str, result: Result) -> None:
+        """ Post a command result and release batch slots """
+        if isinstance(result, PartialResult):
+            super().post_command_result(cmd_id, result)
+            return
+        tracker: BatchTracker | None = self._batch_trackers.pop(cmd_id, None)
+        super().post_command_result(cmd_id, result)
+        if tracker is not None:
+            tracker.release(result.success)
+
     def listen(self) -> None:
-        """ Listen for inputs """
+        """
+        Listen for inputs.
+        Listening stops at the end of the input.
+        """
         stdin_input: str = ""
-        while True:
+        while not self.stopped:
             try:
                 stdin_input = input("Enter command: ")
             except EOFError:
-                print()
-            if len(stdin_input) == 0:
-                print("No command entered")
+                console("")
+                self.stop()
+                return
+            if len(stdin_input.strip()) == 0:
+                console("No command entered")
                 continue
-            cmd, *args = stdin_input.split()
             try:
-                _, _, parser = self._cmd_map.get_command(cmd)  # type: ignore
+                cmd, kw_args = self.parse_command(stdin_input)
             except excs.CommandNotFound:
-                print(f"Command {cmd} not found")
+                console(f"Command {stdin_input.split()[0]} not found")
+                continue
+            except excs.InvalidCommandArguments as error:
+                console(str(error))
                 continue
-            kw_args = vars(parser.parse_args(args))
             self.receive_command(
                 command=cmd,
                 args=[],
@@ -203,6 +442,44 @@ class ClearTextInterface(InteractInterface):
                 cback_iiface=None
             )
 
+    def run_batch(
+        self,
+        source: Iterable[str],
+        output: TextIO = sys.stdout,
+        max_in_flight: int = 16,
+    ) -> BatchTracker:
+        """
+        Run commands from source in a non-interactive manner.
+        Every line is a command. Empty lines and lines starting with `#` are skipped.
+        At most `max_in_flight` commands are scheduled at any time.
+        Results are written to output as they complete, tagged with their line number.
+        Method returns when all commands have posted their result.
+        """
+        tracker = BatchTracker(max_in_flight)
+        out_lock = Lock()
+        for line_no, line in enumerate(source, start=1):
+            if self.stopped:
+                break
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            thread = BatchThread(line_no, output, out_lock)
+            try:
+                cmd, kw_args = self.parse_command(line)
+            except excs.GenericCommandError as error:
+                thread.post(f"{line} failed with message: {error}")
+                tracker.reject()
+                continue
+            tracker.acquire()
+            cmd_id = get_cmd_id(cmd, [], kw_args, thread, self)
+            self._batch_trackers[cmd_id] = tracker
+            if not self.receive_command(cmd, [], kw_args, thread, None):
+                del self._batch_trackers[cmd_id]
+                tracker.release(False)
+        tracker.wait()
+        self.flush()
+        return tracker
+
 
 class InteractInterfacesRegistry(metaclass=SingletonController):
     """ Singleton interact interface """
@@ -213,6 +490,7 @@ class InteractInterfacesRegistry(metaclass=SingletonController):
         self._command_queue: Queue
         self._command_result_queue: Queue
         self._default_class: type[InteractInterface] = ClearTextInterface
+        self._types: dict[str, type[InteractInterface]] = {"cleartext": ClearTextInterface}
 
     @ property
     def default(self) -> InteractInterface:
@@ -225,6 +503,24 @@ class InteractInterfacesRegistry(metaclass=SingletonController):
         """ Get the default class """
         return self._default_class
 
+    def register_type(self, iface_type: type[InteractInterface], name: str) -> None:
+        """ Register an interface type, so it can be referenced by name in configs """
+        with self._lock:
+            self._types[name] = iface_type
+
+    def get_type(
+        self, iface_type: str | type[InteractInterface] | None
+    ) -> type[InteractInterface]:
+        """ Get an interface type by name """
+        if iface_type is None:
+            return self._default_class
+        if isinstance(iface_type, type):
+            return iface_type
+        with self._lock:
+            if iface_type not in self._types:
+                raise excs.GenericKitchenAidError(f'Interface type "{iface_type}" not found')
+            return self._types[iface_type]
+
     def add_queues(self, command_queue: Queue, command_result_queue: Queue) -> None:
         """ Add queues to the registry """
         self._command_queue = command_queue
@@ -252,6 +548,16 @@ class InteractInterfacesRegistry(metaclass=SingletonController):
         with self._lock:
             self._interfaces[name] = iface
 
+    def interfaces(self) -> list[InteractInterface]:
+        """ Get all registered interfaces """
+        with self._lock:
+            return list(self._interfaces.values())
+
+    def unregister(self, name: str) -> InteractInterface | None:
+        """ Remove an interface from the registry and return it """
+        with self._lock:
+            return self._interfaces.pop(name, None)
+
     def get(
         self, iface: str | type[InteractInterface] | None
     ) -> InteractInterface:
@@ -0,0 +1,207 @@
+#! /usr/bin/env python3
+
+"""
+This module provides the command inventory used by interact interfaces.
+Inventory keeps track of the commands that are scheduled but have not posted
+their result yet. It is bounded both in size and in time.
+"""
+
+from collections import OrderedDict
+from contextlib import ExitStack
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable
+
+
+DEFAULT_INVENTORY_SIZE: int = 10000
+DEFAULT_INVENTORY_TTL: float = 3600.0
+DEFAULT_INVENTORY_SHARDS: int = 16
+# Smaller inventories are split into fewer shards, down to a single one
+MIN_SHARD_SIZE: int = 64
+
+
+class _Shard:
+    """ Part of the inventory with it's own lock """
+
+    __slots__ = ("entries", "lock", "max_size", "expired", "evicted")
+
+    def __init__(self, max_size: int) -> None:
+        self.entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.lock: Lock = Lock()
+        self.max_size: int = max_size
+        self.expired: int = 0
+        self.evicted: int = 0
+
+    def sweep(self, now: float) -> int:
+        """ Drop expired entries. Lock should be held by the caller. """
+        swept: int = 0
+        while self.entries:
+            cmd_id, (deadline, _) = next(iter(self.entries.items()))
+            if deadline > now:
+                break
+            del self.entries[cmd_id]
+            swept += 1
+        self.expired += swept
+        return swept
+
+    def shift(self, delta: float) -> None:
+        """ Move the deadlines of all entries by delta. Lock should be held by the caller. """
+        for cmd_id, (deadline, entry) in list(self.entries.items()):
+            self.entries[cmd_id] = (deadline + delta, entry)
+
+    def evict(self, size: int) -> None:
+        """ Evict the oldest entries down to size. Lock should be held by the caller. """
+        while len(self.entries) > size:
+            self.entries.popitem(last=False)
+            self.evicted += 1
+
+
+class CommandInventory:
+    """
+    Bounded, self-expiring map of command id -> command entry.
+    Entries are striped over shards by the hash of the command id, every shard has it's
+      own lock, so interfaces adding and removing commands from many threads don't
+      serialize on a single lock (which matters the most on free-threaded builds).
+    Entries of a shard are kept in insertion order. As the TTL is the same for all entries,
+      insertion order is also expiry order, so sweeps only touch expired entries.
+    Size bound is split evenly between the shards. When a shard is full
+      it's oldest entry is evicted.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        max_size: int = DEFAULT_INVENTORY_SIZE,
+        ttl: float = DEFAULT_INVENTORY_TTL,
+        clock: Callable[[], float] = monotonic,
+        shards: int = DEFAULT_INVENTORY_SHARDS,
+    ) -> None:
+        if max_size < 1:
+            raise ValueError("Inventory size should be positive")
+        if ttl <= 0:
+            raise ValueError("Inventory TTL should be positive")
+        if shards < 1:
+            raise ValueError("Inventory shards should be positive")
+        self._max_size: int = max_size
+        self._ttl: float = ttl
+        self._clock: Callable[[], float] = clock
+        count = max(1, min(shards, max_size // MIN_SHARD_SIZE))
+        self._shards: tuple[_Shard, ...] = tuple(
+            _Shard(self._shard_size(max_size, count)) for _ in range(count)
+        )
+
+    @staticmethod
+    def _shard_size(max_size: int, shards: int) -> int:
+        """ Size bound of a shard """
+        return max(1, -(-max_size // shards))
+
+    def _shard(self, cmd_id: object) -> _Shard:
+        """ Get the shard of a command id """
+        return self._shards[hash(cmd_id) % len(self._shards)]
+
+    @property
+    def size(self) -> int:
+        """ Get the current number of entries """
+        return sum(len(shard.entries) for shard in self._shards)
+
+    @property
+    def max_size(self) -> int:
+        """ Get the size bound """
+        return self._max_size
+
+    @property
+    def ttl(self) -> float:
+        """ Get the TTL of the entries """
+        return self._ttl
+
+    @property
+    def shards(self) -> int:
+        """ Get the number of shards """
+        return len(self._shards)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """ Get inventory counters """
+        return {
+            "size": self.size,
+            "max_size": self._max_size,
+            "shards": len(self._shards),
+            "expired": sum(shard.expired for shard in self._shards),
+            "evicted": sum(shard.evicted for shard in self._shards),
+        }
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, cmd_id: object) -> bool:
+        shard = self._shard(cmd_id)
+        with shard.lock:
+            shard.sweep(self._clock())
+            return cmd_id in shard.entries
+
+    def configure(self, max_size: int | None = None, ttl: float | None = None) -> None:
+        """
+        Change the bounds in place. Entries over the new size are evicted, oldest first.
+        New TTL applies to all entries, counted from when they were added,
+          so insertion order stays expiry order.
+        Number of shards is kept.
+        """
+        if max_size is not None and max_size < 1:
+            raise ValueError("Inventory size should be positive")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("Inventory TTL should be positive")
+        if ttl is not None and ttl != self._ttl:
+            # All shards are locked, so no entry is added with the previous TTL meanwhile
+            with ExitStack() as stack:
+                for shard in self._shards:
+                    stack.enter_context(shard.lock)
+                for shard in self._shards:
+                    shard.shift(ttl - self._ttl)
+                self._ttl = ttl
+        if max_size is not None:
+            self._max_size = max_size
+            shard_size = self._shard_size(max_size, len(self._shards))
+            for shard in self._shards:
+                with shard.lock:
+                    shard.max_size = shard_size
+                    shard.evict(shard_size)
+
+    def sweep(self) -> int:
+        """ Drop expired entries and return how many were dropped """
+        swept: int = 0
+        now: float = self._clock()
+        for shard in self._shards:
+            with shard.lock:
+                swept += shard.sweep(now)
+        return swept
+
+    def add(self, cmd_id: str, entry: Any) -> bool:
+        """
+        Add an entry if it's not already in the inventory.
+        Returns True if the entry was added.
+        """
+        now: float = self._clock()
+        shard = self._shard(cmd_id)
+        with shard.lock:
+            shard.sweep(now)
+            if cmd_id in shard.entries:
+                return False
+            shard.evict(shard.max_size - 1)
+            shard.entries[cmd_id] = (now + self._ttl, entry)
+            return True
+
+    def get(self, cmd_id: str) -> Any | None:
+        """ Get an entry without removing it """
+        shard = self._shard(cmd_id)
+        with shard.lock:
+            shard.sweep(self._clock())
+            item = shard.entries.get(cmd_id)
+        return None if item is None else item[1]
+
+    def pop(self, cmd_id: str) -> Any | None:
+        """ Remove an entry and return it. None is returned for unknown entries """
+        shard = self._shard(cmd_id)
+        with shard.lock:
+            shard.sweep(self._clock())
+            item = shard.entries.pop(cmd_id, None)
+        return None if item is None else item[1]
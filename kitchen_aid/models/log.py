@@ -0,0 +1,336 @@
+#! /usr/bin/env python3
+
+"""
+Module provides structured, non-blocking logging.
+Loggers under `kitchen_aid` hand their records to an `AsyncHandler`, which only queues them.
+The `LogWriter` thread drains the queue in batches and writes the records as JSON lines
+to stdout or a file. Console output (`console`) goes through the same writer, so threads
+posting results don't block on stdout either.
+Debug records are sampled and rate limited. With the debug level disabled, a debug call
+costs the logger's cached level check only.
+Uncaught exceptions of threads are logged, see `log_thread_exception`.
+"""
+
+import json
+import logging
+import random
+import sys
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import Any, Callable, TextIO
+
+
+LOGGER_NAME: str = "kitchen_aid"
+DEFAULT_LEVEL: str = "INFO"
+DEFAULT_DEBUG_RATE: float = 100.0
+DEFAULT_BATCH_SIZE: int = 256
+DEFAULT_FLUSH_INTERVAL: float = 0.1
+DEFAULT_MAX_QUEUE: int = 10000
+
+# Attributes every record has, anything else was passed as `extra` and is a field of the line
+_RECORD_ATTRIBUTES: frozenset[str] = frozenset(
+    logging.LogRecord("", 0, "", 0, "", None, None).__dict__
+) | {"message", "asctime", "taskName"}
+
+
+class JSONFormatter(logging.Formatter):
+    """ Formats a record as a JSON line, with the `extra` fields of the record """
+
+    def format(self, record: logging.LogRecord) -> str:
+        line: dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for name, value in record.__dict__.items():
+            if name not in _RECORD_ATTRIBUTES and name not in line:
+                line[name] = value
+        if record.exc_info:
+            line["exception"] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+
+# pylint: disable=too-few-public-methods,too-many-instance-attributes
+class DebugSampler(logging.Filter):
+    """
+    Keeps a `sample` fraction of the debug records, at most `rate` per second.
+    Records of other levels pass. Counters are approximate when threads race, which is fine
+      for a sample.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        sample: float = 1.0,
+        rate: float | None = DEFAULT_DEBUG_RATE,
+        clock: Callable[[], float] = monotonic,
+        rand: Callable[[], float] = random.random,
+    ) -> None:
+        super().__init__()
+        if not 0 <= sample <= 1 or (rate is not None and rate <= 0):
+            raise ValueError("Debug sample should be within [0, 1] and the rate positive")
+        self.sample: float = sample
+        self.rate: float | None = rate
+        self._clock: Callable[[], float] = clock
+        self._rand: Callable[[], float] = rand
+        self._tokens: float = rate or 0.0
+        self._last: float = clock()
+        self.sampled_out: int = 0
+        self.limited: int = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        if self.sample < 1 and self._rand() >= self.sample:
+            self.sampled_out += 1
+            return False
+        if self.rate is None:
+            return True
+        now = self._clock()
+        tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        if tokens < 1:
+            self._tokens = tokens
+            self.limited += 1
+            return False
+        self._tokens = tokens - 1
+        return True
+
+
+# pylint: disable=too-many-instance-attributes
+class LogWriter:
+    """
+    Background writer of log records and console lines.
+    Records over `max_queue` are dropped and counted, console lines never are.
+    The writer wakes up every `flush_interval`, when `batch_size` items are queued
+      and for console lines, and writes all that's queued at once.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        stream: TextIO | None = None,
+        output: TextIO | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+    ) -> None:
+        if batch_size < 1 or flush_interval <= 0 or max_queue < 1:
+            raise ValueError("Log batch size, flush interval and queue size should be positive")
+        # None streams are looked up when written, so they follow stdout replacements
+        self._stream: TextIO | None = stream
+        self._output: TextIO | None = output
+        self.batch_size: int = batch_size
+        self.flush_interval: float = flush_interval
+        self.max_queue: int = max_queue
+        self.formatter: logging.Formatter = JSONFormatter()
+        # Items are (console, record or line). deque appends are atomic, no lock is taken.
+        self._queue: deque[tuple[bool, Any]] = deque()
+        self._wakeup: Event = Event()
+        self._stopped: bool = False
+        self._thread: Thread | None = None
+        self.written: int = 0
+        self.dropped: int = 0
+        self.batches: int = 0
+
+    def enqueue(self, record: logging.LogRecord) -> bool:
+        """ Queue a record. Returns False if it was dropped. """
+        queue = self._queue
+        if len(queue) >= self.max_queue:
+            self.dropped += 1
+            return False
+        queue.append((False, record))
+        if len(queue) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def write(self, line: str) -> None:
+        """ Queue a line of console output """
+        self._queue.append((True, line))
+        self._wakeup.set()
+
+    def _format(self, record: logging.LogRecord) -> str:
+        """ Format a record, a broken one is reported instead of stopping the writer """
+        try:
+            return self.formatter.format(record)
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            return json.dumps({
+                "level": "ERROR", "logger": LOGGER_NAME,
+                "message": f"Unformattable record of {record.name}: {error!r}",
+            })
+
+    def flush(self) -> int:
+        """ Write everything queued. Returns the number of items written. """
+        queue = self._queue
+        segments: list[tuple[TextIO, list[str]]] = []
+        written = 0
+        while queue:
+            try:
+                is_output, item = queue.popleft()
+            except IndexError:
+                break
+            stream = (self._output or sys.stdout) if is_output else (self._stream or sys.stdout)
+            if not segments or segments[-1][0] is not stream:
+                segments.append((stream, []))
+            segments[-1][1].append(item if is_output else self._format(item))
+            written += 1
+        for stream, lines in segments:
+            try:
+                stream.write("\n".join(lines) + "\n")
+                stream.flush()
+            except (OSError, ValueError):
+                pass  # Nowhere left to report it
+        if written:
+            self.written += written
+            self.batches += 1
+        return written
+
+    def run(self) -> None:
+        """ Write batches until stopped. Call this method in it's own thread. """
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+        self.flush()
+
+    def start(self) -> None:
+        """ Start the writer thread """
+        self._thread = Thread(target=self.run, daemon=True, name="log_writer")
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        """ Stop the writer, once everything queued is written """
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self.flush()
+
+    def close(self) -> None:
+        """ Stop the writer and close the log file """
+        self.stop()
+        if self._stream is not None:
+            self._stream.close()
+
+    def stats(self) -> dict[str, int]:
+        """ Statistics of the writer """
+        return {
+            "queued": len(self._queue),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+        }
+
+
+class AsyncHandler(logging.Handler):
+    """ Handler that only queues records for the writer, it never blocks on the output """
+
+    def __init__(self, writer: LogWriter, level: int = logging.NOTSET) -> None:
+        super().__init__(level)
+        self.writer: LogWriter = writer
+
+    def handle(self, record: logging.LogRecord) -> bool:  # type: ignore[override]
+        """ Filter and queue the record. The writer's queue is thread safe, no lock is taken. """
+        if not self.filter(record):
+            return False
+        self.emit(record)
+        return True
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # Arguments are rendered now, they may change before the record is written
+        record.msg, record.args = record.getMessage(), None
+        self.writer.enqueue(record)
+
+
+def log_thread_exception(args: threading.ExceptHookArgs) -> None:
+    """ Log an uncaught exception of a thread. Installed as `threading.excepthook`. """
+    if args.exc_type is SystemExit:
+        return
+    logging.getLogger(LOGGER_NAME).error(
+        "Uncaught exception in thread %s",
+        args.thread.name if args.thread is not None else "<unknown>",
+        exc_info=(args.exc_type, args.exc_value, args.exc_traceback),  # type: ignore[arg-type]
+    )
+
+
+_writer: LogWriter | None = None  # pylint: disable=invalid-name
+_handler: AsyncHandler | None = None  # pylint: disable=invalid-name
+_excepthook: Callable[[threading.ExceptHookArgs], Any] | None = None  # pylint: disable=invalid-name
+_writer_lock: Lock = Lock()
+
+
+# pylint: disable=too-many-arguments,too-many-positional-arguments
+def configure_logging(
+    level: str = DEFAULT_LEVEL,
+    path: str | None = None,
+    debug_sample: float = 1.0,
+    debug_rate: float | None = DEFAULT_DEBUG_RATE,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    max_queue: int = DEFAULT_MAX_QUEUE,
+) -> LogWriter:
+    """
+    Log the `kitchen_aid` loggers as JSON lines to stdout, or the file at path,
+      through a background writer. Uncaught exceptions of threads are logged.
+    A previous writer is stopped once everything it queued is written.
+    """
+    global _writer, _handler, _excepthook  # pylint: disable=global-statement
+    # pylint: disable-next=consider-using-with
+    stream = open(path, "a", encoding="utf-8") if path else None
+    writer = LogWriter(stream, None, batch_size, flush_interval, max_queue)
+    handler = AsyncHandler(writer)
+    handler.addFilter(DebugSampler(debug_sample, debug_rate))
+    logger = logging.getLogger(LOGGER_NAME)
+    writer.start()
+    with _writer_lock:
+        previous, previous_handler = _writer, _handler
+        logger.addHandler(handler)
+        if previous_handler is not None:
+            logger.removeHandler(previous_handler)
+        logger.setLevel(level)
+        logger.propagate = False
+        if threading.excepthook is not log_thread_exception:
+            _excepthook, threading.excepthook = threading.excepthook, log_thread_exception
+        _writer, _handler = writer, handler
+    if previous is not None:
+        previous.close()
+    return writer
+
+
+def close_logging() -> None:
+    """ Stop the writer, once everything queued is written, and log synchronously again """
+    global _writer, _handler, _excepthook  # pylint: disable=global-statement
+    with _writer_lock:
+        writer, handler, _writer, _handler = _writer, _handler, None, None
+        logger = logging.getLogger(LOGGER_NAME)
+        if handler is not None:
+            logger.removeHandler(handler)
+        logger.propagate = True
+        if _excepthook is not None:
+            threading.excepthook, _excepthook = _excepthook, None
+    if writer is not None:
+        writer.close()
+
+
+def get_log_writer() -> LogWriter | None:
+    """ Get the process wide log writer """
+    return _writer
+
+
+def console(line: str) -> None:
+    """
+    Write a line of output for the user to stdout.
+    It's written by the log writer when logging is configured, so the caller doesn't block.
+    """
+    writer = _writer
+    if writer is None:
+        print(line)
+    else:
+        writer.write(line)
@@ -0,0 +1,33 @@
+#! /usr/bin/env python3
+
+"""
+This module confines the files named by command arguments to configured directories.
+Commands are reachable from remote interfaces, so a file name of a command argument
+is only ever resolved under the directory configured for it - never absolute,
+never outside of it, symbolic links included.
+"""
+
+import os
+
+import kitchen_aid.models.exceptions as excs
+
+
+def resolve_under(directory: str | None, name: str, purpose: str) -> str:
+    """
+    Path of a file name under the directory.
+    Raises InvalidCommandArguments when no directory is configured for the purpose,
+      or the name is absolute or leads out of the directory.
+    """
+    if directory is None:
+        raise excs.InvalidCommandArguments(f"No directory is configured for {purpose}")
+    if not name or os.path.isabs(name) or ".." in name.replace("\\", "/").split("/"):
+        raise excs.InvalidCommandArguments(
+            f"{purpose.capitalize()} should be a relative path within it's directory: {name!r}"
+        )
+    root = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath((root, path)) != root:
+        raise excs.InvalidCommandArguments(
+            f"{purpose.capitalize()} should be within it's directory: {name!r}"
+        )
+    return path
@@ -0,0 +1,375 @@
+#! /usr/bin/env python3
+
+"""
+This module provides command pipelines.
+A pipeline is a DAG of stages, every stage is a registered command.
+Output of a stage is passed to the stages that depend on it, without going through
+an interface. Independent stages run in parallel.
+When a stage can stream and it's only dependent accepts a stream, chunks are passed
+as they are produced, instead of materializing the whole output.
+When a stage fails, completed stages are undone in reverse order.
+Spec files of the pipeline command are read from the configured pipeline directory only.
+"""
+
+import json
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, fields
+from typing import Any, Callable, Iterator
+
+from ruamel.yaml import YAML
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.command import (
+    Command, CommandHandler, CommandMapper, FailedOperation, PartialResult, Result
+)
+from kitchen_aid.models.paths import resolve_under
+
+
+# Directory of the spec files of the pipeline command, spec files are refused without it
+_directory: str | None = None  # pylint: disable=invalid-name
+
+
+@dataclass
+class Stage:
+    """ Single stage of a pipeline """
+
+    name: str
+    command: str
+    # CLI arguments, parsed with the parser of the command
+    args: list[str] = field(default_factory=list)
+    # Receiver arguments, applied over the parsed ones
+    kwargs: dict[str, Any] = field(default_factory=dict)
+    depends_on: list[str] = field(default_factory=list)
+    # Receiver argument that gets the output of the upstream stages
+    input: str | None = None
+    retries: int = 0
+
+    @classmethod
+    def from_dict(cls, spec: dict[str, Any]) -> "Stage":
+        """ Build a stage from it's spec """
+        known = {stage_field.name for stage_field in fields(cls)}
+        unknown = set(spec) - known
+        if unknown:
+            raise excs.InvalidPipeline(f"Unknown stage fields: {sorted(unknown)}")
+        try:
+            return cls(**spec)
+        except TypeError as error:
+            raise excs.InvalidPipeline(f"Invalid stage {spec}: {error}") from error
+
+
+class StageStream:
+    """ Output of a streaming stage, consumed by the next stage as it's produced """
+
+    __slots__ = ("_chunks", "chunks", "error")
+
+    def __init__(self, chunks: Iterator[str]) -> None:
+        self._chunks: Iterator[str] = chunks
+        self.chunks: int = 0
+        self.error: Exception | None = None
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for chunk in self._chunks:
+                self.chunks += 1
+                yield chunk
+        except Exception as error:
+            self.error = error
+            raise
+
+    def close(self) -> None:
+        """ Release the producer, when the stream was not consumed till the end """
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+
+
+# (stage name, result, command) of every stage executed by a single task
+StageOutcome = list[tuple[str, Result, Command | None]]
+
+
+class Pipeline:
+    """ DAG of commands """
+
+    def __init__(self, stages: list[Stage], max_workers: int = 4) -> None:
+        if max_workers < 1:
+            raise excs.InvalidPipeline("Pipeline needs at least one worker")
+        self._stages: dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self._stages:
+                raise excs.InvalidPipeline(f"Duplicate stage {stage.name}")
+            self._stages[stage.name] = stage
+        if not self._stages:
+            raise excs.InvalidPipeline("Pipeline has no stages")
+        self._dependents: dict[str, list[str]] = {name: [] for name in self._stages}
+        for stage in stages:
+            for dep in stage.depends_on:
+                if dep not in self._stages:
+                    raise excs.InvalidPipeline(f"Stage {stage.name} depends on unknown {dep}")
+                self._dependents[dep].append(stage.name)
+        self._order: list[str] = self._sort()
+        self._max_workers: int = max_workers
+
+    @classmethod
+    def from_spec(cls, spec: dict[str, Any], max_workers: int | None = None) -> "Pipeline":
+        """
+        Build a pipeline from a spec - {"stages": [...], "max_workers": N}.
+        Given max_workers overrides the one of the spec.
+        """
+        if not isinstance(spec, dict) or not isinstance(spec.get("stages"), list):
+            raise excs.InvalidPipeline("Pipeline spec should have a list of stages")
+        return cls(
+            [Stage.from_dict(dict(stage)) for stage in spec["stages"]],
+            max_workers or spec.get("max_workers", 4),
+        )
+
+    @classmethod
+    def from_file(cls, path: str, max_workers: int | None = None) -> "Pipeline":
+        """ Load a pipeline from a JSON or YAML file """
+        with open(path, "r", encoding="utf-8") as spec_file:
+            if path.endswith(".json"):
+                spec = json.load(spec_file)
+            else:
+                spec = YAML(typ="safe").load(spec_file)
+        return cls.from_spec(spec, max_workers)
+
+    @property
+    def stages(self) -> list[str]:
+        """ Get the stage names in execution order """
+        return list(self._order)
+
+    def _sort(self) -> list[str]:
+        """ Topological order of the stages """
+        remaining = {name: len(stage.depends_on) for name, stage in self._stages.items()}
+        ready = [name for name, count in remaining.items() if count == 0]
+        order: list[str] = []
+        while ready:
+            name = ready.pop(0)
+            order.append(name)
+            for dependent in self._dependents[name]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        if len(order) != len(self._stages):
+            cycle = sorted(name for name in self._stages if name not in order)
+            raise excs.InvalidPipeline(f"Pipeline has a cycle between {cycle}")
+        return order
+
+    def _streamed(self, commands: dict[str, type[Command]]) -> set[str]:
+        """ Stages whose output is streamed into their only dependent """
+        streamed: set[str] = set()
+        for name, dependents in self._dependents.items():
+            if len(dependents) != 1 or not commands[name].can_stream:
+                continue
+            consumer = self._stages[dependents[0]]
+            fed = consumer.depends_on == [name] and consumer.input
+            if fed and consumer.retries == 0 and commands[consumer.name].accepts_stream:
+                streamed.add(name)
+        return streamed
+
+    def _upstream(self, name: str, streamed: set[str]) -> set[str]:
+        """ Stages that should complete before the stage can start """
+        upstream: set[str] = set()
+        for dep in self._stages[name].depends_on:
+            upstream |= self._upstream(dep, streamed) if dep in streamed else {dep}
+        return upstream
+
+    def _handler(
+        self,
+        name: str,
+        results: dict[str, Result],
+        streamed: set[str],
+        chain: list[tuple[str, CommandHandler, StageStream]],
+    ) -> CommandHandler:
+        """ Build the handler of a stage, and of the streaming stages feeding it """
+        stage = self._stages[name]
+        _, _, parser = CommandMapper().get_command(stage.command)
+        kw_args = dict(stage.kwargs)
+        try:
+            if stage.args:
+                kw_args = {**vars(parser.parse_args(stage.args)), **kw_args}
+        except excs.InvalidCommandArguments as error:
+            raise excs.InvalidCommandArguments(
+                f"Invalid arguments for stage {name}: {error}"
+            ) from error
+        if stage.input and stage.depends_on:
+            producer = stage.depends_on[0]
+            if producer in streamed:
+                handler = self._handler(producer, results, streamed, chain)
+                stream = StageStream(handler.command.stream())
+                chain.append((producer, handler, stream))
+                kw_args[stage.input] = stream
+            else:
+                kw_args[stage.input] = "\n".join(
+                    results[dep].message for dep in stage.depends_on
+                )
+        return CommandHandler(stage.command, [], kw_args, retry_limit=stage.retries)
+
+    def _run_stage(
+        self,
+        name: str,
+        results: dict[str, Result],
+        streamed: set[str],
+        emit: Callable[[Result], None] | None,
+        *,
+        origin: str | None = None,
+    ) -> StageOutcome:
+        """
+        Execute a stage. Streaming stages feeding it are executed with it.
+        Stages are scheduled under the origin of the pipeline and their name.
+        """
+        chain: list[tuple[str, CommandHandler, StageStream]] = []
+        handler: CommandHandler | None = None
+        try:
+            handler = self._handler(name, results, streamed, chain)
+            if origin is not None:
+                handler.command.set_origin(f"{origin};stage:{name}")
+            if emit is not None:
+                handler.command.set_emitter(
+                    lambda result: emit(PartialResult(
+                        result.success, f"[{name}] {result.message}", result.errors
+                    ))
+                )
+            result = handler.execute()
+        except FailedOperation as error:
+            result = Result(False, str(error), [error])
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            result = Result(False, f"{type(error).__name__}: {error}", [error])
+        finally:
+            for _, _, stream in chain:
+                stream.close()
+        outcome: StageOutcome = []
+        for producer, producer_handler, stream in chain:
+            if stream.error is None:
+                outcome.append((producer, Result(
+                    True, f"Streamed {stream.chunks} chunks", []
+                ), producer_handler.command))
+            else:
+                outcome.append((producer, Result(False, str(stream.error), [stream.error]), None))
+        outcome.append((name, result, handler.command if handler and result.success else None))
+        return outcome
+
+    def _undo(self, completed: list[tuple[str, Command]]) -> list[Exception | str]:
+        """ Undo completed stages in reverse order, best effort """
+        notes: list[Exception | str] = []
+        for name, command in reversed(completed):
+            if not command.can_undo:
+                continue
+            try:
+                result = command.undo()
+                notes.append(f"Undo {name}: {result.message}")
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                notes.append(f"Undo {name} failed: {error}")
+        return notes
+
+    def _plan(self) -> tuple[set[str], dict[str, set[str]]]:
+        """ Streamed stages, and the stages each stage waits for """
+        commands = {
+            name: CommandMapper().get_command(stage.command)[0]
+            for name, stage in self._stages.items()
+        }
+        streamed = self._streamed(commands)
+        return streamed, {name: self._upstream(name, streamed) for name in self._order}
+
+    def _schedule(
+        self,
+        streamed: set[str],
+        upstream: dict[str, set[str]],
+        emit: Callable[[Result], None] | None,
+        origin: str | None,
+    ) -> tuple[dict[str, Result], list[tuple[str, Command]], list[str]]:
+        """
+        Execute the stages as their upstream stages complete.
+        Nothing new is started once a stage failed, running stages are awaited.
+        Get the results, the completed stages in completion order and the failed stages.
+        """
+        results: dict[str, Result] = {}
+        completed: list[tuple[str, Command]] = []
+        failed: list[str] = []
+        pending = [name for name in self._order if name not in streamed]
+        running: dict[Future, str] = {}
+        with ThreadPoolExecutor(self._max_workers, thread_name_prefix="pipeline") as executor:
+            while pending or running:
+                if not failed:
+                    for name in [name for name in pending if upstream[name] <= results.keys()]:
+                        pending.remove(name)
+                        running[executor.submit(
+                            self._run_stage, name, dict(results), streamed, emit, origin=origin
+                        )] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                    self._record(future.result(), results, completed, failed, emit)
+        return results, completed, failed
+
+    @staticmethod
+    def _record(
+        outcome: StageOutcome,
+        results: dict[str, Result],
+        completed: list[tuple[str, Command]],
+        failed: list[str],
+        emit: Callable[[Result], None] | None,
+    ) -> None:
+        """ Keep the results of a finished stage, emitting it's completion """
+        for name, result, command in outcome:
+            if emit is not None:
+                emit(PartialResult(
+                    result.success, f"Stage {name} {'done' if result.success else 'failed'}", []
+                ))
+            results[name] = result
+            if not result.success:
+                failed.append(name)
+            elif command is not None:
+                completed.append((name, command))
+
+    def run(
+        self, emit: Callable[[Result], None] | None = None, origin: str | None = None
+    ) -> Result:
+        """
+        Execute the pipeline.
+        Result of the pipeline is the output of it's final stages.
+        Completion of every stage is emitted as a partial result.
+        Origin is the id the pipeline was scheduled under, see `Command.origin`.
+        """
+        results, completed, failed = self._schedule(*self._plan(), emit, origin)
+        if failed:
+            first = results[failed[0]]
+            return Result(
+                False,
+                f"Stage {failed[0]} failed: {first.message}",
+                [*first.errors, *self._undo(completed)],
+            )
+        sinks = [name for name in self._order if not self._dependents[name]]
+        if len(sinks) == 1:
+            return Result(True, results[sinks[0]].message, [])
+        return Result(True, "\n".join(f"{name}: {results[name].message}" for name in sinks), [])
+
+
+# pylint: disable=too-few-public-methods
+class PipelineFile:
+    """ Receiver of the pipeline command - a pipeline spec file """
+
+    __slots__ = ("spec", "max_workers")
+
+    def __init__(self, spec: str, max_workers: int | None = None) -> None:
+        self.spec: str = spec
+        self.max_workers: int | None = max_workers
+
+    def spec_path(self) -> str:
+        """
+        Path of the spec file under the pipeline directory.
+        Raises InvalidCommandArguments without a pipeline directory, or when the spec
+          leads out of it.
+        """
+        return resolve_under(_directory, self.spec, "pipeline spec")
+
+    def load(self) -> Pipeline:
+        """ Load the pipeline """
+        return Pipeline.from_file(self.spec_path(), self.max_workers)
+
+
+def configure_pipelines(directory: str | None) -> None:
+    """ Set the directory of the pipeline spec files. None refuses spec files. """
+    global _directory  # pylint: disable=global-statement
+    _directory = directory
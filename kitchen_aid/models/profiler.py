@@ -0,0 +1,215 @@
+#! /usr/bin/env python3
+
+"""
+This module provides an on-demand sampling profiler of the process threads.
+Stacks of all threads are read with `sys._current_frames` every interval and counted,
+so nothing is installed into the threads and the profiled code runs unchanged.
+Output is in the collapsed stack format (`thread;outer;...;inner count`), which flame graph
+tools read as it is, and a per thread summary of the functions seen on top of the stack.
+Only one profile runs at a time.
+Collapsed stacks are written only under the configured profile directory
+(`configure_profiles`), the profile command is reachable from remote interfaces.
+"""
+
+import fnmatch
+import os
+import sys
+import threading
+from collections import Counter
+from threading import Lock, get_ident
+from time import monotonic, sleep
+from types import CodeType, FrameType
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.paths import resolve_under
+
+
+DEFAULT_DURATION: float = 5.0
+MAX_DURATION: float = 300.0
+DEFAULT_INTERVAL: float = 0.01
+MIN_INTERVAL: float = 0.001
+DEFAULT_TOP: int = 10
+MAX_DEPTH: int = 128
+
+_running: Lock = Lock()
+# Directory of the profile output files, output files are refused without it
+_directory: str | None = None  # pylint: disable=invalid-name
+
+
+def frame_label(code: CodeType) -> str:
+    """ Label of a function in the collapsed stacks """
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackProfile:
+    """ Stacks counted by a sampler """
+
+    __slots__ = ("stacks", "samples", "duration", "_labels")
+
+    def __init__(self) -> None:
+        # (thread name, stack from the outermost frame) -> times seen
+        self.stacks: Counter[tuple[str, tuple[CodeType, ...]]] = Counter()
+        self.samples: int = 0
+        self.duration: float = 0.0
+        self._labels: dict[CodeType, str] = {}
+
+    def _label(self, code: CodeType) -> str:
+        """ Label of a function, built once per function """
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = frame_label(code)
+        return label
+
+    def add(self, thread: str, frame: FrameType | None) -> None:
+        """ Count the stack of a frame """
+        codes: list[CodeType] = []
+        while frame is not None and len(codes) < MAX_DEPTH:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.reverse()
+        self.stacks[(thread, tuple(codes))] += 1
+
+    def threads(self) -> Counter[str]:
+        """ Get the samples per thread """
+        threads: Counter[str] = Counter()
+        for (thread, _), count in self.stacks.items():
+            threads[thread] += count
+        return threads
+
+    def collapsed(self) -> str:
+        """ Stacks in the collapsed format, the most frequent first """
+        return "\n".join(
+            ";".join([thread.replace(";", "_"), *map(self._label, codes)]) + f" {count}"
+            for (thread, codes), count in self.stacks.most_common()
+        )
+
+    def summary(self, top: int = DEFAULT_TOP) -> str:
+        """
+        Top functions of every thread, by the share of the samples they were on top
+          of the stack (self) and anywhere on the stack (total).
+        """
+        lines = [
+            f"{self.samples} samples of {len(self.threads())} threads in {self.duration:.2f}s"
+        ]
+        for thread, samples in self.threads().most_common():
+            own: Counter[CodeType] = Counter()
+            total: Counter[CodeType] = Counter()
+            for (name, codes), count in self.stacks.items():
+                if name != thread or not codes:
+                    continue
+                own[codes[-1]] += count
+                for code in set(codes):
+                    total[code] += count
+            lines.append(f"{thread}: {samples} samples")
+            lines.extend(
+                f"  {count / samples:6.1%} self {total[code] / samples:6.1%} total  "
+                f"{self._label(code)}"
+                for code, count in own.most_common(top)
+            )
+        return "\n".join(lines)
+
+
+# pylint: disable=too-few-public-methods
+class StackSampler:
+    """ Samples the stacks of the threads, except it's own """
+
+    __slots__ = ("interval", "threads")
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, threads: str | None = None) -> None:
+        self.interval: float = interval
+        # Glob of the thread names to sample, all threads when None
+        self.threads: str | None = threads
+
+    def sample(self, duration: float) -> StackProfile:
+        """ Sample the stacks for duration seconds """
+        profile = StackProfile()
+        own = get_ident()
+        names: dict[int, str] = {}
+        start = monotonic()
+        deadline = start + duration
+        while True:
+            frames = sys._current_frames()  # pylint: disable=protected-access
+            if not names.keys() >= frames.keys():
+                names = {thread.ident: thread.name for thread in threading.enumerate()
+                         if thread.ident is not None}
+            for ident, frame in frames.items():
+                name = names.get(ident, str(ident))
+                if ident != own and (self.threads is None or fnmatch.fnmatch(name, self.threads)):
+                    profile.add(name, frame)
+            del frames
+            profile.samples += 1
+            now = monotonic()
+            if now >= deadline:
+                break
+            sleep(min(self.interval, deadline - now))
+        profile.duration = monotonic() - start
+        return profile
+
+
+class ProfileRequest:
+    """ Receiver of the profile command - samples the threads of the process """
+
+    __slots__ = ("duration", "interval", "top", "output", "threads")
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        duration: float = DEFAULT_DURATION,
+        interval: float = DEFAULT_INTERVAL,
+        top: int = DEFAULT_TOP,
+        output: str | None = None,
+        threads: str | None = None,
+    ) -> None:
+        self.duration: float = duration
+        self.interval: float = interval
+        self.top: int = top
+        self.output: str | None = output
+        self.threads: str | None = threads
+
+    def output_path(self) -> str | None:
+        """
+        Path of the output file under the profile directory, None without an output.
+        Raises InvalidCommandArguments without a profile directory, or when the output
+          leads out of it.
+        """
+        if self.output is None:
+            return None
+        return resolve_under(_directory, self.output, "profile output")
+
+    def run(self) -> StackProfile:
+        """
+        Sample the threads.
+        Fails when the arguments are out of bounds, the output file is not allowed
+          or another profile is running.
+        """
+        self.output_path()
+        if not 0 < self.duration <= MAX_DURATION:
+            raise excs.InvalidCommandArguments(
+                f"Profile duration should be between 0 and {MAX_DURATION:g} seconds"
+            )
+        if self.interval < MIN_INTERVAL:
+            raise excs.InvalidCommandArguments(
+                f"Profile interval should be at least {MIN_INTERVAL:g} seconds"
+            )
+        if not _running.acquire(blocking=False):  # pylint: disable=consider-using-with
+            raise excs.GenericCommandError("Another profile is running")
+        try:
+            return StackSampler(self.interval, self.threads).sample(self.duration)
+        finally:
+            _running.release()
+
+    def write(self, profile: StackProfile) -> None:
+        """ Write the collapsed stacks to the output file, under the profile directory """
+        with open(self.output_path(), "w", encoding="utf-8") as output:  # type: ignore
+            output.write(profile.collapsed() + "\n")
+
+
+def configure_profiles(directory: str | None) -> None:
+    """ Set the directory of the profile output files. None refuses output files. """
+    global _directory  # pylint: disable=global-statement
+    _directory = directory
+
+
+def get_profile_directory() -> str | None:
+    """ Get the directory of the profile output files """
+    return _directory
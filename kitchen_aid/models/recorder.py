@@ -0,0 +1,116 @@
+#! /usr/bin/env python3
+
+"""
+This module provides the traffic recorder.
+Recorder writes the commands received by the interfaces and the results emitted
+by the command engine to a JSON lines log, gzipped when the path ends with `.gz`.
+First line is the header, every other line is an event:
+    ["c", seconds since start, seq, command, args, kw_args]  - command received
+    ["r", seconds since start, seq, success, message size, partial]  - result emitted
+Recordings are replayed with `kitchen_aid.models.replay`.
+"""
+
+import gzip
+import json
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic, time
+from typing import Any, TextIO
+
+from kitchen_aid.models.command import PartialResult, Result
+
+
+RECORDING_VERSION: int = 1
+# Commands waiting for their result, older ones are forgotten
+MAX_PENDING: int = 100000
+FLUSH_INTERVAL: float = 1.0
+
+
+def open_recording(path: str, mode: str) -> TextIO:
+    """ Open a recording, gzipped ones by their extension """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")  # type: ignore
+    return open(path, mode, encoding="utf-8")  # pylint: disable=consider-using-with
+
+
+# pylint: disable=too-many-instance-attributes
+class TrafficRecorder:
+    """ Writes command and result events to a recording """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self._file: TextIO | None = open_recording(path, "w")
+        self._lock: Lock = Lock()
+        self._start: float = monotonic()
+        self._last_flush: float = self._start
+        self._seq: int = 0
+        self._pending: OrderedDict[str, int] = OrderedDict()
+        self.events: int = 0
+        self._write({"version": RECORDING_VERSION, "started_at": time()})
+
+    def _write(self, event: Any) -> None:
+        """ Write an event. Lock should be held. """
+        if self._file is None:
+            return
+        self._file.write(json.dumps(event, separators=(",", ":"), default=str) + "\n")
+        self.events += 1
+        now = monotonic()
+        if now - self._last_flush >= FLUSH_INTERVAL:
+            self._file.flush()
+            self._last_flush = now
+
+    def command(
+        self, cmd_id: str, command: str, args: list[Any], kw_args: dict[str, Any]
+    ) -> None:
+        """ Record a received command """
+        with self._lock:
+            self._seq += 1
+            self._pending[cmd_id] = self._seq
+            while len(self._pending) > MAX_PENDING:
+                self._pending.popitem(last=False)
+            self._write(
+                ["c", round(monotonic() - self._start, 6), self._seq, command, args, kw_args]
+            )
+
+    def result(self, cmd_id: str, result: Result) -> None:
+        """ Record an emitted result. Results of commands that weren't recorded are skipped. """
+        partial = isinstance(result, PartialResult)
+        with self._lock:
+            seq = self._pending.get(cmd_id) if partial else self._pending.pop(cmd_id, None)
+            if seq is None:
+                return
+            self._write([
+                "r", round(monotonic() - self._start, 6), seq, result.success,
+                len(result.message), partial,
+            ])
+
+    def close(self) -> None:
+        """ Close the recording """
+        with self._lock:
+            recording, self._file = self._file, None
+        if recording is not None:
+            recording.close()
+
+
+_recorder: TrafficRecorder | None = None  # pylint: disable=invalid-name
+_recorder_lock: Lock = Lock()
+
+
+def configure_recorder(path: str | None) -> TrafficRecorder | None:
+    """
+    Start recording to path, closing the previous recording. None stops recording.
+    Recording the same path again keeps the running recorder.
+    """
+    global _recorder  # pylint: disable=global-statement
+    with _recorder_lock:
+        if _recorder is not None and _recorder.path == path:
+            return _recorder
+        previous, _recorder = _recorder, TrafficRecorder(path) if path else None
+    if previous is not None:
+        previous.close()
+    return _recorder
+
+
+def get_recorder() -> TrafficRecorder | None:
+    """ Get the process wide recorder """
+    return _recorder
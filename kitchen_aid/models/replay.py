@@ -0,0 +1,304 @@
+#! /usr/bin/env python3
+
+"""
+This module provides the replay of traffic recordings.
+Recorded commands are fed to a local command engine at their recorded pace, or `speed` times
+faster, and the throughput and latencies of the replay are compared with the recorded ones.
+Only the arrival of the commands is time compressed - commands take as long as they take,
+so the receivers should be stubbed to serve the recorded sizes and latencies
+(see `kitchen_aid.pkgs.http.replay`).
+"""
+
+import json
+from dataclasses import dataclass, field
+from queue import Queue
+from threading import Condition, Thread
+from time import monotonic, sleep
+from typing import Any
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.command import PartialResult, Result
+from kitchen_aid.models.engine import CommandEngine
+from kitchen_aid.models.interact import IThread, InteractInterface
+from kitchen_aid.models.recorder import RECORDING_VERSION, open_recording
+
+
+# pylint: disable=too-many-instance-attributes
+@dataclass(slots=True)
+class RecordedCommand:
+    """ Command of a recording, with it's final result """
+
+    seq: int
+    # Seconds since the start of the recording
+    at: float
+    command: str
+    args: list[Any]
+    kwargs: dict[str, Any]
+    # Seconds until the final result, None when the recording ended before it
+    latency: float | None = None
+    size: int = 0
+    success: bool | None = None
+
+
+@dataclass
+class RunStats:
+    """ Throughput and latencies of a run """
+
+    commands: int
+    failed: int
+    duration: float
+    latencies: list[float] = field(default_factory=list, repr=False)
+
+    @property
+    def completed(self) -> int:
+        """ Get the number of commands with a final result """
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        """ Get the completed commands per second """
+        return self.completed / self.duration if self.duration > 0 else 0.0
+
+    def percentile(self, percentile: float) -> float:
+        """ Get a latency percentile, 0 without latencies """
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * percentile), len(ordered) - 1)]
+
+
+class Recording:
+    """ Commands of a traffic recording """
+
+    def __init__(self, commands: list[RecordedCommand], started_at: float = 0.0) -> None:
+        self.commands: list[RecordedCommand] = commands
+        self.started_at: float = started_at
+
+    @classmethod
+    def load(cls, path: str) -> "Recording":
+        """
+        Load a recording.
+        A truncated last line, left by a process that didn't close the recording, is ignored.
+        """
+        try:
+            with open_recording(path, "r") as recording:
+                lines = recording.read().splitlines()
+        except (OSError, EOFError) as error:
+            raise excs.InvalidRecording(f"Can't read recording {path}: {error}") from error
+        if not lines:
+            raise excs.InvalidRecording(f"Recording {path} is empty")
+        try:
+            header = json.loads(lines[0])
+        except json.JSONDecodeError as error:
+            raise excs.InvalidRecording(f"Recording {path} has no header") from error
+        if not isinstance(header, dict) or header.get("version") != RECORDING_VERSION:
+            raise excs.InvalidRecording(f"Unsupported recording {path}: {lines[0]}")
+        commands: dict[int, RecordedCommand] = {}
+        for number, line in enumerate(lines[1:], 2):
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError as error:
+                if number == len(lines):
+                    break
+                raise excs.InvalidRecording(f"{path}:{number}: {error}") from error
+            cls._apply(commands, event, f"{path}:{number}")
+        return cls(list(commands.values()), header.get("started_at", 0.0))
+
+    @staticmethod
+    def _apply(commands: dict[int, RecordedCommand], event: Any, where: str) -> None:
+        """ Add a recorded event to the commands """
+        try:
+            if event[0] == "c":
+                _, at, seq, command, args, kwargs = event
+                commands[seq] = RecordedCommand(seq, at, command, args, kwargs)
+            elif event[0] == "r":
+                _, at, seq, success, size, partial = event
+                recorded = commands.get(seq)
+                if recorded is not None and not partial:
+                    recorded.latency = at - recorded.at
+                    recorded.size = size
+                    recorded.success = success
+            else:
+                raise excs.InvalidRecording(f"{where}: unknown event {event[0]!r}")
+        except (TypeError, ValueError, IndexError) as error:
+            raise excs.InvalidRecording(f"{where}: malformed event {event!r}") from error
+
+    def stats(self) -> RunStats:
+        """ Get the recorded throughput and latencies """
+        finished = [cmd for cmd in self.commands if cmd.latency is not None]
+        if not self.commands:
+            return RunStats(0, 0, 0.0)
+        end = max((cmd.at + cmd.latency for cmd in finished), default=self.commands[-1].at)
+        return RunStats(
+            len(self.commands),
+            sum(1 for cmd in finished if not cmd.success),
+            end - self.commands[0].at,
+            [cmd.latency for cmd in finished],  # type: ignore
+        )
+
+
+@dataclass
+class ReplayReport:
+    """ Recorded run compared with it's replay """
+
+    speed: float
+    original: RunStats
+    replay: RunStats
+
+    def format(self) -> str:
+        """ Human readable comparison """
+
+        def change(original: float, replay: float, suffix: str = "") -> str:
+            return f"{(replay - original) / original:+.1%}{suffix}" if original else ""
+
+        original, replay = self.original, self.replay
+        rows = [
+            ("commands", f"{original.commands}", f"{replay.commands}", ""),
+            ("completed", f"{original.completed}", f"{replay.completed}", ""),
+            ("failed", f"{original.failed}", f"{replay.failed}", ""),
+            ("duration (s)", f"{original.duration:.3f}", f"{replay.duration:.3f}", ""),
+            (
+                "throughput (/s)", f"{original.throughput:.2f}", f"{replay.throughput:.2f}",
+                change(original.throughput * self.speed, replay.throughput, " vs expected"),
+            ),
+        ]
+        for percentile in (0.5, 0.95, 0.99):
+            before, after = original.percentile(percentile), replay.percentile(percentile)
+            rows.append((
+                f"latency p{percentile * 100:g} (ms)", f"{before * 1000:.1f}",
+                f"{after * 1000:.1f}", change(before, after),
+            ))
+        lines = [f"Replay at {self.speed:g}x", f"{'':<18}{'original':>12}{'replay':>12}"]
+        lines.extend(f"{name:<18}{before:>12}{after:>12}  {diff}".rstrip()
+                     for name, before, after, diff in rows)
+        return "\n".join(lines)
+
+
+class ReplayThread(IThread):
+    """ Thread of a replayed command, results are collected by the interface """
+
+    __slots__ = ("seq",)
+
+    def __init__(self, seq: int) -> None:
+        self.seq: int = seq
+
+    def __repr__(self) -> str:
+        return f"ReplayThread({self.seq})"
+
+    def post(self, message: bytes | Any) -> None:
+        """ Results are not posted """
+
+
+class ReplayInterface(InteractInterface):
+    """ Feeds recorded commands to the engine and times their results """
+
+    def __init__(self, command_queue: Queue, command_result_queue: Queue) -> None:
+        super().__init__(command_queue, command_result_queue)
+        self._done: Condition = Condition()
+        self._started: dict[int, float] = {}
+        self.latencies: list[float] = []
+        self.failed: int = 0
+        self.first_start: float | None = None
+        self.last_finish: float | None = None
+
+    def get_main_thread(self) -> IThread:
+        """ Get the main thread """
+        return ReplayThread(0)
+
+    def spawn_thread(self) -> IThread:
+        """ Replayed commands get the thread of their sequence number """
+        return ReplayThread(0)
+
+    def _post_message(self, message: bytes, thread: IThread) -> None:
+        """ Results are not posted """
+
+    def listen(self) -> None:
+        """ Commands are submitted by the replayer """
+
+    def submit(self, command: RecordedCommand, overrides: dict[str, Any]) -> None:
+        """ Schedule a recorded command. Overrides replace the keyword arguments it has. """
+        kwargs = {
+            name: overrides.get(name, value) for name, value in command.kwargs.items()
+        }
+        started = monotonic()
+        with self._done:
+            self._started[command.seq] = started
+            if self.first_start is None:
+                self.first_start = started
+        if not self.receive_command(
+            command.command, list(command.args), kwargs, ReplayThread(command.seq)
+        ):
+            with self._done:
+                self._started.pop(command.seq, None)
+                self.failed += 1
+                self._done.notify_all()
+
+    def post_command_result(self, cmd_id: str, result: Result) -> None:
+        """ Time the final result of a command """
+        if isinstance(result, PartialResult):
+            return
+        entry = self._pop_command(cmd_id, result)
+        if entry is None:
+            return
+        finished = monotonic()
+        with self._done:
+            started = self._started.pop(entry[3].seq, None)
+            if started is None:
+                return
+            self.latencies.append(finished - started)
+            self.failed += not result.success
+            self.last_finish = finished
+            self._done.notify_all()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """ Wait for the results of the submitted commands. Returns False on timeout. """
+        with self._done:
+            return self._done.wait_for(lambda: not self._started, timeout)
+
+
+# pylint: disable=too-few-public-methods
+class Replayer:
+    """ Replays a recording against a local command engine """
+
+    def __init__(
+        self,
+        recording: Recording,
+        speed: float = 1.0,
+        max_workers: int | None = None,
+        overrides: dict[str, Any] | None = None,
+    ) -> None:
+        if speed <= 0:
+            raise ValueError("Replay speed should be positive")
+        self.recording: Recording = recording
+        self.speed: float = speed
+        self.max_workers: int | None = max_workers
+        # Keyword arguments replaced in every command that has them
+        self.overrides: dict[str, Any] = overrides or {}
+
+    def run(self, timeout: float | None = None) -> ReplayReport:
+        """
+        Replay the recording and compare it with the recorded run.
+        Commands still running `timeout` seconds after the last one was submitted
+          are cancelled and reported as failed.
+        """
+        engine = CommandEngine(self.max_workers)
+        Thread(target=engine.run, daemon=True, name="replay_engine").start()
+        iface = ReplayInterface(engine.command_queue, engine.command_result_queue)
+        commands = self.recording.commands
+        start = monotonic()
+        origin = commands[0].at if commands else 0.0
+        for command in commands:
+            delay = start + (command.at - origin) / self.speed - monotonic()
+            if delay > 0:
+                sleep(delay)
+            iface.submit(command, self.overrides)
+        iface.wait(timeout)
+        engine.shutdown(0)
+        duration = 0.0
+        if iface.first_start is not None and iface.last_finish is not None:
+            duration = iface.last_finish - iface.first_start
+        return ReplayReport(
+            self.speed,
+            self.recording.stats(),
+            RunStats(len(commands), iface.failed, duration, iface.latencies),
+        )
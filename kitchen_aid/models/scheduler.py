@@ -0,0 +1,505 @@
+#! /usr/bin/env python3
+
+"""
+This module provides recurring commands.
+`Scheduler` is an interact interface that submits commands on interval or cron schedules.
+Timers are kept in a hierarchical timer wheel, so adding, cancelling and expiring
+a timer is O(1) regardless of how many schedules there are.
+Run times are jittered to spread the load, and a run is skipped when the previous one
+of the same schedule is still executing.
+"""
+
+import logging
+import math
+import random
+from datetime import datetime, timedelta
+from queue import Queue
+from threading import Lock
+from time import time
+from typing import Any
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.command import CommandMapper
+from kitchen_aid.models.interact import IThread, InteractInterface, InteractInterfacesRegistry
+
+
+LOG: logging.Logger = logging.getLogger(__name__)
+
+
+# Jitter of schedules without an explicit one - a fraction of the period, capped
+AUTO_JITTER_FRACTION: float = 0.1
+MAX_AUTO_JITTER: float = 60.0
+
+
+# pylint: disable=too-few-public-methods
+class Timer:
+    """ Single timer of the wheel """
+
+    __slots__ = ("tick", "item", "cancelled")
+
+    def __init__(self, tick: int, item: Any) -> None:
+        self.tick: int = tick
+        self.item: Any = item
+        self.cancelled: bool = False
+
+
+# pylint: disable=too-many-instance-attributes
+class TimerWheel:
+    """
+    Hierarchical timer wheel.
+    Level `n` has `slots` buckets, each spanning `slots ** n` ticks. Timers are placed on the
+      lowest level that covers their deadline and cascade to lower levels as time advances.
+    Timers beyond the range of the wheel wait in an overflow list.
+    Cancelled timers are dropped lazily.
+    """
+
+    def __init__(
+        self, tick: float = 0.1, slots: int = 64, levels: int = 4, start: float | None = None
+    ) -> None:
+        if tick <= 0 or slots < 2 or levels < 1:
+            raise ValueError("Invalid timer wheel geometry")
+        self.tick: float = tick
+        self._slots: int = slots
+        self._levels: int = levels
+        self._spans: list[int] = [slots ** level for level in range(levels + 1)]
+        self._wheel: list[list[list[Timer]]] = [
+            [[] for _ in range(slots)] for _ in range(levels)
+        ]
+        self._overflow: list[Timer] = []
+        self._due: list[Timer] = []
+        self._current: int = int((time() if start is None else start) / tick)
+        self._size: int = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, deadline: float, item: Any) -> Timer:
+        """ Add a timer that expires at deadline (a timestamp) """
+        timer = Timer(math.ceil(deadline / self.tick), item)
+        self._place(timer)
+        self._size += 1
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        """ Cancel a timer """
+        if not timer.cancelled:
+            timer.cancelled = True
+            self._size -= 1
+
+    def _place(self, timer: Timer) -> None:
+        """ Put a timer in the bucket that covers it's deadline """
+        delta = timer.tick - self._current
+        if delta <= 0:
+            self._due.append(timer)
+            return
+        for level in range(self._levels):
+            if delta < self._spans[level + 1]:
+                index = (timer.tick // self._spans[level]) % self._slots
+                self._wheel[level][index].append(timer)
+                return
+        self._overflow.append(timer)
+
+    def _cascade(self, level: int) -> None:
+        """ Move the timers of the current bucket of a level to lower levels """
+        index = (self._current // self._spans[level]) % self._slots
+        bucket, self._wheel[level][index] = self._wheel[level][index], []
+        for timer in bucket:
+            if not timer.cancelled:
+                self._place(timer)
+
+    def advance(self, now: float) -> list[Any]:
+        """ Advance the wheel to now and return the items of the expired timers """
+        target = int(now / self.tick)
+        expired: list[Timer] = self._due
+        self._due = []
+        while self._current < target:
+            self._current += 1
+            if self._current % self._spans[self._levels - 1] == 0 and self._overflow:
+                overflow, self._overflow = self._overflow, []
+                for timer in overflow:
+                    if not timer.cancelled:
+                        self._place(timer)
+            for level in range(self._levels - 1, 0, -1):
+                if self._current % self._spans[level] == 0:
+                    self._cascade(level)
+            index = self._current % self._slots
+            expired.extend(self._wheel[0][index])
+            self._wheel[0][index] = []
+            expired.extend(self._due)
+            self._due = []
+        items: list[Any] = []
+        for timer in expired:
+            if not timer.cancelled:
+                timer.cancelled = True
+                self._size -= 1
+                items.append(timer.item)
+        return items
+
+
+class IntervalSchedule:
+    """ Runs every `every` seconds """
+
+    __slots__ = ("every", "_anchor")
+
+    def __init__(self, every: float, anchor: float | None = None) -> None:
+        if every <= 0:
+            raise ValueError("Interval should be positive")
+        self.every: float = every
+        self._anchor: float = time() if anchor is None else anchor
+
+    def __str__(self) -> str:
+        return f"every {self.every}s"
+
+    def next_after(self, timestamp: float) -> float:
+        """ First run strictly after timestamp """
+        runs = math.floor((timestamp - self._anchor) / self.every) + 1
+        return self._anchor + max(runs, 1) * self.every
+
+
+# pylint: disable=too-few-public-methods,too-many-instance-attributes
+class CronSchedule:
+    """
+    Runs on a 5-field cron expression - minute, hour, day of month, month, day of week.
+    Fields support `*`, lists, ranges and steps. Day of week 0 and 7 are Sunday.
+    When both day fields are restricted, a day matching either of them runs.
+    Times are local.
+    """
+
+    __slots__ = (
+        "expr", "minutes", "hours", "days", "months", "weekdays", "_any_day", "_any_weekday",
+    )
+
+    MACROS: dict[str, str] = {
+        "@hourly": "0 * * * *",
+        "@daily": "0 0 * * *",
+        "@midnight": "0 0 * * *",
+        "@weekly": "0 0 * * 0",
+        "@monthly": "0 0 1 * *",
+        "@yearly": "0 0 1 1 *",
+        "@annually": "0 0 1 1 *",
+    }
+
+    def __init__(self, expr: str) -> None:
+        self.expr: str = expr
+        fields = self.MACROS.get(expr.strip(), expr).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression should have 5 fields: {expr}")
+        self.minutes: list[int] = sorted(self._parse(fields[0], 0, 59))
+        self.hours: list[int] = sorted(self._parse(fields[1], 0, 23))
+        self.days: frozenset[int] = self._parse(fields[2], 1, 31)
+        self.months: frozenset[int] = self._parse(fields[3], 1, 12)
+        self.weekdays: frozenset[int] = frozenset(
+            day % 7 for day in self._parse(fields[4], 0, 7)
+        )
+        self._any_day: bool = fields[2].startswith("*")
+        self._any_weekday: bool = fields[4].startswith("*")
+
+    def __str__(self) -> str:
+        return f"cron {self.expr}"
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> frozenset[int]:
+        """ Parse a single field into the values it matches """
+        values: set[int] = set()
+        for part in field.split(","):
+            span, _, step = part.partition("/")
+            if span == "*":
+                start, end = low, high
+            elif "-" in span:
+                start, end = (int(value) for value in span.split("-", 1))
+            else:
+                start = int(span)
+                end = high if step else start
+            if not low <= start <= end <= high:
+                raise ValueError(f"Cron field {field} is out of range {low}-{high}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return frozenset(values)
+
+    def _day_matches(self, moment: datetime) -> bool:
+        """ Does the day match the day fields """
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, timestamp: float) -> float:
+        """ First run strictly after timestamp """
+        moment = datetime.fromtimestamp(timestamp).replace(second=0, microsecond=0)
+        moment += timedelta(minutes=1)
+        # Leap days may take years to come around
+        for _ in range(366 * 8):
+            if moment.month in self.months and self._day_matches(moment):
+                for hour in self.hours:
+                    if hour < moment.hour:
+                        continue
+                    for minute in self.minutes:
+                        if hour == moment.hour and minute < moment.minute:
+                            continue
+                        return moment.replace(hour=hour, minute=minute).timestamp()
+            moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+        raise ValueError(f"Cron expression {self.expr} never matches")
+
+
+class ScheduleThread(IThread):
+    """ Thread of a schedule. Results of it's runs are printed and the last one is kept. """
+
+    __slots__ = ("name", "last_message")
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.last_message: str | None = None
+
+    def __str__(self) -> str:
+        return f"schedule:{self.name}"
+
+    def post(self, message: bytes | Any) -> None:
+        """ Post a message """
+        if isinstance(message, bytes):
+            message = message.decode("utf-8")
+        self.last_message = message
+        LOG.info("Scheduled command result", extra={"schedule": self.name, "result": message})
+
+
+# pylint: disable=too-many-instance-attributes,too-few-public-methods
+class ScheduledCommand:
+    """ Command submitted on a schedule """
+
+    __slots__ = (
+        "name", "command", "kw_args", "schedule", "jitter", "thread",
+        "timer", "next_run", "runs", "skipped",
+    )
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        name: str,
+        command: str,
+        kw_args: dict[str, Any],
+        schedule: IntervalSchedule | CronSchedule,
+        jitter: float | None,
+    ) -> None:
+        self.name: str = name
+        self.command: str = command
+        self.kw_args: dict[str, Any] = kw_args
+        self.schedule: IntervalSchedule | CronSchedule = schedule
+        self.jitter: float | None = jitter
+        self.thread: ScheduleThread = ScheduleThread(name)
+        self.timer: Timer | None = None
+        self.next_run: float = 0.0
+        self.runs: int = 0
+        self.skipped: int = 0
+
+    def describe(self) -> str:
+        """ Human readable state of the schedule """
+        return (
+            f"{self.name}: {self.command} {self.schedule}, next run at "
+            f"{datetime.fromtimestamp(self.next_run).isoformat(timespec='seconds')}, "
+            f"{self.runs} runs, {self.skipped} skipped"
+        )
+
+
+class Scheduler(InteractInterface):
+    """
+    Interface that submits commands on schedules.
+    Schedules come from the interface config or from the `schedule` command:
+        {"name": "check", "command": "get-page", "args": ["https://example.com"],
+         "every": 60, "jitter": 5}
+        {"name": "report", "command": "get-page", "args": [...], "cron": "*/5 * * * *"}
+    """
+
+    has_threads: bool = True
+    reconfigurable: frozenset[str] = InteractInterface.reconfigurable | {"schedules"}
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        command_queue: Queue,
+        command_result_queue: Queue,
+        schedules: list[dict[str, Any]] | None = None,
+        tick: float = 0.1,
+        wheel_slots: int = 64,
+        wheel_levels: int = 4,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(command_queue, command_result_queue, **kwargs)
+        self._wheel: TimerWheel = TimerWheel(tick, wheel_slots, wheel_levels)
+        self._schedules: dict[str, ScheduledCommand] = {}
+        self._lock: Lock = Lock()
+        # Schedules that come from the config, by name
+        self._configured: dict[str, dict[str, Any]] = {}
+        self.set_schedules(schedules or [])
+
+    def set_schedules(self, schedules: list[dict[str, Any]]) -> None:
+        """
+        Apply the schedules of the config.
+        Unchanged schedules keep their timers, schedules that were removed from the config
+          are removed. Schedules added with the `schedule` command are not affected.
+        """
+        configured = {spec["name"]: dict(spec) for spec in schedules}
+        for name in set(self._configured) - set(configured):
+            self.remove(name)
+        for name, spec in configured.items():
+            if self._configured.get(name) != spec:
+                self.add(**spec)
+        self._configured = configured
+
+    def reconfigure(self, **options: Any) -> bool:
+        """ Apply changed options. Schedules are changed in place. """
+        if not set(options) <= self.reconfigurable:
+            return False
+        if "schedules" in options:
+            self.set_schedules(options.pop("schedules") or [])
+        return super().reconfigure(**options)
+
+    def get_main_thread(self) -> IThread:
+        """ Get the main thread """
+        return ScheduleThread("main")
+
+    def spawn_thread(self) -> IThread:
+        """ Threads belong to schedules, there is nothing to spawn """
+        return self.main_thread
+
+    def _post_message(self, message: bytes, thread: IThread) -> None:
+        """ Post a message """
+        thread.post(message)
+
+    @property
+    def schedules(self) -> list[ScheduledCommand]:
+        """ Get the schedules """
+        with self._lock:
+            return list(self._schedules.values())
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def add(
+        self,
+        name: str,
+        command: str,
+        args: list[str] | None = None,
+        every: float | None = None,
+        cron: str | None = None,
+        jitter: float | None = None,
+    ) -> ScheduledCommand:
+        """
+        Add a schedule, replacing the one with the same name.
+        Arguments are CLI arguments of the command, parsed right away.
+        """
+        if (every is None) == (cron is None):
+            raise excs.GenericCommandError(f"Schedule {name} needs either every or cron")
+        _, _, parser = CommandMapper().get_command(command)
+        try:
+            kw_args = vars(parser.parse_args(args or []))
+        except excs.InvalidCommandArguments as error:
+            raise excs.InvalidCommandArguments(
+                f"Invalid arguments for schedule {name}: {error}"
+            ) from error
+        try:
+            schedule = IntervalSchedule(every) if every is not None else CronSchedule(cron)
+            scheduled = ScheduledCommand(name, command, kw_args, schedule, jitter)
+            with self._lock:
+                self._arm(scheduled, time())
+                previous = self._schedules.pop(name, None)
+                if previous is not None and previous.timer is not None:
+                    self._wheel.cancel(previous.timer)
+                self._schedules[name] = scheduled
+        except ValueError as error:
+            raise excs.GenericCommandError(f"Invalid schedule {name}: {error}") from error
+        return scheduled
+
+    def remove(self, name: str) -> bool:
+        """ Remove a schedule. Runs that are executing are not affected. """
+        with self._lock:
+            scheduled = self._schedules.pop(name, None)
+            if scheduled is None:
+                return False
+            if scheduled.timer is not None:
+                self._wheel.cancel(scheduled.timer)
+            return True
+
+    def _arm(self, scheduled: ScheduledCommand, now: float) -> None:
+        """ Set the timer of the next run. Lock should be held by the caller. """
+        nominal = scheduled.schedule.next_after(now)
+        jitter = scheduled.jitter
+        if jitter is None:
+            period = scheduled.schedule.next_after(nominal) - nominal
+            jitter = min(period * AUTO_JITTER_FRACTION, MAX_AUTO_JITTER)
+        scheduled.next_run = nominal + random.uniform(0, jitter)
+        scheduled.timer = self._wheel.add(scheduled.next_run, scheduled)
+
+    def _fire(self, scheduled: ScheduledCommand) -> None:
+        """ Submit a run, unless the previous one is still executing """
+        if self.receive_command(scheduled.command, [], scheduled.kw_args, scheduled.thread):
+            scheduled.runs += 1
+        else:
+            scheduled.skipped += 1
+
+    def tick(self, now: float | None = None) -> int:
+        """ Submit the runs that are due and arm their next ones. Returns the number of runs due """
+        now = time() if now is None else now
+        with self._lock:
+            due = [
+                scheduled for scheduled in self._wheel.advance(now)
+                if self._schedules.get(scheduled.name) is scheduled
+            ]
+            for scheduled in due:
+                self._arm(scheduled, max(now, scheduled.next_run))
+        for scheduled in due:
+            self._fire(scheduled)
+        return len(due)
+
+    def listen(self) -> None:
+        """ Submit scheduled runs until the interface is stopped """
+        while not self.stopped:
+            self.tick()
+            self._stop_event.wait(self._wheel.tick)
+
+
+class ScheduleRequest:
+    """ Receiver of the schedule command - manages the schedules of the running scheduler """
+
+    __slots__ = ("action", "name", "every", "cron", "jitter", "target")
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        action: str = "list",
+        name: str | None = None,
+        every: float | None = None,
+        cron: str | None = None,
+        jitter: float | None = None,
+        target: list[str] | None = None,
+    ) -> None:
+        self.action: str = action
+        self.name: str | None = name
+        self.every: float | None = every
+        self.cron: str | None = cron
+        self.jitter: float | None = jitter
+        self.target: list[str] = list(target or [])
+
+    @staticmethod
+    def scheduler() -> Scheduler:
+        """ Get the running scheduler """
+        scheduler = InteractInterfacesRegistry().get(Scheduler)
+        if not isinstance(scheduler, Scheduler):
+            raise excs.GenericCommandError("Scheduler is not configured")
+        return scheduler
+
+    def apply(self) -> str:
+        """ Apply the action and describe the outcome """
+        scheduler = self.scheduler()
+        if self.action == "list":
+            return "\n".join(s.describe() for s in scheduler.schedules) or "No schedules"
+        if not self.name:
+            raise excs.InvalidCommandArguments(f"Schedule {self.action} needs a name")
+        if self.action == "remove":
+            if not scheduler.remove(self.name):
+                raise excs.GenericCommandError(f"Schedule {self.name} not found")
+            return f"Schedule {self.name} removed"
+        if self.action == "add":
+            if not self.target:
+                raise excs.InvalidCommandArguments("Schedule add needs a command")
+            command, *args = self.target
+            return scheduler.add(
+                self.name, command, args, self.every, self.cron, self.jitter
+            ).describe()
+        raise excs.InvalidCommandArguments(f"Unknown schedule action {self.action}")
@@ -0,0 +1,181 @@
+#! /usr/bin/env python3
+
+"""
+This module provides result subscriptions.
+A result is posted to the thread that scheduled it's command. Subscribers get the results
+of commands they didn't schedule - of a single command id, or of all commands whose name
+matches a pattern - so a single execution serves any number of consumers.
+Results are encoded once per interface type, however many subscribers get them.
+Subscriptions end when they are cancelled, when their interface stops
+or when it's garbage collected.
+"""
+
+import fnmatch
+import weakref
+from threading import Lock
+from typing import TYPE_CHECKING, Any
+
+from kitchen_aid.models.command import PartialResult, Result, UnchangedResult
+
+if TYPE_CHECKING:
+    from kitchen_aid.models.interact import IThread, InteractInterface
+
+
+def command_name(cmd_id: str) -> str:
+    """ Get the command name out of a command id, see `get_cmd_id` """
+    return cmd_id.removeprefix("cmd:").partition(";args:")[0]
+
+
+class Subscription:
+    """ Results of a command id or a command name pattern, delivered to a thread """
+
+    __slots__ = ("command_id", "pattern", "thread", "delivered", "_iface", "_hub")
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        hub: "SubscriptionHub",
+        iface: "InteractInterface",
+        thread: "IThread",
+        command_id: str | None = None,
+        pattern: str | None = None,
+    ) -> None:
+        self.command_id: str | None = command_id
+        self.pattern: str | None = pattern
+        self.thread: IThread = thread
+        self.delivered: int = 0
+        self._hub: SubscriptionHub = hub
+        self._iface: weakref.ref = weakref.ref(iface, lambda _: hub.unsubscribe(self))
+
+    @property
+    def iface(self) -> "InteractInterface | None":
+        """ Get the interface, None once it's garbage collected """
+        return self._iface()
+
+    @property
+    def active(self) -> bool:
+        """ Is the subscription still receiving results """
+        iface = self._iface()
+        return iface is not None and not iface.stopped and self._hub.has(self)
+
+    def cancel(self) -> bool:
+        """ Stop receiving results. Returns False if the subscription already ended. """
+        return self._hub.unsubscribe(self)
+
+    def __repr__(self) -> str:
+        target = self.command_id if self.pattern is None else f"pattern {self.pattern}"
+        return f"Subscription({target}, thread={self.thread})"
+
+
+class SubscriptionHub:
+    """ Subscriptions of all interfaces, results are published by the command engine """
+
+    def __init__(self) -> None:
+        self._lock: Lock = Lock()
+        self._by_id: dict[str, set[Subscription]] = {}
+        self._patterns: set[Subscription] = set()
+        self.published: int = 0
+        self.delivered: int = 0
+
+    @property
+    def size(self) -> int:
+        """ Get the number of subscriptions """
+        with self._lock:
+            return len(self._patterns) + sum(len(subs) for subs in self._by_id.values())
+
+    def has(self, subscription: Subscription) -> bool:
+        """ Is the subscription registered """
+        with self._lock:
+            if subscription.pattern is not None:
+                return subscription in self._patterns
+            return subscription in self._by_id.get(subscription.command_id or "", ())
+
+    def subscribe(
+        self,
+        iface: "InteractInterface",
+        thread: "IThread",
+        command_id: str | None = None,
+        pattern: str | None = None,
+    ) -> Subscription:
+        """ Subscribe a thread of an interface to a command id or a command name pattern """
+        if (command_id is None) == (pattern is None):
+            raise ValueError("Subscribe to either a command id or a command name pattern")
+        subscription = Subscription(self, iface, thread, command_id, pattern)
+        with self._lock:
+            if pattern is not None:
+                self._patterns.add(subscription)
+            else:
+                self._by_id.setdefault(command_id, set()).add(subscription)  # type: ignore
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> bool:
+        """ Remove a subscription. Returns False if it's not registered. """
+        with self._lock:
+            if subscription.pattern is not None:
+                if subscription not in self._patterns:
+                    return False
+                self._patterns.discard(subscription)
+                return True
+            subscriptions = self._by_id.get(subscription.command_id or "")
+            if subscriptions is None or subscription not in subscriptions:
+                return False
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._by_id[subscription.command_id]  # type: ignore
+            return True
+
+    def unsubscribe_interface(self, iface: "InteractInterface") -> int:
+        """ Remove all subscriptions of an interface. Returns how many were removed. """
+        with self._lock:
+            by_id = (sub for subs in self._by_id.values() for sub in subs)
+            subscriptions = [sub for sub in (*self._patterns, *by_id) if sub.iface is iface]
+        return sum(self.unsubscribe(sub) for sub in subscriptions)
+
+    def _matching(self, cmd_id: str) -> list[Subscription]:
+        """ Subscriptions that get the results of a command """
+        name = command_name(cmd_id)
+        with self._lock:
+            matching = list(self._by_id.get(cmd_id, ()))
+            matching.extend(
+                sub for sub in self._patterns
+                if fnmatch.fnmatchcase(name, sub.pattern)  # type: ignore
+            )
+        return matching
+
+    def publish(self, cmd_id: str, result: Result) -> int:
+        """
+        Deliver a final result to the subscribers of it's command.
+        Subscriptions of stopped and collected interfaces are removed.
+        Returns the number of deliveries.
+        """
+        if isinstance(result, (PartialResult, UnchangedResult)):
+            return 0
+        matching = self._matching(cmd_id)
+        if not matching:
+            return 0
+        encoded: dict[type, bytes] = {}
+        delivered: list[Subscription] = []
+        for subscription in matching:
+            iface: Any = subscription.iface
+            if iface is None or iface.stopped:
+                self.unsubscribe(subscription)
+                continue
+            message = encoded.get(type(iface))
+            if message is None:
+                message = encoded[type(iface)] = iface.encode_result(cmd_id, result)
+            iface.post(message, subscription.thread)
+            delivered.append(subscription)
+        with self._lock:
+            self.published += 1
+            self.delivered += len(delivered)
+            for subscription in delivered:
+                subscription.delivered += 1
+        return len(delivered)
+
+
+_hub: SubscriptionHub = SubscriptionHub()
+
+
+def get_hub() -> SubscriptionHub:
+    """ Get the process wide subscription hub """
+    return _hub
@@ -0,0 +1,46 @@
+#! /usr/bin/env python3
+
+"""
+Class provides a command that extracts the text and links of a web page, as it arrives
+"""
+
+from typing import Iterator
+
+import httpx
+
+from kitchen_aid.models.command import (
+    IrreversibleCommand,
+    Result,
+)
+
+from kitchen_aid.pkgs.http.extract import PageExtraction
+
+
+class ExtractPage(IrreversibleCommand):
+    """
+    Command to extract the text of a web page.
+    Text is emitted in batches while the page is parsed.
+    Final result is a summary of the extraction.
+    """
+
+    __slots__ = ()
+
+    can_stream: bool = True
+    accepts_stream: bool = True
+
+    def __init__(self, receiver: PageExtraction) -> None:
+        super().__init__(receiver=receiver)
+
+    def execute(self) -> Result:
+        """ Extract the page """
+        try:
+            for text in self._receiver.iter_text():
+                self.emit(Result(True, text, []))
+        except httpx.HTTPError as error:
+            return Result(False, str(error), [error])
+        return Result(True, self._receiver.summary, [])
+
+    def stream(self) -> Iterator[str]:
+        """ Stream the extracted text, a line per block """
+        for text in self._receiver.iter_text():
+            yield text + "\n"
@@ -4,45 +4,53 @@
 Class provides a basic command that reads a web page
 """
 
-import requests
+from typing import Iterator
+
+import httpx
 
 from kitchen_aid.models.command import (
-    Command,
+    IrreversibleCommand,
     Result,
-    FailedOperation,
+    UnchangedResult,
 )
 
-from kitchen_aid.pkgs.http.http_requests import HTTPRequest
+from kitchen_aid.pkgs.http.delta import get_fingerprints
+from kitchen_aid.pkgs.http.http_requests import HTTPRequest, reservation_of
+
+UNCHANGED_MESSAGE: str = "unchanged"
 
 
-class GetWebPage(Command):
+class GetWebPage(IrreversibleCommand):
     """
-    Command to get a web page
+    Command to get a web page.
+    In delta mode, the result is the change of the page since it's previous execution
+      under the same origin (command, arguments, thread and interface) -
+      the hunks of the changed lines, or an unchanged result that's not posted.
     """
 
-    can_undo: bool = False
+    __slots__ = ()
+
+    can_stream: bool = True
 
     def __init__(self, receiver: HTTPRequest) -> None:
         super().__init__(receiver=receiver)
 
-    def undo(self) -> Result:
-        """ Undo command. It will fail as it's not supported """
-        raise FailedOperation(
-            "Undo not supported",
-            undo_result=Result(False, "Undo not supported", [])
-        )
-
-    def redo(self) -> Result:
-        """ Redo command. It will fail as it's not supported """
-        raise FailedOperation(
-            "Redo not supported",
-            undo_result=Result(False, "Redo not supported", [])
-        )
-
     def execute(self) -> Result:
         """ Get the web page """
         try:
-            response: requests.Response = self._receiver.do_request()
-            return Result(True, response.text, [])
-        except requests.RequestException as error:
+            response: httpx.Response = self._receiver.do_request()
+        except httpx.HTTPError as error:
             return Result(False, str(error), [error])
+        if not self._receiver.delta:
+            return Result(True, response.text, [], reservation_of(response))
+        change = get_fingerprints().diff(self.origin or self._receiver.key, response.text)
+        if change is None:
+            reservation = reservation_of(response)
+            if reservation is not None:
+                reservation.release()
+            return UnchangedResult(True, UNCHANGED_MESSAGE, [])
+        return Result(True, change, [], reservation_of(response))
+
+    def stream(self) -> Iterator[str]:
+        """ Stream the web page, as it arrives """
+        yield from self._receiver.iter_text()
@@ -0,0 +1,52 @@
+#! /usr/bin/env python3
+
+"""
+Class provides a bulk command that reads many web pages concurrently
+"""
+
+import httpx
+
+from kitchen_aid.models.command import (
+    IrreversibleCommand,
+    Result,
+)
+
+from kitchen_aid.pkgs.http.http_requests import HTTPBatchRequest, reservation_of
+
+
+class GetWebPages(IrreversibleCommand):
+    """
+    Command to get many web pages.
+    Result of every page is emitted as soon as it's fetched.
+    Final result is a summary of the batch.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, receiver: HTTPBatchRequest) -> None:
+        super().__init__(receiver=receiver)
+
+    def _page_result(self, url: str, outcome: httpx.Response | Exception) -> Result:
+        """ Result of a single page """
+        if isinstance(outcome, Exception):
+            return Result(False, f"{url}: {outcome}", [outcome])
+        if self._receiver.status_only:
+            return Result(True, f"{url}: {outcome.status_code}, {len(outcome.content)} bytes", [])
+        return Result(True, f"{url}: {outcome.text}", [], reservation_of(outcome))
+
+    def execute(self) -> Result:
+        """ Get the web pages """
+        fetched: int = 0
+        errors: list[Exception | str] = []
+        for url, outcome in self._receiver.iter_requests():
+            result = self._page_result(url, outcome)
+            if result.success:
+                fetched += 1
+            else:
+                errors.append(f"{url}: {outcome}")
+            self.emit(result)
+        return Result(
+            not errors,
+            f"Fetched {fetched} of {len(self._receiver.urls)} pages, {len(errors)} failed",
+            errors,
+        )
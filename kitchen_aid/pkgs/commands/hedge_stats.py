@@ -0,0 +1,34 @@
+#! /usr/bin/env python3
+
+"""
+Class provides a command that reports the hedging stats of HTTP requests
+"""
+
+from kitchen_aid.models.command import (
+    IrreversibleCommand,
+    Result,
+)
+
+from kitchen_aid.pkgs.http.hedging import HedgingStats
+
+
+class HedgeStats(IrreversibleCommand):
+    """
+    Command to report how many requests were hedged and how many hedges won
+    """
+
+    __slots__ = ()
+
+    def __init__(self, receiver: HedgingStats) -> None:
+        super().__init__(receiver=receiver)
+
+    def execute(self) -> Result:
+        """ Report the hedging stats """
+        stats = self._receiver.collect()
+        return Result(
+            True,
+            f"Requests: {stats['requests']}, hedged: {stats['hedges']} "
+            f"({stats['hedge_rate']:.1%}), hedges won: {stats['hedge_wins']} "
+            f"({stats['win_rate']:.1%})",
+            [],
+        )
@@ -0,0 +1,36 @@
+#! /usr/bin/env python3
+
+"""
+Class provides a command that reports the usage of the memory budget
+"""
+
+from kitchen_aid.models.budget import MemoryBudgetStats
+from kitchen_aid.models.command import (
+    IrreversibleCommand,
+    Result,
+)
+
+
+class MemoryStats(IrreversibleCommand):
+    """
+    Command to report how much of the memory budget is reserved by payloads
+    """
+
+    __slots__ = ()
+
+    def __init__(self, receiver: MemoryBudgetStats) -> None:
+        super().__init__(receiver=receiver)
+
+    def execute(self) -> Result:
+        """ Report the budget usage """
+        stats = self._receiver.collect()
+        if stats is None:
+            return Result(True, "Memory budget not configured", [])
+        return Result(
+            True,
+            f"Reserved: {stats['used']} of {stats['max_bytes']} bytes ({stats['usage']:.1%}), "
+            f"peak: {stats['peak']}, reservations: {stats['reservations']}, "
+            f"waiting: {stats['waiting']}, waited: {stats['waited']}, "
+            f"timed out: {stats['timeouts']}, refused: {stats['refused']}",
+            [],
+        )
@@ -0,0 +1,41 @@
+#! /usr/bin/env python3
+
+"""
+Class provides a command that samples the stacks of the process threads
+"""
+
+from kitchen_aid.models.command import (
+    IrreversibleCommand,
+    Result,
+)
+import kitchen_aid.models.exceptions as excs
+
+from kitchen_aid.models.profiler import ProfileRequest
+
+
+class ProfileThreads(IrreversibleCommand):
+    """
+    Command to profile the threads of the running process.
+    Reports the top functions of every thread, followed by the collapsed stacks,
+      unless they are written to the output file.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, receiver: ProfileRequest) -> None:
+        super().__init__(receiver=receiver)
+
+    def execute(self) -> Result:
+        """ Sample the threads and report the profile """
+        try:
+            profile = self._receiver.run()
+        except excs.GenericCommandError as error:
+            return Result(False, str(error), [error])
+        summary = profile.summary(self._receiver.top)
+        if self._receiver.output is None:
+            return Result(True, f"{summary}\n\n{profile.collapsed()}", [])
+        try:
+            self._receiver.write(profile)
+        except OSError as error:
+            return Result(False, f"Can't write the profile: {error}", [error])
+        return Result(True, f"{summary}\n\nCollapsed stacks written to {self._receiver.output}", [])
@@ -0,0 +1,29 @@
+#! /usr/bin/env python3
+
+"""
+Class provides a command that executes a pipeline of commands
+"""
+
+from kitchen_aid.models.command import (
+    IrreversibleCommand,
+    Result,
+)
+
+from kitchen_aid.models.pipeline import PipelineFile
+
+
+class RunPipeline(IrreversibleCommand):
+    """
+    Command to execute a pipeline.
+    Completion of every stage is emitted, final result is the output of the pipeline.
+    Pipelines undo their completed stages themselves, when one fails.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, receiver: PipelineFile) -> None:
+        super().__init__(receiver=receiver)
+
+    def execute(self) -> Result:
+        """ Execute the pipeline """
+        return self._receiver.load().run(self.emit, self.origin)
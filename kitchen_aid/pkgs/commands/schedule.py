@@ -0,0 +1,31 @@
+#! /usr/bin/env python3
+
+"""
+Class provides a command that manages the schedules of the scheduler
+"""
+
+from kitchen_aid.models.command import (
+    IrreversibleCommand,
+    Result,
+)
+import kitchen_aid.models.exceptions as excs
+
+from kitchen_aid.models.scheduler import ScheduleRequest
+
+
+class ManageSchedules(IrreversibleCommand):
+    """
+    Command to add, remove or list scheduled commands
+    """
+
+    __slots__ = ()
+
+    def __init__(self, receiver: ScheduleRequest) -> None:
+        super().__init__(receiver=receiver)
+
+    def execute(self) -> Result:
+        """ Apply the schedule action """
+        try:
+            return Result(True, self._receiver.apply(), [])
+        except excs.GenericCommandError as error:
+            return Result(False, str(error), [error])
@@ -0,0 +1,367 @@
+#! /usr/bin/env python3
+
+"""
+Module provides a disk backed HTTP response cache.
+Bodies are kept in files and metadata (validators, freshness) next to them,
+so the cache survives restarts.
+Stale entries are revalidated with `If-None-Match` / `If-Modified-Since`.
+Responses that `Vary` are kept per value of the request headers they vary on,
+responses with `Vary: *` are not cached.
+Cache is bounded in size and evicts the least recently used entries.
+Bodies of entries evicted while being read are treated as misses.
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from email.utils import parsedate_to_datetime
+from threading import Lock, get_ident
+from time import time
+from typing import Mapping
+
+import httpx
+
+
+DEFAULT_CACHE_SIZE: int = 256 * 1024 * 1024
+# Headers that describe the transfer, not the (decoded) body we store
+_SKIP_HEADERS: frozenset[str] = frozenset({
+    "content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive",
+})
+
+
+def parse_cache_control(value: str | None) -> dict[str, str | None]:
+    """ Parse a Cache-Control header into a dict of directives """
+    directives: dict[str, str | None] = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else None
+    return directives
+
+
+# pylint: disable=too-many-instance-attributes
+@dataclass(slots=True)
+class CacheEntry:
+    """ Metadata of a cached response """
+
+    key: str
+    url: str
+    status_code: int
+    headers: list[tuple[str, str]]
+    size: int
+    stored_at: float
+    etag: str | None = None
+    last_modified: str | None = None
+    max_age: float | None = None
+    no_cache: bool = False
+    # Key of the request, when the response varies on request headers, and their names
+    primary_key: str | None = None
+    vary: list[str] | None = None
+
+    def is_fresh(self, now: float | None = None) -> bool:
+        """ Can the entry be served without revalidation """
+        if self.no_cache or self.max_age is None:
+            return False
+        return (now or time()) - self.stored_at < self.max_age
+
+    def conditional_headers(self) -> dict[str, str]:
+        """ Headers to revalidate the entry with """
+        headers: dict[str, str] = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def _freshness(response: httpx.Response, directives: dict[str, str | None]) -> float | None:
+    """ Freshness lifetime of a response in seconds, None if unknown """
+    if directives.get("max-age") is not None:
+        try:
+            return float(directives["max-age"])  # type: ignore
+        except ValueError:
+            return None
+    expires, date = response.headers.get("expires"), response.headers.get("date")
+    if expires:
+        try:
+            origin = parsedate_to_datetime(date).timestamp() if date else time()
+            return parsedate_to_datetime(expires).timestamp() - origin
+        except (TypeError, ValueError):
+            return 0.0
+    return None
+
+
+def _vary_names(response: httpx.Response) -> tuple[str, ...] | None:
+    """ Request headers a response varies on, sorted. None when it varies on anything (`*`). """
+    names = {
+        name.strip().lower()
+        for value in response.headers.get_list("vary")
+        for name in value.split(",")
+        if name.strip()
+    }
+    if "*" in names:
+        return None
+    return tuple(sorted(names))
+
+
+class HTTPCache:
+    """ Disk backed, size bounded, LRU HTTP cache """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_SIZE) -> None:
+        self._directory: str = directory
+        self._max_bytes: int = max_bytes
+        self._index: OrderedDict[str, CacheEntry] = OrderedDict()
+        # Request headers that responses to a request key vary on
+        self._vary: dict[str, tuple[str, ...]] = {}
+        self._size: int = 0
+        self._lock: Lock = Lock()
+        self.stats: dict[str, int] = {
+            "hits": 0, "revalidated": 0, "misses": 0, "stores": 0, "evictions": 0,
+        }
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @property
+    def size(self) -> int:
+        """ Get the size of the cached bodies in bytes """
+        return self._size
+
+    @property
+    def max_bytes(self) -> int:
+        """ Get the size bound """
+        return self._max_bytes
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @staticmethod
+    def key(method: str, url: str, params: dict[str, str] | None = None) -> str:
+        """ Cache key of a request """
+        target = str(httpx.URL(url, params=params)) if params else url
+        return hashlib.sha256(f"{method.upper()} {target}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def variant_key(
+        key: str, names: tuple[str, ...], headers: Mapping[str, str] | None = None
+    ) -> str:
+        """ Cache key of the response to a request, that varies on the named request headers """
+        if not names:
+            return key
+        request_headers = httpx.Headers(headers)
+        selected = "\n".join(f"{name}: {request_headers.get(name, '')}" for name in names)
+        return hashlib.sha256(f"{key}\n{selected}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, kind: str) -> str:
+        """ Path of an entry file """
+        return os.path.join(self._directory, f"{key}.{kind}")
+
+    def _load(self) -> None:
+        """ Rebuild the index from disk, least recently used first """
+        entries: list[tuple[float, CacheEntry]] = []
+        for name in os.listdir(self._directory):
+            if name.endswith(".tmp"):
+                os.unlink(os.path.join(self._directory, name))
+                continue
+            if not name.endswith(".meta"):
+                continue
+            path = os.path.join(self._directory, name)
+            try:
+                with open(path, "r", encoding="utf-8") as meta:
+                    data = json.load(meta)
+                data["headers"] = [tuple(header) for header in data["headers"]]
+                entry = CacheEntry(**data)
+                if os.path.getsize(self._path(entry.key, "body")) != entry.size:
+                    raise ValueError("Body does not match the metadata")
+                entries.append((os.path.getmtime(path), entry))
+            except (OSError, ValueError, TypeError, KeyError):
+                self._remove_files(name[:-len(".meta")])
+        for _, entry in sorted(entries, key=lambda item: item[0]):
+            self._index[entry.key] = entry
+            self._size += entry.size
+            if entry.primary_key is not None:
+                self._vary[entry.primary_key] = tuple(entry.vary or ())
+        with self._lock:
+            self._evict()
+
+    def _tmp_path(self, key: str, kind: str) -> str:
+        """ Path to write an entry file to, before it's moved in place """
+        return self._path(key, f"{kind}.{get_ident()}.tmp")
+
+    def _remove_files(self, key: str) -> None:
+        """ Remove the files of an entry """
+        for kind in ("meta", "body"):
+            try:
+                os.unlink(self._path(key, kind))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self) -> None:
+        """ Evict least recently used entries. Lock should be held by the caller. """
+        while self._size > self._max_bytes and self._index:
+            key, entry = self._index.popitem(last=False)
+            self._size -= entry.size
+            self._remove_files(key)
+            self.stats["evictions"] += 1
+
+    def _write_meta(self, entry: CacheEntry) -> None:
+        """ Atomically write the metadata of an entry """
+        tmp = self._tmp_path(entry.key, "meta")
+        with open(tmp, "w", encoding="utf-8") as meta:
+            json.dump(asdict(entry), meta)
+        os.replace(tmp, self._path(entry.key, "meta"))
+
+    def lookup(self, key: str, headers: Mapping[str, str] | None = None) -> CacheEntry | None:
+        """
+        Get the entry of a request and mark it as recently used.
+        Headers of the request select the entry of responses that vary on them.
+        """
+        with self._lock:
+            key = self.variant_key(key, self._vary.get(key, ()), headers)
+            entry = self._index.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._index.move_to_end(key)
+            return entry
+
+    def _is_cached(self, entry: CacheEntry) -> bool:
+        """ Is the entry still in the cache. Lock should be held by the caller. """
+        return self._index.get(entry.key) is entry
+
+    def read_body(self, entry: CacheEntry) -> bytes | None:
+        """ Read the body of an entry. None when the entry was evicted. """
+        if entry.size == 0:
+            return b""
+        try:
+            with open(self._path(entry.key, "body"), "rb") as body:
+                content = body.read()
+        except FileNotFoundError:
+            return None
+        # Replaced by the body of a newer response meanwhile
+        return content if len(content) == entry.size else None
+
+    def response(
+        self, entry: CacheEntry, request: httpx.Request | None = None
+    ) -> httpx.Response | None:
+        """ Build a response from a cached entry. None when the entry was evicted. """
+        content = self.read_body(entry)
+        if content is None:
+            return None
+        return httpx.Response(
+            status_code=entry.status_code,
+            headers=entry.headers,
+            content=content,
+            request=request or httpx.Request("GET", entry.url),
+        )
+
+    def hit(
+        self, entry: CacheEntry, request: httpx.Request | None = None
+    ) -> httpx.Response | None:
+        """ Serve a fresh entry. None, counted as a miss, when the entry was evicted. """
+        response = self.response(entry, request)
+        with self._lock:
+            self.stats["hits" if response is not None else "misses"] += 1
+        return response
+
+    def store(
+        self, key: str, response: httpx.Response, headers: Mapping[str, str] | None = None
+    ) -> CacheEntry | None:
+        """
+        Store the response to a request, if it's cacheable.
+        Responses are cacheable when they are successful, are not marked as `no-store`,
+          don't vary on everything (`Vary: *`) and have either validators or a freshness lifetime.
+        Responses that vary are stored per value of the request headers they vary on.
+        """
+        directives = parse_cache_control(response.headers.get("cache-control"))
+        if response.status_code != 200 or "no-store" in directives:
+            return None
+        vary = _vary_names(response)
+        if vary is None:
+            return None
+        entry = CacheEntry(
+            key=self.variant_key(key, vary, headers),
+            url=str(response.request.url) if response.request else "",
+            status_code=response.status_code,
+            headers=[
+                (name, value) for name, value in response.headers.items()
+                if name.lower() not in _SKIP_HEADERS
+            ],
+            size=len(response.content),
+            stored_at=time(),
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+            max_age=_freshness(response, directives),
+            no_cache="no-cache" in directives,
+            primary_key=key if vary else None,
+            vary=list(vary) if vary else None,
+        )
+        if not (entry.etag or entry.last_modified or entry.max_age):
+            return None
+        if entry.size > self._max_bytes:
+            return None
+        tmp = self._tmp_path(entry.key, "body")
+        with open(tmp, "wb") as body:
+            body.write(response.content)
+        os.replace(tmp, self._path(entry.key, "body"))
+        self._write_meta(entry)
+        with self._lock:
+            if vary:
+                self._vary[key] = vary
+            else:
+                self._vary.pop(key, None)
+            old = self._index.pop(entry.key, None)
+            if old is not None:
+                self._size -= old.size
+            self._index[entry.key] = entry
+            self._size += entry.size
+            self.stats["stores"] += 1
+            self._evict()
+        return entry
+
+    def revalidated(
+        self, entry: CacheEntry, response: httpx.Response
+    ) -> httpx.Response | None:
+        """
+        Refresh an entry after a `304 Not Modified` and serve it.
+        None when the entry was evicted meanwhile - the request should be repeated unconditionally.
+        """
+        directives = parse_cache_control(response.headers.get("cache-control"))
+        with self._lock:
+            if not self._is_cached(entry):
+                return None
+            entry.stored_at = time()
+            entry.etag = response.headers.get("etag", entry.etag)
+            entry.last_modified = response.headers.get("last-modified", entry.last_modified)
+            if "cache-control" in response.headers or "expires" in response.headers:
+                entry.max_age = _freshness(response, directives)
+                entry.no_cache = "no-cache" in directives
+            self._write_meta(entry)
+            self.stats["revalidated"] += 1
+        return self.response(entry, response.request)
+
+    def remove(self, key: str) -> None:
+        """ Remove an entry """
+        with self._lock:
+            entry = self._index.pop(key, None)
+            if entry is not None:
+                self._size -= entry.size
+        self._remove_files(key)
+
+
+_default_cache: HTTPCache | None = None  # pylint: disable=invalid-name
+
+
+def configure_cache(
+    directory: str | None, max_bytes: int = DEFAULT_CACHE_SIZE
+) -> HTTPCache | None:
+    """ Set the process wide cache used by HTTP requests. None disables caching. """
+    global _default_cache  # pylint: disable=global-statement
+    _default_cache = HTTPCache(directory, max_bytes) if directory else None
+    return _default_cache
+
+
+def get_cache() -> HTTPCache | None:
+    """ Get the process wide cache """
+    return _default_cache
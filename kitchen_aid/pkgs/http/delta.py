@@ -0,0 +1,199 @@
+#! /usr/bin/env python3
+
+"""
+Module provides change detection of repeatedly fetched pages.
+`FingerprintStore` keeps a fingerprint per poller (see `Command.origin`) instead of the page -
+a digest of the body and an 8 byte hash per line of it. A fetched body is compared against
+the previous fingerprint: unchanged bodies are reported as such, changed ones as the hunks
+of lines that changed.
+Removed lines are not kept, so hunks report how many were removed and the lines added.
+Lines are matched the patience diff way - lines unique in both bodies anchor the diff and
+the lines between anchors are hunks - which takes O(n log n), however the pages change.
+"""
+
+import hashlib
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from threading import Lock
+from typing import Any
+
+
+DEFAULT_MAX_ENTRIES: int = 1024
+
+
+def _line_hashes(lines: list[str]) -> array:
+    """ 8 byte hashes of the lines """
+    return array("Q", (
+        int.from_bytes(hashlib.blake2b(line.encode("utf-8"), digest_size=8).digest(), "little")
+        for line in lines
+    ))
+
+
+def _anchors(old: array, new: array) -> list[tuple[int, int]]:
+    """
+    Positions of the lines that are unique in both bodies and appear in the same order,
+      the longest such sequence.
+    """
+    # Line hash -> occurrences in old, occurrences in new, position in old, position in new
+    seen: dict[int, list[int]] = {}
+    for position, line in enumerate(old):
+        entry = seen.setdefault(line, [0, 0, position, 0])
+        entry[0] += 1
+    for position, line in enumerate(new):
+        entry = seen.get(line)
+        if entry is not None:
+            entry[1] += 1
+            entry[3] = position
+    unique = sorted(
+        (new_pos, old_pos) for old_count, new_count, old_pos, new_pos in seen.values()
+        if old_count == 1 and new_count == 1
+    )
+    # Longest increasing sequence of the old positions, by patience sorting
+    tails: list[int] = []
+    tail_indexes: list[int] = []
+    previous: list[int] = []
+    for index, (_, old_pos) in enumerate(unique):
+        pile = bisect_left(tails, old_pos)
+        previous.append(tail_indexes[pile - 1] if pile else -1)
+        if pile == len(tails):
+            tails.append(old_pos)
+            tail_indexes.append(index)
+        else:
+            tails[pile] = old_pos
+            tail_indexes[pile] = index
+    anchors: list[tuple[int, int]] = []
+    index = tail_indexes[-1] if tail_indexes else -1
+    while index >= 0:
+        new_pos, old_pos = unique[index]
+        anchors.append((old_pos, new_pos))
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+
+# pylint: disable=too-few-public-methods
+class Fingerprint:
+    """ Digest of a body and hashes of it's lines """
+
+    __slots__ = ("digest", "lines")
+
+    def __init__(self, digest: bytes, lines: array) -> None:
+        self.digest: bytes = digest
+        self.lines: array = lines
+
+
+class FingerprintStore:
+    """
+    Fingerprints of pages, by key - the poller, so pollers of the same page don't see
+      each other's bodies.
+    Least recently compared keys are dropped over `max_entries`; their next body is new again.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        if max_entries < 1:
+            raise ValueError("Fingerprint store size should be positive")
+        self.max_entries: int = max_entries
+        self._fingerprints: OrderedDict[str, Fingerprint] = OrderedDict()
+        self._lock: Lock = Lock()
+        self.unchanged: int = 0
+        self.changed: int = 0
+
+    @staticmethod
+    def _hunks(old: array, new: array, lines: list[str]) -> list[str]:
+        """ Hunks of the changed lines, in the unified diff notation """
+        hunks: list[str] = []
+        old_start = new_start = 0
+        for old_anchor, new_anchor in [*_anchors(old, new), (len(old), len(new))]:
+            old_end, new_end = old_anchor, new_anchor
+            # Lines next to the anchors may match, even if they are not unique
+            while old_start < old_end and new_start < new_end:
+                if old[old_start] != new[new_start]:
+                    break
+                old_start += 1
+                new_start += 1
+            while old_end > old_start and new_end > new_start:
+                if old[old_end - 1] != new[new_end - 1]:
+                    break
+                old_end -= 1
+                new_end -= 1
+            if old_start < old_end or new_start < new_end:
+                removed, added = old_end - old_start, new_end - new_start
+                hunks.append(f"@@ -{old_start + 1},{removed} +{new_start + 1},{added} @@")
+                hunks.extend(f"+{line}" for line in lines[new_start:new_end])
+            old_start, new_start = old_anchor + 1, new_anchor + 1
+        return hunks
+
+    def diff(self, key: str, text: str) -> str | None:
+        """
+        Compare a body with the previous body of the key, and remember it's fingerprint.
+        Returns None when the body is unchanged, the whole body when the key is new
+          and the hunks of the changed lines otherwise.
+        """
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            previous = self._fingerprints.get(key)
+            if previous is not None:
+                self._fingerprints.move_to_end(key)
+                if previous.digest == digest:
+                    self.unchanged += 1
+                    return None
+        lines = text.splitlines()
+        fingerprint = Fingerprint(digest, _line_hashes(lines))
+        with self._lock:
+            self._fingerprints[key] = fingerprint
+            self._fingerprints.move_to_end(key)
+            while len(self._fingerprints) > self.max_entries:
+                self._fingerprints.popitem(last=False)
+            self.changed += 1
+        if previous is None:
+            return text
+        return "\n".join(self._hunks(previous.lines, fingerprint.lines, lines))
+
+    def forget(self, key: str) -> None:
+        """ Drop the fingerprint of a key """
+        with self._lock:
+            self._fingerprints.pop(key, None)
+
+    def configure(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        """ Change the size of the store, dropping the least recently compared keys over it """
+        if max_entries < 1:
+            raise ValueError("Fingerprint store size should be positive")
+        with self._lock:
+            self.max_entries = max_entries
+            while len(self._fingerprints) > self.max_entries:
+                self._fingerprints.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        """ Statistics of the store """
+        with self._lock:
+            return {
+                "entries": len(self._fingerprints),
+                "line_hashes": sum(len(entry.lines) for entry in self._fingerprints.values()),
+                "unchanged": self.unchanged,
+                "changed": self.changed,
+            }
+
+
+_fingerprints: FingerprintStore | None = None  # pylint: disable=invalid-name
+_fingerprints_lock: Lock = Lock()
+
+
+def configure_fingerprints(max_entries: int = DEFAULT_MAX_ENTRIES) -> FingerprintStore:
+    """ Set the size of the process wide fingerprint store. Fingerprints are kept. """
+    global _fingerprints  # pylint: disable=global-statement
+    with _fingerprints_lock:
+        if _fingerprints is None:
+            _fingerprints = FingerprintStore(max_entries)
+        else:
+            _fingerprints.configure(max_entries)
+        return _fingerprints
+
+
+def get_fingerprints() -> FingerprintStore:
+    """ Get the process wide fingerprint store, of the default size unless configured """
+    global _fingerprints  # pylint: disable=global-statement
+    with _fingerprints_lock:
+        if _fingerprints is None:
+            _fingerprints = FingerprintStore()
+        return _fingerprints
@@ -0,0 +1,240 @@
+#! /usr/bin/env python3
+
+"""
+Module provides a DNS cache for the HTTP clients.
+Clients connect through a network backend that resolves host names with the process wide
+`DNSCache`, so new connections to a known host skip the lookup. Failed lookups are cached
+for a shorter time, so a missing host doesn't get a lookup per request.
+Resolved addresses are tried in order until one connects. When none does, the entry is
+dropped, so the next connection resolves the host again.
+TLS is still verified against the host name, only the TCP connection goes to the address.
+"""
+
+import ipaddress
+import socket
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Iterable
+
+import anyio
+import httpcore
+
+
+DEFAULT_DNS_TTL: float = 60.0
+DEFAULT_NEGATIVE_TTL: float = 5.0
+DEFAULT_DNS_ENTRIES: int = 1024
+
+# (family, socket address) of a resolved host
+Address = tuple[int, tuple[Any, ...]]
+
+
+def _is_ip(host: str) -> bool:
+    """ Is the host an IP address literal """
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+    except ValueError:
+        return False
+    return True
+
+
+# pylint: disable=too-many-instance-attributes
+class DNSCache:
+    """
+    Resolved addresses of hosts, kept for `ttl` seconds (`negative_ttl` for failures).
+    getaddrinfo doesn't report the TTL of the records, so a single TTL applies to all hosts;
+      keep it under the shortest record TTL of the upstreams.
+    Least recently used hosts are dropped over `max_entries`.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        ttl: float = DEFAULT_DNS_TTL,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+        max_entries: int = DEFAULT_DNS_ENTRIES,
+        resolver: Callable[..., list] = socket.getaddrinfo,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        if ttl <= 0 or negative_ttl < 0 or max_entries < 1:
+            raise ValueError("DNS cache TTL and size should be positive")
+        self.ttl: float = ttl
+        self.negative_ttl: float = negative_ttl
+        self.max_entries: int = max_entries
+        self._resolver: Callable[..., list] = resolver
+        self._clock: Callable[[], float] = clock
+        # (host, port) -> (deadline, addresses or the error of the lookup)
+        self._entries: OrderedDict[tuple[str, int], tuple[float, list[Address] | OSError]] = (
+            OrderedDict()
+        )
+        self._lock: Lock = Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.failures: int = 0
+
+    def configure(self, ttl: float, negative_ttl: float, max_entries: int) -> None:
+        """ Change the bounds in place. New TTLs apply to new lookups. """
+        if ttl <= 0 or negative_ttl < 0 or max_entries < 1:
+            raise ValueError("DNS cache TTL and size should be positive")
+        with self._lock:
+            self.ttl, self.negative_ttl, self.max_entries = ttl, negative_ttl, max_entries
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _lookup(self, key: tuple[str, int]) -> list[Address] | OSError | None:
+        """ Get a fresh entry """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _store(self, key: tuple[str, int], resolved: list[Address] | OSError) -> None:
+        """ Store a lookup """
+        ttl = self.negative_ttl if isinstance(resolved, OSError) else self.ttl
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, resolved)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def resolve(self, host: str, port: int) -> list[Address]:
+        """ Get the addresses of a host. Raises the OSError of a failed lookup. """
+        key = (host, port)
+        resolved = self._lookup(key)
+        if resolved is None:
+            try:
+                resolved = [
+                    (family, sockaddr) for family, _, _, _, sockaddr
+                    in self._resolver(host, port, type=socket.SOCK_STREAM)
+                ]
+            except OSError as error:
+                resolved = error
+            self._store(key, resolved)
+        if isinstance(resolved, OSError):
+            self.failures += 1
+            raise resolved
+        return resolved
+
+    def invalidate(self, host: str, port: int) -> None:
+        """ Drop the entry of a host """
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+    def stats(self) -> dict[str, int]:
+        """ Cache counters """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "failures": self.failures,
+            }
+
+
+class CachingBackend(httpcore.SyncBackend):
+    """ Network backend of sync clients, resolving hosts with the process wide DNS cache """
+
+    # pylint: disable=too-many-arguments
+    def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: float | None = None,
+        local_address: str | None = None,
+        socket_options: Iterable[Any] | None = None,
+    ) -> httpcore.NetworkStream:
+        """ Connect to the first address of the host that accepts the connection """
+        cache = get_dns_cache()
+        if cache is None or _is_ip(host):
+            return super().connect_tcp(host, port, timeout, local_address, socket_options)
+        try:
+            addresses = cache.resolve(host, port)
+        except OSError as error:
+            raise httpcore.ConnectError(str(error)) from error
+        last_error: Exception | None = None
+        for _, sockaddr in addresses:
+            try:
+                return super().connect_tcp(
+                    sockaddr[0], port, timeout, local_address, socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as error:
+                last_error = error
+        cache.invalidate(host, port)
+        raise last_error or httpcore.ConnectError(f"No addresses for {host}")
+
+
+class AsyncCachingBackend(httpcore.AnyIOBackend):
+    """ Network backend of async clients, resolving hosts with the process wide DNS cache """
+
+    # httpcore stubs AnyIOBackend out without anyio, which is the one pylint sees
+    # pylint: disable=too-many-arguments,no-member
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: float | None = None,
+        local_address: str | None = None,
+        socket_options: Iterable[Any] | None = None,
+    ) -> httpcore.AsyncNetworkStream:
+        """ Connect to the first address of the host that accepts the connection """
+        cache = get_dns_cache()
+        if cache is None or _is_ip(host):
+            return await super().connect_tcp(host, port, timeout, local_address, socket_options)
+        try:
+            addresses = await anyio.to_thread.run_sync(cache.resolve, host, port)
+        except OSError as error:
+            raise httpcore.ConnectError(str(error)) from error
+        last_error: Exception | None = None
+        for _, sockaddr in addresses:
+            try:
+                return await super().connect_tcp(
+                    sockaddr[0], port, timeout, local_address, socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as error:
+                last_error = error
+        cache.invalidate(host, port)
+        raise last_error or httpcore.ConnectError(f"No addresses for {host}")
+
+
+def use_dns_cache(transport: Any) -> Any:
+    """
+    Connect a transport (httpx.HTTPTransport or AsyncHTTPTransport) through the DNS cache.
+    httpx doesn't take a network backend, so it's set on the connection pool of the transport.
+    """
+    pool = transport._pool  # pylint: disable=protected-access
+    if isinstance(pool, httpcore.AsyncConnectionPool):
+        pool._network_backend = AsyncCachingBackend()  # pylint: disable=protected-access
+    else:
+        pool._network_backend = CachingBackend()  # pylint: disable=protected-access
+    return transport
+
+
+_dns_cache: DNSCache | None = None  # pylint: disable=invalid-name
+
+
+def configure_dns(
+    ttl: float | None = DEFAULT_DNS_TTL,
+    negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+    max_entries: int = DEFAULT_DNS_ENTRIES,
+) -> DNSCache | None:
+    """
+    Set the process wide DNS cache. None TTL disables it, hosts are resolved per connection.
+    An existing cache is changed in place, resolved hosts are kept until their current TTL.
+    """
+    global _dns_cache  # pylint: disable=global-statement
+    if ttl is None:
+        _dns_cache = None
+    elif _dns_cache is None:
+        _dns_cache = DNSCache(ttl, negative_ttl, max_entries)
+    else:
+        _dns_cache.configure(ttl, negative_ttl, max_entries)
+    return _dns_cache
+
+
+def get_dns_cache() -> DNSCache | None:
+    """ Get the process wide DNS cache """
+    return _dns_cache
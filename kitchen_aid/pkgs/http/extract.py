@@ -0,0 +1,364 @@
+#! /usr/bin/env python3
+
+"""
+Module provides streaming extraction of text and links out of HTML pages.
+`PageExtractor` is an incremental parser, fed the body chunk by chunk as it arrives.
+It keeps the stack of open elements only - never a DOM nor the body,
+  so the memory it needs doesn't grow with the size of the page.
+Selectors are a subset of CSS: tag, #id and .class, compounds of them like `div.note`,
+  and the descendant combinator, like `article p`.
+"""
+
+import re
+from html.parser import HTMLParser
+from typing import Iterable, Iterator, Sequence
+from urllib.parse import urljoin
+
+import httpx
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.pkgs.http.http_requests import HTTPRequest
+
+
+# Elements whose content is never text
+SKIPPED_TAGS: frozenset[str] = frozenset({
+    "script", "style", "noscript", "template", "svg", "math", "canvas", "iframe", "object",
+})
+# Elements without content, they are never closed
+VOID_TAGS: frozenset[str] = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param",
+    "source", "track", "wbr",
+})
+# Elements that start and end a line of text
+BLOCK_TAGS: frozenset[str] = frozenset({
+    "address", "article", "aside", "blockquote", "br", "dd", "details", "div", "dl", "dt",
+    "fieldset", "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6",
+    "header", "hr", "li", "main", "nav", "ol", "p", "pre", "section", "summary", "table", "td",
+    "th", "tr", "ul",
+})
+# Open elements implicitly closed by the start of an element, while they are the innermost
+_CLOSED_BY: dict[str, frozenset[str]] = {
+    "li": frozenset({"li"}),
+    "dt": frozenset({"dt", "dd"}),
+    "dd": frozenset({"dt", "dd"}),
+    "tr": frozenset({"tr", "td", "th"}),
+    "td": frozenset({"td", "th"}),
+    "th": frozenset({"td", "th"}),
+    "option": frozenset({"option"}),
+}
+# Line prefixes, so the structure of the page survives as markdown
+_PREFIXES: dict[str, str] = {
+    **{f"h{level}": "#" * level + " " for level in range(1, 7)},
+    "li": "- ",
+}
+# Elements nested deeper are treated as part of their ancestor, which bounds the stack
+MAX_DEPTH: int = 256
+DEFAULT_BATCH_SIZE: int = 4096
+
+_SPACES: re.Pattern = re.compile(r"\s+")
+_COMPOUND: re.Pattern = re.compile(r"(?P<tag>[a-z][a-z0-9-]*|\*)?(?P<rest>(?:[.#][\w-]+)*)", re.I)
+
+
+# pylint: disable=too-few-public-methods
+class _Element:
+    """ Open element. Whether it's content is kept is decided when it's opened. """
+
+    __slots__ = ("tag", "id", "classes", "selected", "excluded")
+
+    def __init__(self, tag: str, attrs: dict[str, str | None]) -> None:
+        self.tag: str = tag
+        self.id: str | None = attrs.get("id")
+        self.classes: frozenset[str] = frozenset((attrs.get("class") or "").split())
+        self.selected: bool = False
+        self.excluded: bool = False
+
+
+class Selector:
+    """ CSS selector of tags, ids and classes, combined by descendant only """
+
+    __slots__ = ("text", "_steps")
+
+    def __init__(self, text: str) -> None:
+        self.text: str = text
+        self._steps: list[tuple[str | None, str | None, frozenset[str]]] = []
+        for part in text.split():
+            match = _COMPOUND.fullmatch(part)
+            if match is None:
+                raise excs.InvalidCommandArguments(f"Unsupported selector: {text}")
+            tag = (match["tag"] or "*").lower()
+            rest = re.findall(r"[.#][\w-]+", match["rest"])
+            ids = [name[1:] for name in rest if name[0] == "#"]
+            if len(ids) > 1:
+                raise excs.InvalidCommandArguments(f"Unsupported selector: {text}")
+            self._steps.append((
+                None if tag == "*" else tag,
+                ids[0] if ids else None,
+                frozenset(name[1:] for name in rest if name[0] == "."),
+            ))
+        if not self._steps:
+            raise excs.InvalidCommandArguments("Empty selector")
+
+    @staticmethod
+    def _fits(step: tuple[str | None, str | None, frozenset[str]], element: _Element) -> bool:
+        """ Whether an element matches a compound selector """
+        tag, id_, classes = step
+        if tag is not None and tag != element.tag:
+            return False
+        if id_ is not None and id_ != element.id:
+            return False
+        return classes <= element.classes
+
+    def matches(self, path: Sequence[_Element]) -> bool:
+        """ Whether the last element of the path is matched, the rest being it's ancestors """
+        if not path or not self._fits(self._steps[-1], path[-1]):
+            return False
+        index = len(self._steps) - 2
+        for element in reversed(path[:-1]):
+            if index < 0:
+                break
+            if self._fits(self._steps[index], element):
+                index -= 1
+        return index < 0
+
+
+class PageExtractor(HTMLParser):
+    """
+    Incremental HTML to text parser.
+    Text is collected per block (paragraph, heading, list item...), with it's whitespace
+      collapsed. Completed blocks are handed out by `take`, as the page is fed.
+    Links are resolved against the page URL, and rendered inline as markdown with `links`.
+    With selectors, only the content of the selected elements is kept,
+      the content of excluded elements never is.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        base_url: str = "",
+        select: Iterable[Selector] = (),
+        exclude: Iterable[Selector] = (),
+        links: bool = False,
+    ) -> None:
+        super().__init__(convert_charrefs=True)
+        self._base: str = base_url
+        self._select: list[Selector] = list(select)
+        self._exclude: list[Selector] = list(exclude)
+        self._render_links: bool = links
+        self._stack: list[_Element] = []
+        self._line: list[str] = []
+        self._prefix: str = ""
+        self._space: bool = True
+        self._pre: int = 0
+        self._anchor: tuple[int, str] | None = None
+        self._title: list[str] | None = None
+        self._blocks: list[str] = []
+        self.pending: int = 0
+        self.title: str | None = None
+        self.chars: int = 0
+        self.links: int = 0
+
+    @property
+    def _kept(self) -> bool:
+        """ Whether text at the current position is kept """
+        if not self._stack:
+            return not self._select
+        top = self._stack[-1]
+        return top.selected and not top.excluded
+
+    def _add_block(self, text: str) -> None:
+        """ Add a completed block """
+        self._blocks.append(text)
+        self.pending += len(text) + 1
+
+    def _break(self) -> None:
+        """ Complete the current block """
+        text = "".join(self._line)
+        text = text.strip("\n") if self._pre else text.strip()
+        self._line.clear()
+        self._space = True
+        if self._anchor is not None:
+            self._anchor = (0, self._anchor[1])
+        if text:
+            self._add_block(self._prefix + text)
+            self._prefix = ""
+
+    def _push(self, tag: str, attrs: dict[str, str | None]) -> None:
+        """ Open an element """
+        if len(self._stack) >= MAX_DEPTH:
+            return
+        element = _Element(tag, attrs)
+        path = [*self._stack, element]
+        parent = self._stack[-1] if self._stack else None
+        selected = parent.selected if parent else not self._select
+        element.selected = selected or any(selector.matches(path) for selector in self._select)
+        excluded = (parent is not None and parent.excluded) or tag in SKIPPED_TAGS
+        element.excluded = excluded or any(selector.matches(path) for selector in self._exclude)
+        self._stack.append(element)
+        if tag == "pre":
+            self._pre += 1
+
+    def _pop(self) -> None:
+        """ Close the innermost element """
+        element = self._stack.pop()
+        if element.tag in BLOCK_TAGS:
+            self._break()
+        if element.tag == "pre":
+            self._pre -= 1
+        elif element.tag == "a":
+            self._end_link()
+
+    def _end_link(self) -> None:
+        """ Render the link being closed """
+        if self._anchor is None:
+            return
+        (start, url), self._anchor = self._anchor, None
+        self.links += 1
+        if self._render_links:
+            text = "".join(self._line[start:]).strip()
+            del self._line[start:]
+            self._line.append(f"[{text}]({url})" if text else f"<{url}>")
+            self._space = False
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        attributes = dict(attrs)
+        if tag == "base" and attributes.get("href"):
+            self._base = urljoin(self._base, attributes["href"])
+            return
+        if tag == "title" and self.title is None:
+            self._title = []
+            return
+        closes = _CLOSED_BY.get(tag, frozenset())
+        while self._stack and (
+            self._stack[-1].tag in closes or (self._stack[-1].tag == "p" and tag in BLOCK_TAGS)
+        ):
+            self._pop()
+        if tag in BLOCK_TAGS:
+            self._break()
+        if tag in VOID_TAGS:
+            return
+        self._push(tag, attributes)
+        if not self._kept:
+            return
+        if tag in _PREFIXES:
+            self._prefix = _PREFIXES[tag]
+        elif tag == "a" and attributes.get("href") and self._anchor is None:
+            self._anchor = (len(self._line), urljoin(self._base, attributes["href"]))
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "title" and self._title is not None:
+            self._end_title()
+            return
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index].tag == tag:
+                while len(self._stack) > index:
+                    self._pop()
+                return
+
+    def _end_title(self) -> None:
+        """ Complete the title, it's handed out ahead of the text that follows """
+        self.title = _SPACES.sub(" ", "".join(self._title or ())).strip()
+        self._title = None
+        if self.title:
+            self._add_block(f"Title: {self.title}")
+
+    def handle_data(self, data: str) -> None:
+        if self._title is not None:
+            self._title.append(data)
+            return
+        if not self._kept:
+            return
+        if not self._pre:
+            data = _SPACES.sub(" ", data)
+            if self._space:
+                data = data.lstrip(" ")
+        if data:
+            self._line.append(data)
+            self._space = data[-1].isspace()
+
+    def close(self) -> None:
+        """ Process the rest of the page and complete the open elements """
+        super().close()
+        if self._title is not None:
+            self._end_title()
+        while self._stack:
+            self._pop()
+        self._break()
+
+    def take(self) -> str:
+        """ Text of the blocks completed since the last call, a line per block """
+        if not self._blocks:
+            return ""
+        text = "\n".join(self._blocks)
+        self.chars += len(text)
+        self._blocks.clear()
+        self.pending = 0
+        return text
+
+
+# pylint: disable=too-few-public-methods,too-many-instance-attributes
+class PageExtraction:
+    """
+    Receiver of the extract-page command - a page to get, or HTML streamed in by a pipeline.
+    Statistics of the extraction are available once it's done.
+    """
+
+    __slots__ = (
+        "url", "_source", "_select", "_exclude", "_links", "_timeout", "_headers", "_batch_size",
+        "title", "chars", "links",
+    )
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        url: str | None = None,
+        source: str | Iterable[str] | None = None,
+        select: list[str] | None = None,
+        exclude: list[str] | None = None,
+        links: bool = False,
+        timeout: int = 10,
+        headers: dict[str, str] | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        if url is None and source is None:
+            raise excs.InvalidCommandArguments("A URL or a source to extract is required")
+        self.url: str | None = url
+        self._source: str | Iterable[str] | None = source
+        self._select: list[Selector] = [Selector(text) for text in select or ()]
+        self._exclude: list[Selector] = [Selector(text) for text in exclude or ()]
+        self._links: bool = links
+        self._timeout: int = timeout
+        self._headers: dict[str, str] | None = headers
+        self._batch_size: int = batch_size
+        self.title: str | None = None
+        self.chars: int = 0
+        self.links: int = 0
+
+    def _chunks(self, client: httpx.Client | None) -> Iterable[str]:
+        """ Chunks of HTML to parse """
+        if self._source is None:
+            return HTTPRequest(
+                self.url or "", headers=self._headers, timeout=self._timeout, cache=False
+            ).iter_text(client)
+        if isinstance(self._source, str):
+            return (self._source,)
+        return self._source
+
+    def iter_text(self, client: httpx.Client | None = None) -> Iterator[str]:
+        """ Extract the page as it arrives, in batches of about `batch_size` characters """
+        extractor = PageExtractor(self.url or "", self._select, self._exclude, self._links)
+        for chunk in self._chunks(client):
+            extractor.feed(chunk)
+            if extractor.pending >= self._batch_size:
+                yield extractor.take()
+        extractor.close()
+        if text := extractor.take():
+            yield text
+        self.title, self.chars, self.links = extractor.title, extractor.chars, extractor.links
+
+    @property
+    def summary(self) -> str:
+        """ Summary of the extraction """
+        summary = f"Extracted {self.chars} characters and {self.links} links"
+        if self.url:
+            summary += f" from {self.url}"
+        return summary + (f": {self.title}" if self.title else "")
@@ -0,0 +1,268 @@
+#! /usr/bin/env python3
+
+"""
+Module provides hedged HTTP requests.
+When a response doesn't arrive within an adaptive delay (a percentile of the recent
+latencies of the host), a second identical request is sent. The first one to succeed wins
+and the other one is cancelled. Only idempotent requests are hedged, and the extra load
+hedging may add is capped.
+
+Requests run on a dedicated event loop thread, so losing requests can be cancelled.
+"""
+
+import asyncio
+from collections import deque
+from threading import Lock, Thread
+from time import monotonic
+from typing import Any
+
+import httpx
+
+from kitchen_aid.pkgs.http.dns import use_dns_cache
+
+
+IDEMPOTENT_METHODS: frozenset[str] = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+# pylint: disable=too-many-instance-attributes
+class HedgingPolicy:
+    """
+    Decides when to hedge and keeps the hedging stats.
+    Extra load is capped with a token bucket - every request adds `max_extra_load` tokens,
+      every hedge takes one, so hedges stay under `max_extra_load` of all requests.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        min_delay: float = 0.01,
+        default_delay: float = 1.0,
+        max_extra_load: float = 0.1,
+        window: int = 200,
+        min_samples: int = 20,
+        burst: float = 10.0,
+    ) -> None:
+        if not 0 < percentile < 1:
+            raise ValueError("Percentile should be between 0 and 1")
+        if max_extra_load < 0:
+            raise ValueError("Extra load can't be negative")
+        self.percentile: float = percentile
+        self.min_delay: float = min_delay
+        self.default_delay: float = default_delay
+        self.max_extra_load: float = max_extra_load
+        self._window: int = window
+        self._min_samples: int = min_samples
+        self._burst: float = burst
+        self._tokens: float = 0.0
+        self._latencies: dict[str, deque[float]] = {}
+        self._lock: Lock = Lock()
+        self.requests: int = 0
+        self.hedges: int = 0
+        self.hedge_wins: int = 0
+
+    # pylint: disable=protected-access
+    def configure(self, **fields: Any) -> None:
+        """
+        Change the thresholds to the ones of a policy with the fields.
+        Recorded latencies, the hedge budget and the stats are kept.
+        """
+        policy = HedgingPolicy(**fields)
+        with self._lock:
+            self.percentile = policy.percentile
+            self.min_delay = policy.min_delay
+            self.default_delay = policy.default_delay
+            self.max_extra_load = policy.max_extra_load
+            self._min_samples = policy._min_samples
+            self._burst = policy._burst
+            self._tokens = min(self._tokens, self._burst)
+            if policy._window != self._window:
+                self._window = policy._window
+                self._latencies = {
+                    host: deque(samples, maxlen=self._window)
+                    for host, samples in self._latencies.items()
+                }
+
+    def delay(self, host: str) -> float:
+        """ How long to wait for the response before hedging """
+        with self._lock:
+            samples = self._latencies.get(host)
+            if samples is None or len(samples) < self._min_samples:
+                return self.default_delay
+            ordered = sorted(samples)
+        index = min(int(len(ordered) * self.percentile), len(ordered) - 1)
+        return max(ordered[index], self.min_delay)
+
+    def record(self, host: str, latency: float) -> None:
+        """ Record the latency of a response, from the start of it's own request """
+        with self._lock:
+            samples = self._latencies.get(host)
+            if samples is None:
+                samples = self._latencies[host] = deque(maxlen=self._window)
+            samples.append(latency)
+
+    def start_request(self) -> None:
+        """ Count a hedgeable request, which refills the hedge budget """
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self._tokens + self.max_extra_load, self._burst)
+
+    def try_hedge(self) -> bool:
+        """ Take a hedge from the budget """
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            self.hedges += 1
+            return True
+
+    def hedge_won(self) -> None:
+        """ Count a hedge that finished before the original request """
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self) -> dict[str, float]:
+        """ Hedging stats """
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "hedge_rate": self.hedges / self.requests if self.requests else 0.0,
+                "win_rate": self.hedge_wins / self.hedges if self.hedges else 0.0,
+            }
+
+
+class Hedger:
+    """ Sends hedged requests from a dedicated event loop thread """
+
+    def __init__(
+        self, policy: HedgingPolicy | None = None, client: httpx.AsyncClient | None = None
+    ) -> None:
+        self.policy: HedgingPolicy = policy or HedgingPolicy()
+        self._client: httpx.AsyncClient | None = client
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock: Lock = Lock()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """ Start the loop thread on first use """
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                Thread(target=self._loop.run_forever, daemon=True, name="http_hedger").start()
+            return self._loop
+
+    def close(self) -> None:
+        """ Close the client and stop the loop thread """
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result()
+            self._client = None
+        loop.call_soon_threadsafe(loop.stop)
+
+    def request(self, method: str, url: str, **kw_args: Any) -> httpx.Response:
+        """ Send a request, hedging it if it's idempotent """
+        future = asyncio.run_coroutine_threadsafe(
+            self._request(method.upper(), url, kw_args), self._get_loop()
+        )
+        return future.result()
+
+    async def _send(self, method: str, url: str, kw_args: dict[str, Any]) -> httpx.Response:
+        """ Send a single request """
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=use_dns_cache(httpx.AsyncHTTPTransport())
+            )
+        return await self._client.request(method, url, **kw_args)
+
+    async def _attempt(
+        self, method: str, url: str, host: str, kw_args: dict[str, Any]
+    ) -> httpx.Response:
+        """
+        Send a single request and record it's latency once it completes.
+        Failed and cancelled requests are not recorded.
+        """
+        started = monotonic()
+        response = await self._send(method, url, kw_args)
+        self.policy.record(host, monotonic() - started)
+        return response
+
+    async def _request(self, method: str, url: str, kw_args: dict[str, Any]) -> httpx.Response:
+        """ Send a request and hedge it when it's slow """
+        if method not in IDEMPOTENT_METHODS:
+            return await self._send(method, url, kw_args)
+        host = httpx.URL(url).host
+        self.policy.start_request()
+        primary = asyncio.ensure_future(self._attempt(method, url, host, kw_args))
+        done, _ = await asyncio.wait({primary}, timeout=self.policy.delay(host))
+        if done or not self.policy.try_hedge():
+            return await primary
+
+        hedge = asyncio.ensure_future(self._attempt(method, url, host, kw_args))
+        pending = {primary, hedge}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                # A failed request only loses if the other one can still succeed
+                if not succeeded and pending:
+                    continue
+                winner = succeeded[0] if succeeded else done.pop()
+                response = winner.result()
+                if winner is hedge:
+                    self.policy.hedge_won()
+                return response
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+# pylint: disable=too-few-public-methods
+class HedgingStats:
+    """ Reads the stats of the process wide hedger """
+
+    __slots__ = ()
+
+    def collect(self) -> dict[str, float]:
+        """ Get the hedging stats """
+        return get_hedger().policy.stats()
+
+
+_hedger: Hedger | None = None  # pylint: disable=invalid-name
+_hedger_lock: Lock = Lock()
+
+
+def configure_hedging(**policy: Any) -> Hedger:
+    """
+    Set the policy of the process wide hedger. Arguments are the fields of `HedgingPolicy`.
+    A running hedger keeps it's event loop and client, and it's policy keeps the recorded
+      latencies and the stats - only the thresholds change.
+    """
+    global _hedger  # pylint: disable=global-statement
+    with _hedger_lock:
+        if _hedger is None:
+            _hedger = Hedger(HedgingPolicy(**policy))
+        else:
+            _hedger.policy.configure(**policy)
+        return _hedger
+
+
+def get_hedger() -> Hedger:
+    """ Get the process wide hedger, with the default policy unless configured """
+    global _hedger  # pylint: disable=global-statement
+    with _hedger_lock:
+        if _hedger is None:
+            _hedger = Hedger()
+        return _hedger
+
+
+def close_hedging() -> None:
+    """ Close the process wide hedger, if it was started """
+    global _hedger  # pylint: disable=global-statement
+    with _hedger_lock:
+        hedger, _hedger = _hedger, None
+    if hedger is not None:
+        hedger.close()
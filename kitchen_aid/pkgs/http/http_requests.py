@@ -4,16 +4,79 @@
 Module provides http requests utils
 """
 
-from typing import Any, Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
+from typing import Any, Iterator
 
 import httpx
 
+from kitchen_aid.models.budget import Reservation, get_budget
+from kitchen_aid.models.compression import get_compression
+from kitchen_aid.models.paths import resolve_under
+from kitchen_aid.pkgs.http.cache import HTTPCache, get_cache
+from kitchen_aid.pkgs.http.dns import use_dns_cache
+from kitchen_aid.pkgs.http.hedging import get_hedger
 
-# pylint: disable=too-few-public-methods
+
+DEFAULT_POOL_LIMITS: httpx.Limits = httpx.Limits(
+    max_connections=100, max_keepalive_connections=50, keepalive_expiry=30.0
+)
+
+# Headers that don't apply to a body that is already decoded
+_DECODED_HEADERS: frozenset[str] = frozenset({
+    "content-encoding", "content-length", "transfer-encoding",
+})
+# Response extension with the memory budget reservation of the body
+RESERVATION_EXTENSION: str = "kitchen_aid.reservation"
+
+_client: httpx.Client | None = None  # pylint: disable=invalid-name
+_client_lock: Lock = Lock()
+# Directory of the URL files of batch requests, URL files are refused without it
+_url_directory: str | None = None  # pylint: disable=invalid-name
+
+
+def get_client() -> httpx.Client:
+    """ Get the process wide client. It's connection pool is shared by all requests using it. """
+    global _client  # pylint: disable=global-statement
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            _client = httpx.Client(
+                transport=use_dns_cache(httpx.HTTPTransport(limits=DEFAULT_POOL_LIMITS)),
+                follow_redirects=True,
+            )
+        return _client
+
+
+def set_client(client: httpx.Client | None) -> None:
+    """ Replace the process wide client. The previous one is closed. """
+    global _client  # pylint: disable=global-statement
+    with _client_lock:
+        previous, _client = _client, client
+    if previous is not None and previous is not client:
+        previous.close()
+
+
+def configure_url_files(directory: str | None) -> None:
+    """ Set the directory of the URL files of batch requests. None refuses URL files. """
+    global _url_directory  # pylint: disable=global-statement
+    _url_directory = directory
+
+
+def reservation_of(response: httpx.Response) -> Reservation | None:
+    """ Get the memory budget reservation of a response body """
+    return response.extensions.get(RESERVATION_EXTENSION)
+
+
+# pylint: disable=too-few-public-methods,too-many-instance-attributes
 class HTTPRequest:
     """ Class to provide a basic HTTP request, definition detached from execution """
 
-    # pylint: disable=too-many-arguments
+    __slots__ = (
+        "_url", "_method", "_headers", "_params", "_timeout", "_data", "_cache",
+        "_hedge", "delta",
+    )
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
     def __init__(
         self,
         url: str,
@@ -22,23 +85,221 @@ class HTTPRequest:
         params: dict[str, str] | None = None,
         data: str | None = None,
         timeout: int = 10,
+        cache: bool = True,
+        hedge: bool = False,
+        delta: bool = False,
     ) -> None:
         self._url: str = url
+        self._method: str = method.upper()
         self._headers: dict[str, str] | None = headers
         self._params: dict[str, str] | None = params
         self._timeout: int = timeout
-        self._req_callable: Callable = getattr(httpx, method.lower())
         self._data: str | None = data
+        self._cache: bool = cache
+        # Hedged requests are sent by the process wide hedger, not over the given client
+        self._hedge: bool = hedge
+        # Only changes of the body since the previous request are reported
+        self.delta: bool = delta
 
-        self._request_kw_args: dict[str, Any] = {}
-        for key in ["params", "headers", "timeout", "data"]:
-            if getattr(self, f"_{key}"):
-                self._request_kw_args[key] = getattr(self, f"_{key}")
+    @property
+    def _request_kw_args(self) -> dict[str, Any]:
+        """
+        Keyword arguments of the request. Built on demand, so it's not kept per instance.
+        Encodings of the compression policy are accepted, unless the headers say otherwise.
+        """
+        kw_args: dict[str, Any] = {}
+        if self._params:
+            kw_args["params"] = self._params
+        headers = self._headers or {}
+        if not any(name.lower() == "accept-encoding" for name in headers):
+            headers = {"Accept-Encoding": get_compression().accept_encoding, **headers}
+        kw_args["headers"] = headers
+        if self._timeout:
+            kw_args["timeout"] = self._timeout
+        if self._data:
+            kw_args["data"] = self._data
+        return kw_args
 
-    def do_request(self) -> httpx.Response:
-        """ Get the web page """
-        response: httpx.Response = self._req_callable(
-            self._url, follow_redirects=True, **self._request_kw_args
+    @property
+    def url(self) -> str:
+        """ Get the URL of the request """
+        return self._url
+
+    @property
+    def key(self) -> str:
+        """ Key of the request - method, URL and parameters - for the stores that track it """
+        return HTTPCache.key(self._method, self._url, self._params)
+
+    def _read(
+        self, client: httpx.Client, kw_args: dict[str, Any], reservation: Reservation
+    ) -> httpx.Response:
+        """ Send the request and read the body chunk by chunk, reserving it as it arrives """
+        chunks: list[bytes] = []
+        with client.stream(
+            self._method, self._url, follow_redirects=True, **kw_args
+        ) as response:
+            for chunk in response.iter_bytes():
+                reservation.grow(len(chunk))
+                chunks.append(chunk)
+        return httpx.Response(
+            response.status_code,
+            headers=[
+                (name, value) for name, value in response.headers.multi_items()
+                if name.lower() not in _DECODED_HEADERS
+            ],
+            content=b"".join(chunks),
+            request=response.request,
+            history=response.history,
         )
+
+    def _send(
+        self,
+        client: httpx.Client | None,
+        kw_args: dict[str, Any],
+        reservation: Reservation | None = None,
+    ) -> httpx.Response:
+        """
+        Send the request over the client, the process wide one when none is given,
+          so requests share it's connection pool and DNS cache.
+        """
+        if self._hedge:
+            return get_hedger().request(self._method, self._url, follow_redirects=True, **kw_args)
+        client = client or get_client()
+        if reservation is not None:
+            return self._read(client, kw_args, reservation)
+        return client.request(self._method, self._url, follow_redirects=True, **kw_args)
+
+    def do_request(self, client: httpx.Client | None = None) -> httpx.Response:
+        """
+        Get the web page.
+        GET requests go through the process wide cache, when one is configured.
+        Fresh cached responses are served without a request, stale ones are revalidated.
+        When a memory budget is configured, the body is reserved from it, see `reservation`.
+        """
+        budget = get_budget()
+        reservation = None if budget is None else budget.reserve()
+        if reservation is None:
+            return self._fetch(client, None)
+        try:
+            response = self._fetch(client, reservation)
+            if not reservation.size:
+                # Body was not read chunk by chunk - served from the cache or hedged
+                reservation.grow(len(response.content))
+        except BaseException:
+            # The traceback would keep the reservation alive
+            reservation.release()
+            raise
+        response.extensions[RESERVATION_EXTENSION] = reservation
+        return response
+
+    def _fetch(
+        self, client: httpx.Client | None, reservation: Reservation | None
+    ) -> httpx.Response:
+        """ Get the response, through the cache when it applies """
+        cache = get_cache() if self._cache and self._method == "GET" else None
+        if cache is None:
+            response: httpx.Response = self._send(client, self._request_kw_args, reservation)
+            response.raise_for_status()
+            return response
+
+        key = cache.key(self._method, self._url, self._params)
+        entry = cache.lookup(key, self._headers)
+        kw_args = self._request_kw_args
+        if entry is not None and entry.is_fresh():
+            cached = cache.hit(entry)
+            if cached is not None:
+                return cached
+            entry = None
+        if entry is not None:
+            kw_args["headers"] = {**kw_args["headers"], **entry.conditional_headers()}
+        response = self._send(client, kw_args, reservation)
+        if entry is not None and response.status_code == httpx.codes.NOT_MODIFIED:
+            cached = cache.revalidated(entry, response)
+            if cached is not None:
+                return cached
+            # Evicted while it was revalidated, there is no body to serve
+            response = self._send(client, self._request_kw_args, reservation)
         response.raise_for_status()
+        cache.store(key, response, self._headers)
         return response
+
+    def iter_text(self, client: httpx.Client | None = None) -> Iterator[str]:
+        """
+        Stream the decoded body of the response, as it arrives.
+        Streamed requests are not cached nor hedged.
+        """
+        with (client or get_client()).stream(
+            self._method, self._url, follow_redirects=True, **self._request_kw_args
+        ) as response:
+            response.raise_for_status()
+            yield from response.iter_text()
+
+
+# pylint: disable=too-few-public-methods
+class HTTPBatchRequest:
+    """
+    Many HTTP requests with the same options, executed concurrently
+      over the shared connection pool.
+    URL files are read only from the configured directory (`configure_url_files`),
+      batches are scheduled by remote interfaces too.
+    """
+
+    __slots__ = ("_urls", "_concurrency", "_request_kw_args", "status_only")
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        urls: list[str] | None = None,
+        url_file: str | None = None,
+        concurrency: int = 10,
+        method: str = "GET",
+        headers: dict[str, str] | None = None,
+        params: dict[str, str] | None = None,
+        timeout: int = 10,
+        cache: bool = True,
+        hedge: bool = False,
+        status_only: bool = False,
+    ) -> None:
+        self._urls: list[str] = list(urls or [])
+        if url_file:
+            path = resolve_under(_url_directory, url_file, "URL file")
+            with open(path, "r", encoding="utf-8") as url_lines:
+                self._urls.extend(
+                    line.strip() for line in url_lines
+                    if line.strip() and not line.lstrip().startswith("#")
+                )
+        if concurrency < 1:
+            raise ValueError("Concurrency should be positive")
+        self._concurrency: int = concurrency
+        self._request_kw_args: dict[str, Any] = {
+            "method": method, "headers": headers, "params": params,
+            "timeout": timeout, "cache": cache, "hedge": hedge,
+        }
+        # Only report status and size of the responses, not their bodies
+        self.status_only: bool = status_only
+
+    @property
+    def urls(self) -> list[str]:
+        """ Get the URLs of the batch """
+        return self._urls
+
+    def iter_requests(
+        self, client: httpx.Client | None = None
+    ) -> Iterator[tuple[str, httpx.Response | Exception]]:
+        """
+        Execute the requests, at most `concurrency` at a time.
+        Yields (url, response or error) pairs in completion order.
+        """
+        client = client or get_client()
+        with ThreadPoolExecutor(
+            min(self._concurrency, len(self._urls) or 1), thread_name_prefix="http_batch"
+        ) as executor:
+            futures = {
+                executor.submit(
+                    HTTPRequest(url, **self._request_kw_args).do_request, client
+                ): url
+                for url in self._urls
+            }
+            for future in as_completed(futures):
+                error = future.exception()
+                yield futures[future], error if error is not None else future.result()
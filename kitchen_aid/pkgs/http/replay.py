@@ -0,0 +1,102 @@
+#! /usr/bin/env python3
+
+"""
+This module provides the HTTP stub of traffic replays.
+Requests of the recorded HTTP commands are answered locally, with bodies of the recorded
+sizes after the recorded latencies, so a replay measures kitchen_aid and not the upstreams.
+Latency of a request is the latency of it's command. Pages of a batch command share
+the latency of the batch and split it's size.
+Receivers of single requests are swapped for ones bound to the stub client, batches already
+go over the process wide client.
+"""
+
+from collections import defaultdict, deque
+from time import sleep
+from typing import Any
+
+import httpx
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.command import CommandMapper
+from kitchen_aid.models.replay import Recording
+from kitchen_aid.pkgs.http.http_requests import HTTPRequest, get_client, set_client
+
+
+def _recorded_urls(kwargs: dict[str, Any]) -> list[str]:
+    """ URLs requested by a recorded command """
+    if isinstance(kwargs.get("url"), str):
+        return [kwargs["url"]]
+    urls = kwargs.get("urls")
+    return [url for url in urls if isinstance(url, str)] if isinstance(urls, list) else []
+
+
+class RecordedTransport(httpx.MockTransport):
+    """
+    Serves the recorded responses of every URL in the recorded order.
+    Once the recorded responses of a URL are used up, the last one is repeated.
+    URLs that weren't recorded get an empty response right away.
+    """
+
+    def __init__(self, recording: Recording) -> None:
+        super().__init__(self._serve)
+        self._responses: defaultdict[str, deque[tuple[float, int]]] = defaultdict(deque)
+        for command in recording.commands:
+            urls = _recorded_urls(command.kwargs)
+            if command.latency is None or not urls:
+                continue
+            for url in urls:
+                self._responses[url].append((command.latency, command.size // len(urls)))
+        self.served: int = 0
+
+    def _next(self, request: httpx.Request) -> tuple[float, int]:
+        """ Get the latency and size of the next response of the requested URL """
+        for url in (str(request.url), str(request.url.copy_with(query=None))):
+            responses = self._responses.get(url)
+            if responses:
+                try:
+                    return responses.popleft() if len(responses) > 1 else responses[0]
+                except IndexError:
+                    # Another request took the one before last
+                    return responses[0]
+        return 0.0, 0
+
+    def _serve(self, request: httpx.Request) -> httpx.Response:
+        """ Answer a request after the recorded latency """
+        latency, size = self._next(request)
+        self.served += 1
+        if latency > 0:
+            sleep(latency)
+        return httpx.Response(200, content=b"x" * size, request=request)
+
+
+def _stubbed(receiver: type[HTTPRequest]) -> type[HTTPRequest]:
+    """ Receiver sending it's requests over the process wide client """
+
+    # pylint: disable=too-few-public-methods
+    class StubbedRequest(receiver):  # type: ignore
+        """ Request sent to the recorded responses """
+
+        __slots__ = ()
+
+        def do_request(self, client: httpx.Client | None = None) -> httpx.Response:
+            """ Get the recorded response """
+            return super().do_request(client or get_client())
+
+    return StubbedRequest
+
+
+def install_stub(recording: Recording) -> RecordedTransport:
+    """
+    Send the requests of the recorded commands to the recorded responses.
+    Commands of the recording that aren't registered are left alone, they fail on replay.
+    """
+    transport = RecordedTransport(recording)
+    set_client(httpx.Client(transport=transport, follow_redirects=True))
+    for name in {command.command for command in recording.commands}:
+        try:
+            command, receiver, parser = CommandMapper().get_command(name)
+        except excs.CommandNotFound:
+            continue
+        if isinstance(receiver, type) and issubclass(receiver, HTTPRequest):
+            CommandMapper().register(command, _stubbed(receiver), name, parser)
+    return transport
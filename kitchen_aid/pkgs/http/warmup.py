@@ -0,0 +1,125 @@
+#! /usr/bin/env python3
+
+"""
+Module provides pre-warming of upstream connections.
+Known upstreams are probed when the process starts, so their DNS lookup and TCP/TLS
+handshake are done before the first command needs them, and then every interval,
+so their keep-alive connections in the shared pool don't expire while idle.
+Any response counts - a probe is there to hold a connection, not to check the upstream.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
+from typing import Any
+
+import httpx
+
+from kitchen_aid.pkgs.http.http_requests import DEFAULT_POOL_LIMITS, get_client
+
+
+# Under the keep-alive expiry of the shared pool
+DEFAULT_WARMUP_INTERVAL: float = DEFAULT_POOL_LIMITS.keepalive_expiry * 2 / 3  # type: ignore
+DEFAULT_PROBE_TIMEOUT: float = 2.0
+MAX_PROBES_AT_ONCE: int = 8
+
+
+# pylint: disable=too-many-instance-attributes
+class ConnectionWarmer:
+    """ Probes upstream URLs over the process wide client, at start and every interval """
+
+    def __init__(
+        self,
+        urls: list[str],
+        interval: float = DEFAULT_WARMUP_INTERVAL,
+        timeout: float = DEFAULT_PROBE_TIMEOUT,
+        method: str = "HEAD",
+    ) -> None:
+        if interval <= 0 or timeout <= 0:
+            raise ValueError("Warmup interval and timeout should be positive")
+        self.urls: list[str] = list(urls)
+        self.interval: float = interval
+        self.timeout: float = timeout
+        self.method: str = method.upper()
+        self._stop: Event = Event()
+        self._thread: Thread | None = None
+        self._lock: Lock = Lock()
+        self.rounds: int = 0
+        self.probes: int = 0
+        self.failures: int = 0
+        # URL -> status code of the last probe, or the error it failed with
+        self.last: dict[str, int | str] = {}
+
+    def _probe(self, url: str) -> bool:
+        """ Probe a single URL """
+        try:
+            response = get_client().request(self.method, url, timeout=self.timeout)
+            outcome: int | str = response.status_code
+        except httpx.HTTPError as error:
+            outcome = f"{type(error).__name__}: {error}"
+        with self._lock:
+            self.probes += 1
+            self.failures += isinstance(outcome, str)
+            self.last[url] = outcome
+        return isinstance(outcome, int)
+
+    def warm(self) -> int:
+        """ Probe all URLs at once. Returns how many were reached. """
+        if not self.urls:
+            return 0
+        with ThreadPoolExecutor(
+            min(len(self.urls), MAX_PROBES_AT_ONCE), thread_name_prefix="http_warmup"
+        ) as pool:
+            reached = sum(pool.map(self._probe, self.urls))
+        self.rounds += 1
+        return reached
+
+    def start(self) -> int:
+        """
+        Warm the connections, then keep them warm from a background thread.
+        Returns how many URLs were reached by the first round.
+        """
+        reached = self.warm()
+        self._thread = Thread(target=self._keep_warm, daemon=True, name="http_warmer")
+        self._thread.start()
+        return reached
+
+    def _keep_warm(self) -> None:
+        """ Probe every interval until stopped """
+        while not self._stop.wait(self.interval):
+            self.warm()
+
+    def stop(self) -> None:
+        """ Stop probing """
+        self._stop.set()
+
+    def stats(self) -> dict[str, Any]:
+        """ Probe counters and the outcome of the last probe of every URL """
+        with self._lock:
+            return {
+                "rounds": self.rounds,
+                "probes": self.probes,
+                "failures": self.failures,
+                "last": dict(self.last),
+            }
+
+
+_warmer: ConnectionWarmer | None = None  # pylint: disable=invalid-name
+
+
+def configure_warmup(urls: list[str] | None, **options: Any) -> ConnectionWarmer | None:
+    """
+    Replace the process wide warmer, stopping the previous one. None or no URLs stop warming.
+    Options are the arguments of `ConnectionWarmer`. Returns once the first round is done.
+    """
+    global _warmer  # pylint: disable=global-statement
+    previous, _warmer = _warmer, ConnectionWarmer(urls, **options) if urls else None
+    if previous is not None:
+        previous.stop()
+    if _warmer is not None:
+        _warmer.start()
+    return _warmer
+
+
+def get_warmer() -> ConnectionWarmer | None:
+    """ Get the process wide warmer """
+    return _warmer
@@ -0,0 +1,80 @@
+#! /usr/bin/env python3
+
+"""
+Module provides a base for interfaces that are driven by an asyncio event loop.
+Loop lives in the listener thread. Results are posted from engine threads,
+so all calls into the loop go through `call_soon_threadsafe`.
+"""
+
+import asyncio
+from queue import Queue
+from threading import Event
+from typing import Any, Callable
+
+from kitchen_aid.models.interact import InteractInterface
+
+
+class AsyncInteractInterface(InteractInterface):
+    """
+    Base interface for event loop driven interfaces.
+    Subclasses implement `start_serving` and `stop_serving` coroutines.
+    """
+
+    def __init__(
+        self, command_queue: Queue, command_result_queue: Queue, **kwargs: Any
+    ) -> None:
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_stop: asyncio.Event | None = None
+        self._ready: Event = Event()
+        super().__init__(command_queue, command_result_queue, **kwargs)
+
+    async def start_serving(self) -> None:
+        """ Start accepting clients """
+        raise NotImplementedError
+
+    async def stop_serving(self) -> None:
+        """ Stop accepting clients and close the open connections """
+        raise NotImplementedError
+
+    def listen(self) -> None:
+        """ Run the event loop until the interface is stopped """
+        asyncio.run(self._listen())
+
+    async def _listen(self) -> None:
+        """ Serve until stopped """
+        self._loop = asyncio.get_running_loop()
+        self._loop_stop = asyncio.Event()
+        if self.stopped:
+            return
+        await self.start_serving()
+        self._ready.set()
+        try:
+            await self._loop_stop.wait()
+        finally:
+            self._ready.clear()
+            await self.stop_serving()
+            self._loop = None
+
+    def wait_ready(self, timeout: float | None = None) -> bool:
+        """ Wait for the interface to start serving """
+        return self._ready.wait(timeout)
+
+    def call_soon(self, callback: Callable, *args: Any) -> bool:
+        """
+        Schedule a callback within the event loop from any thread.
+        Returns False if the loop is not running.
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return False
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            return False
+        return True
+
+    def stop(self) -> None:
+        """ Stop the interface and it's event loop """
+        super().stop()
+        if self._loop_stop is not None:
+            self.call_soon(self._loop_stop.set)
@@ -0,0 +1,561 @@
+#! /usr/bin/env python3
+
+"""
+Module provides an HTTP/REST interact interface.
+Interface is served from a single asyncio event loop with keep-alive connections.
+
+Endpoints:
+    GET    /, /healthz              - health of the interface
+    POST   /commands                - schedule one command or a list of commands.
+                                      Body: {"command": "get-page", "args": ["http://..."]}
+                                      Response holds the ids of the scheduled commands.
+    GET    /commands/<id>?wait=N    - get the results of a command.
+                                      Long-polls for up to N seconds until the command is done.
+                                      Large results are compressed when the client accepts it
+                                      (Accept-Encoding), see `kitchen_aid.models.compression`.
+    GET    /commands/<id>/stream    - chunked stream of results (JSON lines)
+                                      until the command is done.
+    DELETE /commands/<id>           - forget a command
+    GET    /subscribe?command=glob  - chunked stream of the results (JSON lines) of all commands
+                                      with a matching name, e.g. get-page*, scheduled by anyone.
+                                      ?id=<command id> follows a single command id instead.
+                                      Empty lines are sent while idle, to detect closed clients.
+"""
+
+import asyncio
+import json
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from http import HTTPStatus
+from queue import Queue
+from time import monotonic
+from typing import Any, AsyncIterator
+from urllib.parse import parse_qs, urlsplit
+from uuid import uuid4
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.command import CommandMapper, PartialResult, Result, UnchangedResult
+from kitchen_aid.models.compression import get_compression, negotiate, parse_accept_encoding
+from kitchen_aid.models.interact import IThread
+from kitchen_aid.models.subscriptions import command_name
+from kitchen_aid.pkgs.interacts.aio import AsyncInteractInterface
+
+
+MAX_HEADERS: int = 100
+MAX_WAIT: float = 60.0
+# Results a slow subscriber can fall behind before the oldest ones are skipped
+SUBSCRIPTION_BUFFER: int = 1000
+# Limits of the interface, they can be changed while it's running
+DEFAULT_LIMITS: dict[str, float] = {
+    "keep_alive_timeout": 15.0,
+    "max_body_size": 1024 * 1024,
+    "result_ttl": 300.0,
+    "max_threads": 10000,
+}
+
+
+class HTTPError(Exception):
+    """ Error that is returned to the client as an HTTP error response """
+
+    def __init__(self, status: HTTPStatus, message: str | None = None) -> None:
+        self.status: HTTPStatus = status
+        super().__init__(message or status.phrase)
+
+
+@dataclass(slots=True)
+class _Request:
+    """ Request routed to a handler, path parts hold the command id """
+
+    writer: asyncio.StreamWriter
+    parts: list[str]
+    query: str
+    headers: dict[str, str]
+    body: bytes
+    keep_alive: bool
+
+
+class HTTPThread(IThread):
+    """
+    Thread of a single HTTP submission.
+    Thread lives within the event loop. Messages are kept until the thread is forgotten.
+    """
+
+    __slots__ = ("thread_id", "messages", "posted", "done", "done_at", "_changed")
+
+    def __init__(self, thread_id: str, max_messages: int | None = None) -> None:
+        self.thread_id: str = thread_id
+        self.messages: deque[bytes] = deque(maxlen=max_messages)
+        self.posted: int = 0
+        self.done: bool = False
+        self.done_at: float | None = None
+        self._changed: asyncio.Event | None = None
+
+    def __str__(self) -> str:
+        return f"http:{self.thread_id}"
+
+    def _notify(self) -> None:
+        """ Wake up everyone waiting on the thread """
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    def post(self, message: bytes | Any) -> None:
+        """ Post a message. Call this within the event loop. """
+        if not isinstance(message, bytes):
+            message = str(message).encode("utf-8")
+        self.messages.append(message)
+        self.posted += 1
+        self._notify()
+
+    def finish(self) -> None:
+        """ Mark the thread as done. Call this within the event loop. """
+        self.done = True
+        self.done_at = monotonic()
+        self._notify()
+
+    async def wait(self, timeout: float) -> None:
+        """ Wait for a change in the thread """
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def follow(
+        self, idle_timeout: float, heartbeat: bool = False
+    ) -> AsyncIterator[bytes]:
+        """
+        Iterate over the messages as they are posted, until the thread is done.
+        With heartbeat, an empty message is yielded when nothing was posted within idle_timeout.
+        """
+        seen: int = 0
+        while True:
+            new: int = self.posted - seen
+            if new:
+                # Messages that fell out of the buffer are skipped
+                for message in list(self.messages)[-min(new, len(self.messages)):]:
+                    yield message
+                seen = self.posted
+                continue
+            if self.done:
+                return
+            await self.wait(idle_timeout)
+            if heartbeat and self.posted == seen and not self.done:
+                yield b""
+
+
+# pylint: disable=too-many-instance-attributes
+class HTTPInterface(AsyncInteractInterface):
+    """ HTTP/REST interface """
+
+    has_threads: bool = True
+    # Thread messages are JSON documents, a batch of them is not one
+    coalescing: bool = False
+    reconfigurable: frozenset[str] = (
+        AsyncInteractInterface.reconfigurable - {"coalesce"} | set(DEFAULT_LIMITS)
+    )
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        command_queue: Queue,
+        command_result_queue: Queue,
+        host: str = "0.0.0.0",
+        port: int = 8080,
+        keep_alive_timeout: float = DEFAULT_LIMITS["keep_alive_timeout"],
+        max_body_size: int = int(DEFAULT_LIMITS["max_body_size"]),
+        result_ttl: float = DEFAULT_LIMITS["result_ttl"],
+        max_threads: int = int(DEFAULT_LIMITS["max_threads"]),
+        **kwargs: Any,
+    ) -> None:
+        self._threads: OrderedDict[str, HTTPThread] = OrderedDict()
+        super().__init__(command_queue, command_result_queue, **kwargs)
+        self.host: str = host
+        self.port: int = port
+        self._keep_alive_timeout: float = keep_alive_timeout
+        self._max_body_size: int = max_body_size
+        self._result_ttl: float = result_ttl
+        self._max_threads: int = max_threads
+        self._cmd_map: CommandMapper = CommandMapper()
+        self._server: asyncio.AbstractServer | None = None
+        self._sweeper: asyncio.Task | None = None
+        self._connections: set[asyncio.StreamWriter] = set()
+        self._subscribers: set[HTTPThread] = set()
+
+    def reconfigure(self, **options: Any) -> bool:
+        """ Apply changed options. Limits are changed in place, they apply to new requests. """
+        if not set(options) <= self.reconfigurable:
+            return False
+        for limit, default in DEFAULT_LIMITS.items():
+            if limit in options:
+                value = options.pop(limit)
+                setattr(self, f"_{limit}", type(default)(default if value is None else value))
+        return super().reconfigure(**options)
+
+    def get_main_thread(self) -> IThread:
+        """ Get the main thread """
+        return HTTPThread("main", max_messages=100)
+
+    def spawn_thread(self) -> IThread:
+        """ Spawn a new thread """
+        thread = HTTPThread(uuid4().hex)
+        self._threads[thread.thread_id] = thread
+        while len(self._threads) > self._max_threads:
+            self._threads.popitem(last=False)
+        return thread
+
+    def _post_message(self, message: bytes, thread: IThread) -> None:
+        """ Post a message. Message is handed over to the event loop. """
+        if not self.call_soon(thread.post, message):
+            thread.post(message)
+
+    @staticmethod
+    def _result_body(result: Result) -> dict[str, Any]:
+        """ JSON representation of a result """
+        body: dict[str, Any] = {
+            "success": result.success,
+            "message": result.message,
+            "errors": [str(error) for error in result.errors],
+        }
+        if isinstance(result, PartialResult):
+            body["partial"] = True
+        elif isinstance(result, UnchangedResult):
+            body["unchanged"] = True
+        return body
+
+    def encode_result(self, cmd_id: str, result: Result) -> bytes:
+        """ Encode the result of a subscription, with the name of it's command """
+        return json.dumps(
+            {"command": command_name(cmd_id), **self._result_body(result)}
+        ).encode("utf-8")
+
+    def post_command_result(self, cmd_id: str, result: Result) -> None:
+        """ Post a command result as JSON and mark the thread as done, unless it's partial """
+        entry = self._pop_command(cmd_id, result)
+        partial = isinstance(result, PartialResult)
+        thread: HTTPThread = entry[3] if entry is not None else self.main_thread
+        self._post_message(json.dumps(self._result_body(result)).encode("utf-8"), thread)
+        if not partial and thread is not self.main_thread and not self.call_soon(thread.finish):
+            thread.finish()
+
+    async def start_serving(self) -> None:
+        """ Start the HTTP server """
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._sweeper = asyncio.create_task(self._sweep_threads())
+
+    async def stop_serving(self) -> None:
+        """ Stop the HTTP server """
+        for thread in self._subscribers:
+            thread.finish()
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _sweep_threads(self) -> None:
+        """ Forget threads that are done for longer than the result TTL """
+        while True:
+            await asyncio.sleep(min(self._result_ttl, 5.0))
+            now = monotonic()
+            expired = [
+                thread_id for thread_id, thread in self._threads.items()
+                if thread.done_at is not None and now - thread.done_at > self._result_ttl
+            ]
+            for thread_id in expired:
+                del self._threads[thread_id]
+
+    def parse_submission(self, submission: Any) -> tuple[str, dict[str, Any]]:
+        """ Command name and arguments of a submission. Raises HTTPError when it's invalid. """
+        if not isinstance(submission, dict) or not isinstance(submission.get("command"), str):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Submission should have a command")
+        args = submission.get("args", [])
+        if not isinstance(args, list):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Args should be a list")
+        cmd: str = submission["command"]
+        try:
+            _, _, parser = self._cmd_map.get_command(cmd)
+            kw_args = vars(parser.parse_args([str(arg) for arg in args]))
+        except excs.CommandNotFound as error:
+            raise HTTPError(HTTPStatus.NOT_FOUND, str(error)) from error
+        except excs.InvalidCommandArguments as error:
+            raise HTTPError(
+                HTTPStatus.BAD_REQUEST, f"Invalid arguments for command {cmd}: {error}"
+            ) from error
+        return cmd, kw_args
+
+    def submit(self, submission: Any) -> dict[str, Any]:
+        """ Schedule a single submission and return it's status """
+        return self._schedule(*self.parse_submission(submission))
+
+    def submit_all(self, submissions: list[Any]) -> list[dict[str, Any]]:
+        """
+        Schedule a list of submissions and return their statuses.
+        Every submission is parsed before any is scheduled, so an invalid one
+          fails the whole list.
+        """
+        parsed: list[tuple[str, dict[str, Any]]] = []
+        for index, submission in enumerate(submissions):
+            try:
+                parsed.append(self.parse_submission(submission))
+            except HTTPError as error:
+                raise HTTPError(error.status, f"Submission {index}: {error}") from error
+        return [self._schedule(cmd, kw_args) for cmd, kw_args in parsed]
+
+    def _schedule(self, cmd: str, kw_args: dict[str, Any]) -> dict[str, Any]:
+        """ Schedule a parsed submission on a thread of it's own """
+        thread = self.spawn_thread()
+        scheduled = self.receive_command(cmd, [], kw_args, thread, None)
+        return {"id": thread.thread_id, "status": "scheduled" if scheduled else "duplicate"}
+
+    def _get_thread(self, thread_id: str) -> HTTPThread:
+        """ Get a thread by id """
+        if thread_id not in self._threads:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Command {thread_id} not found")
+        return self._threads[thread_id]
+
+    @staticmethod
+    def _thread_status(thread: HTTPThread) -> dict[str, Any]:
+        """ JSON representation of a thread """
+        return {
+            "id": thread.thread_id,
+            "done": thread.done,
+            "results": [json.loads(message) for message in thread.messages],
+        }
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> tuple[str, str, str, dict[str, str], bytes] | None:
+        """ Read a request. Returns None when the connection should be closed """
+        try:
+            line = await asyncio.wait_for(reader.readline(), self._keep_alive_timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            return None
+        if not line.strip():
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line") from error
+        headers: dict[str, str] = {}
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            name, _, value = header.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "chunked" in headers.get("transfer-encoding", ""):
+            raise HTTPError(HTTPStatus.LENGTH_REQUIRED)
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed content length") from error
+        if length > self._max_body_size:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, version.upper(), headers, body
+
+    @staticmethod
+    def _response_head(
+        status: HTTPStatus, headers: dict[str, str], keep_alive: bool
+    ) -> bytes:
+        """ Build status line and headers """
+        headers = {
+            **headers, "Connection": "keep-alive" if keep_alive else "close"
+        }
+        head = f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        return (head + "\r\n").encode("latin-1")
+
+    async def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: HTTPStatus,
+        body: Any,
+        keep_alive: bool,
+        encodings: list[str] | None = None,
+    ) -> None:
+        """
+        Write a JSON response.
+        With the encodings the client accepts, a large payload is compressed off the event loop.
+        """
+        payload = json.dumps(body).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if encodings is not None:
+            headers["Vary"] = "Accept-Encoding"
+            policy = get_compression()
+            if len(payload) >= policy.min_size and negotiate(encodings) is not None:
+                payload, encoding = await asyncio.to_thread(policy.compress, payload, encodings)
+                if encoding is not None:
+                    headers["Content-Encoding"] = encoding
+        headers["Content-Length"] = str(len(payload))
+        writer.write(self._response_head(status, headers, keep_alive) + payload)
+        await writer.drain()
+
+    async def _stream(
+        self,
+        writer: asyncio.StreamWriter,
+        thread: HTTPThread,
+        keep_alive: bool,
+        heartbeat: bool = False,
+    ) -> None:
+        """ Stream the messages of a thread as chunked JSON lines """
+        writer.write(self._response_head(
+            HTTPStatus.OK,
+            {"Content-Type": "application/x-ndjson", "Transfer-Encoding": "chunked"},
+            keep_alive,
+        ))
+        async for message in thread.follow(self._keep_alive_timeout, heartbeat):
+            writer.write(b"%x\r\n%s\n\r\n" % (len(message) + 1, message))
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _subscribe(
+        self, writer: asyncio.StreamWriter, query: str, keep_alive: bool
+    ) -> None:
+        """ Stream the results of a subscription until the client goes away """
+        params = parse_qs(query)
+        command_id = params.get("id", [None])[0]
+        pattern = params.get("command", [None])[0]
+        if (command_id is None) == (pattern is None):
+            raise HTTPError(
+                HTTPStatus.BAD_REQUEST, "Subscribe to either a command pattern or an id"
+            )
+        thread = HTTPThread(f"subscription:{uuid4().hex}", max_messages=SUBSCRIPTION_BUFFER)
+        subscription = self.subscribe(command_id, pattern, thread)
+        self._subscribers.add(thread)
+        try:
+            await self._stream(writer, thread, keep_alive, heartbeat=True)
+        finally:
+            subscription.cancel()
+            self._subscribers.discard(thread)
+
+    async def _get_health(self, request: _Request) -> None:
+        """ Health of the interface """
+        await self._respond(request.writer, HTTPStatus.OK, {
+            "status": "ok" if self.accepting else "stopping",
+            "pending": self.pending_commands,
+        }, request.keep_alive)
+
+    async def _get_subscription(self, request: _Request) -> None:
+        """ Stream the results of the commands a client subscribes to """
+        await self._subscribe(request.writer, request.query, request.keep_alive)
+
+    async def _post_commands(self, request: _Request) -> None:
+        """ Schedule one command or a list of commands """
+        if not self.accepting:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Interface is stopping")
+        try:
+            submission = json.loads(request.body)
+        except ValueError as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body should be JSON") from error
+        if isinstance(submission, list):
+            response: Any = self.submit_all(submission)
+        else:
+            response = self.submit(submission)
+        await self._respond(request.writer, HTTPStatus.ACCEPTED, response, request.keep_alive)
+
+    async def _get_command(self, request: _Request) -> None:
+        """ Results of a command, long-polled until it's done or the wait is over """
+        thread = self._get_thread(request.parts[1])
+        try:
+            wait = min(float(parse_qs(request.query).get("wait", ["0"])[0]), MAX_WAIT)
+        except ValueError as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "wait should be a number") from error
+        deadline = monotonic() + wait
+        while not thread.done and monotonic() < deadline:
+            await thread.wait(deadline - monotonic())
+        await self._respond(
+            request.writer, HTTPStatus.OK, self._thread_status(thread), request.keep_alive,
+            parse_accept_encoding(request.headers.get("accept-encoding", "")),
+        )
+
+    async def _delete_command(self, request: _Request) -> None:
+        """ Forget a command """
+        thread = self._get_thread(request.parts[1])
+        del self._threads[thread.thread_id]
+        await self._respond(
+            request.writer, HTTPStatus.OK, {"id": thread.thread_id}, request.keep_alive
+        )
+
+    async def _get_command_stream(self, request: _Request) -> None:
+        """ Stream the results of a command until it's done """
+        await self._stream(request.writer, self._get_thread(request.parts[1]), request.keep_alive)
+
+    # Handlers by path and method, "*" stands for a command id
+    _routes: dict[tuple[str, ...], dict[str, str]] = {
+        (): {"GET": "_get_health"},
+        ("healthz",): {"GET": "_get_health"},
+        ("subscribe",): {"GET": "_get_subscription"},
+        ("commands",): {"POST": "_post_commands"},
+        ("commands", "*"): {"GET": "_get_command", "DELETE": "_delete_command"},
+        ("commands", "*", "stream"): {"GET": "_get_command_stream"},
+    }
+
+    async def _route(
+        self,
+        writer: asyncio.StreamWriter,
+        method: str,
+        target: str,
+        headers: dict[str, str],
+        body: bytes,
+        keep_alive: bool,
+    ) -> None:
+        """ Route a request to the handler of it's path and method """
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        path = tuple(parts)
+        if path[:1] == ("commands",) and len(path) > 1:
+            path = ("commands", "*", *path[2:])
+        handlers = self._routes.get(path)
+        if handlers is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND)
+        if method not in handlers:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+        await getattr(self, handlers[method])(
+            _Request(writer, parts, url.query, headers, body, keep_alive)
+        )
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """ Serve requests of a single keep-alive connection """
+        self._connections.add(writer)
+        try:
+            while True:
+                keep_alive: bool = False
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, target, version, headers, body = request
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = (
+                        connection != "close" if version == "HTTP/1.1"
+                        else connection == "keep-alive"
+                    )
+                    await self._route(writer, method, target, headers, body, keep_alive)
+                except HTTPError as error:
+                    await self._respond(
+                        writer, error.status, {"error": str(error)}, keep_alive
+                    )
+                if not keep_alive:
+                    break
+        except (
+            ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError
+        ):
+            # Broken connections and oversized request lines just close the connection
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
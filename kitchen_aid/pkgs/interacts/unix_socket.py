@@ -0,0 +1,391 @@
+#! /usr/bin/env python3
+
+"""
+Module provides a Unix domain socket interact interface with binary framing.
+
+Every frame starts with a fixed header, followed by the payload:
+    payload length - u32, big endian
+    frame type     - u8
+    request id     - u32, big endian, chosen by the client
+
+Frame types:
+    COMMAND (1) - client -> server. Payload is the command name followed by it's
+                  CLI arguments, UTF-8 encoded and separated by NUL bytes.
+    RESULT  (2) - server -> client. First payload byte holds the status flags
+                  (bit 0 - success, bit 1 - partial result, more results follow,
+                  bit 2 - message is compressed with the negotiated encoding),
+                  the rest is the result message.
+    ERROR   (3) - server -> client. Command could not be scheduled, payload is the reason.
+    MESSAGE (4) - server -> client. Message posted to the connection thread, request id is 0.
+    ACCEPT  (5) - client -> server. Encodings the client accepts, by preference, separated
+                  by commas (e.g. `zstd,gzip`). Server replies with an ACCEPT frame of the same
+                  request id, holding the chosen encoding or nothing. Results of at least
+                  the compression `min_size` are compressed from then on.
+
+Clients can pipeline any number of commands without waiting for results.
+Results are multiplexed by request id and arrive in completion order.
+Every connection is a single `IThread`.
+"""
+
+import asyncio
+import os
+import socket
+import struct
+from itertools import count
+from queue import Queue
+from collections import deque
+from typing import Any, Iterable, NamedTuple
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.command import CommandMapper, PartialResult, Result
+from kitchen_aid.models.compression import COMPRESSORS, DECOMPRESSORS, get_compression, negotiate
+from kitchen_aid.models.interact import IThread, get_cmd_id
+from kitchen_aid.pkgs.interacts.aio import AsyncInteractInterface
+
+
+HEADER: struct.Struct = struct.Struct(">IBI")
+FRAME_COMMAND: int = 1
+FRAME_RESULT: int = 2
+FRAME_ERROR: int = 3
+FRAME_MESSAGE: int = 4
+FRAME_ACCEPT: int = 5
+FLAG_SUCCESS: int = 1
+FLAG_PARTIAL: int = 2
+FLAG_COMPRESSED: int = 4
+DEFAULT_MAX_FRAME: int = 16 * 1024 * 1024
+
+
+class Frame(NamedTuple):
+    """ Decoded frame """
+    frame_type: int
+    request_id: int
+    payload: bytes
+
+
+class FrameError(excs.GenericKitchenAidError):
+    """ This error identifies a frame that violates the protocol """
+
+
+def encode_frame(frame_type: int, request_id: int, payload: bytes = b"") -> bytes:
+    """ Encode a single frame """
+    return HEADER.pack(len(payload), frame_type, request_id) + payload
+
+
+def encode_command(request_id: int, command: str, args: list[str] | None = None) -> bytes:
+    """ Encode a command frame """
+    tokens = [command, *(args or [])]
+    return encode_frame(FRAME_COMMAND, request_id, b"\0".join(t.encode("utf-8") for t in tokens))
+
+
+def decode_command(payload: bytes) -> tuple[str, list[str]]:
+    """ Decode the payload of a command frame """
+    if not payload:
+        raise FrameError("Empty command")
+    command, *args = payload.decode("utf-8").split("\0")
+    return command, args
+
+
+def encode_result(
+    request_id: int, success: bool, message: bytes, partial: bool = False, compressed: bool = False
+) -> bytes:
+    """ Encode a result frame """
+    flags = FLAG_SUCCESS if success else 0
+    if partial:
+        flags |= FLAG_PARTIAL
+    if compressed:
+        flags |= FLAG_COMPRESSED
+    return encode_frame(FRAME_RESULT, request_id, bytes((flags,)) + message)
+
+
+def decode_result(payload: bytes, encoding: str | None = None) -> tuple[bool, bytes]:
+    """ Decode the payload of a result frame, decompressing it with the negotiated encoding """
+    if not payload:
+        return False, b""
+    message = payload[1:]
+    if payload[0] & FLAG_COMPRESSED:
+        if encoding not in DECOMPRESSORS:
+            raise FrameError(f"Result is compressed, but {encoding} can't be decompressed")
+        message = DECOMPRESSORS[encoding](message)
+    return bool(payload[0] & FLAG_SUCCESS), message
+
+
+def is_partial(payload: bytes) -> bool:
+    """ Is the result frame payload a partial result """
+    return bool(payload and payload[0] & FLAG_PARTIAL)
+
+
+async def read_frame(reader: asyncio.StreamReader, max_frame: int = DEFAULT_MAX_FRAME) -> Frame:
+    """ Read a single frame from a stream """
+    length, frame_type, request_id = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if length > max_frame:
+        raise FrameError(f"Frame of {length} bytes exceeds the limit of {max_frame}")
+    payload = await reader.readexactly(length) if length else b""
+    return Frame(frame_type, request_id, payload)
+
+
+class SocketThread(IThread):
+    """
+    Thread of a single client connection.
+    Keeps the request ids waiting for each scheduled command.
+    All methods should be called within the event loop.
+    """
+
+    __slots__ = ("conn_id", "_writer", "pending", "encoding")
+
+    def __init__(self, conn_id: int, writer: asyncio.StreamWriter | None) -> None:
+        self.conn_id: int = conn_id
+        self._writer: asyncio.StreamWriter | None = writer
+        self.pending: dict[str, list[int]] = {}
+        # Encoding the client accepts for results, None until negotiated
+        self.encoding: str | None = None
+
+    def __str__(self) -> str:
+        return f"unix:{self.conn_id}"
+
+    @property
+    def closed(self) -> bool:
+        """ Is the connection closed """
+        return self._writer is None or self._writer.is_closing()
+
+    def close(self) -> None:
+        """ Close the connection and drop all pending requests """
+        self.pending.clear()
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = None
+
+    def write(self, data: bytes) -> None:
+        """ Write raw frames to the connection """
+        if not self.closed:
+            self._writer.write(data)  # type: ignore
+
+    def post(self, message: bytes | Any) -> None:
+        """ Post a message frame """
+        if not isinstance(message, bytes):
+            message = str(message).encode("utf-8")
+        self.write(encode_frame(FRAME_MESSAGE, 0, message))
+
+    # pylint: disable=too-many-arguments
+    def post_result(
+        self,
+        cmd_id: str,
+        success: bool,
+        message: bytes,
+        partial: bool = False,
+        compressed: bool = False,
+    ) -> None:
+        """ Post a result to every request waiting for the command """
+        request_ids = self.pending.get(cmd_id, []) if partial else self.pending.pop(cmd_id, [])
+        self.write(b"".join(
+            encode_result(req_id, success, message, partial, compressed)
+            for req_id in request_ids
+        ))
+
+
+class UnixSocketInterface(AsyncInteractInterface):
+    """ Unix domain socket interface """
+
+    has_threads: bool = True
+    # Messages and results are framed one by one
+    coalescing: bool = False
+    reconfigurable: frozenset[str] = AsyncInteractInterface.reconfigurable - {"coalesce"}
+
+    def __init__(
+        self,
+        command_queue: Queue,
+        command_result_queue: Queue,
+        path: str = "/tmp/kitchen-aid.sock",
+        max_frame: int = DEFAULT_MAX_FRAME,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(command_queue, command_result_queue, **kwargs)
+        self.path: str = path
+        self._max_frame: int = max_frame
+        self._cmd_map: CommandMapper = CommandMapper()
+        self._conn_ids = count(1)
+        self._server: asyncio.AbstractServer | None = None
+        self._connections: set[SocketThread] = set()
+
+    def get_main_thread(self) -> IThread:
+        """ Get the main thread. Messages without a connection are dropped. """
+        return SocketThread(0, None)
+
+    def spawn_thread(self) -> IThread:
+        """ Threads are bound to connections, there is nothing to spawn """
+        return self.main_thread
+
+    def _post_message(self, message: bytes, thread: IThread) -> None:
+        """ Post a message. Message is handed over to the event loop. """
+        self.call_soon(thread.post, message)
+
+    def post_command_result(self, cmd_id: str, result: Result) -> None:
+        """
+        Post a command result to the requests waiting for it.
+        Result is compressed here, in the emitting thread, when the connection negotiated it.
+        """
+        entry = self._pop_command(cmd_id, result)
+        if entry is None:
+            return
+        thread: SocketThread = entry[3]
+        message, encoding = result.get_byte_message(), None
+        if thread.encoding is not None:
+            message, encoding = get_compression().compress(message, (thread.encoding,))
+        self.call_soon(
+            thread.post_result,
+            cmd_id,
+            result.success,
+            message,
+            isinstance(result, PartialResult),
+            encoding is not None,
+        )
+
+    async def start_serving(self) -> None:
+        """ Start listening on the socket """
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle_connection, self.path)
+
+    async def stop_serving(self) -> None:
+        """ Stop listening and drop the connections """
+        if self._server is not None:
+            self._server.close()
+            for thread in list(self._connections):
+                thread.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    @staticmethod
+    def _negotiate(thread: SocketThread, frame: Frame) -> None:
+        """ Choose the encoding of the results and reply with it """
+        accepted = frame.payload.decode("utf-8").split(",")
+        thread.encoding = negotiate(name.strip().lower() for name in accepted)
+        thread.write(
+            encode_frame(FRAME_ACCEPT, frame.request_id, (thread.encoding or "").encode("utf-8"))
+        )
+
+    def _schedule(self, thread: SocketThread, frame: Frame) -> None:
+        """ Schedule a command frame """
+        if frame.frame_type == FRAME_ACCEPT:
+            self._negotiate(thread, frame)
+            return
+        if frame.frame_type != FRAME_COMMAND:
+            raise FrameError(f"Unexpected frame type {frame.frame_type}")
+        if not self.accepting:
+            raise FrameError("Interface is stopping")
+        cmd, args = decode_command(frame.payload)
+        _, _, parser = self._cmd_map.get_command(cmd)
+        try:
+            kw_args = vars(parser.parse_args(args))
+        except excs.InvalidCommandArguments as error:
+            raise excs.InvalidCommandArguments(
+                f"Invalid arguments for command {cmd}: {error}"
+            ) from error
+        cmd_id = get_cmd_id(cmd, [], kw_args, thread, self)
+        # Pipelined duplicates share a single execution
+        thread.pending.setdefault(cmd_id, []).append(frame.request_id)
+        self.receive_command(cmd, [], kw_args, thread, None)
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """ Serve a single connection """
+        thread = SocketThread(next(self._conn_ids), writer)
+        self._connections.add(thread)
+        try:
+            while True:
+                frame = await read_frame(reader, self._max_frame)
+                try:
+                    self._schedule(thread, frame)
+                except (excs.GenericKitchenAidError, UnicodeDecodeError) as error:
+                    thread.write(
+                        encode_frame(FRAME_ERROR, frame.request_id, str(error).encode("utf-8"))
+                    )
+                # Returns immediately unless the client doesn't keep up with the results
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, FrameError):
+            pass
+        finally:
+            self._connections.discard(thread)
+            thread.close()
+
+
+class UnixSocketClient:
+    """
+    Blocking client for the unix socket interface.
+    Meant for scripts and sidecars.
+    """
+
+    def __init__(self, path: str = "/tmp/kitchen-aid.sock", timeout: float | None = None) -> None:
+        self._sock: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(path)
+        self._request_ids = count(1)
+        self._buffer: bytearray = bytearray()
+        # Frames received while negotiating, they are returned by recv first
+        self._received: deque[Frame] = deque()
+        self.encoding: str | None = None
+
+    def close(self) -> None:
+        """ Close the connection """
+        self._sock.close()
+
+    def __enter__(self) -> "UnixSocketClient":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def send(self, command: str, args: list[str] | None = None) -> int:
+        """ Send a command and return it's request id """
+        request_id = next(self._request_ids)
+        self._sock.sendall(encode_command(request_id, command, args))
+        return request_id
+
+    def send_many(self, commands: list[tuple[str, list[str]]]) -> list[int]:
+        """ Pipeline many commands with a single write """
+        request_ids = [next(self._request_ids) for _ in commands]
+        self._sock.sendall(b"".join(
+            encode_command(req_id, cmd, args) for req_id, (cmd, args) in zip(request_ids, commands)
+        ))
+        return request_ids
+
+    def _read_exactly(self, size: int) -> bytes:
+        """ Read exactly size bytes """
+        while len(self._buffer) < size:
+            chunk = self._sock.recv(max(65536, size - len(self._buffer)))
+            if not chunk:
+                raise ConnectionError("Connection closed")
+            self._buffer.extend(chunk)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def _read_frame(self) -> Frame:
+        """ Read a single frame from the socket """
+        length, frame_type, request_id = HEADER.unpack(self._read_exactly(HEADER.size))
+        return Frame(frame_type, request_id, self._read_exactly(length))
+
+    def recv(self) -> Frame:
+        """ Receive a single frame """
+        return self._received.popleft() if self._received else self._read_frame()
+
+    def accept_encodings(self, encodings: Iterable[str] | None = None) -> str | None:
+        """
+        Ask for compressed results, by default with any encoding available.
+        Returns the encoding chosen by the server, None if results stay uncompressed.
+        """
+        request_id = next(self._request_ids)
+        accepted = ",".join(COMPRESSORS if encodings is None else encodings)
+        self._sock.sendall(encode_frame(FRAME_ACCEPT, request_id, accepted.encode("utf-8")))
+        frame = self._read_frame()
+        while frame.frame_type != FRAME_ACCEPT or frame.request_id != request_id:
+            self._received.append(frame)
+            frame = self._read_frame()
+        self.encoding = frame.payload.decode("utf-8") or None
+        return self.encoding
+
+    def decode(self, frame: Frame) -> tuple[bool, bytes]:
+        """ Decode a result frame, with the negotiated encoding """
+        return decode_result(frame.payload, self.encoding)
@@ -0,0 +1,29 @@
+#! /usr/bin/env python3
+
+""" Fixtures shared by the tests """
+
+from unittest.mock import MagicMock
+
+import pytest
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.command import CommandArgumentParser
+
+
+@pytest.fixture
+def url_command(request):
+    """
+    Command lookup for a mocked CommandMapper, also set as `get_command` of the test case.
+    Only the `get` command exists and it takes an url.
+    """
+    parser = CommandArgumentParser()
+    parser.add_argument("url")
+
+    def get_command(name):
+        if name != "get":
+            raise excs.CommandNotFound(name)
+        return MagicMock(), MagicMock(), parser
+
+    if request.instance is not None:
+        request.instance.get_command = get_command
+    return get_command
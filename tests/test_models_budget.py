@@ -0,0 +1,98 @@
+#! /usr/bin/env python3
+
+""" Tests for the memory budget module """
+
+import threading
+import time
+import unittest
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.budget import MemoryBudget, configure_budget, get_budget
+from kitchen_aid.models.command import Result
+
+
+class TestMemoryBudget(unittest.TestCase):
+    """ Tests for MemoryBudget """
+
+    def test_reserve(self):
+        """ Test bytes are accounted until the reservation is released """
+        budget = MemoryBudget(100)
+        reservation = budget.reserve()
+        reservation.grow(60)
+        reservation.grow(40)
+        self.assertEqual(budget.used, 100)
+        self.assertTrue(budget.exhausted)
+        reservation.release()
+        reservation.release()
+        self.assertEqual(budget.used, 0)
+        self.assertEqual(budget.stats()["peak"], 100)
+        self.assertEqual(budget.stats()["reservations"], 0)
+
+    def test_hard_limit(self):
+        """ Test bytes over the budget are refused and the reservation keeps it's bytes """
+        budget = MemoryBudget(100)
+        first, second = budget.reserve(), budget.reserve()
+        first.grow(70)
+        with self.assertRaises(excs.MemoryBudgetExhausted):
+            second.grow(40)
+        second.grow(30)
+        self.assertEqual((first.size, second.size, budget.used), (70, 30, 100))
+        with self.assertRaises(excs.MemoryBudgetExhausted):
+            first.grow(1)
+        self.assertEqual(budget.stats()["refused"], 2)
+        self.assertEqual(budget.stats()["peak"], 100)
+
+    def test_release_with_result(self):
+        """ Test a reservation is released when the result holding it is dropped """
+        budget = MemoryBudget(100)
+        reservation = budget.reserve()
+        reservation.grow(10)
+        result = Result(True, "x" * 10, [], reservation)
+        del reservation
+        self.assertEqual(result, Result(True, "x" * 10, []))
+        self.assertEqual(budget.used, 10)
+        del result
+        self.assertEqual(budget.used, 0)
+
+    def test_backpressure(self):
+        """ Test new reservations wait while the budget is exhausted """
+        budget = MemoryBudget(10, max_wait=5)
+        held = budget.reserve()
+        held.grow(10)
+        reserved = threading.Event()
+
+        def reserve():
+            budget.reserve()
+            reserved.set()
+
+        threading.Thread(target=reserve, daemon=True).start()
+        self.assertFalse(reserved.wait(0.05))
+        self.assertEqual(budget.stats()["waiting"], 1)
+        self.assertFalse(budget.wait_available(0.01))
+        held.release()
+        self.assertTrue(reserved.wait(5))
+        self.assertTrue(budget.wait_available(0))
+
+    def test_timeout(self):
+        """ Test a reservation fails when the budget doesn't free up in time """
+        budget = MemoryBudget(10)
+        held = budget.reserve()
+        held.grow(10)
+        started = time.monotonic()
+        with self.assertRaises(excs.MemoryBudgetExhausted):
+            budget.reserve(timeout=0.05)
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(budget.stats()["timeouts"], 1)
+        with self.subTest("raising the limit lets reservations through"):
+            budget.configure(20)
+            budget.reserve(timeout=0)
+
+    def test_configure_budget(self):
+        """ Test the process wide budget is changed in place """
+        try:
+            budget = configure_budget(100)
+            self.assertIs(configure_budget(200, 1), budget)
+            self.assertEqual(get_budget().max_bytes, 200)
+        finally:
+            configure_budget(None)
+        self.assertIsNone(get_budget())
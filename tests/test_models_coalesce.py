@@ -0,0 +1,59 @@
+#! /usr/bin/env python3
+
+""" Tests for message coalescing """
+
+import unittest
+from threading import Event
+
+from kitchen_aid.models.coalesce import FlushPolicy, MessageCoalescer
+
+
+class TestMessageCoalescer(unittest.TestCase):
+    """ Tests for MessageCoalescer """
+
+    def setUp(self):
+        self.delivered: list[tuple[bytes, str]] = []
+        self.event = Event()
+
+    def deliver(self, message: bytes, thread: str) -> None:
+        """ Record deliveries """
+        self.delivered.append((message, thread))
+        self.event.set()
+
+    def test_size_window(self):
+        """ Test flushing on message count and bytes """
+        coalescer = MessageCoalescer(self.deliver, FlushPolicy(max_messages=3, max_delay=60))
+        for msg in (b"a", b"b", b"c", b"d"):
+            coalescer.add(msg, "t1")
+        self.assertEqual(self.delivered, [(b"a\nb\nc", "t1")])
+        coalescer.policy = FlushPolicy(max_bytes=4, max_delay=60)
+        coalescer.add(b"eeee", "t1")
+        self.assertEqual(self.delivered[-1], (b"d\neeee", "t1"))
+        self.assertEqual(coalescer.buffered, 0)
+
+    def test_time_window(self):
+        """ Test that the flusher delivers after the delay """
+        coalescer = MessageCoalescer(self.deliver, FlushPolicy(max_delay=0.01))
+        coalescer.add(b"a", "t1")
+        coalescer.add(b"b", "t2")
+        coalescer.add(b"c", "t1")
+        self.assertTrue(self.event.wait(2))
+        coalescer.close()
+        self.assertEqual(sorted(self.delivered), [(b"a\nc", "t1"), (b"b", "t2")])
+        self.assertEqual(coalescer.deliveries, 2)
+        self.assertEqual(coalescer.messages, 3)
+
+    def test_close(self):
+        """ Test that closing flushes and disables buffering """
+        coalescer = MessageCoalescer(self.deliver, FlushPolicy(max_delay=60))
+        coalescer.add(b"a", "t1")
+        coalescer.close()
+        self.assertEqual(self.delivered, [(b"a", "t1")])
+        coalescer.add(b"b", "t1")
+        self.assertEqual(self.delivered[-1], (b"b", "t1"))
+
+    def test_invalid_policy(self):
+        """ Test policy validation """
+        with self.assertRaises(ValueError):
+            FlushPolicy(max_messages=0)
+        self.assertEqual(FlushPolicy(separator="|").separator, b"|")
@@ -8,13 +8,15 @@ import unittest
 from unittest.mock import MagicMock, patch
 
 from kitchen_aid.models.command import (
+    CommandArgumentParser,
     FailedOperation,
+    IrreversibleCommand,
     Result,
     CommandHandler,
     CommandMapper
 )
 
-from kitchen_aid.models.exceptions import RetriableError
+from kitchen_aid.models.exceptions import InvalidCommandArguments, RetriableError
 
 
 class TestCommandMapper(unittest.TestCase):
@@ -40,6 +42,22 @@ class TestCommandMapper(unittest.TestCase):
         )
 
 
+class TestCommandArgumentParser(unittest.TestCase):
+    """ Tests for the CommandArgumentParser class """
+
+    def test_errors(self):
+        """ Test invalid arguments raise, without printing nor exiting """
+        parser = CommandArgumentParser()
+        parser.add_argument("url")
+        parser.add_argument("-n", type=int)
+        self.assertEqual(vars(parser.parse_args(["a", "-n", "1"])), {"url": "a", "n": 1})
+        with patch("sys.stderr") as stderr:
+            for args in ([], ["a", "-n", "x"], ["a", "b"], ["-h"]):
+                with self.subTest(args), self.assertRaises(InvalidCommandArguments):
+                    parser.parse_args(args)
+        stderr.write.assert_not_called()
+
+
 class TestCommandHandler(unittest.TestCase):
     """ Tests for the CommandHandler class """
 
@@ -166,3 +184,42 @@ class TestCommandHandlerExecute(unittest.TestCase):
             ch.execute()
 
         self.assertIn("Operation failed after 3 retries", str(context.exception))
+
+
+class EchoCommand(IrreversibleCommand):
+    """ Command whose result is it's receiver """
+
+    __slots__ = ()
+
+    def execute(self) -> Result:
+        """ Return the receiver """
+        return self._receiver
+
+
+class TestIrreversibleCommand(unittest.TestCase):
+    """ Tests for the IrreversibleCommand class """
+
+    def test_undo_redo(self):
+        """ Test undo and redo fail """
+        command = EchoCommand(Result(True, "done", []))
+        self.assertFalse(command.can_undo)
+        with self.assertRaises(FailedOperation):
+            command.undo()
+        with self.assertRaises(FailedOperation):
+            command.redo()
+
+    def test_stream(self):
+        """ Test the default stream is the message of the result """
+        self.assertEqual(list(EchoCommand(Result(True, "done", [])).stream()), ["done"])
+        with self.assertRaises(FailedOperation):
+            list(EchoCommand(Result(False, "failed", [])).stream())
+
+
+class TestSlots(unittest.TestCase):
+    """ Hot path models don't carry per instance dicts """
+
+    def test_result(self):
+        """ Test that results are slotted """
+        result = Result(True, "message", [])
+        self.assertFalse(hasattr(result, "__dict__"))
+        self.assertEqual(result.get_byte_message(), b"message")
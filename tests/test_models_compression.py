@@ -0,0 +1,78 @@
+#! /usr/bin/env python3
+
+""" Tests for the compression policy """
+
+import unittest
+
+from kitchen_aid.models.compression import (
+    COMPRESSORS,
+    DECOMPRESSORS,
+    CompressionPolicy,
+    configure_compression,
+    get_compression,
+    negotiate,
+    parse_accept_encoding,
+)
+
+
+class TestEncodings(unittest.TestCase):
+    """ Tests for the encoding helpers """
+
+    def test_round_trip(self):
+        """ Test every available encoding decompresses what it compressed """
+        payload = b"payload " * 100
+        for encoding, compress in COMPRESSORS.items():
+            with self.subTest(encoding):
+                self.assertEqual(DECOMPRESSORS[encoding](compress(payload, 6)), payload)
+
+    def test_parse_accept_encoding(self):
+        """ Test q-values order the encodings and zero excludes them """
+        self.assertEqual(
+            parse_accept_encoding("deflate;q=0.5, gzip, br;q=0, identity;q=0.1"),
+            ["gzip", "deflate", "identity"],
+        )
+        self.assertEqual(parse_accept_encoding("*"), list(COMPRESSORS))
+        self.assertEqual(parse_accept_encoding(""), [])
+        self.assertEqual(parse_accept_encoding("gzip;q=x"), [])
+
+    def test_negotiate(self):
+        """ Test the first available encoding is chosen """
+        self.assertEqual(negotiate(["unknown", "deflate", "gzip"]), "deflate")
+        self.assertIsNone(negotiate(["identity"]))
+
+
+class TestCompressionPolicy(unittest.TestCase):
+    """ Tests for CompressionPolicy """
+
+    def tearDown(self):
+        configure_compression()
+
+    def test_compress(self):
+        """ Test small, incompressible and unaccepted payloads are left as they are """
+        policy = CompressionPolicy(min_size=100)
+        payload = b"a" * 1000
+        compressed, encoding = policy.compress(payload, ["gzip"])
+        self.assertEqual(encoding, "gzip")
+        self.assertEqual(DECOMPRESSORS["gzip"](compressed), payload)
+        self.assertEqual(policy.compress(b"a" * 99, ["gzip"]), (b"a" * 99, None))
+        self.assertEqual(policy.compress(payload, ["identity"]), (payload, None))
+        noise = bytes(range(256)) * 4
+        self.assertEqual(
+            CompressionPolicy(min_size=0, level=0).compress(noise, ["deflate"]), (noise, None)
+        )
+
+    def test_accept(self):
+        """ Test the accepted encodings of upstream requests """
+        self.assertEqual(CompressionPolicy().accept, tuple(COMPRESSORS))
+        self.assertEqual(CompressionPolicy(["GZIP"]).accept_encoding, "gzip")
+        self.assertEqual(CompressionPolicy([]).accept_encoding, "identity")
+        with self.assertRaises(ValueError):
+            CompressionPolicy(["lzma"])
+        with self.assertRaises(ValueError):
+            CompressionPolicy(level=10)
+
+    def test_configure(self):
+        """ Test the process wide policy is replaced """
+        policy = configure_compression(["deflate"], min_size=10, level=1)
+        self.assertIs(get_compression(), policy)
+        self.assertEqual((policy.accept, policy.min_size, policy.level), (("deflate",), 10, 1))
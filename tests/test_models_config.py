@@ -0,0 +1,147 @@
+#! /usr/bin/env python3
+
+""" Tests for the config module """
+
+import os
+import tempfile
+import unittest
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.config import (
+    ConfigWatcher, changed_sections, load_config, validate_config
+)
+
+
+class TestConfig(unittest.TestCase):
+    """ Tests for config loading and validation """
+
+    def test_validate_config(self):
+        """ Test defaults are filled in and violations are listed """
+        self.assertEqual(
+            validate_config(None),
+            {
+                "compression": {}, "engine": {}, "http": {}, "logging": {}, "memory": {},
+                "pipeline": {}, "profile": {}, "recording": {}, "reload": {}, "shutdown": {},
+                "interacts": [],
+            },
+        )
+        with self.assertRaises(excs.InvalidConfig) as error:
+            validate_config({
+                "engine": {"max_workers": 0},
+                "interacts": [{"name": "http", "start": "yes"}],
+                "unknown": 1,
+            })
+        message = str(error.exception)
+        self.assertIn("engine.max_workers", message)
+        self.assertIn("interacts.0.start", message)
+        self.assertIn("<root>", message)
+
+    def test_validate_interacts(self):
+        """ Test the options of the built-in interface types are checked """
+        validate_config({"interacts": [
+            {"name": "http", "interface_type": "http", "port": 8080, "max_body_size": 10},
+            {"name": "unix", "interface_type": "unix", "path": "/tmp/kitchen-aid.sock"},
+            {"name": "other", "interface_type": "custom", "anything": 1},
+        ]})
+        for interact, field in (
+            ({"interface_type": "http", "port": 70000}, "port"),
+            ({"interface_type": "http", "prot": 8080}, "prot"),
+            ({"interface_type": "unix", "path": ""}, "path"),
+            ({"interface_type": "unix", "port": 8080}, "port"),
+            ({"interface_type": "unix", "coalesce": {"max_messages": 2}}, "coalesce"),
+            ({"interface_type": "scheduler", "schedules": [{"name": "a", "command": "b"}]}, "0"),
+        ):
+            with self.subTest(interact), self.assertRaises(excs.InvalidConfig) as error:
+                validate_config({"interacts": [{"name": "iface", **interact}]})
+            self.assertIn("interacts.0", str(error.exception))
+            self.assertIn(field, str(error.exception))
+
+    def test_load_config(self):
+        """ Test YAML configs are loaded into plain dicts """
+        with tempfile.NamedTemporaryFile("w", suffix=".yaml") as config_file:
+            config_file.write("engine:\n  max_workers: 2\ninteracts:\n  - name: http\n")
+            config_file.flush()
+            config = load_config(config_file.name)
+        self.assertEqual(config["engine"], {"max_workers": 2})
+        self.assertIs(type(config["interacts"][0]), dict)
+        with self.assertRaises(excs.InvalidConfig):
+            load_config("/nonexistent/config.yaml")
+
+    def test_changed_sections(self):
+        """ Test only differing sections are reported """
+        old = validate_config({"engine": {"max_workers": 2}})
+        new = validate_config({"engine": {"max_workers": 2}, "http": {"hedging": {}}})
+        self.assertEqual(changed_sections(old, new), {"http"})
+        self.assertEqual(changed_sections(None, new), set(new))
+
+
+class TestConfigWatcher(unittest.TestCase):
+    """ Tests for ConfigWatcher """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.path = os.path.join(self.directory.name, "config.yaml")
+        self.write("engine:\n  max_workers: 2\n")
+        self.changes = []
+        self.watcher = ConfigWatcher(self.path, lambda old, new: self.changes.append((old, new)))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, text: str) -> None:
+        """ Write the config file, making sure it's stamp changes """
+        with open(self.path, "w", encoding="utf-8") as config_file:
+            config_file.write(text)
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_reload_on_change(self):
+        """ Test a changed file is reloaded and an unchanged one is not """
+        self.assertFalse(self.watcher.check())
+        self.write("engine:\n  max_workers: 4\n")
+        self.assertTrue(self.watcher.check())
+        old, new = self.changes[0]
+        self.assertEqual(old["engine"], {"max_workers": 2})
+        self.assertEqual(new["engine"], {"max_workers": 4})
+        self.assertEqual(self.watcher.config, new)
+        self.write("engine:\n  max_workers: 4\n")
+        self.assertFalse(self.watcher.check())
+        self.assertEqual(self.watcher.reloads, 1)
+
+    def test_invalid_config_ignored(self):
+        """ Test an invalid config keeps the current one in effect """
+        self.write("engine:\n  max_workers: -1\n")
+        self.assertFalse(self.watcher.check())
+        self.assertEqual(self.watcher.config["engine"], {"max_workers": 2})
+        self.assertEqual(self.changes, [])
+
+    def test_failed_change_kept_out(self):
+        """ Test a config that failed to apply does not replace the current one """
+        def on_change(old, new):
+            self.changes.append((old, new))
+            if len(self.changes) == 1:
+                raise RuntimeError("apply failed")
+
+        watcher = ConfigWatcher(self.path, on_change)
+        self.write("engine:\n  max_workers: 4\n")
+        with self.assertRaises(RuntimeError):
+            watcher.check()
+        self.assertEqual(watcher.config["engine"], {"max_workers": 2})
+        self.assertEqual(watcher.reloads, 0)
+        watcher.request_reload()
+        self.assertTrue(watcher.check())
+        old, new = self.changes[1]
+        self.assertEqual(old["engine"], {"max_workers": 2})
+        self.assertEqual(new["engine"], {"max_workers": 4})
+        self.assertEqual(watcher.config, new)
+
+    def test_request_reload(self):
+        """ Test a requested reload happens even when the file stamp is the same """
+        stamp = os.stat(self.path)
+        with open(self.path, "w", encoding="utf-8") as config_file:
+            config_file.write("engine:\n  max_workers: 3\n")
+        os.utime(self.path, ns=(stamp.st_atime_ns, stamp.st_mtime_ns))
+        self.assertFalse(self.watcher.check())
+        self.watcher.request_reload()
+        self.assertTrue(self.watcher.check())
+        self.assertEqual(self.watcher.config["engine"], {"max_workers": 3})
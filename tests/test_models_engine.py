@@ -0,0 +1,256 @@
+#! /usr/bin/env python3
+
+""" Tests for the engine module """
+
+import time
+import unittest
+from queue import Queue
+from threading import Event, Thread
+from unittest.mock import MagicMock, patch
+
+from kitchen_aid.models.budget import configure_budget
+from kitchen_aid.models.command import FailedOperation, PartialResult, Result
+from kitchen_aid.models.engine import SHUTDOWN_MESSAGE, CommandEngine, InteractEngine
+from kitchen_aid.models.interact import IThread, InteractInterface, InteractInterfacesRegistry
+
+
+class TestCommandEngine(unittest.TestCase):
+    """ Tests for CommandEngine """
+
+    @patch('kitchen_aid.models.engine.CommandHandler')
+    def test_run_command(self, mock_handler):
+        """ Test that run_command always returns a result """
+        with self.subTest("success"):
+            result = Result(True, "ok", [])
+            mock_handler.return_value.execute.return_value = result
+            self.assertIs(CommandEngine.run_command("test", [], {}), result)
+
+        with self.subTest("failed operation"):
+            mock_handler.return_value.execute.side_effect = FailedOperation("failed")
+            result = CommandEngine.run_command("test", [], {})
+            self.assertFalse(result.success)
+            self.assertEqual(result.message, "failed")
+
+        with self.subTest("unexpected error"):
+            error = ValueError("boom")
+            mock_handler.return_value.execute.side_effect = error
+            result = CommandEngine.run_command("test", [], {})
+            self.assertFalse(result.success)
+            self.assertEqual(result.message, "ValueError: boom")
+            self.assertEqual(result.errors, [error])
+
+        with self.subTest("handler can't be built"):
+            mock_handler.side_effect = KeyError("missing")
+            result = CommandEngine.run_command("test", [], {})
+            self.assertFalse(result.success)
+
+    @patch('kitchen_aid.models.engine.CommandHandler')
+    def test_execute_command(self, mock_handler):
+        """ Test that results are placed in the result queue """
+        mock_handler.return_value.execute.side_effect = RuntimeError("boom")
+        engine = CommandEngine(1)
+        iface = MagicMock()
+        engine._execute_command("id", "test", [], {}, iface)  # pylint: disable=protected-access
+        cmd_id, result, res_iface = engine.command_result_queue.get_nowait()
+        self.assertEqual(cmd_id, "id")
+        self.assertFalse(result.success)
+        self.assertIs(res_iface, iface)
+
+    @patch('kitchen_aid.models.engine.CommandHandler')
+    def test_partial_results(self, mock_handler):
+        """ Test that partial results are queued before the final one """
+        handler = mock_handler.return_value
+
+        def execute():
+            emitter = handler.command.set_emitter.call_args.args[0]
+            emitter(PartialResult(True, "part", []))
+            return Result(True, "done", [])
+
+        handler.execute.side_effect = execute
+        engine = CommandEngine(1)
+        engine._execute_command("id", "test", [], {}, MagicMock())  # pylint: disable=protected-access
+        _, partial, _ = engine.command_result_queue.get_nowait()
+        _, final, _ = engine.command_result_queue.get_nowait()
+        self.assertIsInstance(partial, PartialResult)
+        self.assertEqual(final, Result(True, "done", []))
+        self.assertNotIsInstance(final, PartialResult)
+
+    def test_set_max_workers(self):
+        """ Test the pool bounds are changed without losing submitted commands """
+        engine = CommandEngine(2)
+        release = Event()
+        done = Queue()
+        engine.pool.submit(lambda: done.put(release.wait(5)))
+        engine.set_max_workers(4, min_workers=2)
+        self.assertEqual(engine.pool.max_workers, 4)
+        self.assertEqual(engine.pool.size, 2)
+        release.set()
+        self.assertTrue(done.get(timeout=5))
+
+    @patch('kitchen_aid.models.engine.CommandHandler')
+    def test_shutdown(self, mock_handler):
+        """ Test commands in flight finish within the grace period """
+        mock_handler.return_value.execute.side_effect = lambda: time.sleep(0.05) or Result(
+            True, "done", []
+        )
+        engine = CommandEngine(2)
+        runner = Thread(target=engine.run, daemon=True)
+        runner.start()
+        iface = MagicMock()
+        engine.command_queue.put(("test", ["a"], {}, "thread", iface))
+        engine.command_queue.put(("test", ["b"], {}, "thread", iface))
+        started = time.monotonic()
+        self.assertEqual(engine.shutdown(5), 0)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(
+            [call.args[1] for call in iface.post_command_result.call_args_list],
+            [Result(True, "done", [])] * 2,
+        )
+        runner.join(5)
+        self.assertFalse(runner.is_alive())
+        self.assertEqual(engine.in_flight, 0)
+
+    @patch('kitchen_aid.models.engine.CommandHandler')
+    def test_dispatch(self, mock_handler):
+        """ Test queued commands go to the pool right away and fail once the shutdown started """
+        mock_handler.return_value.execute.return_value = Result(True, "done", [])
+        engine = CommandEngine(2)
+        iface = MagicMock()
+        engine.command_queue.put(("test", ["a"], {}, "thread", iface))
+        self.assertEqual(engine.command_queue.qsize(), 0)
+        cmd_id, result, _ = engine.command_result_queue.get(timeout=5)
+        self.assertEqual(result, Result(True, "done", []))
+        self.assertIn("cmd:test", cmd_id)
+        self.assertEqual(engine.shutdown(0, flush_timeout=0), 0)
+        self.assertIsNone(engine.command_result_queue.get_nowait())
+        engine.command_queue.put(("test", ["b"], {}, "thread", iface))
+        self.assertEqual(engine.command_result_queue.get_nowait()[1].message, SHUTDOWN_MESSAGE)
+        self.assertEqual(engine.in_flight, 0)
+
+    @patch('kitchen_aid.models.engine.CommandHandler')
+    def test_memory_backpressure(self, mock_handler):
+        """ Test commands are held off the caller's thread while the memory budget is exhausted """
+        mock_handler.return_value.execute.return_value = Result(True, "done", [])
+        budget = configure_budget(10)
+        self.addCleanup(configure_budget, None)
+        reservation = budget.reserve()
+        reservation.grow(10)
+        engine = CommandEngine(2)
+        Thread(target=engine.execute, daemon=True).start()
+        iface = MagicMock()
+        started = time.monotonic()
+        engine.command_queue.put(("test", ["a"], {}, "thread", iface))
+        engine.command_queue.put(("test", ["b"], {}, "thread", iface))
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertTrue(engine.command_result_queue.empty())
+        reservation.release()
+        for _ in range(2):
+            self.assertEqual(engine.command_result_queue.get(timeout=5)[1].message, "done")
+        with self.subTest("held commands fail on shutdown"):
+            reservation = budget.reserve()
+            reservation.grow(10)
+            engine.command_queue.put(("test", ["c"], {}, "thread", iface))
+            self.assertEqual(engine.shutdown(0, flush_timeout=0), 0)
+            result = engine.command_result_queue.get(timeout=5)[1]
+            self.assertEqual(result.message, SHUTDOWN_MESSAGE)
+            reservation.release()
+
+    @patch('kitchen_aid.models.engine.CommandHandler')
+    def test_shutdown_grace_exceeded(self, mock_handler):
+        """ Test commands still running after the grace period fail and are undone later """
+        release = Event()
+        handler = mock_handler.return_value
+        handler.execute.side_effect = lambda: release.wait(5) and Result(True, "late", [])
+        handler.command.can_undo = True
+        engine = CommandEngine(1)
+        Thread(target=engine.run, daemon=True).start()
+        iface = MagicMock()
+        engine.command_queue.put(("test", ["a"], {}, "thread", iface))
+        engine.command_queue.put(("test", ["b"], {}, "thread", iface))
+        self.assertEqual(engine.shutdown(0.1), 2)
+        self.assertEqual(
+            [call.args[1] for call in iface.post_command_result.call_args_list],
+            [Result(False, SHUTDOWN_MESSAGE, [])] * 2,
+        )
+        release.set()
+        deadline = time.monotonic() + 5
+        while not handler.command.undo.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+        handler.command.undo.assert_called_once()
+        self.assertEqual(iface.post_command_result.call_count, 2)
+
+
+class TestInteractEngine(unittest.TestCase):
+    """ Tests for InteractEngine """
+
+    class FakeInterface(InteractInterface):
+        """ Fake interface with a fixed option """
+
+        def __init__(self, *args, port: int = 0, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            self.port = port
+            self.stopped_calls = 0
+
+        def spawn_thread(self) -> IThread:
+            return MagicMock()
+
+        def get_main_thread(self) -> IThread:
+            return MagicMock()
+
+        def _post_message(self, message: bytes, thread: IThread) -> None:
+            pass
+
+        def listen(self) -> None:
+            pass
+
+        def stop(self) -> None:
+            self.stopped_calls += 1
+            super().stop()
+
+    def conf(self, *interacts: dict) -> dict:
+        """ Build a config with the fake interface type """
+        return {"interacts": [{"interface_type": self.FakeInterface, **conf} for conf in interacts]}
+
+    def test_reconfigure(self):
+        """ Test interacts are added, changed in place, replaced and removed """
+        engine = InteractEngine(
+            self.conf({"name": "t-a", "port": 1}, {"name": "t-b", "port": 2}), Queue(), Queue()
+        )
+        engine.gen_interacts()
+        registry = InteractInterfacesRegistry()
+        first, second = registry.get("t-a"), registry.get("t-b")
+
+        engine.reconfigure(self.conf(
+            {"name": "t-a", "port": 1, "inventory_size": 5},
+            {"name": "t-b", "port": 3},
+            {"name": "t-c"},
+        ))
+        with self.subTest("changed in place"):
+            self.assertIs(registry.get("t-a"), first)
+            inventory = first._command_inventory  # pylint: disable=protected-access
+            self.assertEqual(inventory.max_size, 5)
+        with self.subTest("replaced"):
+            self.assertIsNot(registry.get("t-b"), second)
+            self.assertEqual(registry.get("t-b").port, 3)
+            self.assertEqual(second.stopped_calls, 1)
+        with self.subTest("added"):
+            self.assertIsInstance(registry.get("t-c"), self.FakeInterface)
+
+        engine.reconfigure(self.conf({"name": "t-a", "port": 1, "inventory_size": 5}))
+        with self.subTest("removed"):
+            with self.assertRaises(KeyError):
+                registry.get("t-c")
+            self.assertEqual(first.stopped_calls, 0)
+
+    def test_drain_and_stop(self):
+        """ Test draining interacts stops them accepting commands before they are stopped """
+        engine = InteractEngine(self.conf({"name": "t-drain"}), Queue(), Queue())
+        engine.gen_interacts()
+        iface = InteractInterfacesRegistry().get("t-drain")
+        engine.drain()
+        self.assertFalse(iface.accepting)
+        self.assertFalse(iface.receive_command("test", [], {}, MagicMock()))
+        self.assertFalse(iface.stopped)
+        engine.stop(1)
+        self.assertTrue(iface.stopped)
+        self.assertTrue(engine.stopped)
@@ -0,0 +1,129 @@
+#! /usr/bin/env python3
+
+""" Tests for the executor module """
+
+import time
+import unittest
+from threading import Event
+
+from kitchen_aid.models.executor import AdaptiveThreadPoolExecutor
+
+
+class TestAdaptiveThreadPoolExecutor(unittest.TestCase):
+    """ Tests for AdaptiveThreadPoolExecutor """
+
+    def setUp(self):
+        self.release = Event()
+        # Checks are done by the tests, the controller interval is never reached
+        self.pool = AdaptiveThreadPoolExecutor(
+            1, 8, target_wait=0.01, interval=3600, shrink_after=2
+        )
+
+    def tearDown(self):
+        self.release.set()
+        self.pool.shutdown()
+
+    def wait_for(self, condition) -> None:
+        """ Wait until the condition is met """
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+    def test_results(self):
+        """ Test calls return results and exceptions through futures """
+        self.assertEqual(self.pool.submit(sum, [1, 2]).result(timeout=5), 3)
+        with self.assertRaises(ZeroDivisionError):
+            self.pool.submit(lambda: 1 / 0).result(timeout=5)
+        self.assertEqual(list(self.pool.map(abs, [-1, -2])), [1, 2])
+
+    def test_grow(self):
+        """ Test the pool grows when calls wait, up to doubling it's size """
+        futures = [self.pool.submit(self.release.wait, 5)]
+        self.wait_for(lambda: self.pool.stats()["idle"] == 0)
+        futures.extend(self.pool.submit(self.release.wait, 5) for _ in range(5))
+        time.sleep(0.02)
+        grown = self.pool.adjust()
+        self.assertGreaterEqual(grown, 1)
+        self.assertLessEqual(self.pool.size, 4)
+        for _ in range(5):
+            time.sleep(0.02)
+            self.pool.adjust()
+        self.assertEqual(self.pool.size, 6)
+        self.release.set()
+        self.assertTrue(all(future.result(timeout=5) for future in futures))
+
+    def test_max_workers(self):
+        """ Test the pool never grows over the maximum """
+        for _ in range(20):
+            self.pool.submit(self.release.wait, 5)
+        time.sleep(0.02)
+        for _ in range(10):
+            self.pool.adjust()
+        self.assertEqual(self.pool.size, 8)
+        self.wait_for(lambda: self.pool.stats()["queued"] == 12)
+
+    def test_shrink_hysteresis(self):
+        """ Test idle workers are retired only after consecutive idle checks """
+        self.pool.resize(6, 8)
+        self.assertEqual(self.pool.size, 6)
+        self.pool.resize(1, 8)
+        self.assertEqual(self.pool.adjust(), 0)
+        self.assertEqual(self.pool.adjust(), -3)
+        self.assertEqual(self.pool.adjust(), 0)
+        self.assertEqual(self.pool.adjust(), -1)
+        self.wait_for(lambda: self.pool.stats()["idle"] == 2)
+        with self.subTest("busy pool doesn't shrink"):
+            self.pool.submit(self.release.wait, 5)
+            self.pool.submit(self.release.wait, 5)
+            self.wait_for(lambda: self.pool.stats()["idle"] == 0)
+            self.assertEqual(self.pool.adjust(), 0)
+            self.assertEqual(self.pool.adjust(), 0)
+            self.assertEqual(self.pool.size, 2)
+
+    def test_resize(self):
+        """ Test the bounds are applied right away """
+        self.pool.resize(min_workers=3)
+        self.assertEqual(self.pool.size, 3)
+        self.pool.resize(0, 2)
+        self.assertEqual(self.pool.size, 2)
+        self.wait_for(lambda: self.pool.stats()["idle"] == 2)
+        with self.assertRaises(ValueError):
+            self.pool.resize(3, 2)
+
+    def test_work_stealing(self):
+        """ Test calls queued behind a busy worker are stolen by an idle one """
+        self.pool.resize(2, 8)
+        self.wait_for(lambda: self.pool.stats()["idle"] == 2)
+
+        futures = []
+
+        def spawn():
+            # Submitted by a worker, so queued behind the call it's running
+            futures.extend(self.pool.submit(int, "1") for _ in range(3))
+            return self.release.wait(5)
+
+        blocker = self.pool.submit(spawn)
+        self.wait_for(lambda: len(futures) == 3)
+        self.assertEqual([future.result(timeout=5) for future in futures], [1, 1, 1])
+        self.assertFalse(blocker.done())
+        self.assertEqual(self.pool.stats()["stolen"], 3)
+
+    def test_shutdown(self):
+        """ Test queued calls run or are cancelled on shutdown """
+        pool = AdaptiveThreadPoolExecutor(1, 1, interval=3600)
+        blocker = pool.submit(self.release.wait, 5)
+        queued = pool.submit(int, "1")
+        self.release.set()
+        pool.shutdown()
+        self.assertTrue(blocker.result())
+        self.assertEqual(queued.result(), 1)
+        with self.assertRaises(RuntimeError):
+            pool.submit(int, "1")
+        pool = AdaptiveThreadPoolExecutor(1, 1, interval=3600)
+        release = Event()
+        pool.submit(release.wait, 5)
+        queued = pool.submit(int, "1")
+        pool.shutdown(wait=False, cancel_futures=True)
+        release.set()
+        self.assertTrue(queued.cancelled())
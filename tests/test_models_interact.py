@@ -2,17 +2,24 @@
 
 """ Tests for the interact module """
 
+import io
 import unittest
-from unittest.mock import MagicMock
+from queue import Queue
+from threading import Thread
+from typing import Callable
+from unittest.mock import MagicMock, patch
 
-from kitchen_aid.models.command import Result
+import pytest
+
+from kitchen_aid.models.command import PartialResult, Result, UnchangedResult
+from kitchen_aid.models.inventory import DEFAULT_INVENTORY_SIZE
 from kitchen_aid.models.interact import (
     get_cmd_id,
     wrap_result,
     IThread,
     InteractInterface,
     # STDOutThread,
-    # ClearTextInterface,
+    ClearTextInterface,
     # InteractInterfacesRegistry
 )
 
@@ -117,4 +124,110 @@ class TestInteractInterface(unittest.TestCase):
         iface = self.FakeInteractInterface(command_queue, command_result_queue)
         self.assertEqual(iface._command_queue, command_queue)
         self.assertEqual(iface._command_result_queue, command_result_queue)
-        self.assertEqual(iface._command_inventory, {})
+        self.assertEqual(len(iface._command_inventory), 0)
+        self.assertEqual(iface.pending_commands, 0)
+
+    def test_receive_command(self):
+        """ Test duplicate suppression in receive_command """
+        command_queue = MagicMock()
+        iface = self.FakeInteractInterface(command_queue, MagicMock())
+        thread = MagicMock()
+        self.assertTrue(iface.receive_command("test", ["arg"], {}, thread))
+        self.assertFalse(iface.receive_command("test", ["arg"], {}, thread))
+        command_queue.put.assert_called_once_with(("test", ["arg"], {}, thread, iface))
+        self.assertEqual(iface.pending_commands, 1)
+
+    def test_post_command_result(self):
+        """ Test that posting a result clears the inventory """
+        iface = self.FakeInteractInterface(MagicMock(), MagicMock())
+        iface._post_message = MagicMock()
+        thread = MagicMock()
+        iface.receive_command("test", [], {"kw": "val"}, thread)
+        cmd_id = get_cmd_id("test", [], {"kw": "val"}, thread, iface)
+        iface.post_command_result(cmd_id, Result(True, "done", []))
+        iface._post_message.assert_called_once_with(
+            b"test with args ['kw: val'] succeeded with message: done", thread
+        )
+        self.assertEqual(iface.pending_commands, 0)
+        with self.subTest("Partial results keep the command in the inventory"):
+            iface.receive_command("test", [], {"kw": "val"}, thread)
+            iface.post_command_result(cmd_id, PartialResult(True, "part", []))
+            self.assertEqual(iface.pending_commands, 1)
+            iface.post_command_result(cmd_id, Result(True, "done", []))
+            self.assertEqual(iface.pending_commands, 0)
+        with self.subTest("Unchanged results are not delivered"):
+            iface.receive_command("test", [], {"kw": "val"}, thread)
+            iface._post_message.reset_mock()
+            iface.post_command_result(cmd_id, UnchangedResult(True, "unchanged", []))
+            self.assertEqual(iface.pending_commands, 0)
+            iface._post_message.assert_not_called()
+        with self.subTest("Unknown command goes to the main thread"):
+            iface.post_command_result(cmd_id, Result(False, "late", []))
+            iface._post_message.assert_called_with(
+                f"{cmd_id} failed with message: late".encode("utf-8"), iface.main_thread
+            )
+
+    def test_reconfigure(self):
+        """ Test options are changed in place """
+        iface = self.FakeInteractInterface(MagicMock(), MagicMock(), inventory_size=10)
+        self.assertFalse(iface.reconfigure(port=80))
+        self.assertTrue(iface.reconfigure(inventory_size=5, coalesce={"max_messages": 2}))
+        self.assertEqual(iface._command_inventory.max_size, 5)
+        self.assertIsNotNone(iface._coalescer)
+        self.assertTrue(iface.reconfigure(inventory_size=None, coalesce=None))
+        self.assertEqual(iface._command_inventory.max_size, DEFAULT_INVENTORY_SIZE)
+        self.assertIsNone(iface._coalescer)
+
+
+class TestClearTextInterface(unittest.TestCase):
+    """ Tests for ClearTextInterface """
+
+    # Set by the url_command fixture
+    get_command: Callable[[str], tuple]
+
+    @staticmethod
+    def fake_engine(iface: ClearTextInterface, command_queue: Queue) -> None:
+        """ Echo the url of each command back as the result """
+        while True:
+            cmd, args, kw_args, thread, _ = command_queue.get()
+            if cmd is None:
+                return
+            cmd_id = get_cmd_id(cmd, args, kw_args, thread, iface)
+            iface.post_command_result(
+                cmd_id, Result(kw_args["url"] != "bad", kw_args["url"], [])
+            )
+
+    @pytest.mark.usefixtures("url_command")
+    @patch('kitchen_aid.models.interact.CommandMapper')
+    def test_run_batch(self, mock_cmap):
+        """ Test batch mode """
+        mock_cmap.return_value.get_command.side_effect = self.get_command
+
+        command_queue: Queue = Queue()
+        iface = ClearTextInterface(command_queue, Queue())
+        engine = Thread(target=self.fake_engine, args=(iface, command_queue), daemon=True)
+        engine.start()
+        output = io.StringIO()
+        source = ["get one\n", "\n", "# comment\n", "get one\n", "nope x\n", "get bad\n"]
+        tracker = iface.run_batch(source, output, max_in_flight=1)
+        command_queue.put((None, None, None, None, None))
+        engine.join(1)
+
+        lines = sorted(output.getvalue().splitlines())
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith("[line 1] get with args ['url: one'] succeeded"))
+        self.assertTrue(lines[1].startswith("[line 4] get with args ['url: one'] succeeded"))
+        self.assertTrue(lines[2].startswith("[line 5] nope x failed"))
+        self.assertTrue(lines[3].startswith("[line 6] get with args ['url: bad'] failed"))
+        self.assertEqual(tracker.succeeded, 2)
+        self.assertEqual(tracker.failed, 2)
+        self.assertEqual(tracker.in_flight, 0)
+        self.assertEqual(iface.pending_commands, 0)
+
+    @patch('builtins.input', side_effect=EOFError)
+    def test_listen_eof(self, _):
+        """ Test that listen stops at the end of the input """
+        iface = ClearTextInterface(Queue(), Queue())
+        with patch('builtins.print'):
+            iface.listen()
+        self.assertTrue(iface.stopped)
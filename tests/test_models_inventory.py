@@ -0,0 +1,135 @@
+#! /usr/bin/env python3
+
+""" Tests for the command inventory """
+
+import unittest
+from threading import Barrier, Thread
+
+from kitchen_aid.models.inventory import CommandInventory
+
+
+class FakeClock:  # pylint: disable=too-few-public-methods
+    """ Manually advanced clock """
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestCommandInventory(unittest.TestCase):
+    """ Tests for CommandInventory """
+
+    def test_add_pop(self):
+        """ Test insert-if-absent and pop """
+        inventory = CommandInventory(10, 10)
+        self.assertTrue(inventory.add("cmd", "entry"))
+        self.assertFalse(inventory.add("cmd", "other"))
+        self.assertIn("cmd", inventory)
+        self.assertEqual(inventory.get("cmd"), "entry")
+        self.assertEqual(len(inventory), 1)
+        self.assertEqual(inventory.pop("cmd"), "entry")
+        self.assertIsNone(inventory.pop("cmd"))
+        self.assertEqual(inventory.size, 0)
+        self.assertTrue(inventory.add("cmd", "other"))
+
+    def test_ttl(self):
+        """ Test that entries expire """
+        clock = FakeClock()
+        inventory = CommandInventory(10, 5, clock=clock)
+        inventory.add("first", 1)
+        clock.now = 3
+        inventory.add("second", 2)
+        clock.now = 5
+        self.assertNotIn("first", inventory)
+        self.assertIn("second", inventory)
+        clock.now = 8
+        self.assertEqual(inventory.sweep(), 1)
+        self.assertEqual(inventory.size, 0)
+        self.assertEqual(inventory.stats["expired"], 2)
+        with self.subTest("expired command can be scheduled again"):
+            self.assertTrue(inventory.add("first", 1))
+
+    def test_size_bound(self):
+        """ Test that the oldest entries are evicted """
+        inventory = CommandInventory(2, 10)
+        inventory.add("first", 1)
+        inventory.add("second", 2)
+        inventory.add("third", 3)
+        self.assertEqual(inventory.size, 2)
+        self.assertIsNone(inventory.get("first"))
+        self.assertEqual(inventory.get("third"), 3)
+        self.assertEqual(inventory.stats["evicted"], 1)
+
+    def test_invalid_bounds(self):
+        """ Test bounds validation """
+        with self.assertRaises(ValueError):
+            CommandInventory(0, 10)
+        with self.assertRaises(ValueError):
+            CommandInventory(10, 0)
+
+    def test_configure(self):
+        """ Test bounds are changed in place """
+        inventory = CommandInventory(3, 10)
+        for cmd_id in ("first", "second", "third"):
+            inventory.add(cmd_id, 1)
+        inventory.configure(max_size=2, ttl=5)
+        self.assertEqual((inventory.size, inventory.max_size, inventory.ttl), (2, 2, 5))
+        self.assertNotIn("first", inventory)
+        with self.assertRaises(ValueError):
+            inventory.configure(max_size=0)
+
+    def test_configure_ttl(self):
+        """ Test a new TTL applies to the entries already in the inventory """
+        clock = FakeClock()
+        inventory = CommandInventory(10, 100, clock=clock)
+        inventory.add("first", 1)
+        clock.now = 10
+        inventory.configure(ttl=5)
+        inventory.add("second", 2)
+        self.assertNotIn("first", inventory)
+        clock.now = 15
+        self.assertEqual(inventory.sweep(), 1)
+        self.assertEqual(inventory.size, 0)
+        with self.subTest("longer TTL keeps the entries longer"):
+            inventory.add("third", 3)
+            inventory.configure(ttl=20)
+            clock.now = 30
+            self.assertIn("third", inventory)
+            clock.now = 35
+            self.assertNotIn("third", inventory)
+
+    def test_shards(self):
+        """ Test large inventories are striped and small ones are not """
+        self.assertEqual(CommandInventory(10, 10).shards, 1)
+        self.assertEqual(CommandInventory(200, 10, shards=16).shards, 3)
+        inventory = CommandInventory(1024, 10, shards=8)
+        self.assertEqual(inventory.shards, 8)
+        for index in range(2000):
+            inventory.add(f"cmd{index}", index)
+        self.assertLessEqual(inventory.size, 1024)
+        self.assertEqual(inventory.stats["evicted"], 2000 - inventory.size)
+        self.assertEqual(inventory.get("cmd1999"), 1999)
+        inventory.configure(max_size=256)
+        self.assertLessEqual(inventory.size, 256)
+        with self.assertRaises(ValueError):
+            CommandInventory(10, 10, shards=0)
+
+    def test_concurrent_add(self):
+        """ Test only one of the threads adding the same command succeeds """
+        inventory = CommandInventory(4096, 10)
+        barrier = Barrier(8)
+        added = []
+
+        def add() -> None:
+            barrier.wait()
+            added.extend(inventory.add(f"cmd{index}", index) for index in range(500))
+
+        threads = [Thread(target=add) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(added.count(True), 500)
+        self.assertEqual(inventory.size, 500)
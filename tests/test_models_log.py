@@ -0,0 +1,148 @@
+#! /usr/bin/env python3
+
+""" Tests for the log module """
+
+import io
+import json
+import logging
+import sys
+import threading
+import unittest
+from unittest.mock import patch
+
+from kitchen_aid.models.log import (
+    AsyncHandler,
+    DebugSampler,
+    LogWriter,
+    close_logging,
+    configure_logging,
+    console,
+    get_log_writer,
+)
+
+
+# pylint: disable=keyword-arg-before-vararg
+def record(level: int = logging.INFO, msg: str = "message", *args, **extra) -> logging.LogRecord:
+    """ Build a record, with extra fields """
+    built = logging.LogRecord("kitchen_aid.test", level, __file__, 1, msg, args, None)
+    built.__dict__.update(extra)
+    return built
+
+
+class TestLogWriter(unittest.TestCase):
+    """ Tests for LogWriter """
+
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.output = io.StringIO()
+        self.writer = LogWriter(self.stream, self.output, batch_size=2, max_queue=3)
+
+    def test_json_lines(self):
+        """ Test records are written as JSON lines with their extra fields """
+        self.writer.enqueue(record(logging.WARNING, "took %ss", 3, command="get-page"))
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            failed = record(logging.ERROR, "failed")
+            failed.exc_info = sys.exc_info()
+        self.writer.enqueue(failed)
+        self.assertEqual(self.writer.flush(), 2)
+        first, second = map(json.loads, self.stream.getvalue().splitlines())
+        self.assertEqual(first["message"], "took 3s")
+        self.assertEqual(first["level"], "WARNING")
+        self.assertEqual(first["command"], "get-page")
+        self.assertIn("ValueError: bad", second["exception"])
+
+    def test_batches(self):
+        """ Test everything queued is written at once, console lines to the output """
+        self.writer.enqueue(record())
+        self.writer.write("result")
+        self.writer.enqueue(record())
+        self.writer.flush()
+        self.assertEqual(self.output.getvalue(), "result\n")
+        self.assertEqual(len(self.stream.getvalue().splitlines()), 2)
+        self.assertEqual(self.writer.stats(), {
+            "queued": 0, "written": 3, "dropped": 0, "batches": 1,
+        })
+
+    def test_drop(self):
+        """ Test records over the queue size are dropped, console lines never are """
+        self.assertEqual([self.writer.enqueue(record()) for _ in range(4)], [True] * 3 + [False])
+        self.writer.write("result")
+        self.assertEqual(self.writer.flush(), 4)
+        self.assertEqual(self.writer.dropped, 1)
+
+    def test_thread(self):
+        """ Test the writer thread writes the queue and flushes it on stop """
+        writer = LogWriter(self.stream, self.output, flush_interval=3600)
+        writer.start()
+        handler = AsyncHandler(writer)
+        for index in range(5):
+            handler.handle(record(logging.INFO, "record %s", index))
+        writer.stop()
+        lines = self.stream.getvalue().splitlines()
+        self.assertEqual([json.loads(line)["message"] for line in lines], [
+            f"record {index}" for index in range(5)
+        ])
+
+
+class TestDebugSampler(unittest.TestCase):
+    """ Tests for DebugSampler """
+
+    def test_rate(self):
+        """ Test debug records are rate limited, other levels pass """
+        now = [0.0]
+        sampler = DebugSampler(rate=2, clock=lambda: now[0])
+        debug = record(logging.DEBUG)
+        self.assertEqual([sampler.filter(debug) for _ in range(3)], [True, True, False])
+        self.assertTrue(sampler.filter(record(logging.INFO)))
+        now[0] = 0.5
+        self.assertEqual([sampler.filter(debug) for _ in range(2)], [True, False])
+        self.assertEqual(sampler.limited, 2)
+
+    def test_sample(self):
+        """ Test a fraction of the debug records is kept """
+        values = iter([0.1, 0.9, 0.2, 0.6])
+        sampler = DebugSampler(sample=0.5, rate=None, rand=lambda: next(values))
+        self.assertEqual(
+            [sampler.filter(record(logging.DEBUG)) for _ in range(4)], [True, False, True, False]
+        )
+        self.assertEqual(sampler.sampled_out, 2)
+        with self.assertRaises(ValueError):
+            DebugSampler(sample=2)
+
+
+class TestConfigureLogging(unittest.TestCase):
+    """ Tests for the process wide logging """
+
+    def tearDown(self):
+        close_logging()
+
+    def test_configure(self):
+        """ Test loggers and uncaught thread exceptions are written by the writer """
+        output = io.StringIO()
+        excepthook = threading.excepthook
+        with patch("sys.stdout", output):
+            configure_logging("INFO", debug_rate=1)
+            logger = logging.getLogger("kitchen_aid.tests")
+            logger.debug("hidden")
+            logger.info("shown", extra={"field": 1})
+            console("result")
+            thread = threading.Thread(target=lambda: 1 / 0, name="failing")
+            thread.start()
+            thread.join()
+            close_logging()
+        lines = output.getvalue().splitlines()
+        self.assertEqual(json.loads(lines[0])["field"], 1)
+        self.assertEqual(lines[1], "result")
+        failure = json.loads(lines[2])
+        self.assertEqual(failure["message"], "Uncaught exception in thread failing")
+        self.assertIn("ZeroDivisionError", failure["exception"])
+        self.assertIsNone(get_log_writer())
+        self.assertIs(threading.excepthook, excepthook)
+
+    def test_console_fallback(self):
+        """ Test console lines are printed without a writer """
+        with patch("builtins.print") as mock_print:
+            console("result")
+        mock_print.assert_called_once_with("result")
@@ -0,0 +1,28 @@
+#! /usr/bin/env python3
+
+""" Tests for the paths module """
+
+import os
+import tempfile
+import unittest
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.paths import resolve_under
+
+
+class TestResolveUnder(unittest.TestCase):
+    """ Tests for resolve_under """
+
+    def test_resolve_under(self):
+        """ Test names are confined to the directory """
+        with tempfile.TemporaryDirectory() as directory:
+            root = os.path.realpath(directory)
+            self.assertEqual(
+                resolve_under(directory, "a/b.txt", "output"), os.path.join(root, "a", "b.txt")
+            )
+            os.symlink("/etc", os.path.join(directory, "link"))
+            for name in ("", "/etc/passwd", "../x", "a/../../x", "link/passwd"):
+                with self.subTest(name), self.assertRaises(excs.InvalidCommandArguments):
+                    resolve_under(directory, name, "output")
+        with self.assertRaises(excs.InvalidCommandArguments):
+            resolve_under(None, "a", "output")
@@ -0,0 +1,198 @@
+#! /usr/bin/env python3
+
+""" Tests for the pipeline module """
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+from typing import Iterator
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.command import (
+    Command,
+    CommandArgumentParser,
+    CommandMapper,
+    PartialResult,
+    Result,
+)
+from kitchen_aid.models.pipeline import Pipeline, PipelineFile, Stage, configure_pipelines
+
+
+UNDONE: list[str] = []
+
+
+class Text:  # pylint: disable=too-few-public-methods
+    """ Receiver of test commands """
+
+    def __init__(self, text: str = "", source: str | Iterator[str] | None = None) -> None:
+        self.text = text
+        self.source = source
+
+
+class Upper(Command):  # pylint: disable=abstract-method
+    """ Upper cases it's text and source """
+
+    can_undo = True
+
+    def execute(self) -> Result:
+        source = self._receiver.source
+        if source is not None and not isinstance(source, str):
+            source = f"stream:{''.join(source)}"
+        return Result(True, (self._receiver.text + (source or "")).upper(), [])
+
+    def undo(self) -> Result:
+        UNDONE.append(self._receiver.text)
+        return Result(True, "undone", [])
+
+
+class Fail(Command):  # pylint: disable=abstract-method
+    """ Always fails """
+
+    def execute(self) -> Result:
+        return Result(False, "failed", [])
+
+
+class Chunks(Upper):  # pylint: disable=abstract-method
+    """ Streams it's text character by character """
+
+    can_stream = True
+
+    def stream(self) -> Iterator[str]:
+        yield from self._receiver.text
+
+
+class Join(Upper):  # pylint: disable=abstract-method
+    """ Accepts a stream """
+
+    accepts_stream = True
+
+
+class Wait(Command):  # pylint: disable=abstract-method
+    """ Waits for a barrier, so it succeeds only when executed in parallel """
+
+    barrier = threading.Barrier(2, timeout=5)
+
+    def execute(self) -> Result:
+        self.barrier.wait()
+        return Result(True, self._receiver.text, [])
+
+
+def register() -> None:
+    """ Register the test commands """
+    parser = CommandArgumentParser()
+    parser.add_argument("text")
+    for name, command in (
+        ("t-upper", Upper), ("t-fail", Fail), ("t-chunks", Chunks),
+        ("t-join", Join), ("t-wait", Wait),
+    ):
+        CommandMapper().register(command, Text, name, parser)
+
+
+class TestPipeline(unittest.TestCase):
+    """ Tests for Pipeline """
+
+    def setUp(self):
+        register()
+        UNDONE.clear()
+
+    def test_validation(self):
+        """ Test invalid pipelines are rejected """
+        with self.subTest("cycle"):
+            with self.assertRaises(excs.InvalidPipeline):
+                Pipeline([
+                    Stage("a", "t-upper", depends_on=["b"]),
+                    Stage("b", "t-upper", depends_on=["a"]),
+                ])
+        with self.subTest("unknown dependency"):
+            with self.assertRaises(excs.InvalidPipeline):
+                Pipeline([Stage("a", "t-upper", depends_on=["c"])])
+        with self.subTest("duplicate"):
+            with self.assertRaises(excs.InvalidPipeline):
+                Pipeline([Stage("a", "t-upper"), Stage("a", "t-upper")])
+        with self.subTest("unknown field"):
+            with self.assertRaises(excs.InvalidPipeline):
+                Pipeline.from_spec({"stages": [{"name": "a", "command": "t-upper", "x": 1}]})
+
+    def test_order(self):
+        """ Test stages are ordered by their dependencies """
+        pipeline = Pipeline([
+            Stage("c", "t-upper", depends_on=["a", "b"]),
+            Stage("b", "t-upper", depends_on=["a"]),
+            Stage("a", "t-upper"),
+        ])
+        self.assertEqual(pipeline.stages, ["a", "b", "c"])
+
+    def test_run(self):
+        """ Test outputs are passed to the dependent stages """
+        emitted: list[Result] = []
+        pipeline = Pipeline([
+            Stage("fetch", "t-upper", args=["a"]),
+            Stage("left", "t-upper", kwargs={"text": "b-"}, depends_on=["fetch"], input="source"),
+            Stage("right", "t-upper", kwargs={"text": "c-"}, depends_on=["fetch"], input="source"),
+            Stage("merge", "t-upper", depends_on=["left", "right"], input="source"),
+        ])
+        result = pipeline.run(emitted.append)
+        self.assertEqual(result, Result(True, "B-A\nC-A", []))
+        self.assertTrue(all(isinstance(partial, PartialResult) for partial in emitted))
+        self.assertEqual(len(emitted), 4)
+
+    def test_parallel(self):
+        """ Test independent stages run in parallel """
+        stages = [Stage("a", "t-wait", args=["a"]), Stage("b", "t-wait", args=["b"])]
+        result = Pipeline(stages).run()
+        self.assertEqual(result, Result(True, "a: a\nb: b", []))
+
+    def test_stream(self):
+        """ Test streaming stages pass chunks to the next stage """
+        result = Pipeline([
+            Stage("chunks", "t-chunks", args=["abc"]),
+            Stage("join", "t-join", depends_on=["chunks"], input="source"),
+        ]).run()
+        self.assertEqual(result, Result(True, "STREAM:ABC", []))
+
+    def test_no_stream(self):
+        """ Test output is materialized for consumers that don't accept streams """
+        result = Pipeline([
+            Stage("chunks", "t-chunks", args=["abc"]),
+            Stage("upper", "t-upper", depends_on=["chunks"], input="source"),
+        ]).run()
+        self.assertEqual(result, Result(True, "ABC", []))
+
+    def test_failure(self):
+        """ Test completed stages are undone in reverse order when a stage fails """
+        result = Pipeline([
+            Stage("first", "t-upper", args=["first"]),
+            Stage("second", "t-upper", args=["second"], depends_on=["first"]),
+            Stage("fail", "t-fail", args=["x"], depends_on=["second"]),
+            Stage("never", "t-upper", args=["never"], depends_on=["fail"]),
+        ]).run()
+        self.assertFalse(result.success)
+        self.assertEqual(result.message, "Stage fail failed: failed")
+        self.assertEqual(UNDONE, ["second", "first"])
+
+    def test_unknown_command(self):
+        """ Test pipelines with unknown commands don't start """
+        with self.assertRaises(excs.CommandNotFound):
+            Pipeline([Stage("a", "t-missing")]).run()
+
+    def test_pipeline_file(self):
+        """ Test pipelines are loaded from files of the pipeline directory """
+        spec = {"max_workers": 2, "stages": [{"name": "a", "command": "t-upper", "args": ["x"]}]}
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "a.json"), "w", encoding="utf-8") as spec_file:
+                json.dump(spec, spec_file)
+            with open(os.path.join(directory, "b.yaml"), "w", encoding="utf-8") as spec_file:
+                spec_file.write("stages:\n  - name: a\n    command: t-upper\n    args: [y]\n")
+            with self.subTest("no pipeline directory"), self.assertRaises(
+                excs.InvalidCommandArguments
+            ):
+                PipelineFile("a.json").load()
+            configure_pipelines(directory)
+            self.addCleanup(configure_pipelines, None)
+            self.assertEqual(PipelineFile("a.json").load().run(), Result(True, "X", []))
+            self.assertEqual(PipelineFile("b.yaml", 1).load().run(), Result(True, "Y", []))
+            for spec_name in (os.path.join(directory, "a.json"), "../a.json", "a/../../a.json"):
+                with self.subTest(spec_name), self.assertRaises(excs.InvalidCommandArguments):
+                    PipelineFile(spec_name).load()
@@ -0,0 +1,78 @@
+#! /usr/bin/env python3
+
+""" Tests for the profiler module """
+
+import os
+import tempfile
+import unittest
+from threading import Event, Thread
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models import profiler
+from kitchen_aid.models.profiler import ProfileRequest, StackSampler
+
+
+def busy_wait(stop: Event) -> None:
+    """ Function the sampled thread spends it's time in """
+    while not stop.wait(0.001):
+        pass
+
+
+class TestProfiler(unittest.TestCase):
+    """ Tests for StackSampler and ProfileRequest """
+
+    def setUp(self):
+        self.stop = Event()
+        self.thread = Thread(target=busy_wait, args=(self.stop,), name="profiled_thread")
+        self.thread.start()
+
+    def tearDown(self):
+        self.stop.set()
+        self.thread.join()
+
+    def test_sample(self):
+        """ Test stacks of the selected threads are counted from the outermost frame """
+        profile = StackSampler(0.001, threads="profiled_*").sample(0.05)
+        self.assertGreater(profile.samples, 1)
+        self.assertEqual(set(profile.threads()), {"profiled_thread"})
+        line = profile.collapsed().splitlines()[0]
+        stack, count = line.rsplit(" ", 1)
+        frames = stack.split(";")
+        self.assertEqual(frames[0], "profiled_thread")
+        self.assertTrue(frames[1].startswith("Thread._bootstrap "))
+        self.assertIn("busy_wait (test_models_profiler.py:", stack)
+        self.assertGreater(int(count), 0)
+        summary = profile.summary(top=2)
+        self.assertIn("profiled_thread:", summary)
+        self.assertLessEqual(len(summary.splitlines()), 4)
+
+    def test_own_thread_skipped(self):
+        """ Test the sampler doesn't sample itself """
+        profile = StackSampler(0.001).sample(0.01)
+        self.assertIn("profiled_thread", profile.threads())
+        self.assertNotIn("MainThread", profile.threads())
+
+    def test_request(self):
+        """ Test bounds, exclusive runs and the output file """
+        for request in (ProfileRequest(duration=0), ProfileRequest(duration=1e6),
+                        ProfileRequest(interval=0)):
+            with self.assertRaises(excs.InvalidCommandArguments):
+                request.run()
+        with profiler._running:  # pylint: disable=protected-access
+            with self.assertRaises(excs.GenericCommandError):
+                ProfileRequest(duration=0.01).run()
+        with tempfile.TemporaryDirectory() as directory:
+            with self.subTest("no profile directory"), self.assertRaises(
+                excs.InvalidCommandArguments
+            ):
+                ProfileRequest(0.01, 0.001, output="out").run()
+            profiler.configure_profiles(directory)
+            self.addCleanup(profiler.configure_profiles, None)
+            for output in (os.path.join(directory, "out"), "../out", "a/../../out"):
+                with self.subTest(output), self.assertRaises(excs.InvalidCommandArguments):
+                    ProfileRequest(0.01, 0.001, output=output).run()
+            request = ProfileRequest(0.01, 0.001, output="out")
+            profile = request.run()
+            request.write(profile)
+            with open(os.path.join(directory, "out"), encoding="utf-8") as output:
+                self.assertEqual(output.read(), profile.collapsed() + "\n")
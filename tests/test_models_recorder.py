@@ -0,0 +1,73 @@
+#! /usr/bin/env python3
+
+""" Tests for the recorder module """
+
+import json
+import os
+import tempfile
+import unittest
+from queue import Queue
+from unittest.mock import MagicMock
+
+from kitchen_aid.models.command import PartialResult, Result
+from kitchen_aid.models.interact import IThread, InteractInterface
+from kitchen_aid.models.recorder import (
+    RECORDING_VERSION, TrafficRecorder, configure_recorder, get_recorder, open_recording
+)
+
+
+class TestTrafficRecorder(unittest.TestCase):
+    """ Tests for TrafficRecorder """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+
+    def tearDown(self):
+        configure_recorder(None)
+        self.directory.cleanup()
+
+    def read(self, path: str) -> list:
+        """ Read the events of a recording """
+        with open_recording(path, "r") as recording:
+            return [json.loads(line) for line in recording]
+
+    def test_events(self):
+        """ Test commands and their results are written with a shared sequence number """
+        for name in ("traffic.jsonl", "traffic.jsonl.gz"):
+            with self.subTest(name):
+                path = os.path.join(self.directory.name, name)
+                recorder = TrafficRecorder(path)
+                recorder.command("id", "get-page", [], {"url": "http://test"})
+                recorder.result("id", PartialResult(True, "part", []))
+                recorder.result("id", Result(True, "done!", []))
+                recorder.result("id", Result(True, "late", []))
+                recorder.result("unknown", Result(True, "skipped", []))
+                recorder.close()
+                header, command, partial, final = self.read(path)
+                self.assertEqual(header["version"], RECORDING_VERSION)
+                self.assertEqual(command[0], "c")
+                self.assertEqual(command[2:], [1, "get-page", [], {"url": "http://test"}])
+                self.assertEqual(partial[2:], [1, True, 4, True])
+                self.assertEqual(final[2:], [1, True, 5, False])
+                self.assertGreaterEqual(final[1], command[1])
+
+    def test_receive_command_recorded(self):
+        """ Test interfaces record the commands they schedule """
+
+        class FakeInterface(InteractInterface):  # pylint: disable=abstract-method
+            """ Fake interface """
+
+            def get_main_thread(self) -> IThread:
+                return MagicMock()
+
+        path = os.path.join(self.directory.name, "traffic.jsonl")
+        recorder = configure_recorder(path)
+        self.assertIs(get_recorder(), recorder)
+        self.assertIs(configure_recorder(path), recorder)
+        iface = FakeInterface(Queue(), Queue())
+        self.assertTrue(iface.receive_command("test", ["a"], {"k": 1}))
+        self.assertFalse(iface.receive_command("test", ["a"], {"k": 1}))
+        configure_recorder(None)
+        self.assertIsNone(get_recorder())
+        _, command = self.read(path)
+        self.assertEqual(command[3:], ["test", ["a"], {"k": 1}])
@@ -0,0 +1,92 @@
+#! /usr/bin/env python3
+
+""" Tests for the replay module """
+
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.command import Result
+from kitchen_aid.models.recorder import TrafficRecorder
+from kitchen_aid.models.replay import Recording, Replayer, RunStats
+
+
+class TestReplay(unittest.TestCase):
+    """ Tests for Recording and Replayer """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.path = os.path.join(self.directory.name, "traffic.jsonl")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def record(self, count: int, interval: float) -> None:
+        """ Record commands arriving every interval, each taking the interval """
+        recorder = TrafficRecorder(self.path)
+        for index in range(count):
+            recorder.command(f"id{index}", "test", [], {"index": index, "hedge": True})
+            time.sleep(interval)
+            recorder.result(f"id{index}", Result(index % 2 == 0, "x" * index, []))
+        recorder.close()
+
+    def test_load(self):
+        """ Test commands are paired with their final results """
+        self.record(3, 0.01)
+        with open(self.path, "a", encoding="utf-8") as recording:
+            recording.write('["c",1.0,4,"test",[],{}]\n["r",1.')
+        recording = Recording.load(self.path)
+        self.assertEqual([cmd.seq for cmd in recording.commands], [1, 2, 3, 4])
+        self.assertEqual(recording.commands[2].size, 2)
+        self.assertFalse(recording.commands[1].success)
+        self.assertIsNone(recording.commands[3].latency)
+        self.assertGreaterEqual(recording.commands[0].latency, 0.01)
+        stats = recording.stats()
+        self.assertEqual((stats.commands, stats.completed, stats.failed), (4, 3, 1))
+
+    def test_invalid_recording(self):
+        """ Test recordings that can't be replayed are rejected """
+        for content in ("", "{}\n", '{"version":1}\n["x"]\n["c"]\n'):
+            with self.subTest(content=content):
+                with open(self.path, "w", encoding="utf-8") as recording:
+                    recording.write(content)
+                with self.assertRaises(excs.InvalidRecording):
+                    Recording.load(self.path)
+        with self.assertRaises(excs.InvalidRecording):
+            Recording.load(os.path.join(self.directory.name, "missing.jsonl"))
+
+    @patch("kitchen_aid.models.engine.CommandHandler")
+    def test_replay(self, mock_handler):
+        """ Test arrivals are time compressed and overrides are applied """
+        self.record(10, 0.02)
+        calls = []
+
+        def handler(**handler_kwargs):
+            calls.append(handler_kwargs["kwargs"])
+            time.sleep(0.01)
+            return mock_handler.return_value
+
+        mock_handler.side_effect = handler
+        mock_handler.return_value.execute.return_value = Result(True, "ok", [])
+        report = Replayer(
+            Recording.load(self.path), speed=4, overrides={"hedge": False, "missing": 1}
+        ).run(timeout=5)
+        self.assertEqual(report.replay.completed, 10)
+        self.assertEqual(report.replay.failed, 0)
+        self.assertLess(report.replay.duration, report.original.duration)
+        self.assertEqual(calls[0], {"index": 0, "hedge": False})
+        self.assertIn("Replay at 4x", report.format())
+        self.assertIn("latency p95 (ms)", report.format())
+
+    def test_run_stats(self):
+        """ Test throughput and percentiles """
+        stats = RunStats(4, 1, 2.0, [0.4, 0.1, 0.3, 0.2])
+        self.assertEqual(stats.throughput, 2.0)
+        self.assertEqual(stats.percentile(0.5), 0.3)
+        self.assertEqual(stats.percentile(0.99), 0.4)
+        self.assertEqual(RunStats(0, 0, 0.0).percentile(0.5), 0.0)
+        with self.assertRaises(ValueError):
+            Replayer(Recording([]), speed=0)
@@ -0,0 +1,166 @@
+#! /usr/bin/env python3
+
+""" Tests for the scheduler module """
+
+import math
+import unittest
+from datetime import datetime
+from queue import Queue
+from unittest.mock import patch
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.command import Command, CommandArgumentParser, CommandMapper, Result
+from kitchen_aid.models.scheduler import (
+    CronSchedule, IntervalSchedule, ScheduleRequest, Scheduler, TimerWheel
+)
+
+
+class Noop(Command):  # pylint: disable=abstract-method
+    """ Command that does nothing """
+
+    def execute(self) -> Result:
+        return Result(True, "", [])
+
+
+class Receiver:  # pylint: disable=too-few-public-methods
+    """ Receiver of the test command """
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+
+
+class TestTimerWheel(unittest.TestCase):
+    """ Tests for TimerWheel """
+
+    def test_expiry(self):
+        """ Test timers expire on their tick, across all levels """
+        wheel = TimerWheel(tick=1.0, slots=4, levels=3, start=0)
+        deadlines = [0.5, 1, 3, 4, 5, 15, 16, 17, 63, 64, 65, 200, 1000]
+        for deadline in deadlines:
+            wheel.add(deadline, deadline)
+        self.assertEqual(len(wheel), len(deadlines))
+        expired: dict[float, int] = {}
+        for now in range(1, 1001):
+            for item in wheel.advance(now):
+                expired[item] = now
+        # Timers expire on the first tick at or after their deadline
+        self.assertEqual(expired, {deadline: max(math.ceil(deadline), 1) for deadline in deadlines})
+        self.assertEqual(len(wheel), 0)
+
+    def test_cancel(self):
+        """ Test cancelled timers don't expire """
+        wheel = TimerWheel(tick=1.0, slots=4, levels=2, start=0)
+        timer = wheel.add(10, "cancelled")
+        wheel.add(10, "kept")
+        wheel.cancel(timer)
+        self.assertEqual(len(wheel), 1)
+        self.assertEqual(wheel.advance(20), ["kept"])
+
+    def test_jump(self):
+        """ Test advancing over many ticks at once """
+        wheel = TimerWheel(tick=0.1, slots=8, levels=2, start=0)
+        for deadline in range(1, 100):
+            wheel.add(deadline / 10, deadline)
+        self.assertEqual(sorted(wheel.advance(5)), list(range(1, 51)))
+        self.assertEqual(sorted(wheel.advance(10)), list(range(51, 100)))
+
+
+class TestSchedules(unittest.TestCase):
+    """ Tests for interval and cron schedules """
+
+    def test_interval(self):
+        """ Test interval runs stay on their anchor """
+        schedule = IntervalSchedule(10, anchor=100)
+        self.assertEqual(schedule.next_after(100), 110)
+        self.assertEqual(schedule.next_after(115), 120)
+        self.assertEqual(schedule.next_after(50), 110)
+
+    def test_cron(self):
+        """ Test next cron runs """
+        start = datetime(2024, 1, 1, 10, 7).timestamp()  # Monday
+        cases = {
+            "*/15 * * * *": datetime(2024, 1, 1, 10, 15),
+            "0 9-17 * * *": datetime(2024, 1, 1, 11, 0),
+            "30 8 * * 0": datetime(2024, 1, 7, 8, 30),
+            "0 0 1,15 * *": datetime(2024, 1, 15, 0, 0),
+            "0 0 29 2 *": datetime(2024, 2, 29, 0, 0),
+            "0 0 13 * 5": datetime(2024, 1, 5, 0, 0),  # Friday or the 13th
+            "@hourly": datetime(2024, 1, 1, 11, 0),
+        }
+        for expr, expected in cases.items():
+            with self.subTest(expr):
+                self.assertEqual(CronSchedule(expr).next_after(start), expected.timestamp())
+
+    def test_invalid_cron(self):
+        """ Test invalid cron expressions """
+        for expr in ("* * * *", "60 * * * *", "a * * * *"):
+            with self.subTest(expr):
+                with self.assertRaises(ValueError):
+                    CronSchedule(expr)
+        with self.assertRaises(ValueError):
+            CronSchedule("0 0 31 2 *").next_after(0)
+
+
+class TestScheduler(unittest.TestCase):
+    """ Tests for Scheduler """
+
+    def setUp(self):
+        parser = CommandArgumentParser()
+        parser.add_argument("url")
+        CommandMapper().register(Noop, Receiver, "t-noop", parser)
+        self.queue: Queue = Queue()
+        self.scheduler = Scheduler(self.queue, Queue(), tick=0.5)
+
+    def test_add(self):
+        """ Test schedules are validated and replaced by name """
+        scheduled = self.scheduler.add("a", "t-noop", ["http://a"], every=10, jitter=0)
+        self.assertEqual(scheduled.kw_args, {"url": "http://a"})
+        self.scheduler.add("a", "t-noop", ["http://b"], every=10)
+        self.assertEqual(len(self.scheduler.schedules), 1)
+        with self.assertRaises(excs.GenericCommandError):
+            self.scheduler.add("b", "t-noop", ["http://a"])
+        with self.assertRaises(excs.InvalidCommandArguments):
+            self.scheduler.add("b", "t-noop", [], every=10)
+        with self.assertRaises(excs.CommandNotFound):
+            self.scheduler.add("b", "t-missing", [], every=10)
+        self.assertTrue(self.scheduler.remove("a"))
+        self.assertFalse(self.scheduler.remove("a"))
+
+    def test_tick(self):
+        """ Test runs are submitted and skipped while the previous one is executing """
+        scheduled = self.scheduler.add("a", "t-noop", ["http://a"], every=10, jitter=0)
+        first = scheduled.next_run
+        self.assertEqual(self.scheduler.tick(first - 1), 0)
+        self.assertEqual(self.scheduler.tick(first + 0.5), 1)
+        cmd, _, kw_args, thread, _ = self.queue.get_nowait()
+        self.assertEqual((cmd, kw_args, str(thread)), ("t-noop", {"url": "http://a"}, "schedule:a"))
+        self.assertAlmostEqual(scheduled.next_run, first + 10)
+        # Previous run didn't post it's result yet
+        self.assertEqual(self.scheduler.tick(first + 10.5), 1)
+        self.assertEqual((scheduled.runs, scheduled.skipped), (1, 1))
+        self.assertTrue(self.queue.empty())
+
+    def test_jitter(self):
+        """ Test runs are jittered within 10% of the period by default """
+        offsets = set()
+        for _ in range(20):
+            scheduled = self.scheduler.add("a", "t-noop", ["http://a"], every=100)
+            # Anchor is the time the schedule was added, so the first nominal run is a period away
+            nominal = scheduled.schedule.next_after(scheduled.next_run - 100)
+            offsets.add(scheduled.next_run - nominal)
+        self.assertTrue(all(0 <= offset <= 10 for offset in offsets))
+        self.assertGreater(len(offsets), 1)
+
+    @patch("kitchen_aid.models.scheduler.InteractInterfacesRegistry")
+    def test_schedule_request(self, registry):
+        """ Test the receiver of the schedule command """
+        registry.return_value.get.return_value = self.scheduler
+        ScheduleRequest("add", "a", every=60, target=["t-noop", "http://a"]).apply()
+        self.assertIn("a: t-noop every 60", ScheduleRequest("list").apply())
+        self.assertEqual(ScheduleRequest("remove", "a").apply(), "Schedule a removed")
+        self.assertEqual(ScheduleRequest("list").apply(), "No schedules")
+        with self.assertRaises(excs.GenericCommandError):
+            ScheduleRequest("remove", "a").apply()
+        registry.return_value.get.return_value = object()
+        with self.assertRaises(excs.GenericCommandError):
+            ScheduleRequest("list").apply()
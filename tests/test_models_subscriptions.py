@@ -0,0 +1,105 @@
+#! /usr/bin/env python3
+
+""" Tests for the subscriptions module """
+
+import gc
+import unittest
+from queue import Queue
+from unittest.mock import MagicMock
+
+from kitchen_aid.models.command import PartialResult, Result, UnchangedResult
+from kitchen_aid.models.engine import CommandEngine
+from kitchen_aid.models.interact import IThread, InteractInterface, get_cmd_id
+from kitchen_aid.models.subscriptions import SubscriptionHub, command_name, get_hub
+
+
+class FakeInterface(InteractInterface):  # pylint: disable=abstract-method
+    """ Interface collecting the posted messages """
+
+    def __init__(self) -> None:
+        super().__init__(Queue(), Queue())
+        self.posted: list[tuple[bytes, IThread]] = []
+        self.encoded: int = 0
+
+    def get_main_thread(self) -> IThread:
+        return MagicMock()
+
+    def _post_message(self, message: bytes, thread: IThread) -> None:
+        self.posted.append((message, thread))
+
+    def encode_result(self, cmd_id: str, result: Result) -> bytes:
+        self.encoded += 1
+        return super().encode_result(cmd_id, result)
+
+
+class TestSubscriptionHub(unittest.TestCase):
+    """ Tests for SubscriptionHub """
+
+    def setUp(self):
+        self.hub = SubscriptionHub()
+        self.cmd_id = get_cmd_id("get-page", [], {"url": "http://a"}, MagicMock(), MagicMock())
+
+    def test_command_name(self):
+        """ Test the name is taken out of the command id """
+        self.assertEqual(command_name(self.cmd_id), "get-page")
+
+    def test_fan_out(self):
+        """ Test a result is encoded once and delivered to every matching subscriber """
+        first, second = FakeInterface(), FakeInterface()
+        threads = [MagicMock() for _ in range(3)]
+        self.hub.subscribe(first, threads[0], command_id=self.cmd_id)
+        self.hub.subscribe(first, threads[1], pattern="get-*")
+        self.hub.subscribe(second, threads[2], pattern="get-page")
+        self.hub.subscribe(second, MagicMock(), pattern="schedule")
+        self.assertEqual(self.hub.publish(self.cmd_id, Result(True, "page", [])), 3)
+        self.assertEqual(first.encoded + second.encoded, 1)
+        messages = {message for message, _ in first.posted + second.posted}
+        self.assertEqual(len(messages), 1)
+        self.assertIn(b"get-page succeeded with message: page", messages.pop())
+        self.assertEqual([thread for _, thread in first.posted], threads[:2])
+        with self.subTest("partial results are not published"):
+            self.assertEqual(self.hub.publish(self.cmd_id, PartialResult(True, "", [])), 0)
+        with self.subTest("unchanged results are not published"):
+            self.assertEqual(self.hub.publish(self.cmd_id, UnchangedResult(True, "", [])), 0)
+        with self.assertRaises(ValueError):
+            self.hub.subscribe(first, MagicMock())
+
+    def test_cleanup(self):
+        """ Test subscriptions end on cancel, interface stop and garbage collection """
+        iface = FakeInterface()
+        subscription = self.hub.subscribe(iface, MagicMock(), pattern="*")
+        self.assertTrue(subscription.active)
+        self.assertTrue(subscription.cancel())
+        self.assertFalse(subscription.cancel())
+        self.assertFalse(subscription.active)
+
+        self.hub.subscribe(iface, MagicMock(), command_id=self.cmd_id)
+        iface.stop()
+        self.assertEqual(self.hub.publish(self.cmd_id, Result(True, "", [])), 0)
+        self.assertEqual(self.hub.size, 0)
+
+        iface = FakeInterface()
+        self.hub.subscribe(iface, MagicMock(), pattern="*")
+        del iface
+        gc.collect()
+        self.assertEqual(self.hub.size, 0)
+
+    def test_interface_subscribe(self):
+        """ Test interfaces subscribe on the process wide hub and stop ends them """
+        iface = FakeInterface()
+        subscription = iface.subscribe(pattern="get-*")
+        self.assertIs(subscription.thread, iface.main_thread)
+        self.assertTrue(get_hub().has(subscription))
+        iface.stop()
+        self.assertFalse(get_hub().has(subscription))
+
+    def test_engine_publishes(self):
+        """ Test the engine publishes final results after posting them """
+        engine = CommandEngine(1, subscriptions=self.hub)
+        origin, subscriber = FakeInterface(), FakeInterface()
+        self.hub.subscribe(subscriber, MagicMock(), pattern="get-page")
+        engine.command_result_queue.put((self.cmd_id, Result(True, "page", []), origin))
+        engine.command_result_queue.put(None)
+        engine.emmit_command_results()
+        self.assertEqual(len(origin.posted), 1)
+        self.assertEqual(len(subscriber.posted), 1)
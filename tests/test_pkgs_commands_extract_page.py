@@ -0,0 +1,53 @@
+#! /usr/bin/env python3
+
+"""
+Tests for the extract_page command
+"""
+
+import unittest
+
+from unittest.mock import MagicMock
+
+import httpx
+
+from kitchen_aid.models.command import FailedOperation, PartialResult, Result
+from kitchen_aid.pkgs.commands.extract_page import ExtractPage
+
+
+class TestExtractPage(unittest.TestCase):
+    """ Test the extract_page command """
+
+    def test_redo_undo(self):
+        """ Ensure redo/undo fail as commands """
+        extract_page = ExtractPage(MagicMock())
+        with self.assertRaises(FailedOperation):
+            extract_page.redo()
+        with self.assertRaises(FailedOperation):
+            extract_page.undo()
+
+    def test_execute(self):
+        """ Test batches are emitted and summarized """
+        receiver = MagicMock(summary="Extracted 8 characters and 0 links")
+        receiver.iter_text.return_value = iter(["# A", "Text"])
+        emitted = []
+        extract_page = ExtractPage(receiver)
+        extract_page.set_emitter(emitted.append)
+        result = extract_page.execute()
+        self.assertEqual(emitted, [PartialResult(True, "# A", []), PartialResult(True, "Text", [])])
+        self.assertEqual(result, Result(True, "Extracted 8 characters and 0 links", []))
+
+    def test_execute_error(self):
+        """ Test HTTP errors fail the command """
+        error = httpx.ConnectError("refused")
+        receiver = MagicMock()
+        receiver.iter_text.side_effect = error
+        result = ExtractPage(receiver).execute()
+        self.assertEqual(result, Result(False, "refused", [error]))
+
+    def test_stream(self):
+        """ Test the text is streamed a line per block """
+        receiver = MagicMock()
+        receiver.iter_text.return_value = iter(["a\nb", "c"])
+        extract_page = ExtractPage(receiver)
+        self.assertTrue(extract_page.can_stream and extract_page.accepts_stream)
+        self.assertEqual("".join(extract_page.stream()), "a\nb\nc\n")
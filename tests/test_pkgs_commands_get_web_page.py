@@ -4,14 +4,19 @@
 Tests for the get_web_page command
 """
 
+import socket
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from unittest.mock import MagicMock, patch
 
-from unittest.mock import MagicMock
+import httpx
 
-from requests.exceptions import RequestException
-
-from kitchen_aid.models.command import FailedOperation, Result
+from kitchen_aid.models.command import FailedOperation, Result, UnchangedResult
 from kitchen_aid.pkgs.commands.get_web_page import GetWebPage
+from kitchen_aid.pkgs.http.delta import get_fingerprints
+from kitchen_aid.pkgs.http.dns import DNSCache
+from kitchen_aid.pkgs.http.http_requests import HTTPRequest, set_client
 
 
 class TestGetWebPage(unittest.TestCase):
@@ -37,7 +42,7 @@ class TestGetWebPage(unittest.TestCase):
             self.assertEqual(result, Result(True, "Text", []))
 
         with self.subTest("Sad scenario"):
-            exc = RequestException("Error")
+            exc = httpx.HTTPError("Error")
             receiver = MagicMock()
             receiver.do_request.side_effect = exc
             get_web_page = GetWebPage(receiver)
@@ -45,3 +50,80 @@ class TestGetWebPage(unittest.TestCase):
             self.assertEqual(result.success, False)
             self.assertEqual(result.message, "Error")
             self.assertEqual(result.errors, [exc])
+
+    def test_delta(self):
+        """ Test only changes of the page are reported in delta mode """
+        receiver = MagicMock(delta=True, key="test_delta")
+        get_web_page = GetWebPage(receiver)
+        self.addCleanup(get_fingerprints().forget, "test_delta")
+        for text, expected in [
+            ("a\nb", Result(True, "a\nb", [])),
+            ("a\nb", UnchangedResult(True, "unchanged", [])),
+            ("a\nc", Result(True, "@@ -2,1 +2,1 @@\n+c", [])),
+        ]:
+            receiver.do_request.return_value = MagicMock(text=text, extensions={})
+            result = get_web_page.execute()
+            self.assertEqual(result, expected)
+            self.assertIs(type(result), type(expected))
+
+    def test_delta_per_origin(self):
+        """ Test pollers of the same page keep their own baselines """
+        receiver = MagicMock(delta=True, key="test_delta_per_origin")
+        receiver.do_request.return_value = MagicMock(text="a", extensions={})
+        for origin in ("poller-1", "poller-2"):
+            self.addCleanup(get_fingerprints().forget, origin)
+            get_web_page = GetWebPage(receiver)
+            get_web_page.set_origin(origin)
+            self.assertEqual(get_web_page.execute(), Result(True, "a", []))
+
+    def test_stream(self):
+        """ Test the page is streamed from the receiver """
+        receiver = MagicMock()
+        receiver.iter_text.return_value = iter(["a", "b"])
+        get_web_page = GetWebPage(receiver)
+        self.assertTrue(get_web_page.can_stream)
+        self.assertEqual(list(get_web_page.stream()), ["a", "b"])
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """ Serves a fixed page """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """ Serve the page """
+        self.send_response(200)
+        self.send_header("Content-Length", "4")
+        self.end_headers()
+        self.wfile.write(b"page")
+
+    def log_message(self, *_):  # pylint: disable=arguments-differ
+        """ Keep the test output clean """
+
+
+class TestGetWebPageClient(unittest.TestCase):
+    """ Test pages are fetched over the process wide client """
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.resolver = MagicMock(side_effect=lambda host, port, type=0: [
+            (socket.AF_INET, type, 0, "", ("127.0.0.1", port))
+        ])
+        patcher = patch(
+            "kitchen_aid.pkgs.http.dns._dns_cache", DNSCache(resolver=self.resolver)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        set_client(None)
+        self.addCleanup(set_client, None)
+
+    def test_dns_cache(self):
+        """ Test get-page resolves hosts with the DNS cache and reuses the connection """
+        url = f"http://upstream.test:{self.server.server_address[1]}/"
+        for _ in range(2):
+            result = GetWebPage(HTTPRequest(url, cache=False)).execute()
+            self.assertEqual(result, Result(True, "page", []))
+        self.assertEqual(self.resolver.call_count, 1)
@@ -0,0 +1,61 @@
+#! /usr/bin/env python3
+
+"""
+Tests for the get_web_pages command
+"""
+
+import unittest
+
+from unittest.mock import MagicMock
+
+import httpx
+
+from kitchen_aid.models.command import FailedOperation, PartialResult
+from kitchen_aid.pkgs.commands.get_web_pages import GetWebPages
+
+
+class TestGetWebPages(unittest.TestCase):
+    """ Test the get_web_pages command """
+
+    def test_redo_undo(self):
+        """ Ensure redo/undo fail as commands """
+        get_web_pages = GetWebPages(MagicMock())
+        with self.assertRaises(FailedOperation):
+            get_web_pages.redo()
+        with self.assertRaises(FailedOperation):
+            get_web_pages.undo()
+
+    def test_execute(self):
+        """ Test that page results are emitted and summarized """
+        error = httpx.ConnectError("refused")
+        receiver = MagicMock(urls=["http://a", "http://b"], status_only=False)
+        receiver.iter_requests.return_value = [
+            ("http://b", MagicMock(text="B")),
+            ("http://a", error),
+        ]
+        emitted = []
+        get_web_pages = GetWebPages(receiver)
+        get_web_pages.set_emitter(emitted.append)
+        result = get_web_pages.execute()
+
+        self.assertEqual(
+            emitted,
+            [
+                PartialResult(True, "http://b: B", []),
+                PartialResult(False, "http://a: refused", [error]),
+            ]
+        )
+        self.assertFalse(result.success)
+        self.assertEqual(result.message, "Fetched 1 of 2 pages, 1 failed")
+
+    def test_status_only(self):
+        """ Test that bodies are skipped in status only mode """
+        receiver = MagicMock(urls=["http://a"], status_only=True)
+        receiver.iter_requests.return_value = [
+            ("http://a", MagicMock(status_code=200, content=b"abc")),
+        ]
+        emitted = []
+        get_web_pages = GetWebPages(receiver)
+        get_web_pages.set_emitter(emitted.append)
+        self.assertTrue(get_web_pages.execute().success)
+        self.assertEqual(emitted[0].message, "http://a: 200, 3 bytes")
@@ -0,0 +1,36 @@
+#! /usr/bin/env python3
+
+"""
+Tests for the hedge_stats command
+"""
+
+import unittest
+
+from unittest.mock import MagicMock
+
+from kitchen_aid.models.command import FailedOperation
+from kitchen_aid.pkgs.commands.hedge_stats import HedgeStats
+
+
+class TestHedgeStats(unittest.TestCase):
+    """ Test the hedge_stats command """
+
+    def test_redo_undo(self):
+        """ Ensure redo/undo fail as commands """
+        hedge_stats = HedgeStats(MagicMock())
+        with self.assertRaises(FailedOperation):
+            hedge_stats.redo()
+        with self.assertRaises(FailedOperation):
+            hedge_stats.undo()
+
+    def test_execute(self):
+        """ Test the execute method """
+        receiver = MagicMock()
+        receiver.collect.return_value = {
+            "requests": 200, "hedges": 10, "hedge_wins": 4, "hedge_rate": 0.05, "win_rate": 0.4,
+        }
+        result = HedgeStats(receiver).execute()
+        self.assertTrue(result.success)
+        self.assertEqual(
+            result.message, "Requests: 200, hedged: 10 (5.0%), hedges won: 4 (40.0%)"
+        )
@@ -0,0 +1,41 @@
+#! /usr/bin/env python3
+
+"""
+Tests for the memory_stats command
+"""
+
+import unittest
+
+from unittest.mock import MagicMock
+
+from kitchen_aid.models.command import FailedOperation
+from kitchen_aid.pkgs.commands.memory_stats import MemoryStats
+
+
+class TestMemoryStats(unittest.TestCase):
+    """ Test the memory_stats command """
+
+    def test_redo_undo(self):
+        """ Ensure redo/undo fail as commands """
+        memory_stats = MemoryStats(MagicMock())
+        with self.assertRaises(FailedOperation):
+            memory_stats.redo()
+        with self.assertRaises(FailedOperation):
+            memory_stats.undo()
+
+    def test_execute(self):
+        """ Test the execute method """
+        receiver = MagicMock()
+        receiver.collect.return_value = {
+            "max_bytes": 1000, "used": 250, "peak": 900, "usage": 0.25,
+            "reservations": 3, "waiting": 0, "waited": 2, "timeouts": 1, "refused": 4,
+        }
+        result = MemoryStats(receiver).execute()
+        self.assertTrue(result.success)
+        self.assertEqual(
+            result.message,
+            "Reserved: 250 of 1000 bytes (25.0%), peak: 900, reservations: 3, "
+            "waiting: 0, waited: 2, timed out: 1, refused: 4",
+        )
+        receiver.collect.return_value = None
+        self.assertEqual(MemoryStats(receiver).execute().message, "Memory budget not configured")
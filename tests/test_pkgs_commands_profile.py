@@ -0,0 +1,48 @@
+#! /usr/bin/env python3
+
+"""
+Tests for the profile command
+"""
+
+import unittest
+
+from unittest.mock import MagicMock
+
+from kitchen_aid.models.command import FailedOperation
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.pkgs.commands.profile import ProfileThreads
+
+
+class TestProfileThreads(unittest.TestCase):
+    """ Test the profile command """
+
+    def test_redo_undo(self):
+        """ Ensure redo/undo fail as commands """
+        profile = ProfileThreads(MagicMock())
+        with self.assertRaises(FailedOperation):
+            profile.redo()
+        with self.assertRaises(FailedOperation):
+            profile.undo()
+
+    def test_execute(self):
+        """ Test the execute method """
+        receiver = MagicMock(output=None, top=3)
+        receiver.run.return_value.summary.return_value = "summary"
+        receiver.run.return_value.collapsed.return_value = "main;run 2"
+        result = ProfileThreads(receiver).execute()
+        self.assertTrue(result.success)
+        self.assertEqual(result.message, "summary\n\nmain;run 2")
+        receiver.run.return_value.summary.assert_called_once_with(3)
+
+        receiver.output = "profile.txt"
+        result = ProfileThreads(receiver).execute()
+        self.assertEqual(result.message, "summary\n\nCollapsed stacks written to profile.txt")
+        receiver.write.assert_called_once_with(receiver.run.return_value)
+
+        receiver.write.side_effect = OSError("read-only")
+        self.assertFalse(ProfileThreads(receiver).execute().success)
+
+        receiver.run.side_effect = excs.GenericCommandError("Another profile is running")
+        result = ProfileThreads(receiver).execute()
+        self.assertFalse(result.success)
+        self.assertEqual(result.message, "Another profile is running")
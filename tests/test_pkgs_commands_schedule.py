@@ -0,0 +1,37 @@
+#! /usr/bin/env python3
+
+"""
+Tests for the schedule command
+"""
+
+import unittest
+
+from unittest.mock import MagicMock
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.models.command import FailedOperation, Result
+from kitchen_aid.pkgs.commands.schedule import ManageSchedules
+
+
+class TestManageSchedules(unittest.TestCase):
+    """ Test the schedule command """
+
+    def test_redo_undo(self):
+        """ Ensure redo/undo fail as commands """
+        command = ManageSchedules(MagicMock())
+        with self.assertRaises(FailedOperation):
+            command.redo()
+        with self.assertRaises(FailedOperation):
+            command.undo()
+
+    def test_execute(self):
+        """ Test the execute method """
+        receiver = MagicMock()
+        receiver.apply.return_value = "No schedules"
+        self.assertEqual(ManageSchedules(receiver).execute(), Result(True, "No schedules", []))
+        error = excs.GenericCommandError("Scheduler is not configured")
+        receiver.apply.side_effect = error
+        self.assertEqual(
+            ManageSchedules(receiver).execute(),
+            Result(False, "Scheduler is not configured", [error]),
+        )
@@ -0,0 +1,166 @@
+#! /usr/bin/env python3
+
+"""
+Tests for the disk backed HTTP cache
+"""
+
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import httpx
+
+from kitchen_aid.pkgs.http.cache import (
+    HTTPCache, configure_cache, get_cache, parse_cache_control
+)
+from kitchen_aid.pkgs.http.http_requests import HTTPRequest
+
+
+def make_response(status: int, body: bytes = b"", **headers: str) -> httpx.Response:
+    """ Build a response to an example request """
+    return httpx.Response(
+        status,
+        headers={name.replace("_", "-"): value for name, value in headers.items()},
+        content=body,
+        request=httpx.Request("GET", "http://example.com"),
+    )
+
+
+class TestHTTPCache(unittest.TestCase):
+    """ Tests for HTTPCache """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_parse_cache_control(self):
+        """ Test Cache-Control parsing """
+        self.assertEqual(
+            parse_cache_control('max-age=60, No-Cache, private="x"'),
+            {"max-age": "60", "no-cache": None, "private": "x"},
+        )
+        self.assertEqual(parse_cache_control(None), {})
+
+    def test_store(self):
+        """ Test what gets stored """
+        cache = HTTPCache(self.tmp_dir.name)
+        key = cache.key("GET", "http://example.com")
+        with self.subTest("no validators"):
+            self.assertIsNone(cache.store(key, make_response(200, b"body")))
+        with self.subTest("no-store"):
+            response = make_response(200, b"body", etag='"a"', cache_control="no-store")
+            self.assertIsNone(cache.store(key, response))
+        with self.subTest("not successful"):
+            self.assertIsNone(cache.store(key, make_response(404, b"body", etag='"a"')))
+        with self.subTest("cacheable"):
+            entry = cache.store(key, make_response(200, b"body", etag='"a"', content_length="4"))
+            self.assertIsNotNone(entry)
+            self.assertFalse(entry.is_fresh())
+            self.assertEqual(entry.conditional_headers(), {"If-None-Match": '"a"'})
+            self.assertEqual(cache.lookup(key), entry)
+            response = cache.hit(entry)
+            self.assertEqual(response.content, b"body")
+            self.assertNotIn("content-length", dict(entry.headers))
+        with self.subTest("survives restart"):
+            reloaded = HTTPCache(self.tmp_dir.name)
+            self.assertEqual(len(reloaded), 1)
+            self.assertEqual(reloaded.read_body(reloaded.lookup(key)), b"body")
+
+    def test_vary(self):
+        """ Test responses are kept per value of the headers they vary on """
+        cache = HTTPCache(self.tmp_dir.name)
+        key = cache.key("GET", "http://example.com")
+        english = make_response(200, b"hello", etag='"en"', vary="Accept-Language")
+        german = make_response(200, b"hallo", etag='"de"', vary="accept-language")
+        cache.store(key, english, {"Accept-Language": "en"})
+        cache.store(key, german, {"accept-language": "de"})
+        self.assertEqual(cache.lookup(key, {"Accept-Language": "en"}).etag, '"en"')
+        self.assertEqual(cache.lookup(key, {"Accept-Language": "de"}).etag, '"de"')
+        self.assertIsNone(cache.lookup(key, {"Accept-Language": "fr"}))
+        self.assertIsNone(cache.lookup(key))
+        with self.subTest("survives restart"):
+            reloaded = HTTPCache(self.tmp_dir.name)
+            self.assertEqual(reloaded.lookup(key, {"Accept-Language": "de"}).etag, '"de"')
+        with self.subTest("vary on everything"):
+            response = make_response(200, b"body", etag='"a"', vary="Accept, *")
+            self.assertIsNone(cache.store(cache.key("GET", "http://example.com/any"), response))
+
+    def test_evicted_while_served(self):
+        """ Test entries evicted after the lookup are misses """
+        cache = HTTPCache(self.tmp_dir.name)
+        key = cache.key("GET", "http://example.com")
+        entry = cache.store(key, make_response(200, b"body", etag='"a"'))
+        cache.remove(key)
+        self.assertIsNone(cache.hit(entry))
+        self.assertEqual((cache.stats["hits"], cache.stats["misses"]), (0, 1))
+        self.assertIsNone(cache.revalidated(entry, make_response(304, etag='"b"')))
+        self.assertEqual(entry.etag, '"a"')
+        self.assertEqual(cache.stats["revalidated"], 0)
+
+    def test_lru_eviction(self):
+        """ Test size bound """
+        cache = HTTPCache(self.tmp_dir.name, max_bytes=10)
+        keys = [cache.key("GET", f"http://example.com/{i}") for i in range(3)]
+        cache.store(keys[0], make_response(200, b"aaaa", etag="0"))
+        cache.store(keys[1], make_response(200, b"bbbb", etag="1"))
+        cache.lookup(keys[0])
+        cache.store(keys[2], make_response(200, b"cccc", etag="2"))
+        self.assertIsNotNone(cache.lookup(keys[0]))
+        self.assertIsNone(cache.lookup(keys[1]))
+        self.assertEqual(cache.size, 8)
+        self.assertEqual(cache.stats["evictions"], 1)
+
+
+class TestCachedRequest(unittest.TestCase):
+    """ Tests for HTTPRequest with a cache """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self.tmp_dir.cleanup)
+        configure_cache(self.tmp_dir.name)
+        self.addCleanup(configure_cache, None)
+
+    def test_revalidation(self):
+        """ Test conditional revalidation and 304 handling """
+        request = HTTPRequest("http://example.com")
+        client = MagicMock()
+        client.request.return_value = make_response(
+            200, b"page", etag='"v1"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT"
+        )
+        self.assertEqual(request.do_request(client).text, "page")
+
+        client.request.return_value = make_response(304)
+        response = request.do_request(client)
+        self.assertEqual(response.text, "page")
+        self.assertEqual(response.status_code, 200)
+        headers = client.request.call_args.kwargs["headers"]
+        self.assertEqual(headers["If-None-Match"], '"v1"')
+        self.assertEqual(headers["If-Modified-Since"], "Mon, 01 Jan 2024 00:00:00 GMT")
+        self.assertEqual(get_cache().stats["revalidated"], 1)
+
+    def test_evicted_on_revalidation(self):
+        """ Test an entry evicted while it was revalidated is requested again """
+        request = HTTPRequest("http://example.com")
+        client = MagicMock()
+        client.request.return_value = make_response(200, b"page", etag='"v1"')
+        request.do_request(client)
+        client.request.side_effect = [
+            make_response(304),
+            make_response(200, b"new page", etag='"v2"'),
+        ]
+        with patch.object(get_cache(), "revalidated", return_value=None):
+            self.assertEqual(request.do_request(client).text, "new page")
+        self.assertNotIn("If-None-Match", client.request.call_args.kwargs["headers"])
+
+    def test_fresh_hit(self):
+        """ Test that fresh entries don't hit the network """
+        request = HTTPRequest("http://example.com")
+        client = MagicMock()
+        client.request.return_value = make_response(200, b"page", cache_control="max-age=600")
+        request.do_request(client)
+        self.assertEqual(request.do_request(client).text, "page")
+        client.request.assert_called_once()
+        with self.subTest("cache can be skipped"):
+            client.request.return_value = make_response(200, b"new")
+            uncached = HTTPRequest("http://example.com", cache=False)
+            self.assertEqual(uncached.do_request(client).text, "new")
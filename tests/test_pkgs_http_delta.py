@@ -0,0 +1,74 @@
+#! /usr/bin/env python3
+
+""" Tests for the delta module """
+
+import random
+import re
+import unittest
+
+from kitchen_aid.pkgs.http.delta import FingerprintStore
+
+
+def apply_hunks(old: list[str], hunks: str) -> list[str]:
+    """ Apply hunks of the store to the old lines """
+    new: list[str] = []
+    position = 0
+    for hunk in re.split(r"^(?=@@)", hunks, flags=re.MULTILINE):
+        if not hunk:
+            continue
+        header, *added = hunk.rstrip("\n").split("\n")
+        start, removed = (int(value) for value in re.findall(r"-(\d+),(\d+)", header)[0])
+        start -= 1
+        new.extend(old[position:start])
+        new.extend(line[1:] for line in added)
+        position = start + removed
+    return new + old[position:]
+
+
+class TestFingerprintStore(unittest.TestCase):
+    """ Tests for FingerprintStore """
+
+    def setUp(self):
+        self.store = FingerprintStore(max_entries=2)
+
+    def test_diff(self):
+        """ Test new bodies are returned whole, unchanged ones as None, changed ones as hunks """
+        self.assertEqual(self.store.diff("a", "one\ntwo\nthree"), "one\ntwo\nthree")
+        self.assertIsNone(self.store.diff("a", "one\ntwo\nthree"))
+        self.assertEqual(
+            self.store.diff("a", "zero\none\nthree\nfour"),
+            "@@ -1,0 +1,1 @@\n+zero\n@@ -2,1 +3,0 @@\n@@ -4,0 +4,1 @@\n+four",
+        )
+        self.assertIsNone(self.store.diff("a", "zero\none\nthree\nfour"))
+        self.assertEqual(self.store.stats(), {
+            "entries": 1, "line_hashes": 4, "unchanged": 2, "changed": 2,
+        })
+
+    def test_hunks_rebuild_the_body(self):
+        """ Test hunks turn the previous body into the new one, with repeated and moved lines """
+        rng = random.Random(7)
+        for attempt in range(50):
+            old = [rng.choice("abcdefgh") * rng.randint(1, 2) for _ in range(rng.randint(0, 30))]
+            new = list(old)
+            for _ in range(rng.randint(1, 5)):
+                position = rng.randint(0, len(new))
+                if new and rng.random() < 0.5:
+                    del new[min(position, len(new) - 1)]
+                else:
+                    new.insert(position, rng.choice("abcdefghxyz"))
+            with self.subTest(attempt=attempt):
+                self.store.diff("a", "\n".join(old + ["end"]))
+                hunks = self.store.diff("a", "\n".join(new + ["end"]))
+                if hunks is not None:
+                    self.assertEqual(apply_hunks(old + ["end"], hunks), new + ["end"])
+
+    def test_eviction(self):
+        """ Test least recently compared keys are dropped over the size """
+        for key in ("a", "b", "a", "c"):
+            self.store.diff(key, key)
+        self.assertIsNone(self.store.diff("a", "a"))
+        self.assertEqual(self.store.diff("b", "b"), "b")
+        self.store.configure(1)
+        self.assertEqual(self.store.stats()["entries"], 1)
+        with self.assertRaises(ValueError):
+            FingerprintStore(0)
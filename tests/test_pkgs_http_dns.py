@@ -0,0 +1,171 @@
+#! /usr/bin/env python3
+
+""" Tests for the http dns module """
+
+import socket
+import threading
+import unittest
+from unittest import mock
+
+import anyio
+import httpcore
+import httpx
+
+from kitchen_aid.pkgs.http.dns import (
+    AsyncCachingBackend, CachingBackend, DNSCache, configure_dns, get_dns_cache, use_dns_cache,
+)
+
+
+class FakeResolver:  # pylint: disable=too-few-public-methods
+    """ Resolves every host to the given addresses, counting the lookups """
+
+    def __init__(self, *addresses):
+        self.addresses = addresses
+        self.lookups = 0
+
+    def __call__(self, host, port, type=0):  # pylint: disable=redefined-builtin
+        self.lookups += 1
+        if not self.addresses:
+            raise socket.gaierror(f"Unknown host {host}")
+        return [(socket.AF_INET, type, 0, "", (address, port)) for address in self.addresses]
+
+
+class TestDNSCache(unittest.TestCase):
+    """ Tests for DNSCache """
+
+    def setUp(self):
+        self.now = 0.0
+        self.resolver = FakeResolver("10.0.0.1", "10.0.0.2")
+        self.cache = DNSCache(10, 1, 2, resolver=self.resolver, clock=lambda: self.now)
+
+    def test_resolve(self):
+        """ Test lookups are cached until the TTL """
+        addresses = self.cache.resolve("a.test", 80)
+        self.assertEqual(addresses, [(socket.AF_INET, ("10.0.0.1", 80)),
+                                     (socket.AF_INET, ("10.0.0.2", 80))])
+        self.assertEqual(self.cache.resolve("a.test", 80), addresses)
+        self.assertEqual(self.resolver.lookups, 1)
+        self.now = 10
+        self.cache.resolve("a.test", 80)
+        self.assertEqual(self.resolver.lookups, 2)
+        self.assertEqual(self.cache.stats(), {"entries": 1, "hits": 1, "misses": 2, "failures": 0})
+
+    def test_negative(self):
+        """ Test failed lookups are cached for the negative TTL """
+        self.resolver.addresses = ()
+        for _ in range(2):
+            with self.assertRaises(socket.gaierror):
+                self.cache.resolve("missing.test", 80)
+        self.assertEqual(self.resolver.lookups, 1)
+        self.now = 1
+        with self.assertRaises(socket.gaierror):
+            self.cache.resolve("missing.test", 80)
+        self.assertEqual(self.resolver.lookups, 2)
+        self.assertEqual(self.cache.failures, 3)
+
+    def test_max_entries(self):
+        """ Test least recently used hosts are dropped """
+        for host in ("a.test", "b.test", "a.test", "c.test"):
+            self.cache.resolve(host, 80)
+        self.resolver.lookups = 0
+        self.cache.resolve("a.test", 80)
+        self.assertEqual(self.resolver.lookups, 0)
+        self.cache.resolve("b.test", 80)
+        self.assertEqual(self.resolver.lookups, 1)
+        self.cache.configure(10, 1, 1)
+        self.assertEqual(self.cache.stats()["entries"], 1)
+
+    def test_invalidate(self):
+        """ Test an invalidated host is resolved again """
+        self.cache.resolve("a.test", 80)
+        self.cache.invalidate("a.test", 80)
+        self.cache.resolve("a.test", 80)
+        self.assertEqual(self.resolver.lookups, 2)
+
+    def test_bounds(self):
+        """ Test bounds are checked """
+        with self.assertRaises(ValueError):
+            DNSCache(0)
+        with self.assertRaises(ValueError):
+            self.cache.configure(10, 1, 0)
+
+
+class TestCachingBackend(unittest.TestCase):
+    """ Tests for CachingBackend """
+
+    def setUp(self):
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+        self.resolver = FakeResolver("127.0.0.1")
+        patcher = mock.patch(
+            "kitchen_aid.pkgs.http.dns._dns_cache", DNSCache(resolver=self.resolver)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.close()
+
+    def _serve(self):
+        """ Answer every request with an empty response """
+        try:
+            while True:
+                conn, _ = self.server.accept()
+                with conn:
+                    conn.recv(65536)
+                    conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+        except OSError:
+            pass
+
+    def test_connect(self):
+        """ Test connections to a host name go to the cached address """
+        with httpx.Client(transport=use_dns_cache(httpx.HTTPTransport())) as client:
+            for _ in range(2):
+                response = client.get(f"http://upstream.test:{self.port}/",
+                                      headers={"Connection": "close"})
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.resolver.lookups, 1)
+        self.assertEqual(get_dns_cache().hits, 1)
+
+    def test_connect_fails(self):
+        """ Test unreachable addresses drop the entry and unknown hosts fail to connect """
+        # A bound socket that doesn't listen refuses connections to it's port
+        with socket.socket() as closed:
+            closed.bind(("127.0.0.1", 0))
+            with self.assertRaises(httpcore.ConnectError):
+                CachingBackend().connect_tcp("upstream.test", closed.getsockname()[1], timeout=1)
+        self.assertEqual(get_dns_cache().stats()["entries"], 0)
+        self.resolver.addresses = ()
+        with self.assertRaises(httpcore.ConnectError):
+            CachingBackend().connect_tcp("missing.test", self.port, timeout=1)
+
+    def test_async_connect(self):
+        """ Test async clients connect through the cache """
+        async def get():
+            transport = use_dns_cache(httpx.AsyncHTTPTransport())
+            self.assertIsInstance(
+                transport._pool._network_backend,  # pylint: disable=protected-access
+                AsyncCachingBackend,
+            )
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await client.get(f"http://upstream.test:{self.port}/")
+
+        self.assertEqual(anyio.run(get).status_code, 200)
+        self.assertEqual(self.resolver.lookups, 1)
+
+
+class TestConfigureDNS(unittest.TestCase):
+    """ Tests for configure_dns """
+
+    def tearDown(self):
+        configure_dns(None)
+
+    def test_configure_dns(self):
+        """ Test the cache is changed in place and disabled by None """
+        cache = configure_dns(30, 2, 10)
+        self.assertIs(configure_dns(60), cache)
+        self.assertEqual(cache.ttl, 60)
+        self.assertIsNone(configure_dns(None))
+        self.assertIsNone(get_dns_cache())
@@ -0,0 +1,115 @@
+#! /usr/bin/env python3
+
+""" Tests for the extract module """
+
+import unittest
+
+import httpx
+
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.pkgs.http.extract import PageExtraction, PageExtractor, Selector
+
+
+PAGE: str = """<html><head><title> The  page </title><script>var x = "<p>";</script></head>
+<body><nav><a href="/home">Home</a></nav>
+<article id="main"><h1>Hello &amp; bye</h1>
+<p>First <b>para</b> with <a href="x.html">a link</a>.
+<p>Second<ul><li>one<li>two</ul>
+<div class="ad note">Buy</div></article><p>After"""
+
+
+def extract(page: str, size: int = 7, **options) -> str:
+    """ Feed a page in chunks of the given size and get the text """
+    extractor = PageExtractor("http://example.com/docs/", **options)
+    parts = []
+    for start in range(0, len(page), size):
+        extractor.feed(page[start:start + size])
+        parts.append(extractor.take())
+    extractor.close()
+    parts.append(extractor.take())
+    return "\n".join(part for part in parts if part)
+
+
+class TestPageExtractor(unittest.TestCase):
+    """ Tests for PageExtractor """
+
+    def test_text(self):
+        """ Test blocks are extracted as lines, scripts are skipped """
+        self.assertEqual(extract(PAGE), "\n".join([
+            "Title: The page",
+            "Home",
+            "# Hello & bye",
+            "First para with a link.",
+            "Second",
+            "- one",
+            "- two",
+            "Buy",
+            "After",
+        ]))
+
+    def test_chunking(self):
+        """ Test the text doesn't depend on how the page is chunked """
+        self.assertEqual(extract(PAGE, 1), extract(PAGE, len(PAGE)))
+
+    def test_links(self):
+        """ Test links are resolved and rendered inline """
+        text = extract(PAGE, links=True)
+        self.assertIn("[Home](http://example.com/home)", text)
+        self.assertIn("with [a link](http://example.com/docs/x.html).", text)
+        page = '<base href="http://other.com/"><a href=a></a>'
+        self.assertIn("<http://other.com/a>", extract(page, links=True))
+
+    def test_selectors(self):
+        """ Test only selected content is kept, excluded content never is """
+        text = extract(PAGE, select=[Selector("article")], exclude=[Selector("div.ad")])
+        self.assertEqual(text.splitlines()[1:], [
+            "# Hello & bye", "First para with a link.", "Second", "- one", "- two",
+        ])
+        text = extract(PAGE, select=[Selector("#main p")])
+        self.assertEqual(text.splitlines()[1:], ["First para with a link.", "Second"])
+
+    def test_pending(self):
+        """ Test completed blocks are handed out as the page is fed """
+        extractor = PageExtractor()
+        extractor.feed("<p>one</p><p>tw")
+        self.assertEqual(extractor.take(), "one")
+        self.assertEqual(extractor.pending, 0)
+        extractor.feed("o</p>")
+        extractor.close()
+        self.assertEqual(extractor.take(), "two")
+        self.assertEqual(extractor.chars, 6)
+
+    def test_invalid_selector(self):
+        """ Test unsupported selectors are rejected """
+        for text in ("", "a > b", "#a#b", "[href]"):
+            with self.subTest(text), self.assertRaises(excs.InvalidCommandArguments):
+                Selector(text)
+
+
+class TestPageExtraction(unittest.TestCase):
+    """ Tests for PageExtraction """
+
+    def test_source(self):
+        """ Test streamed input is extracted in batches """
+        extraction = PageExtraction(
+            source=(f"<p>paragraph {index}</p>" for index in range(100)), batch_size=100
+        )
+        batches = list(extraction.iter_text())
+        self.assertGreater(len(batches), 10)
+        self.assertEqual("\n".join(batches).splitlines()[-1], "paragraph 99")
+        self.assertEqual(extraction.summary, f"Extracted {extraction.chars} characters and 0 links")
+
+    def test_url(self):
+        """ Test the page is streamed from the URL """
+        chunks = [PAGE[:50].encode(), PAGE[50:].encode()]
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, content=iter(chunks)))
+        extraction = PageExtraction("http://example.com/")
+        with httpx.Client(transport=transport) as client:
+            text = "\n".join(extraction.iter_text(client))
+        self.assertIn("First para with a link.", text)
+        self.assertTrue(extraction.summary.endswith("from http://example.com/: The page"))
+
+    def test_missing_input(self):
+        """ Test a URL or a source is required """
+        with self.assertRaises(excs.InvalidCommandArguments):
+            PageExtraction()
@@ -0,0 +1,163 @@
+#! /usr/bin/env python3
+
+"""
+Tests for hedged HTTP requests
+"""
+
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+from kitchen_aid.pkgs.http.hedging import Hedger, HedgingPolicy, HedgingStats
+from kitchen_aid.pkgs.http.http_requests import HTTPRequest
+
+
+class TestHedgingPolicy(unittest.TestCase):
+    """ Tests for HedgingPolicy """
+
+    def test_delay(self):
+        """ Test the adaptive delay """
+        policy = HedgingPolicy(percentile=0.9, min_delay=0.01, default_delay=2.0, min_samples=10)
+        self.assertEqual(policy.delay("example.com"), 2.0)
+        for latency in range(1, 11):
+            policy.record("example.com", latency / 10)
+        self.assertAlmostEqual(policy.delay("example.com"), 1.0)
+        self.assertEqual(policy.delay("other.com"), 2.0)
+        for _ in range(10):
+            policy.record("fast.com", 0.001)
+        self.assertEqual(policy.delay("fast.com"), 0.01)
+
+    def test_budget(self):
+        """ Test hedges are capped by the extra load """
+        policy = HedgingPolicy(max_extra_load=0.25)
+        hedged = 0
+        for _ in range(100):
+            policy.start_request()
+            hedged += policy.try_hedge()
+        self.assertEqual(hedged, 25)
+        self.assertEqual(policy.stats()["hedge_rate"], 0.25)
+
+    def test_configure(self):
+        """ Test thresholds change in place, latencies and stats are kept """
+        policy = HedgingPolicy(min_samples=2, window=3)
+        for latency in (0.1, 0.2, 0.3):
+            policy.record("example.com", latency)
+        policy.start_request()
+        policy.configure(percentile=0.5, min_samples=2, window=2)
+        self.assertEqual(policy.percentile, 0.5)
+        self.assertEqual(policy.stats()["requests"], 1)
+        self.assertAlmostEqual(policy.delay("example.com"), 0.3)
+        with self.assertRaises(ValueError):
+            policy.configure(percentile=2)
+        self.assertEqual(policy.percentile, 0.5)
+
+    def test_invalid(self):
+        """ Test invalid policies """
+        with self.assertRaises(ValueError):
+            HedgingPolicy(percentile=1.5)
+        with self.assertRaises(ValueError):
+            HedgingPolicy(max_extra_load=-1)
+
+
+class TestHedger(unittest.TestCase):
+    """ Tests for Hedger """
+
+    def setUp(self):
+        self.calls: list[str] = []
+        self.cancelled: list[int] = []
+        # Delays of the responses, in the order of the requests
+        self.delays: list[float] = []
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        """ Respond after the next delay """
+        call = len(self.calls)
+        self.calls.append(request.method)
+        delay = self.delays[call] if call < len(self.delays) else 0.0
+        try:
+            await asyncio.sleep(abs(delay))
+        except asyncio.CancelledError:
+            self.cancelled.append(call)
+            raise
+        if delay < 0:
+            raise httpx.ConnectError("Failed")
+        return httpx.Response(200, text=f"response {call}")
+
+    def make_hedger(self, **policy) -> Hedger:
+        """ Hedger with a mocked transport """
+        policy = {"default_delay": 0.05, "max_extra_load": 1.0, "burst": 1.0, **policy}
+        hedger = Hedger(
+            HedgingPolicy(**policy),
+            httpx.AsyncClient(transport=httpx.MockTransport(self.handler)),
+        )
+        self.addCleanup(hedger.close)
+        return hedger
+
+    def test_fast_response(self):
+        """ Test fast responses are not hedged """
+        hedger = self.make_hedger()
+        response = hedger.request("GET", "http://example.com")
+        self.assertEqual(response.text, "response 0")
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(hedger.policy.stats()["hedges"], 0)
+
+    def test_hedge_wins(self):
+        """ Test a hedge that finishes first wins and the original is cancelled """
+        self.delays = [2.0, 0.0]
+        hedger = self.make_hedger()
+        response = hedger.request("GET", "http://example.com")
+        self.assertEqual(response.text, "response 1")
+        self.assertEqual(self.cancelled, [0])
+        stats = hedger.policy.stats()
+        self.assertEqual((stats["hedges"], stats["hedge_wins"]), (1, 1))
+        self.assertEqual(stats["win_rate"], 1.0)
+
+    def test_latencies(self):
+        """ Test completed requests record their latency from their own start """
+        self.delays = [0.3, 0.0, 0.1]
+        hedger = self.make_hedger(min_samples=1, min_delay=0.0)
+        hedger.request("GET", "http://example.com")
+        # The hedge, not the cancelled original nor the hedge delay
+        self.assertLess(hedger.policy.delay("example.com"), 0.05)
+        hedger.policy.configure(min_samples=2, min_delay=0.0, percentile=0.99, max_extra_load=0.0)
+        hedger.request("GET", "http://example.com")
+        self.assertGreaterEqual(hedger.policy.delay("example.com"), 0.1)
+
+    def test_failed_request(self):
+        """ Test a failed request loses to one that can still succeed """
+        self.delays = [-0.1, 0.2]
+        hedger = self.make_hedger()
+        self.assertEqual(hedger.request("GET", "http://example.com").text, "response 1")
+        self.calls, self.delays = [], [-0.1, -0.2]
+        with self.assertRaises(httpx.ConnectError):
+            hedger.request("GET", "http://example.com")
+
+    def test_no_budget(self):
+        """ Test requests are not hedged without budget """
+        self.delays = [0.2]
+        hedger = self.make_hedger(max_extra_load=0.0)
+        self.assertEqual(hedger.request("GET", "http://example.com").text, "response 0")
+        self.assertEqual(len(self.calls), 1)
+
+    def test_not_idempotent(self):
+        """ Test only idempotent requests are hedged """
+        self.delays = [0.2]
+        hedger = self.make_hedger()
+        hedger.request("POST", "http://example.com", content=b"data")
+        self.assertEqual(self.calls, ["POST"])
+        self.assertEqual(hedger.policy.stats()["requests"], 0)
+
+    def test_http_request(self):
+        """ Test HTTPRequest opts in to hedging """
+        self.delays = [2.0, 0.0]
+        hedger = self.make_hedger()
+        with patch("kitchen_aid.pkgs.http.http_requests.get_hedger", return_value=hedger):
+            response = HTTPRequest("http://example.com", hedge=True, cache=False).do_request()
+        self.assertEqual(response.text, "response 1")
+
+    def test_stats(self):
+        """ Test the stats receiver reads the process wide hedger """
+        hedger = self.make_hedger()
+        with patch("kitchen_aid.pkgs.http.hedging.get_hedger", return_value=hedger):
+            self.assertEqual(HedgingStats().collect()["requests"], 0)
@@ -5,11 +5,22 @@ Tests for the http requests wrapper
 """
 
 
+import gzip
+import os
+import tempfile
 import unittest
 
 import httpx
 
-from kitchen_aid.pkgs.http.http_requests import HTTPRequest
+from kitchen_aid.models.budget import configure_budget
+from kitchen_aid.models.compression import get_compression
+import kitchen_aid.models.exceptions as excs
+from kitchen_aid.pkgs.http.http_requests import (
+    HTTPBatchRequest,
+    HTTPRequest,
+    configure_url_files,
+    reservation_of,
+)
 
 
 class TestHTTPRequest(unittest.TestCase):
@@ -29,9 +40,10 @@ class TestHTTPRequest(unittest.TestCase):
         self.assertIsNone(request._headers)
         self.assertIsNone(request._params)
         self.assertEqual(request._timeout, 10)
-        self.assertEqual(request._req_callable, httpx.get)
+        self.assertEqual(request._method, "GET")
         self.assertIsNone(request._data)
-        self.assertEqual(request._request_kw_args, {"timeout": 10})
+        accept = {"Accept-Encoding": get_compression().accept_encoding}
+        self.assertEqual(request._request_kw_args, {"headers": accept, "timeout": 10})
         request = HTTPRequest(
             "http://example.com",
             method="POST",
@@ -44,14 +56,143 @@ class TestHTTPRequest(unittest.TestCase):
         self.assertEqual(request._headers, {"header": "value"})
         self.assertEqual(request._params, {"param": "value"})
         self.assertEqual(request._timeout, 5)
-        self.assertEqual(request._req_callable, httpx.post)
+        self.assertEqual(request._method, "POST")
         self.assertEqual(request._data, "data")
         self.assertEqual(
             request._request_kw_args,
             {
                 "params": {"param": "value"},
-                "headers": {"header": "value"},
+                "headers": {**accept, "header": "value"},
                 "timeout": 5,
                 "data": "data",
             },
         )
+
+    def test_slots(self):
+        """ Test that requests don't carry a per instance dict """
+        request = HTTPRequest("http://example.com")
+        self.assertFalse(hasattr(request, "__dict__"))
+
+    def test_iter_text(self):
+        """ Test the body is streamed """
+        transport = httpx.MockTransport(
+            lambda request: httpx.Response(200, content=iter([b"chunk 1, ", b"chunk 2"]))
+        )
+        with httpx.Client(transport=transport) as client:
+            text = "".join(HTTPRequest("http://example.com").iter_text(client))
+        self.assertEqual(text, "chunk 1, chunk 2")
+
+    def test_compressed(self):
+        """ Test negotiated encodings are decoded, and explicit ones are kept """
+        body = gzip.compress(b"compressed " * 100)
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            encoding = request.headers["accept-encoding"]
+            if "gzip" not in encoding:
+                return httpx.Response(200, text=encoding)
+            chunks = iter([body[:10], body[10:]])
+            return httpx.Response(200, headers={"Content-Encoding": "gzip"}, content=chunks)
+
+        with httpx.Client(transport=httpx.MockTransport(handler)) as client:
+            text = "".join(HTTPRequest("http://example.com").iter_text(client))
+            self.assertEqual(text, "compressed " * 100)
+            request = HTTPRequest("http://example.com", headers={"accept-encoding": "identity"})
+            self.assertEqual("".join(request.iter_text(client)), "identity")
+
+    def test_budget(self):
+        """ Test the body is reserved from the memory budget while the response is held """
+        transport = httpx.MockTransport(
+            lambda request: httpx.Response(200, content=iter([b"chunk 1, ", b"chunk 2"]))
+        )
+        budget = configure_budget(1024)
+        try:
+            with httpx.Client(transport=transport) as client:
+                response = HTTPRequest("http://example.com", cache=False).do_request(client)
+            self.assertEqual(response.text, "chunk 1, chunk 2")
+            self.assertEqual(reservation_of(response).size, 16)
+            self.assertEqual(budget.used, 16)
+            del response
+            self.assertEqual(budget.used, 0)
+        finally:
+            configure_budget(None)
+
+    def test_failed_request_released(self):
+        """ Test the reservation of a failed request is released at once """
+        transport = httpx.MockTransport(lambda request: httpx.Response(500, content=b"error"))
+        budget = configure_budget(1024)
+        try:
+            failure = None
+            with httpx.Client(transport=transport) as client:
+                try:
+                    HTTPRequest("http://example.com", cache=False).do_request(client)
+                except httpx.HTTPStatusError as error:
+                    # Keeps the traceback, and the frames of the request, alive
+                    failure = error
+            self.assertIsNotNone(failure)
+            self.assertEqual((budget.used, budget.stats()["reservations"]), (0, 0))
+        finally:
+            configure_budget(None)
+
+    def test_over_budget(self):
+        """ Test a body larger than the memory budget is refused while it's streamed """
+        transport = httpx.MockTransport(
+            lambda request: httpx.Response(200, content=iter([b"x" * 600] * 3))
+        )
+        budget = configure_budget(1024)
+        try:
+            with httpx.Client(transport=transport) as client, self.assertRaises(
+                excs.MemoryBudgetExhausted
+            ):
+                HTTPRequest("http://example.com", cache=False).do_request(client)
+            self.assertLessEqual(budget.stats()["peak"], 1024)
+            self.assertEqual(budget.stats()["refused"], 1)
+            self.assertEqual((budget.used, budget.stats()["reservations"]), (0, 0))
+        finally:
+            configure_budget(None)
+
+
+class TestHTTPBatchRequest(unittest.TestCase):
+    """ Test the HTTPBatchRequest class """
+
+    @staticmethod
+    def handler(request: httpx.Request) -> httpx.Response:
+        """ Fail on /bad, echo the path otherwise """
+        if request.url.path == "/bad":
+            return httpx.Response(500)
+        return httpx.Response(200, text=request.url.path)
+
+    def test_iter_requests(self):
+        """ Test concurrent execution over a shared client """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(os.path.join(tmp_dir, "urls"), "w", encoding="utf-8") as urls:
+                urls.write("# comment\nhttp://example.com/c\n\n")
+            configure_url_files(tmp_dir)
+            self.addCleanup(configure_url_files, None)
+            batch = HTTPBatchRequest(
+                ["http://example.com/a", "http://example.com/bad"],
+                url_file="urls",
+                concurrency=2,
+            )
+        self.assertEqual(len(batch.urls), 3)
+        with httpx.Client(transport=httpx.MockTransport(self.handler)) as client:
+            outcomes = dict(batch.iter_requests(client))
+        self.assertEqual(outcomes["http://example.com/a"].text, "/a")
+        self.assertEqual(outcomes["http://example.com/c"].text, "/c")
+        self.assertIsInstance(outcomes["http://example.com/bad"], httpx.HTTPStatusError)
+
+    def test_url_file_confined(self):
+        """ Test URL files are refused without a directory and outside of it """
+        configure_url_files(None)
+        with self.assertRaises(excs.InvalidCommandArguments):
+            HTTPBatchRequest([], url_file="urls")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            configure_url_files(tmp_dir)
+            self.addCleanup(configure_url_files, None)
+            for url_file in ("/etc/passwd", "../urls", "sub/../../urls"):
+                with self.subTest(url_file), self.assertRaises(excs.InvalidCommandArguments):
+                    HTTPBatchRequest([], url_file=url_file)
+
+    def test_invalid_concurrency(self):
+        """ Test concurrency validation """
+        with self.assertRaises(ValueError):
+            HTTPBatchRequest(["http://example.com"], concurrency=0)
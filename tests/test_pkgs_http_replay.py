@@ -0,0 +1,52 @@
+#! /usr/bin/env python3
+
+""" Tests for the http replay module """
+
+import unittest
+
+import httpx
+
+from kitchen_aid.models.command import CommandMapper
+from kitchen_aid.models.replay import RecordedCommand, Recording
+from kitchen_aid.pkgs.commands.get_web_page import GetWebPage
+from kitchen_aid.pkgs.http.http_requests import HTTPRequest, get_client, set_client
+from kitchen_aid.pkgs.http.replay import RecordedTransport, install_stub
+
+
+class TestRecordedTransport(unittest.TestCase):
+    """ Tests for RecordedTransport """
+
+    def setUp(self):
+        self.recording = Recording([
+            RecordedCommand(1, 0.0, "get-page", [], {"url": "http://a"}, 0.01, 10, True),
+            RecordedCommand(2, 0.1, "get-page", [], {"url": "http://a"}, 0.0, 20, True),
+            RecordedCommand(
+                3, 0.2, "get-pages", [], {"urls": ["http://b", "http://c"]}, 0.0, 30, True
+            ),
+            RecordedCommand(4, 0.3, "get-page", [], {"url": "http://d"}, None, 0, None),
+        ])
+
+    def tearDown(self):
+        set_client(None)
+
+    def test_recorded_responses(self):
+        """ Test responses follow the recorded order and sizes """
+        with httpx.Client(transport=RecordedTransport(self.recording)) as client:
+            sizes = [len(client.get(url).content) for url in ("http://a",) * 3]
+            self.assertEqual(sizes, [10, 20, 20])
+            self.assertEqual(len(client.get("http://b", params={"q": 1}).content), 15)
+            self.assertEqual(client.get("http://d").content, b"")
+
+    def test_install_stub(self):
+        """ Test receivers of recorded commands send their requests to the stub """
+        CommandMapper().register(GetWebPage, HTTPRequest, "get-page")
+        try:
+            transport = install_stub(self.recording)
+            _, receiver, _ = CommandMapper().get_command("get-page")
+            self.assertTrue(issubclass(receiver, HTTPRequest))
+            response = receiver("http://c", cache=False).do_request()
+            self.assertEqual(len(response.content), 15)
+            self.assertEqual(transport.served, 1)
+            self.assertIs(get_client()._transport, transport)  # pylint: disable=protected-access
+        finally:
+            CommandMapper().register(GetWebPage, HTTPRequest, "get-page")
@@ -0,0 +1,62 @@
+#! /usr/bin/env python3
+
+""" Tests for the http warmup module """
+
+import time
+import unittest
+
+import httpx
+
+from kitchen_aid.pkgs.http.http_requests import set_client
+from kitchen_aid.pkgs.http.warmup import ConnectionWarmer, configure_warmup, get_warmer
+
+
+class TestConnectionWarmer(unittest.TestCase):
+    """ Tests for ConnectionWarmer """
+
+    def setUp(self):
+        self.requests = []
+
+        def handler(request):
+            self.requests.append((request.method, str(request.url)))
+            if request.url.host == "down.test":
+                raise httpx.ConnectError("Connection refused", request=request)
+            return httpx.Response(204)
+
+        set_client(httpx.Client(transport=httpx.MockTransport(handler)))
+
+    def tearDown(self):
+        configure_warmup(None)
+        set_client(None)
+
+    def test_warm(self):
+        """ Test every URL is probed and failures are counted """
+        warmer = ConnectionWarmer(["http://up.test/", "http://down.test/"])
+        self.assertEqual(warmer.warm(), 1)
+        self.assertCountEqual(
+            self.requests, [("HEAD", "http://up.test/"), ("HEAD", "http://down.test/")]
+        )
+        stats = warmer.stats()
+        self.assertEqual((stats["rounds"], stats["probes"], stats["failures"]), (1, 2, 1))
+        self.assertEqual(stats["last"]["http://up.test/"], 204)
+        self.assertTrue(stats["last"]["http://down.test/"].startswith("ConnectError"))
+
+    def test_keep_warm(self):
+        """ Test URLs are probed at start and every interval until stopped """
+        warmer = configure_warmup(["http://up.test/"], interval=0.01, method="get")
+        self.assertIs(get_warmer(), warmer)
+        self.assertGreaterEqual(len(self.requests), 1)
+        self.assertEqual(self.requests[0][0], "GET")
+        deadline = time.monotonic() + 5
+        while warmer.rounds < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertGreaterEqual(warmer.rounds, 3)
+        self.assertIsNone(configure_warmup(None))
+        rounds = warmer.rounds
+        time.sleep(0.05)
+        self.assertLessEqual(warmer.rounds, rounds + 1)
+
+    def test_bounds(self):
+        """ Test interval and timeout are checked """
+        with self.assertRaises(ValueError):
+            ConnectionWarmer(["http://up.test/"], interval=0)
@@ -0,0 +1,174 @@
+#! /usr/bin/env python3
+
+"""
+Tests for the HTTP interact interface.
+Tests run a local server on a random port.
+"""
+
+import json
+import time
+import unittest
+from queue import Queue
+from threading import Thread
+from typing import Callable
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+
+from kitchen_aid.models.command import Result
+from kitchen_aid.models.compression import configure_compression
+from kitchen_aid.models.interact import get_cmd_id
+from kitchen_aid.models.subscriptions import get_hub
+from kitchen_aid.pkgs.interacts.http_interface import HTTPInterface
+
+
+@pytest.mark.usefixtures("url_command")
+class TestHTTPInterface(unittest.TestCase):
+    """ Tests for HTTPInterface """
+
+    # Set by the url_command fixture
+    get_command: Callable[[str], tuple]
+
+    def setUp(self):
+        patcher = patch('kitchen_aid.pkgs.interacts.http_interface.CommandMapper')
+        mock_cmap = patcher.start()
+        self.addCleanup(patcher.stop)
+        mock_cmap.return_value.get_command.side_effect = self.get_command
+
+        self.command_queue: Queue = Queue()
+        self.iface = HTTPInterface(
+            self.command_queue, Queue(), host="127.0.0.1", port=0, keep_alive_timeout=2
+        )
+        self.listener = Thread(target=self.iface.listen, daemon=True)
+        self.listener.start()
+        self.assertTrue(self.iface.wait_ready(5))
+        self.client = httpx.Client(base_url=f"http://127.0.0.1:{self.iface.port}", timeout=5)
+
+    def tearDown(self):
+        self.client.close()
+        self.iface.stop()
+        self.listener.join(5)
+
+    def complete(self, success: bool = True, message: str | None = None) -> None:
+        """ Act as the engine for one command """
+        cmd, args, kw_args, thread, iface = self.command_queue.get(timeout=5)
+        iface.post_command_result(
+            get_cmd_id(cmd, args, kw_args, thread, iface),
+            Result(success, kw_args["url"] if message is None else message, [])
+        )
+
+    def test_health(self):
+        """ Test the health endpoint """
+        response = self.client.get("/healthz")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "ok", "pending": 0})
+
+    def test_no_coalescing(self):
+        """ Test JSON messages are not coalesced """
+        with self.assertRaises(ValueError):
+            HTTPInterface(Queue(), Queue(), coalesce={"max_messages": 2})
+        self.assertFalse(self.iface.reconfigure(coalesce={"max_messages": 2}))
+        self.assertTrue(self.iface.reconfigure(result_ttl=10))
+
+    def test_submit_and_long_poll(self):
+        """ Test submitting a command and long-polling it's result """
+        response = self.client.post("/commands", json={"command": "get", "args": ["one"]})
+        self.assertEqual(response.status_code, 202)
+        cmd_id = response.json()["id"]
+
+        pending = self.client.get(f"/commands/{cmd_id}").json()
+        self.assertFalse(pending["done"])
+
+        Thread(target=self.complete, daemon=True).start()
+        status = self.client.get(f"/commands/{cmd_id}", params={"wait": 5}).json()
+        self.assertTrue(status["done"])
+        self.assertEqual(
+            status["results"], [{"success": True, "message": "one", "errors": []}]
+        )
+        self.assertEqual(self.client.delete(f"/commands/{cmd_id}").status_code, 200)
+        self.assertEqual(self.client.get(f"/commands/{cmd_id}").status_code, 404)
+
+    def test_compression(self):
+        """ Test large results are compressed for clients that accept it """
+        configure_compression(min_size=100)
+        self.addCleanup(configure_compression)
+        cmd_id = self.client.post(
+            "/commands", json={"command": "get", "args": ["one"]}
+        ).json()["id"]
+        self.complete(message="page " * 100)
+        for accept, encoding in (("gzip", "gzip"), ("identity", None)):
+            with self.subTest(accept):
+                response = self.client.get(
+                    f"/commands/{cmd_id}", headers={"Accept-Encoding": accept}
+                )
+                self.assertEqual(response.headers.get("content-encoding"), encoding)
+                self.assertEqual(response.headers["vary"], "Accept-Encoding")
+                self.assertEqual(response.json()["results"][0]["message"], "page " * 100)
+
+    def test_stream(self):
+        """ Test streaming results of a list of submissions """
+        response = self.client.post("/commands", json=[
+            {"command": "get", "args": ["one"]},
+            {"command": "get", "args": ["two"]},
+        ])
+        ids = [sub["id"] for sub in response.json()]
+        self.assertEqual(len(set(ids)), 2)
+        self.complete()
+        self.complete(False)
+        lines = []
+        for cmd_id in ids:
+            with self.client.stream("GET", f"/commands/{cmd_id}/stream") as stream:
+                lines.extend(stream.iter_lines())
+        self.assertEqual(len(lines), 2)
+        self.assertIn('"success": false', lines[1])
+
+    def test_subscribe(self):
+        """ Test subscribers get the results of commands scheduled by others """
+        hub = get_hub()
+        cmd_id = get_cmd_id("get-page", [], {"url": "one"}, MagicMock(), MagicMock())
+        with self.client.stream("GET", "/subscribe", params={"command": "get-*"}) as stream:
+            deadline = time.monotonic() + 5
+            while not hub.size:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+            hub.publish(cmd_id, Result(True, "page", []))
+            line = next(line for line in stream.iter_lines() if line)
+        self.assertEqual(
+            json.loads(line),
+            {"command": "get-page", "success": True, "message": "page", "errors": []},
+        )
+        with self.subTest("closed subscriber is unsubscribed"):
+            deadline = time.monotonic() + 5
+            while hub.size:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.05)
+        self.assertEqual(self.client.get("/subscribe").status_code, 400)
+
+    def test_errors(self):
+        """ Test error responses """
+        with self.subTest("Unknown command"):
+            response = self.client.post("/commands", json={"command": "nope"})
+            self.assertEqual(response.status_code, 404)
+        with self.subTest("Invalid args"):
+            for args in ([], ["a", "b"], ["a", "-h"]):
+                response = self.client.post("/commands", json={"command": "get", "args": args})
+                self.assertEqual(response.status_code, 400)
+            self.assertIn("-h", response.json()["error"])
+        with self.subTest("Invalid submission of a list"):
+            response = self.client.post("/commands", json=[
+                {"command": "get", "args": ["one"]},
+                {"command": "nope"},
+            ])
+            self.assertEqual(response.status_code, 404)
+            self.assertIn("Submission 1", response.json()["error"])
+            self.assertEqual(self.command_queue.qsize(), 0)
+        with self.subTest("Invalid body"):
+            response = self.client.post("/commands", content=b"not json")
+            self.assertEqual(response.status_code, 400)
+        with self.subTest("Unknown path"):
+            self.assertEqual(self.client.get("/nope").status_code, 404)
+            self.assertEqual(self.client.get("/commands/id/nope").status_code, 404)
+        with self.subTest("Unsupported method"):
+            self.assertEqual(self.client.get("/commands").status_code, 405)
+            self.assertEqual(self.client.delete("/healthz").status_code, 405)
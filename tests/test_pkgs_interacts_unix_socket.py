@@ -0,0 +1,132 @@
+#! /usr/bin/env python3
+
+""" Tests for the unix socket interact interface """
+
+import os
+import tempfile
+import unittest
+import zlib
+from queue import Queue
+from threading import Thread
+from typing import Callable
+from unittest.mock import patch
+
+import pytest
+
+from kitchen_aid.models.command import Result
+from kitchen_aid.models.compression import configure_compression
+from kitchen_aid.models.interact import get_cmd_id
+from kitchen_aid.pkgs.interacts.unix_socket import (
+    FLAG_COMPRESSED,
+    FRAME_ERROR,
+    FRAME_RESULT,
+    FrameError,
+    UnixSocketClient,
+    UnixSocketInterface,
+    decode_command,
+    decode_result,
+    encode_command,
+    encode_result,
+    HEADER,
+)
+
+
+class TestFraming(unittest.TestCase):
+    """ Tests for the framing helpers """
+
+    def test_command(self):
+        """ Test command frames """
+        frame = encode_command(7, "get", ["a", "b"])
+        length, frame_type, request_id = HEADER.unpack(frame[:HEADER.size])
+        self.assertEqual((frame_type, request_id), (1, 7))
+        self.assertEqual(length, len(frame) - HEADER.size)
+        self.assertEqual(decode_command(frame[HEADER.size:]), ("get", ["a", "b"]))
+
+    def test_result(self):
+        """ Test result frames """
+        frame = encode_result(3, False, b"failed")
+        self.assertEqual(decode_result(frame[HEADER.size:]), (False, b"failed"))
+        frame = encode_result(3, True, zlib.compress(b"done"), compressed=True)
+        self.assertEqual(decode_result(frame[HEADER.size:], "deflate"), (True, b"done"))
+        with self.assertRaises(FrameError):
+            decode_result(frame[HEADER.size:])
+
+
+@pytest.mark.usefixtures("url_command")
+class TestUnixSocketInterface(unittest.TestCase):
+    """ Tests for UnixSocketInterface """
+
+    # Set by the url_command fixture
+    get_command: Callable[[str], tuple]
+
+    def setUp(self):
+        patcher = patch('kitchen_aid.pkgs.interacts.unix_socket.CommandMapper')
+        patcher.start().return_value.get_command.side_effect = self.get_command
+        self.addCleanup(patcher.stop)
+
+        tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, "ka.sock")
+        self.command_queue: Queue = Queue()
+        self.iface = UnixSocketInterface(self.command_queue, Queue(), path=self.path)
+        self.listener = Thread(target=self.iface.listen, daemon=True)
+        self.listener.start()
+        self.assertTrue(self.iface.wait_ready(5))
+
+    def tearDown(self):
+        self.iface.stop()
+        self.listener.join(5)
+        self.assertFalse(os.path.exists(self.path))
+
+    def complete(self, message: str | None = None) -> None:
+        """ Act as the engine for one command """
+        cmd, args, kw_args, thread, iface = self.command_queue.get(timeout=5)
+        iface.post_command_result(
+            get_cmd_id(cmd, args, kw_args, thread, iface),
+            Result(True, kw_args["url"] if message is None else message, [])
+        )
+
+    def test_no_coalescing(self):
+        """ Test frames are not coalesced """
+        with self.assertRaises(ValueError):
+            UnixSocketInterface(Queue(), Queue(), path=self.path, coalesce={})
+        self.assertFalse(self.iface.reconfigure(coalesce={"max_messages": 2}))
+
+    def test_pipelining(self):
+        """ Test pipelined commands, duplicates and errors """
+        with UnixSocketClient(self.path, timeout=5) as client:
+            req_ids = client.send_many([
+                ("get", ["one"]), ("get", ["two"]), ("get", ["one"]), ("nope", []),
+            ])
+            error = client.recv()
+            self.assertEqual((error.frame_type, error.request_id), (FRAME_ERROR, req_ids[3]))
+            # Duplicate commands share a single execution
+            self.complete()
+            self.complete()
+            self.assertTrue(self.command_queue.empty())
+            results = {}
+            for _ in range(3):
+                frame = client.recv()
+                self.assertEqual(frame.frame_type, FRAME_RESULT)
+                results[frame.request_id] = decode_result(frame.payload)
+        self.assertEqual(results, {
+            req_ids[0]: (True, b"one"),
+            req_ids[1]: (True, b"two"),
+            req_ids[2]: (True, b"one"),
+        })
+
+    def test_compression(self):
+        """ Test large results are compressed once an encoding is negotiated """
+        configure_compression(min_size=100)
+        self.addCleanup(configure_compression)
+        with UnixSocketClient(self.path, timeout=5) as client:
+            self.assertIsNone(client.accept_encodings(["identity"]))
+            self.assertEqual(client.accept_encodings(["gzip", "deflate"]), "gzip")
+            small, large = client.send_many([("get", ["one"]), ("get", ["two"])])
+            self.complete()
+            self.complete("page " * 100)
+            frames = {frame.request_id: frame for frame in (client.recv(), client.recv())}
+            self.assertFalse(frames[small].payload[0] & FLAG_COMPRESSED)
+            self.assertTrue(frames[large].payload[0] & FLAG_COMPRESSED)
+            self.assertEqual(client.decode(frames[small]), (True, b"one"))
+            self.assertEqual(client.decode(frames[large]), (True, b"page " * 100))